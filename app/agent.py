@@ -1,12 +1,21 @@
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Tuple
 from pydantic import BaseModel
-from pydantic_ai import Agent, Tool
-from pydantic_ai.mcp import MCPServerHTTP
 from dotenv import load_dotenv
 from .settings import get_settings
 from .llm_router import llm_router
+from .providers import provider_registry, ToolRequest
+from .knowledge import knowledge_retriever
+from .mcp_engine import ToolCall, ToolResult, mcp_engine, truncate_tool_output
+from .mcp_catalog import mcp_catalog
+from .mcp_sessions import mcp_sessions, build_http_client
 import os
 import json
+import asyncio
+import functools
+import hashlib
+from .logging_config import get_logger
+
+logger = get_logger(__name__)
 
 load_dotenv()
 settings = get_settings()
@@ -25,7 +34,8 @@ class INeuroAgent:
         self.name = "I-Neuro"
         self.description = "Agente de atendimento inteligente com suporte a múltiplas ferramentas via MCP"
         self.mcp_servers = self._load_mcp_servers()
-        self.mcp_clients: List[MCPServerHTTP] = []
+        # pydantic_ai.mcp.MCPServerHTTP por nome do servidor (o mesmo dict do motor de execução)
+        self.mcp_clients: Dict[str, Any] = mcp_engine.clients
         
         # Configuração da persona do agente
         self.agent_persona = """🤖 Você é o I-Neuro, um assistente virtual super criativo e inovador!
@@ -44,10 +54,8 @@ class INeuroAgent:
 - Técnico quando precisa, mas sempre super acessível 🎯
 - Super empático e compreensivo ❤️"""
 
-        # Configuração do prompt base
-        self.base_system_prompt = f"""{self.agent_persona}
-
-📝 Diretrizes de Resposta:
+        # Diretrizes de resposta (prompt base sem a persona)
+        self.response_guidelines = """📝 Diretrizes de Resposta:
 
 1. 🎯 Estrutura:
    - Comece com uma introdução super animada! 🎉
@@ -106,52 +114,112 @@ class INeuroAgent:
 - Forneça exercícios práticos e recursos de aprendizado 🎓"""
         }
 
-        # Mapeamento de instruções específicas por modelo
-        self.model_instructions = {
-            "claude-3-opus": {
-                "format": "system",
-                "prefix": "You are I-Neuro, a super creative virtual assistant! 🎨 Follow these guidelines strictly:\n\n"
-            },
-            "gpt-4": {
-                "format": "system_message",
-                "prefix": "You are I-Neuro. Be super creative and follow these guidelines in all responses:\n\n"
-            },
-            "gemini-1.5-pro": {
-                "format": "inline",
-                "prefix": "Act as I-Neuro, being super creative and following these guidelines carefully:\n\n"
-            },
-            "deepseek-chat": {
-                "format": "system_message",
-                "prefix": "Embody I-Neuro and be super creative while following these guidelines:\n\n"
-            }
+        # Instruções específicas por modelo vêm da configuração dos provedores
+        self.model_instructions = provider_registry.prompt_instructions()
+
+        # Configuração usada para modelos sem instruções específicas
+        self.default_model_instructions = {
+            "format": "system_message",
+            "prefix": "Follow these guidelines:\n\n"
         }
 
+        # Tabela pré-computada de system prompts por (modelo, tipo de tarefa);
+        # também monta self.base_system_prompt (persona + diretrizes)
+        self.base_system_prompt = ""
+        self.prompt_table: Dict[Tuple[str, Optional[str]], Tuple[str, str]] = {}
+        self.prompt_inputs_hash = ""
+        self._build_prompt_table()
+
+    def _hash_text(self, text: str) -> str:
+        """Hash estável usado como chave de cache para prompts"""
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
+
+    def _build_prompt_table(self) -> bool:
+        """
+        Pré-computa o system prompt e seu hash para cada combinação de modelo e
+        tipo de tarefa. Só reconstrói quando as entradas (persona, diretrizes,
+        prompts de tarefa e instruções de modelo) mudaram.
+        
+        Returns:
+            True se a tabela foi reconstruída
+        """
+        inputs_hash = self._hash_text(json.dumps({
+            "persona": self.agent_persona,
+            "guidelines": self.response_guidelines,
+            "tasks": self.task_prompts,
+            "models": self.model_instructions
+        }, sort_keys=True, ensure_ascii=False))
+        
+        if inputs_hash == self.prompt_inputs_hash:
+            return False
+        
+        self.base_system_prompt = f"{self.agent_persona}\n\n{self.response_guidelines}"
+        
+        models = {**self.model_instructions, "default": self.default_model_instructions}
+        table = {}
+        for model_name, model_config in models.items():
+            for task_type in [None, *self.task_prompts.keys()]:
+                combined_prompt = self.base_system_prompt
+                if task_type:
+                    combined_prompt = f"{combined_prompt}\n\n{self.task_prompts[task_type]}"
+                formatted_prompt = f"{model_config['prefix']}{combined_prompt}"
+                table[(model_name, task_type)] = (formatted_prompt, self._hash_text(formatted_prompt))
+        
+        self.prompt_table = table
+        self.prompt_inputs_hash = inputs_hash
+        return True
+
+    def update_prompt_inputs(self, persona: Optional[str] = None, guidelines: Optional[str] = None) -> bool:
+        """
+        Atualiza a persona e/ou as diretrizes do prompt base (comandos /persona e /prompt)
+        
+        Returns:
+            True se a tabela de prompts foi reconstruída
+        """
+        if persona:
+            self.agent_persona = persona
+        if guidelines:
+            self.response_guidelines = guidelines
+        return self._build_prompt_table()
+
     def _load_mcp_servers(self) -> List[MCPServer]:
         """Carrega configurações dos servidores MCP do arquivo .env"""
         try:
             servers_config = settings.get_mcp_servers()
             return [MCPServer(**server) for server in servers_config]
         except Exception as e:
-            print(f"Erro ao carregar configurações dos servidores MCP: {str(e)}")
+            logger.error(f"Erro ao carregar configurações dos servidores MCP: {str(e)}")
             return []
 
-    async def connect_servers(self):
-        """Conecta a todos os servidores MCP configurados"""
+    async def connect_servers(self, database=None):
+        """
+        Abre as sessões persistentes com os servidores MCP configurados e espera
+        (até MCP_WARMUP_TIMEOUT) que conectem
+        
+        Args:
+            database: DatabaseClient onde o catálogo de ferramentas é gravado e de onde é recarregado
+        """
+        if not self.mcp_servers:
+            return
+        mcp_catalog.database = database
+        # Último catálogo conhecido; a descoberta (list_tools) roda a cada conexão e em segundo plano
+        await mcp_catalog.load_persisted()
+        mcp_sessions.on_connect = lambda name: mcp_catalog.refresh()
+        
+        await mcp_sessions.start(
+            {
+                server.name: functools.partial(build_http_client, server.url, server.api_key, settings.MCP_CONNECT_TIMEOUT)
+                for server in self.mcp_servers
+            },
+            settings.MCP_WARMUP_TIMEOUT
+        )
         for server in self.mcp_servers:
-            try:
-                # Cria cliente MCP usando HTTP SSE
-                client = MCPServerHTTP(
-                    url=f"{server.url}/sse",
-                    headers={"Authorization": f"Bearer {server.api_key}"}
-                )
-                self.mcp_clients.append(client)
-                print(f"Configurado servidor MCP: {server.name}")
-            except Exception as e:
-                print(f"Erro ao configurar servidor {server.name}: {str(e)}")
+            if mcp_sessions.connected(server.name):
+                logger.info(f"Conectado ao servidor MCP: {server.name}")
 
     async def disconnect_servers(self):
-        """Desconecta de todos os servidores MCP"""
-        self.mcp_clients.clear()
+        """Fecha as sessões com todos os servidores MCP"""
+        await mcp_sessions.stop()
     
     async def get_mcp_status(self) -> List[Dict[str, Any]]:
         """
@@ -162,23 +230,17 @@ class INeuroAgent:
         """
         status_list = []
         
-        for i, server in enumerate(self.mcp_servers):
+        # Só lê o estado das sessões e o catálogo em memória: nenhuma chamada aos servidores por requisição
+        for server in self.mcp_servers:
             server_info = {
                 "name": server.name,
                 "description": server.description or f"Servidor MCP {server.name}",
-                "connected": i < len(self.mcp_clients),
-                "url": server.url
+                "connected": mcp_sessions.connected(server.name),
+                "url": server.url,
+                "session": mcp_sessions.status(server.name)
             }
-            
-            # Verifica se o servidor está conectado
             if server_info["connected"]:
-                try:
-                    # Obtém lista de ferramentas disponíveis
-                    client = self.mcp_clients[i]
-                    server_info["available_tools"] = ["execute_code", "search_web"]  # TODO: Implementar descoberta de ferramentas
-                except Exception as e:
-                    server_info["error"] = str(e)
-                    server_info["available_tools"] = []
+                server_info.update(mcp_catalog.snapshot(server.name))
             else:
                 server_info["available_tools"] = []
                 
@@ -186,63 +248,95 @@ class INeuroAgent:
             
         return status_list
     
-    async def _use_server_tools(self, message: str):
+    async def detect_tool_need(self, message: str) -> Tuple[bool, Dict[str, Any]]:
+        """Detecta se a mensagem precisa de ferramenta (sem servidores MCP conectados, nunca precisa)"""
+        if not self.mcp_clients:
+            return False, {}
+        return await llm_router.detect_tool_need(message, mcp_catalog.tools())
+    
+    async def _use_server_tools(self, message: str, tool_need: Optional[Tuple[bool, Dict[str, Any]]] = None) -> Optional[str]:
         """
-        Tenta usar ferramentas dos servidores MCP
-        Retorna None se não for possível ou não for necessário usar ferramentas
+        Executa as ferramentas detectadas por palavras-chave (modo usado quando o
+        provedor não tem function calling nativo) e retorna as saídas formatadas
+        para o prompt do usuário, ou None se nenhuma ferramenta é necessária
+        
+        Args:
+            message: Mensagem (com contexto) enviada à ferramenta
+            tool_need: Resultado de detect_tool_need, se já calculado em paralelo pelo turno
         """
         if not self.mcp_clients:
-            print("Nenhum servidor MCP está conectado")
+            logger.debug("Nenhum servidor MCP está conectado")
             return None
             
         try:
             # Verifica se a mensagem requer uma ferramenta
-            # Usa o LLM para determinar se uma ferramenta é necessária
-            needs_tool, tool_info = await llm_router.detect_tool_need(message)
+            needs_tool, tool_info = tool_need or await llm_router.detect_tool_need(message, mcp_catalog.tools())
             
             if not needs_tool:
                 return None
                 
-            tool_name = tool_info.get("tool_name", "")
-            tool_input = tool_info.get("tool_input", "")
-            server_name = tool_info.get("server_name", "")
-            
-            print(f"Detectada necessidade de ferramenta: {tool_name} do servidor {server_name}")
+            calls = [
+                ToolCall(
+                    server=info.get("server_name", ""),
+                    tool=info.get("tool_name", ""),
+                    arguments=self._tool_arguments(info.get("tool_input", ""))
+                )
+                for info in tool_info.get("calls") or [tool_info]
+            ]
             
-            # Encontra o servidor MCP apropriado
-            target_client = None
-            for i, server in enumerate(self.mcp_servers):
-                if server.name == server_name and i < len(self.mcp_clients):
-                    target_client = self.mcp_clients[i]
-                    break
+            logger.info("Detectada necessidade de ferramenta", extra={
+                "tool": ",".join(call.tool for call in calls),
+                "server": ",".join(call.server for call in calls)
+            })
             
-            if not target_client:
-                return f"Servidor MCP '{server_name}' não encontrado ou não está conectado."
-                
-            # Executa a ferramenta no servidor MCP
-            try:
-                result = await target_client.execute_tool(
-                    tool_name=tool_name,
-                    tool_input=tool_input
-                )
-                
-                # Combina o resultado da ferramenta com uma resposta do LLM
-                combined_response = await llm_router.combine_tool_result(
-                    message, 
-                    tool_name, 
-                    result
-                )
-                
-                return combined_response
-            except Exception as e:
-                error_msg = f"Erro ao executar ferramenta {tool_name}: {str(e)}"
-                print(error_msg)
-                return error_msg
+            # Executa as ferramentas em paralelo, cada uma com seu prazo; as saídas
+            # entram no prompt da resposta, sem uma chamada extra ao LLM para combiná-las
+            results = await mcp_engine.run(calls)
+            return llm_router.format_tool_results([(result.call.tool, self._tool_output(result)) for result in results])
                 
         except Exception as e:
-            print(f"Erro ao processar ferramentas MCP: {str(e)}")
+            logger.error(f"Erro ao processar ferramentas MCP: {str(e)}")
             return None
 
+    def _offered_tools(self, model_name: str) -> List[Dict[str, Any]]:
+        """Ferramentas do catálogo oferecidas ao modelo (function calling nativo); vazio se ele não suporta"""
+        if not self.mcp_clients or not llm_router.supports_tools(model_name):
+            return []
+        # Nomes repetidos entre servidores: vale o primeiro, como em mcp_catalog.find
+        tools = {}
+        for tool in mcp_catalog.tools():
+            tools.setdefault(tool.name, tool.to_dict())
+        return list(tools.values())
+
+    async def _run_tool_requests(self, requests: List[ToolRequest]) -> List[str]:
+        """Executa em paralelo as chamadas pedidas pelo modelo e retorna as saídas, na mesma ordem"""
+        outputs: List[Optional[str]] = [None] * len(requests)
+        calls, positions = [], []
+        for position, request in enumerate(requests):
+            tool = mcp_catalog.find(request.name)
+            if tool is None:
+                outputs[position] = f"Ferramenta desconhecida: {request.name}"
+                continue
+            calls.append(ToolCall(tool.server, tool.name, request.arguments))
+            positions.append(position)
+        for position, result in zip(positions, await mcp_engine.run(calls)):
+            outputs[position] = self._tool_output(result)
+        return outputs
+
+    @staticmethod
+    def _tool_output(result: ToolResult) -> str:
+        """Saída que volta ao modelo: o erro, ou o resultado cortado em MCP_TOOL_OUTPUT_TOKENS"""
+        if not result.ok:
+            return result.error
+        return truncate_tool_output(result.call.tool, result.output, settings.MCP_TOOL_OUTPUT_TOKENS)
+
+    @staticmethod
+    def _tool_arguments(tool_input: Any) -> Dict[str, Any]:
+        """Argumentos da chamada: um dict é repassado como está, um texto vira {"input": texto}"""
+        if isinstance(tool_input, dict):
+            return tool_input
+        return {"input": tool_input}
+
     async def _get_task_prompt(self, message: str) -> str:
         """Determina o prompt específico para o tipo de tarefa"""
         # Palavras-chave para classificação
@@ -262,55 +356,50 @@ class INeuroAgent:
         
         return ""  # Retorna vazio se não identificar um tipo específico
 
+    def get_system_prompt(self, model_name: str, task_type: Optional[str] = None) -> Tuple[str, str]:
+        """
+        Retorna o system prompt pré-computado e seu hash
+        
+        Args:
+            model_name: Nome do modelo (claude-3-opus, ...) ou do LLM (anthropic, ...)
+            task_type: Tipo de tarefa identificado na mensagem
+        """
+        if model_name not in self.model_instructions:
+            model_name = llm_router._get_model_name(model_name)
+        if model_name not in self.model_instructions:
+            model_name = "default"
+        if task_type not in self.task_prompts:
+            task_type = None
+        return self.prompt_table[(model_name, task_type)]
+
     async def _format_system_prompt(self, model_name: str, task_type: str = None) -> str:
         """Formata o system prompt de acordo com o modelo específico"""
-        model_config = self.model_instructions.get(model_name, {
-            "format": "system_message",
-            "prefix": "Follow these guidelines:\n\n"
-        })
-        
-        # Combina os prompts
-        combined_prompt = self.base_system_prompt
-        if task_type and task_type in self.task_prompts:
-            combined_prompt = f"{combined_prompt}\n\n{self.task_prompts[task_type]}"
-        
-        # Formata de acordo com o modelo
-        formatted_prompt = f"{model_config['prefix']}{combined_prompt}"
-        
-        return formatted_prompt
+        return self.get_system_prompt(model_name, task_type)[0]
 
-    async def process_message(self, message: str, context: Optional[str] = None) -> Dict[str, Any]:
+    async def process_message(
+        self,
+        message: str,
+        context: Optional[str] = None,
+        channel: str = "web",
+        tool_need: Optional[Tuple[bool, Dict[str, Any]]] = None
+    ) -> Dict[str, Any]:
         """
         Processa uma mensagem usando o agente e as ferramentas MCP disponíveis
         
         Args:
             message: Mensagem do usuário
             context: Contexto opcional (histórico de conversa, etc)
+            channel: Canal de origem ('web' ou 'whatsapp'), define o perfil de geração
+            tool_need: Detecção de ferramenta já feita pelo turno (evita refazer sobre o prompt)
             
         Returns:
             Dict com a resposta processada e metadados
         """
         try:
             # Adiciona contexto se fornecido
-            prompt = message
-            if context:
-                if isinstance(context, (dict, list)):
-                    context = json.dumps(context, ensure_ascii=False)
-                prompt = f"Contexto anterior:\n{context}\n\nMensagem atual:\n{message}"
-            
-            # Primeiro, verifica se precisa usar alguma ferramenta MCP
-            tool_response = await self._use_server_tools(prompt)
-            if tool_response:
-                return {
-                    "response": tool_response,
-                    "llm": "mcp",
-                    "model": "tool",
-                    "classification": "tool",
-                    "metadata": {
-                        "tool_used": True,
-                        "source": "mcp"
-                    }
-                }
+            if context and isinstance(context, (dict, list)):
+                context = json.dumps(context, ensure_ascii=False)
+            prompt = llm_router._build_user_prompt(message, context)
             
             # Identifica o tipo de tarefa
             task_type = await self._get_task_type(message)
@@ -318,18 +407,33 @@ class INeuroAgent:
             # Seleciona o melhor modelo via LLM Router
             selected_model = await llm_router._select_best_model(message)
             
-            # Formata o system prompt específico para o modelo selecionado
-            system_prompt = await self._format_system_prompt(selected_model, task_type)
+            # Obtém o system prompt pré-computado para o modelo selecionado
+            system_prompt, prompt_hash = self.get_system_prompt(selected_model, task_type)
             
-            print(f"Using model: {selected_model}")
-            print(f"Task type: {task_type}")
-            print(f"System prompt:\n{system_prompt}")
+            logger.debug("agent_prompt_selected", extra={"model": selected_model, "task_type": task_type, "system_prompt_hash": prompt_hash})
+            
+            # Com function calling nativo o modelo recebe as ferramentas e decide na própria
+            # conversa; sem ele, as ferramentas detectadas rodam junto com a busca na base
+            tools = self._offered_tools(selected_model)
+            passages, tool_results = await asyncio.gather(
+                knowledge_retriever.retrieve(message),
+                self._use_server_tools(prompt, tool_need) if not tools else asyncio.sleep(0)
+            )
+            knowledge = knowledge_retriever.format_context(passages)
             
             # Obtém a resposta do LLM Router
+            # O system prompt é estático (cacheável no provedor); o contexto
+            # dinâmico segue separado e é colocado por último pelo router
             llm_response = await llm_router.generate_response(
-                prompt=prompt,
-                context=None,  # Contexto já está no prompt
-                system_prompt=system_prompt
+                prompt=message,
+                context=context,
+                system_prompt=system_prompt,
+                channel=channel,
+                query_class=llm_router._classify_query_complexity(message),
+                knowledge=knowledge,
+                tools=tools,
+                run_tools=self._run_tool_requests,
+                tool_results=tool_results
             )
             
             # Garante que temos todas as informações necessárias
@@ -345,14 +449,20 @@ class INeuroAgent:
             llm_response["metadata"].update({
                 "task_type": task_type or "general",
                 "system_prompt_used": True,
-                "model_used": selected_model
+                "system_prompt_hash": prompt_hash,
+                "model_used": selected_model,
+                "tool_used": bool(tool_results or llm_response["metadata"].get("tools_used")),
+                "knowledge_passages": [
+                    {"filename": passage.filename, "position": passage.position, "score": passage.score}
+                    for passage in passages
+                ]
             })
             
             return llm_response
             
         except Exception as e:
             error_msg = f"Erro ao processar mensagem com o agente: {str(e)}"
-            print(error_msg)
+            logger.error(error_msg)
             return {
                 "response": error_msg,
                 "llm": "system",
@@ -1,6 +1,8 @@
 from typing import Dict, Any, Optional
 from enum import Enum
 import json
+from .agent import ineuro_agent
+from .knowledge import knowledge_ingestor
 
 class CommandType(Enum):
     BASE = "/base"
@@ -170,26 +172,30 @@ class CommandHandler:
         return card.to_dict()
     
     async def _handle_base_command(self, data: Dict[str, Any]) -> Dict[str, Any]:
-        """Processa o comando /base"""
-        if not data.get("files"):
+        """Processa o comando /base: ingere os arquivos (UploadFile) na base de conhecimento"""
+        files = data.get("files") or []
+        if not files:
             return {
                 "response": "Erro: Nenhum arquivo foi fornecido",
                 "model": "system",
                 "error": True
             }
             
-        # Aqui você implementaria o processamento dos arquivos
-        # Por exemplo, enviar para um serviço de embeddings, salvar metadados no banco, etc.
+        jobs = await knowledge_ingestor.ingest_files(files)
+        indexed = [job for job in jobs if job.status in ("done", "unchanged")]
+        failed = [job for job in jobs if job.status == "error"]
         
-        # Simulando o processamento
-        num_files = len(data.get("files", []))
-        file_names = ", ".join(data.get("files", [])[:3])
-        if num_files > 3:
-            file_names += f" e mais {num_files - 3} arquivo(s)"
+        response = f"Base de conhecimento atualizada! {len(indexed)} de {len(jobs)} arquivo(s) indexado(s), {sum(job.chunks for job in indexed)} trecho(s)."
+        if failed:
+            response += " Falhas: " + "; ".join(f"{job.filename}: {job.error}" for job in failed[:3])
+            if len(failed) > 3:
+                response += f" e mais {len(failed) - 3}"
             
         return {
-            "response": f"Base de conhecimento atualizada com sucesso! Arquivos processados: {file_names}",
-            "model": "system"
+            "response": response,
+            "model": "system",
+            "error": not indexed,
+            "files": [job.to_dict() for job in jobs]
         }
     
     async def _handle_persona_command(self, data: Dict[str, Any]) -> Dict[str, Any]:
@@ -204,9 +210,6 @@ class CommandHandler:
                 "error": True
             }
             
-        # Aqui você implementaria a lógica para salvar a persona no sistema
-        # Por exemplo, atualizar um arquivo de configuração, banco de dados, etc.
-        
         # Templates pré-definidos para personalidades
         persona_templates = {
             "friendly": "Assistente amigável e conversacional que usa linguagem informal e emojis ocasionais",
@@ -218,7 +221,10 @@ class CommandHandler:
         if persona_type and not description:
             description = persona_templates.get(persona_type, "")
             
-        # Simulando o processamento
+        # Atualiza a persona do agente (reconstrói a tabela de prompts se mudou)
+        if description:
+            ineuro_agent.update_prompt_inputs(persona=description)
+            
         response_message = f"Personalidade configurada com sucesso!"
         if persona_type:
             response_message += f" Tipo: {persona_type.capitalize()}"
@@ -242,10 +248,9 @@ class CommandHandler:
                 "error": True
             }
             
-        # Aqui você implementaria a lógica para salvar o prompt base no sistema
-        # Por exemplo, atualizar um arquivo de configuração, banco de dados, etc.
+        # Atualiza as diretrizes do prompt base (reconstrói a tabela de prompts se mudou)
+        ineuro_agent.update_prompt_inputs(guidelines=prompt)
         
-        # Simulando o processamento
         short_prompt = prompt[:50] + "..." if len(prompt) > 50 else prompt
         
         return {
@@ -0,0 +1,93 @@
+from typing import List, Dict, Any, Set
+from fastapi import WebSocket
+import asyncio
+import time
+from .shared_state import SharedState, shared_state
+from .ws_session import WebSocketSession, dumps
+from .logging_config import get_logger
+from .metrics import WS_SESSIONS, WS_FANOUT_LATENCY, WS_BROADCAST_DROPPED
+
+logger = get_logger(__name__)
+
+class ConnectionManager:
+    """
+    Sessões WebSocket deste worker, indexadas pelo id. O broadcast passa pelo
+    pub/sub do estado compartilhado, então chega também aos clientes
+    conectados em outros workers.
+    """
+
+    CHANNEL = "ws_broadcast"
+
+    def __init__(self, state: SharedState):
+        self.state = state
+        self.sessions: Dict[str, WebSocketSession] = {}
+        self._fanouts: Set[asyncio.Task] = set()
+        state.subscribe(self.CHANNEL, self._deliver)
+
+    @property
+    def active_connections(self) -> List[WebSocket]:
+        return [session.websocket for session in self.sessions.values()]
+
+    async def connect(self, websocket: WebSocket) -> WebSocketSession:
+        await websocket.accept()
+        session = WebSocketSession(websocket)
+        self.sessions[session.id] = session
+        WS_SESSIONS.set(len(self.sessions))
+        return session
+
+    def disconnect(self, session: WebSocketSession):
+        self.sessions.pop(session.id, None)
+        WS_SESSIONS.set(len(self.sessions))
+
+    async def broadcast(self, message: Dict[str, Any]):
+        """Envia a mensagem a todos os clientes de todos os workers"""
+        await self.state.publish(self.CHANNEL, message)
+
+    async def flush(self):
+        """Espera a entrega (ou falha) dos broadcasts já enfileirados"""
+        if self._fanouts:
+            await asyncio.gather(*list(self._fanouts), return_exceptions=True)
+
+    async def _deliver(self, message: Dict[str, Any]):
+        """
+        Entrega um broadcast aos clientes deste worker: serializa uma vez e põe o
+        texto na fila de envio de cada sessão, sem esperar nenhum cliente. Um
+        cliente com a fila cheia perde a mensagem; a entrega é acompanhada em
+        segundo plano para medir o fan-out e remover clientes que falharam.
+        """
+        start = time.perf_counter()
+        text = dumps(message)
+        loop = asyncio.get_running_loop()
+        pending: Dict[asyncio.Future, WebSocketSession] = {}
+        for session in list(self.sessions.values()):
+            done = loop.create_future()
+            if session.enqueue(text, done):
+                pending[done] = session
+            elif session.closed:
+                WS_BROADCAST_DROPPED.inc(reason="closed")
+                self.disconnect(session)
+            else:
+                WS_BROADCAST_DROPPED.inc(reason="queue_full")
+        if not pending:
+            WS_FANOUT_LATENCY.observe(time.perf_counter() - start)
+            return
+        task = asyncio.create_task(self._track_fanout(pending, start))
+        self._fanouts.add(task)
+        task.add_done_callback(self._fanouts.discard)
+
+    async def _track_fanout(self, pending: Dict[asyncio.Future, WebSocketSession], start: float):
+        await asyncio.wait(pending)
+        failed = 0
+        for done, session in pending.items():
+            if not done.result():
+                failed += 1
+                self.disconnect(session)
+        elapsed = time.perf_counter() - start
+        WS_FANOUT_LATENCY.observe(elapsed)
+        logger.debug("ws_broadcast", extra={
+            "clients": len(pending),
+            "failed": failed,
+            "fanout_ms": round(elapsed * 1000, 2)
+        })
+
+manager = ConnectionManager(shared_state)
@@ -1,16 +1,23 @@
 from typing import Dict, Any, Optional, List
 import os
 from datetime import datetime
-import requests
+import asyncio
+import aiohttp
 import json
 import uuid
+import weakref
+from .logging_config import get_logger
+from .tracing import tracer
+from .metrics import DB_REQUESTS
+from .http_pool import http_pool
+
+logger = get_logger(__name__)
 
 class DatabaseClient:
     def __init__(self):
+        # A validação fica para a primeira requisição: importar o app não exige credenciais
         self.supabase_url = os.getenv("SUPABASE_URL")
         self.supabase_key = os.getenv("SUPABASE_KEY")
-        if not self.supabase_url or not self.supabase_key:
-            raise ValueError("Supabase URL and key must be set in environment variables")
         
         self.headers = {
             "apikey": self.supabase_key,
@@ -18,22 +25,28 @@ class DatabaseClient:
             "Content-Type": "application/json",
             "Prefer": "return=representation"
         }
+        self.timeout = aiohttp.ClientTimeout(total=30)
+        # Um lock por conversa: add_message_to_conversation é leitura-modificação-escrita,
+        # e passos do turno (e o segundo plano) podem gravar na mesma conversa ao mesmo tempo
+        self._conversation_locks: "weakref.WeakValueDictionary[str, asyncio.Lock]" = weakref.WeakValueDictionary()
+
+    def _ensure_configured(self):
+        if not self.supabase_url or not self.supabase_key:
+            raise ValueError("Supabase URL and key must be set in environment variables")
 
-    def _make_request(self, method: str, endpoint: str, data: Optional[Dict] = None) -> Dict:
+    async def _make_request(self, method: str, endpoint: str, data: Optional[Dict] = None) -> Dict:
         """Make a request to Supabase API"""
+        self._ensure_configured()
+        if method not in ("GET", "POST", "PUT"):
+            raise ValueError(f"Unsupported method: {method}")
         url = f"{self.supabase_url}/rest/v1/{endpoint}"
+        table = endpoint.split("?")[0]
+        status = "error"
         try:
-            if method == "GET":
-                response = requests.get(url, headers=self.headers)
-            elif method == "POST":
-                response = requests.post(url, headers=self.headers, json=data)
-            elif method == "PUT":
-                response = requests.put(url, headers=self.headers, json=data)
-            else:
-                raise ValueError(f"Unsupported method: {method}")
-            
-            response.raise_for_status()
-            result = response.json()
+            # Requisição assíncrona pelo pool compartilhado: não bloqueia o event loop
+            with tracer.span("db_request", method=method, table=table):
+                result = await self._send(method, url, self.headers, None if method == "GET" else data)
+            status = "ok"
             
             # Para GET, retorna a lista/objeto diretamente
             if method == "GET":
@@ -44,11 +57,44 @@ class DatabaseClient:
                 return result[0]
             return result
             
-        except requests.exceptions.RequestException as e:
-            print(f"Error making request to Supabase: {e}")
-            if hasattr(e, 'response') and hasattr(e.response, 'text'):
-                print(f"Response text: {e.response.text}")
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            logger.error(f"Error making request to Supabase: {e}")
+            return {}
+        finally:
+            DB_REQUESTS.inc(method=method, table=table, status=status)
+
+    async def _send(self, method: str, url: str, headers: Dict[str, str], data: Optional[Dict]) -> Any:
+        async with http_pool.session().request(method, url, headers=headers, json=data, timeout=self.timeout) as response:
+            if response.status >= 400:
+                logger.error(f"Response text: {await response.text()}")
+            response.raise_for_status()
+            return await response.json(content_type=None)
+
+    async def _patch_conversation(self, sender_id: str, update_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Atualiza a conversa do usuário via PATCH"""
+        self._ensure_configured()
+        # Modifica os headers para usar PATCH
+        patch_headers = {**self.headers}
+        patch_headers["Prefer"] = "return=representation"
+        
+        url = f"{self.supabase_url}/rest/v1/conversations?sender_id=eq.{sender_id}"
+        status = "error"
+        try:
+            with tracer.span("db_request", method="PATCH", table="conversations"):
+                result = await self._send("PATCH", url, patch_headers, update_data)
+            status = "ok"
+            return result[0] if isinstance(result, list) and len(result) > 0 else result
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            logger.error(f"Error updating conversation: {e}")
             return {}
+        finally:
+            DB_REQUESTS.inc(method="PATCH", table="conversations", status=status)
+
+    def _lock(self, sender_id: str) -> asyncio.Lock:
+        lock = self._conversation_locks.get(sender_id)
+        if lock is None:
+            lock = self._conversation_locks[sender_id] = asyncio.Lock()
+        return lock
 
     async def get_or_create_conversation(self, sender_id: str, source: str = "web") -> Dict[str, Any]:
         """
@@ -58,9 +104,28 @@ class DatabaseClient:
             sender_id: ID do usuário (session_id ou número do WhatsApp)
             source: Origem da conversa ('web' ou 'whatsapp')
         """
+        try:
+            result = await self._make_request(
+                "GET",
+                f"conversations?sender_id=eq.{sender_id}"
+            )
+            if result and len(result) > 0:
+                return result[0]
+            
+            # Criação sob o lock da conversa: passos paralelos do primeiro turno
+            # não criam duas conversas para o mesmo usuário
+            async with self._lock(sender_id):
+                return await self._get_or_create(sender_id, source)
+            
+        except Exception as e:
+            logger.error(f"Error getting/creating conversation: {e}")
+            return {}
+
+    async def _get_or_create(self, sender_id: str, source: str = "web") -> Dict[str, Any]:
+        """get_or_create_conversation para quem já tem o lock da conversa"""
         try:
             # Tenta buscar conversa existente
-            result = self._make_request(
+            result = await self._make_request(
                 "GET",
                 f"conversations?sender_id=eq.{sender_id}"
             )
@@ -83,10 +148,10 @@ class DatabaseClient:
                 }
             }
             
-            return self._make_request("POST", "conversations", new_conversation)
+            return await self._make_request("POST", "conversations", new_conversation)
             
         except Exception as e:
-            print(f"Error getting/creating conversation: {e}")
+            logger.error(f"Error getting/creating conversation: {e}")
             return {}
 
     async def add_message_to_conversation(
@@ -105,9 +170,19 @@ class DatabaseClient:
             is_user: Se True, é mensagem do usuário, se False, do LLM
             llm_response: Resposta do LLM com metadados (opcional)
         """
+        async with self._lock(sender_id):
+            return await self._add_message(sender_id, message, is_user, llm_response)
+
+    async def _add_message(
+        self,
+        sender_id: str,
+        message: str,
+        is_user: bool,
+        llm_response: Optional[Dict]
+    ) -> Dict[str, Any]:
         try:
             # Obtém a conversa
-            conversation = await self.get_or_create_conversation(sender_id)
+            conversation = await self._get_or_create(sender_id)
             if not conversation:
                 raise Exception("Failed to get/create conversation")
             
@@ -149,25 +224,10 @@ class DatabaseClient:
                 "content": content
             }
             
-            # Modifica os headers para usar PATCH
-            patch_headers = {**self.headers}
-            patch_headers["Prefer"] = "return=representation"
-            
-            # Faz a requisição PATCH diretamente
-            url = f"{self.supabase_url}/rest/v1/conversations?sender_id=eq.{sender_id}"
-            try:
-                response = requests.patch(url, headers=patch_headers, json=update_data)
-                response.raise_for_status()
-                result = response.json()
-                return result[0] if isinstance(result, list) and len(result) > 0 else result
-            except requests.exceptions.RequestException as e:
-                print(f"Error updating conversation: {e}")
-                if hasattr(e, 'response') and hasattr(e.response, 'text'):
-                    print(f"Response text: {e.response.text}")
-                return {}
+            return await self._patch_conversation(sender_id, update_data)
             
         except Exception as e:
-            print(f"Error adding message to conversation: {e}")
+            logger.error(f"Error adding message to conversation: {e}")
             return {}
 
     async def get_conversation_history(
@@ -193,7 +253,7 @@ class DatabaseClient:
             return messages[-limit:] if limit > 0 else messages
             
         except Exception as e:
-            print(f"Error getting conversation history: {e}")
+            logger.error(f"Error getting conversation history: {e}")
             return []
 
     async def get_conversation_context(
@@ -214,7 +274,7 @@ class DatabaseClient:
             return conversation.get("content", {}).get("context", {})
             
         except Exception as e:
-            print(f"Error getting conversation context: {e}")
+            logger.error(f"Error getting conversation context: {e}")
             return {}
 
     async def save_message(
@@ -265,10 +325,10 @@ class DatabaseClient:
         }
         
         try:
-            result = self._make_request("POST", "messages", data)
+            result = await self._make_request("POST", "messages", data)
             return result if result else {}
         except Exception as e:
-            print(f"Error saving message to database: {e}")
+            logger.error(f"Error saving message to database: {e}")
             return {}
 
     async def get_chat_history(
@@ -297,10 +357,10 @@ class DatabaseClient:
                 filters.append(f"conversation_id=eq.{conversation_id}")
                 
             endpoint = f"messages?{'.and.'.join(filters)}&order=created_at.asc&limit={limit}"
-            result = self._make_request("GET", endpoint)
+            result = await self._make_request("GET", endpoint)
             return result if result else []
         except Exception as e:
-            print(f"Error fetching chat history: {e}")
+            logger.error(f"Error fetching chat history: {e}")
             return []
 
     async def update_message_with_llm_response(
@@ -317,14 +377,14 @@ class DatabaseClient:
         """
         try:
             # Primeiro busca a mensagem atual
-            current = self._make_request("GET", f"messages?id=eq.{message_id}")
+            current = await self._make_request("GET", f"messages?id=eq.{message_id}")
             if not current or len(current) == 0:
-                print(f"Message {message_id} not found")
+                logger.warning(f"Message {message_id} not found")
                 return {}
             
             # Pega o primeiro resultado
             current_message = current[0]
-            print("Current message:", current_message)  # Debug log
+            logger.debug("Current message loaded", extra={"message_id": message_id})
             
             # Atualiza o content
             content = current_message.get("content", {})
@@ -352,25 +412,25 @@ class DatabaseClient:
                 }
             }
             
-            print("Update data:", update_data)  # Debug log
+            logger.debug("Updating message with LLM response", extra={"message_id": message_id, "llm": llm_response.get("llm")})
             
             # Atualiza a mensagem usando PUT
-            result = self._make_request(
+            result = await self._make_request(
                 "PUT", 
                 f"messages?id=eq.{message_id}", 
                 update_data
             )
             
-            print("Update result:", result)  # Debug log
+            logger.debug("Message updated", extra={"message_id": message_id, "updated": bool(result)})
             return result
         
         except Exception as e:
-            print(f"Error updating message with LLM response: {e}")
+            logger.error(f"Error updating message with LLM response: {e}")
             return {}
 
-    async def save_server_status(self, server_name: str, status: bool, tools: List[str]) -> Dict[str, Any]:
+    async def save_server_status(self, server_name: str, status: bool, tools: List[Any]) -> Dict[str, Any]:
         """
-        Save or update server status
+        Save or update server status (tools: the server's tool catalogue, name/description/parameters per tool)
         """
         data = {
             "server_name": server_name,
@@ -381,10 +441,10 @@ class DatabaseClient:
         
         try:
             endpoint = f"server_status?on_conflict=server_name"
-            result = self._make_request("POST", endpoint, data)
+            result = await self._make_request("POST", endpoint, data)
             return result if result else {}
         except Exception as e:
-            print(f"Error saving server status: {e}")
+            logger.error(f"Error saving server status: {e}")
             return {}
 
     async def get_server_statuses(self) -> List[Dict[str, Any]]:
@@ -392,12 +452,28 @@ class DatabaseClient:
         Get all server statuses
         """
         try:
-            result = self._make_request("GET", "server_status")
+            result = await self._make_request("GET", "server_status")
             return result if result else []
         except Exception as e:
-            print(f"Error fetching server statuses: {e}")
+            logger.error(f"Error fetching server statuses: {e}")
             return []
 
+    async def update_conversation_context(self, sender_id: str, context: Dict[str, Any]) -> Dict[str, Any]:
+        """Grava content.context sem perder mensagens gravadas em paralelo (sob o lock da conversa)"""
+        async with self._lock(sender_id):
+            try:
+                conversation = await self._get_or_create(sender_id)
+                if not conversation:
+                    raise Exception("Failed to get/create conversation")
+                content = conversation.get("content", {})
+                if not isinstance(content, dict):
+                    content = {"messages": []}
+                content["context"] = context
+                return await self._patch_conversation(sender_id, {"content": content})
+            except Exception as e:
+                logger.error(f"Error updating conversation context: {e}")
+                return {}
+
     async def update_conversation(
         self,
         sender_id: str,
@@ -411,23 +487,8 @@ class DatabaseClient:
             update_data: Dados para atualizar
         """
         try:
-            # Modifica os headers para usar PATCH
-            patch_headers = {**self.headers}
-            patch_headers["Prefer"] = "return=representation"
-            
-            # Faz a requisição PATCH diretamente
-            url = f"{self.supabase_url}/rest/v1/conversations?sender_id=eq.{sender_id}"
-            try:
-                response = requests.patch(url, headers=patch_headers, json=update_data)
-                response.raise_for_status()
-                result = response.json()
-                return result[0] if isinstance(result, list) and len(result) > 0 else result
-            except requests.exceptions.RequestException as e:
-                print(f"Error updating conversation: {e}")
-                if hasattr(e, 'response') and hasattr(e.response, 'text'):
-                    print(f"Response text: {e.response.text}")
-                return {}
+            return await self._patch_conversation(sender_id, update_data)
             
         except Exception as e:
-            print(f"Error in update_conversation: {e}")
+            logger.error(f"Error in update_conversation: {e}")
             return {}
\ No newline at end of file
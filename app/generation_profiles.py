@@ -0,0 +1,158 @@
+from typing import Dict, Any, Optional, Tuple, List
+from dataclasses import dataclass, field, asdict
+from collections import deque
+import json
+import threading
+from .settings import get_settings
+from .logging_config import get_logger
+
+logger = get_logger(__name__)
+
+settings = get_settings()
+
+# Canais suportados pelo agente
+CHANNELS = ("web", "whatsapp")
+
+# Classes de pergunta produzidas por LLMRouter._classify_query_complexity
+QUERY_CLASSES = ("simples", "complexa", "analitica", "criativa")
+
+@dataclass(frozen=True)
+class GenerationProfile:
+    """Parâmetros de geração aplicados de forma uniforme a todos os provedores"""
+    name: str
+    max_tokens: int
+    temperature: float = 0.7
+    stop_sequences: Tuple[str, ...] = ()
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = asdict(self)
+        data["stop_sequences"] = list(self.stop_sequences)
+        return data
+
+# Perfis padrão por canal. A chave "default" é usada quando a classe da
+# pergunta não tem um perfil específico.
+DEFAULT_PROFILES: Dict[str, Dict[str, Dict[str, Any]]] = {
+    "web": {
+        "default": {"max_tokens": 1024, "temperature": 0.7},
+        "complexa": {"max_tokens": 2048, "temperature": 0.3},
+        "analitica": {"max_tokens": 2048, "temperature": 0.5},
+        "criativa": {"max_tokens": 1536, "temperature": 0.9},
+    },
+    "whatsapp": {
+        "default": {"max_tokens": 300, "temperature": 0.7},
+        "complexa": {"max_tokens": 500, "temperature": 0.3},
+        "analitica": {"max_tokens": 500, "temperature": 0.5},
+        "criativa": {"max_tokens": 400, "temperature": 0.9},
+    },
+}
+
+@dataclass
+class ProfileStats:
+    """Métricas de latência de um perfil de geração"""
+    count: int = 0
+    errors: int = 0
+    total_seconds: float = 0.0
+    max_seconds: float = 0.0
+    samples: deque = field(default_factory=lambda: deque(maxlen=500))
+
+    def record(self, seconds: float, success: bool = True):
+        self.count += 1
+        if not success:
+            self.errors += 1
+        self.total_seconds += seconds
+        self.max_seconds = max(self.max_seconds, seconds)
+        self.samples.append(seconds)
+
+    def _percentile(self, ordered: List[float], pct: float) -> float:
+        if not ordered:
+            return 0.0
+        index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+        return ordered[index]
+
+    def to_dict(self) -> Dict[str, Any]:
+        ordered = sorted(self.samples)
+        return {
+            "count": self.count,
+            "errors": self.errors,
+            "avg_ms": round(self.total_seconds / self.count * 1000, 2) if self.count else 0.0,
+            "p50_ms": round(self._percentile(ordered, 50) * 1000, 2),
+            "p95_ms": round(self._percentile(ordered, 95) * 1000, 2),
+            "p99_ms": round(self._percentile(ordered, 99) * 1000, 2),
+            "max_ms": round(self.max_seconds * 1000, 2),
+        }
+
+class GenerationProfileRegistry:
+    """Resolve perfis de geração por (canal, classe da pergunta) e acumula latências"""
+
+    def __init__(self, overrides: Optional[Dict[str, Dict[str, Dict[str, Any]]]] = None):
+        self.profiles: Dict[Tuple[str, str], GenerationProfile] = {}
+        self.stats: Dict[str, ProfileStats] = {}
+        self._lock = threading.Lock()
+        self._load(DEFAULT_PROFILES)
+        if overrides:
+            self._load(overrides)
+
+    def _load(self, config: Dict[str, Dict[str, Dict[str, Any]]]):
+        """
+        Carrega (ou sobrescreve) perfis a partir de um dicionário de configuração.
+        Uma classe ou canal novo herda os parâmetros ausentes do perfil que
+        resolve() usaria para ele (default do canal, depois web:default); um
+        perfil inválido é ignorado com um aviso no log.
+        """
+        for channel, classes in config.items():
+            for query_class, params in classes.items():
+                inherited = self._inherited(channel, query_class)
+                base = inherited.to_dict() if inherited else {}
+                try:
+                    base.update(params)
+                    profile = GenerationProfile(
+                        name=f"{channel}:{query_class}",
+                        max_tokens=int(base["max_tokens"]),
+                        temperature=float(base.get("temperature", 0.7)),
+                        stop_sequences=tuple(base.get("stop_sequences", ()))
+                    )
+                except (ValueError, TypeError, KeyError) as e:
+                    logger.warning(f"Perfil de geração {channel}:{query_class} ignorado: {str(e)}")
+                    continue
+                self.profiles[(channel, query_class)] = profile
+
+    def _inherited(self, channel: str, query_class: str) -> Optional[GenerationProfile]:
+        try:
+            return self.resolve(channel, query_class)
+        except ValueError:
+            return None
+
+    def resolve(self, channel: str, query_class: Optional[str]) -> GenerationProfile:
+        """Retorna o perfil do canal/classe, caindo para o default do canal e depois da web"""
+        for key in ((channel, query_class), (channel, "default"), ("web", "default")):
+            profile = self.profiles.get(key)
+            if profile:
+                return profile
+        raise ValueError(f"Nenhum perfil de geração para {channel}/{query_class}")
+
+    def record(self, profile: GenerationProfile, seconds: float, success: bool = True):
+        """Registra a latência de uma geração feita com o perfil"""
+        with self._lock:
+            self.stats.setdefault(profile.name, ProfileStats()).record(seconds, success)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Retorna perfis configurados e métricas de latência acumuladas"""
+        with self._lock:
+            return {
+                profile.name: {
+                    **profile.to_dict(),
+                    "latency": self.stats.get(profile.name, ProfileStats()).to_dict()
+                }
+                for profile in self.profiles.values()
+            }
+
+def _load_overrides() -> Dict[str, Dict[str, Dict[str, Any]]]:
+    """Lê sobrescritas de perfis de GENERATION_PROFILES (JSON)"""
+    try:
+        return settings.get_generation_profiles()
+    except Exception as e:
+        logger.error(f"Erro ao carregar perfis de geração: {str(e)}")
+        return {}
+
+# Instância global do registro de perfis
+generation_profiles = GenerationProfileRegistry(_load_overrides())
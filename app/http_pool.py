@@ -0,0 +1,40 @@
+from typing import Dict, Optional
+import asyncio
+import aiohttp
+from .settings import get_settings
+
+settings = get_settings()
+
+class HTTPPool:
+    """
+    Sessão aiohttp compartilhada (uma por event loop), com pool de conexões
+    keep-alive. Evita abrir uma sessão por chamada e não ocupa threads do
+    executor: as chamadas REST aos provedores rodam direto no event loop.
+    """
+
+    def __init__(self, limit: int = 100, limit_per_host: int = 0):
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self._sessions: Dict[asyncio.AbstractEventLoop, aiohttp.ClientSession] = {}
+
+    def session(self) -> aiohttp.ClientSession:
+        """Retorna a sessão do event loop atual, criando-a no primeiro uso"""
+        loop = asyncio.get_running_loop()
+        session = self._sessions.get(loop)
+        if session is None or session.closed:
+            # Descarta sessões de loops já encerrados (ex.: testes)
+            for old_loop in [l for l in self._sessions if l.is_closed()]:
+                del self._sessions[old_loop]
+            connector = aiohttp.TCPConnector(limit=self.limit, limit_per_host=self.limit_per_host, ttl_dns_cache=300)
+            session = aiohttp.ClientSession(connector=connector)
+            self._sessions[loop] = session
+        return session
+
+    async def close(self):
+        """Fecha a sessão do event loop atual (usado no shutdown)"""
+        session: Optional[aiohttp.ClientSession] = self._sessions.pop(asyncio.get_running_loop(), None)
+        if session and not session.closed:
+            await session.close()
+
+# Instância global do pool HTTP
+http_pool = HTTPPool(limit=settings.HTTP_POOL_SIZE)
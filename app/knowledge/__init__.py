@@ -0,0 +1,11 @@
+"""Base de conhecimento do /base: extração, trechos, embeddings, índice em disco e busca"""
+from .extract import SUPPORTED_EXTENSIONS, UnsupportedDocument, extract_text
+from .chunking import chunk_text
+from .embeddings import Embedder, embed_batch
+from .cache import EmbeddingCache
+from .index import KnowledgeIndex, knowledge_index
+from .ivf import IVFIndex
+from .lexical import LexicalIndex
+from .text import chunk_hash
+from .ingest import KnowledgeIngestor, IngestProgress, knowledge_ingestor
+from .retrieval import KnowledgeRetriever, Passage, reciprocal_rank_fusion, knowledge_retriever
@@ -0,0 +1,72 @@
+from typing import Dict, Iterable
+import os
+import sqlite3
+import threading
+import numpy as np
+
+class EmbeddingCache:
+    """
+    Cache persistente de embeddings por hash do trecho (SQLite ao lado do
+    índice). Guarda também os vetores de trechos que saíram do índice, então
+    voltar a enviar uma versão anterior de um manual não recalcula nada. A
+    assinatura do embedder faz parte da chave: trocar o cálculo ou a
+    dimensão não reaproveita vetores incompatíveis.
+    """
+
+    def __init__(self, path: str, signature: str, dim: int):
+        self.path = path
+        self.signature = signature
+        self.dim = dim
+        self._lock = threading.Lock()
+        self._db = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._db is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            # Usado a partir das threads de asyncio.to_thread; o lock serializa o acesso
+            self._db = sqlite3.connect(self.path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings (signature TEXT, hash TEXT, vector BLOB, PRIMARY KEY (signature, hash))"
+            )
+        return self._db
+
+    def get_many(self, hashes: Iterable[str]) -> Dict[str, np.ndarray]:
+        """Vetores já calculados para os hashes (os ausentes ficam de fora)"""
+        hashes = list(dict.fromkeys(hashes))
+        found = {}
+        with self._lock:
+            db = self._connect()
+            # Lotes abaixo do limite de parâmetros do SQLite
+            for start in range(0, len(hashes), 500):
+                batch = hashes[start:start + 500]
+                rows = db.execute(
+                    f"SELECT hash, vector FROM embeddings WHERE signature = ? AND hash IN ({','.join('?' * len(batch))})",
+                    [self.signature, *batch]
+                )
+                for chunk_hash, blob in rows:
+                    vector = np.frombuffer(blob, dtype=np.float32)
+                    if len(vector) == self.dim:
+                        found[chunk_hash] = vector
+        return found
+
+    def put_many(self, vectors: Dict[str, np.ndarray]):
+        if not vectors:
+            return
+        with self._lock:
+            db = self._connect()
+            with db:
+                db.executemany(
+                    "INSERT OR REPLACE INTO embeddings (signature, hash, vector) VALUES (?, ?, ?)",
+                    [(self.signature, chunk_hash, np.asarray(vector, dtype=np.float32).tobytes()) for chunk_hash, vector in vectors.items()]
+                )
+
+    def count(self) -> int:
+        with self._lock:
+            return self._connect().execute("SELECT COUNT(*) FROM embeddings WHERE signature = ?", (self.signature,)).fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
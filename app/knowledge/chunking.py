@@ -0,0 +1,68 @@
+from typing import List, Iterator
+import re
+
+_SENTENCE_END = re.compile(r"(?<=[.!?…;:])\s+")
+
+def chunk_text(text: str, chunk_size: int = 1000, overlap: int = 150) -> List[str]:
+    """
+    Divide o texto em trechos de até chunk_size caracteres, respeitando
+    parágrafos e frases sempre que possível. Cada trecho começa com o final
+    (até overlap caracteres, em palavras inteiras) do anterior, para que uma
+    ideia cortada na fronteira apareça inteira em pelo menos um trecho.
+    """
+    if chunk_size <= 0:
+        raise ValueError("chunk_size deve ser positivo")
+    overlap = max(0, min(overlap, chunk_size // 2))
+    chunks: List[str] = []
+    current = ""
+    for piece in _pieces(text, chunk_size - overlap):
+        candidate = f"{current}\n\n{piece}" if current else piece
+        if len(candidate) <= chunk_size:
+            current = candidate
+            continue
+        chunks.append(current)
+        tail = _tail(current, overlap)
+        current = f"{tail} {piece}" if tail else piece
+    if current:
+        chunks.append(current)
+    return chunks
+
+def _pieces(text: str, limit: int) -> Iterator[str]:
+    """Parágrafos; os maiores que limit são quebrados em frases e, em último caso, em palavras"""
+    for paragraph in text.split("\n\n"):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        if len(paragraph) <= limit:
+            yield paragraph
+            continue
+        for sentence in _SENTENCE_END.split(paragraph):
+            if len(sentence) <= limit:
+                yield sentence
+            else:
+                yield from _split_words(sentence, limit)
+
+def _split_words(text: str, limit: int) -> Iterator[str]:
+    current = ""
+    for word in text.split():
+        while len(word) > limit:
+            if current:
+                yield current
+                current = ""
+            yield word[:limit]
+            word = word[limit:]
+        candidate = f"{current} {word}" if current else word
+        if len(candidate) > limit:
+            yield current
+            candidate = word
+        current = candidate
+    if current:
+        yield current
+
+def _tail(text: str, size: int) -> str:
+    if size <= 0 or len(text) <= size:
+        return "" if size <= 0 else text
+    tail = text[-size:]
+    # Começa numa palavra inteira
+    space = tail.find(" ")
+    return tail[space + 1:] if 0 <= space < len(tail) - 1 else tail
@@ -0,0 +1,72 @@
+from typing import List, Optional, Callable
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+import asyncio
+import math
+import multiprocessing
+import zlib
+import numpy as np
+from .text import tokens
+
+def embed_batch(texts: List[str], dim: int) -> np.ndarray:
+    """
+    Embeddings por feature hashing: palavras e pares de palavras (sem acento)
+    somados em dim posições com sinal, ponderados por 1 + log(tf) e
+    normalizados (L2), de modo que o produto interno é o cosseno. O crc32 é
+    estável entre processos, ao contrário de hash().
+    """
+    matrix = np.zeros((len(texts), dim), dtype=np.float32)
+    for row, text in enumerate(texts):
+        words = tokens(text)
+        features = Counter(words)
+        features.update(f"{a} {b}" for a, b in zip(words, words[1:]))
+        for feature, count in features.items():
+            digest = zlib.crc32(feature.encode("utf-8"))
+            matrix[row, digest % dim] += (1.0 if digest & 0x80000000 else -1.0) * (1.0 + math.log(count))
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    np.divide(matrix, norms, out=matrix, where=norms > 0)
+    return matrix
+
+class Embedder:
+    """
+    Calcula embeddings em lotes num pool de processos (o hashing é CPU puro e
+    não pode disputar o event loop nem o GIL com as requisições). Com
+    workers=0 os lotes rodam no executor padrão de threads.
+    """
+
+    def __init__(self, dim: int = 384, batch_size: int = 64, workers: int = 2):
+        self.dim = dim
+        # Muda quando o cálculo muda: separa as entradas do cache de embeddings
+        self.signature = f"hashing-v1:{dim}"
+        self.batch_size = max(1, batch_size)
+        self.workers = workers
+        self._pool: Optional[ProcessPoolExecutor] = None
+
+    def _executor(self) -> Optional[ProcessPoolExecutor]:
+        if self.workers <= 0:
+            return None
+        if self._pool is None:
+            # spawn: o processo da API tem threads (logging, executor) e fork as copiaria travadas
+            self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"))
+        return self._pool
+
+    async def embed(self, texts: List[str], on_batch: Optional[Callable[[int], None]] = None) -> np.ndarray:
+        """Retorna uma matriz float32 (len(texts), dim); on_batch recebe o tamanho de cada lote concluído"""
+        if not texts:
+            return np.zeros((0, self.dim), dtype=np.float32)
+        loop = asyncio.get_running_loop()
+        executor = self._executor()
+
+        async def run(batch: List[str]) -> np.ndarray:
+            vectors = await loop.run_in_executor(executor, embed_batch, batch, self.dim)
+            if on_batch:
+                on_batch(len(batch))
+            return vectors
+
+        batches = [texts[i:i + self.batch_size] for i in range(0, len(texts), self.batch_size)]
+        return np.vstack(await asyncio.gather(*(run(batch) for batch in batches)))
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
@@ -0,0 +1,78 @@
+from typing import Tuple
+import os
+import re
+import zipfile
+from xml.etree import ElementTree
+
+# Formatos aceitos pelo /base
+SUPPORTED_EXTENSIONS: Tuple[str, ...] = (".txt", ".md", ".pdf", ".docx")
+
+_WORD_NS = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+
+class UnsupportedDocument(ValueError):
+    """Arquivo em formato não suportado (ou sem a dependência para lê-lo)"""
+
+def extension(filename: str) -> str:
+    return os.path.splitext(filename or "")[1].lower()
+
+def extract_text(path: str, filename: str) -> str:
+    """
+    Extrai o texto de um arquivo já salvo em disco, pelo formato do nome
+    original. Bloqueante: rode fora do event loop (asyncio.to_thread).
+    """
+    ext = extension(filename)
+    if ext in (".txt", ".md"):
+        return _read_plain(path)
+    if ext == ".pdf":
+        return _read_pdf(path)
+    if ext == ".docx":
+        return _read_docx(path)
+    raise UnsupportedDocument(f"Formato não suportado: {filename} (aceitos: {', '.join(SUPPORTED_EXTENSIONS)})")
+
+def _read_plain(path: str) -> str:
+    with open(path, "rb") as file:
+        data = file.read()
+    try:
+        return data.decode("utf-8-sig")
+    except UnicodeDecodeError:
+        # Arquivos salvos no Windows em português costumam vir em cp1252
+        return data.decode("cp1252", errors="replace")
+
+def _read_pdf(path: str) -> str:
+    try:
+        from pypdf import PdfReader
+    except ImportError:
+        raise UnsupportedDocument("Leitura de PDF requer o pacote pypdf")
+    reader = PdfReader(path)
+    pages = [page.extract_text() or "" for page in reader.pages]
+    return "\n\n".join(page.strip() for page in pages if page.strip())
+
+def _read_docx(path: str) -> str:
+    """Lê os parágrafos de word/document.xml (o .docx é um zip de XML)"""
+    try:
+        with zipfile.ZipFile(path) as archive:
+            xml = archive.read("word/document.xml")
+    except (zipfile.BadZipFile, KeyError):
+        raise UnsupportedDocument("Arquivo .docx inválido")
+    root = ElementTree.fromstring(xml)
+    paragraphs = []
+    for paragraph in root.iter(f"{_WORD_NS}p"):
+        parts = []
+        for node in paragraph.iter():
+            if node.tag == f"{_WORD_NS}t" and node.text:
+                parts.append(node.text)
+            elif node.tag == f"{_WORD_NS}tab":
+                parts.append("\t")
+            elif node.tag in (f"{_WORD_NS}br", f"{_WORD_NS}cr"):
+                parts.append("\n")
+        text = "".join(parts).strip()
+        if text:
+            paragraphs.append(text)
+    return "\n\n".join(paragraphs)
+
+def normalize_whitespace(text: str) -> str:
+    """Une espaços repetidos e limita as linhas em branco a uma (separador de parágrafo)"""
+    text = text.replace("\r\n", "\n").replace("\r", "\n").replace("\x00", "")
+    text = re.sub(r"[ \t\f\v]+", " ", text)
+    text = re.sub(r" *\n *", "\n", text)
+    return re.sub(r"\n{3,}", "\n\n", text).strip()
@@ -0,0 +1,361 @@
+from typing import Dict, Any, List, Optional, Tuple, Iterable
+import json
+import os
+import threading
+import time
+import numpy as np
+from ..settings import get_settings
+from .ivf import IVFIndex, BLOCK_ROWS
+from .lexical import LexicalIndex
+from .text import chunk_hash
+
+settings = get_settings()
+
+# Tipos aceitos para a matriz de vetores e a extensão do arquivo de cada um
+VECTOR_DTYPES = {"float32": "f32", "float16": "f16"}
+
+class KnowledgeIndex:
+    """
+    Índice da base de conhecimento em disco, só de acréscimo e endereçado
+    pelo conteúdo:
+
+    - chunks.jsonl: um trecho único por linha (id, hash do texto normalizado, texto)
+    - vectors.f32 / vectors.f16: matriz (trechos x dim) lida via np.memmap
+    - documents.json: documentos ativos por nome de arquivo, com os ids dos seus trechos
+    - ivf_centroids.npy / ivf_assign.i32: índice aproximado, criado ao passar de ivf_min_chunks
+    - lexical.npz / lexical_terms.json: índice invertido (BM25) dos mesmos trechos
+
+    Um trecho com o mesmo hash de um já indexado reaproveita a linha (e o
+    vetor) existente, então reenviar um manual atualizado só acrescenta os
+    trechos novos ou alterados. Trechos que nenhum documento ativo usa mais
+    saem das buscas na hora e do disco na compactação, feita quando passam de
+    compact_ratio do índice. A busca é exata (produto interno vetorizado sobre
+    a matriz mapeada) até ivf_min_chunks trechos e, acima disso, aproximada
+    pelo IVF; os vetores novos entram no IVF sem reconstruí-lo.
+    """
+
+    def __init__(self, path: str, dim: int, dtype: str = "float32",
+                 ivf_min_chunks: int = 20000, nprobe: int = 8, compact_ratio: float = 0.5):
+        if dtype not in VECTOR_DTYPES:
+            raise ValueError(f"KB_VECTOR_DTYPE inválido: {dtype} (aceitos: {', '.join(VECTOR_DTYPES)})")
+        self.path = path
+        self.dim = dim
+        self.dtype = np.dtype(dtype)
+        self.vectors_file = f"vectors.{VECTOR_DTYPES[dtype]}"
+        self.ivf_min_chunks = ivf_min_chunks
+        self.nprobe = nprobe
+        self.compact_ratio = compact_ratio
+        self._lock = threading.Lock()
+        self.documents: Dict[str, Dict[str, Any]] = self._read_json("documents.json", {})
+        for document in self.documents.values():
+            if "chunk_ids" not in document:
+                # Formato anterior: trechos contíguos a partir de first_chunk
+                document["chunk_ids"] = list(range(document["first_chunk"], document["first_chunk"] + document["chunks"]))
+        self.count = self._count_chunks()
+        # Carregados no primeiro uso: posição de cada trecho em chunks.jsonl e
+        # id por hash, matriz mapeada, máscara de trechos ativos (com o arquivo
+        # de cada um), IVF e índice lexical
+        self._offsets: Optional[List[int]] = None
+        self._hashes: Dict[str, int] = {}
+        self._matrix: Optional[np.ndarray] = None
+        self._active: Optional[np.ndarray] = None
+        self._owners: Dict[int, str] = {}
+        self._ivf: Optional[IVFIndex] = None
+        self._ivf_loaded = False
+        self._lexical: Optional[LexicalIndex] = None
+
+    def _file(self, name: str) -> str:
+        return os.path.join(self.path, name)
+
+    def _read_json(self, name: str, default: Any) -> Any:
+        try:
+            with open(self._file(name), encoding="utf-8") as file:
+                return json.load(file)
+        except FileNotFoundError:
+            return default
+
+    def _write_json(self, name: str, data: Any):
+        # Escreve ao lado e troca, para que uma queda não deixe o arquivo pela metade
+        temp = self._file(f"{name}.tmp")
+        with open(temp, "w", encoding="utf-8") as file:
+            json.dump(data, file, ensure_ascii=False)
+        os.replace(temp, self._file(name))
+
+    def _count_chunks(self) -> int:
+        try:
+            size = os.path.getsize(self._file(self.vectors_file))
+        except FileNotFoundError:
+            return 0
+        return size // (self.dim * self.dtype.itemsize)
+
+    def find(self, filename: str) -> Optional[Dict[str, Any]]:
+        return self.documents.get(filename)
+
+    @property
+    def active_count(self) -> int:
+        with self._lock:
+            return int(self._active_mask().sum())
+
+    def lookup(self, hashes: Iterable[str]) -> Dict[str, int]:
+        """Ids dos trechos já indexados (ativos ou não) com esses hashes"""
+        with self._lock:
+            self._load_rows()
+            return {chunk_hash: self._hashes[chunk_hash] for chunk_hash in hashes if chunk_hash in self._hashes}
+
+    def add_document(self, filename: str, sha256: str, chunks: List[str], hashes: List[str],
+                     vectors: Dict[str, np.ndarray]) -> Dict[str, Any]:
+        """
+        Torna o documento o ativo para filename (bloqueante). Só os trechos
+        cujo hash ainda não está no índice são gravados; `vectors` traz o
+        vetor (por hash) de cada um deles. Retorna o documento e quantos
+        trechos foram acrescentados, reaproveitados e removidos.
+        """
+        if len(chunks) != len(hashes):
+            raise ValueError("Cada trecho precisa do seu hash")
+        with self._lock:
+            os.makedirs(self.path, exist_ok=True)
+            offsets = self._load_rows()
+            self._load_ivf()
+            lexical = self._load_lexical()
+            start = self.count
+            doc_id = f"{sha256[:16]}-{start}"
+            missing = [chunk_hash for chunk_hash in hashes if chunk_hash not in self._hashes and chunk_hash not in vectors]
+            if missing:
+                raise ValueError(f"Faltam os vetores de {len(missing)} trechos de {filename}")
+            chunk_ids, new_texts, new_vectors = [], [], []
+            with open(self._file("chunks.jsonl"), "ab") as file:
+                for position, (text, chunk_hash) in enumerate(zip(chunks, hashes)):
+                    chunk_id = self._hashes.get(chunk_hash)
+                    if chunk_id is None:
+                        chunk_id = self._hashes[chunk_hash] = start + len(new_texts)
+                        offsets.append(file.tell())
+                        row = {"id": chunk_id, "hash": chunk_hash, "doc": doc_id, "position": position, "text": text}
+                        file.write((json.dumps(row, ensure_ascii=False) + "\n").encode("utf-8"))
+                        new_texts.append(text)
+                        new_vectors.append(vectors[chunk_hash])
+                    chunk_ids.append(chunk_id)
+            matrix = np.asarray(new_vectors, dtype=np.float32).reshape(len(new_vectors), self.dim)
+            with open(self._file(self.vectors_file), "ab") as file:
+                file.write(np.ascontiguousarray(matrix, dtype=self.dtype).tobytes())
+            if new_texts:
+                lexical.add(new_texts, start)
+                lexical.save()
+
+            before = self._active_mask()
+            document = {
+                "id": doc_id,
+                "filename": filename,
+                "sha256": sha256,
+                "chunks": len(chunk_ids),
+                "chunk_ids": chunk_ids,
+                "ingested_at": time.time()
+            }
+            self.documents[filename] = document
+            self.count = start + len(new_texts)
+            self._write_json("documents.json", self.documents)
+
+            # Remapeia no próximo uso; a máscara é recalculada e o IVF só estendido
+            self._matrix = None
+            self._active = None
+            if self._ivf is not None:
+                if new_texts:
+                    assignments = self._ivf.assign(matrix)
+                    with open(self._file("ivf_assign.i32"), "ab") as file:
+                        file.write(assignments.astype(np.int32).tobytes())
+                    self._ivf.add(assignments)
+            elif self.count >= self.ivf_min_chunks:
+                self._train_ivf()
+
+            after = self._active_mask()
+            removed = int((before & ~after[:len(before)]).sum())
+            if self.count - int(after.sum()) > self.compact_ratio * self.count:
+                self._compact()
+            return {
+                "document": self.documents[filename],
+                "added": len(new_texts),
+                "reused": len(set(chunk_ids)) - len(new_texts),
+                "removed": removed
+            }
+
+    def _compact(self):
+        """
+        Regrava os arquivos só com os trechos ativos, renumerando os ids na
+        ordem atual. O IVF mantém os centroides (as atribuições são só
+        filtradas) e o índice lexical é refeito a partir dos textos.
+        """
+        keep = np.flatnonzero(self._active_mask())
+        remap = {int(old): new for new, old in enumerate(keep)}
+        rows = self.chunks(keep, locked=True)
+        with open(self._file("chunks.jsonl.tmp"), "wb") as file:
+            for row in rows:
+                row["id"] = remap[row["id"]]
+                row.pop("filename", None)
+                file.write((json.dumps(row, ensure_ascii=False) + "\n").encode("utf-8"))
+        np.ascontiguousarray(self._map()[keep]).tofile(self._file(f"{self.vectors_file}.tmp"))
+        for document in self.documents.values():
+            document["chunk_ids"] = [remap[chunk_id] for chunk_id in document["chunk_ids"]]
+        os.replace(self._file("chunks.jsonl.tmp"), self._file("chunks.jsonl"))
+        os.replace(self._file(f"{self.vectors_file}.tmp"), self._file(self.vectors_file))
+        self._write_json("documents.json", self.documents)
+        self.count = len(keep)
+        self._offsets = self._matrix = self._active = None
+
+        if self._ivf is not None:
+            if self.count >= self.ivf_min_chunks:
+                self._ivf = IVFIndex(self._ivf.centroids, self._ivf.assignments[keep])
+                self._ivf.assignments.astype(np.int32).tofile(self._file("ivf_assign.i32"))
+            else:
+                self._ivf = None
+                for name in ("ivf_centroids.npy", "ivf_assign.i32"):
+                    os.unlink(self._file(name))
+        lexical = LexicalIndex(self.path)
+        lexical.reset()
+        lexical.add([row["text"] for row in rows])
+        lexical.save()
+        self._lexical = lexical
+        self._load_rows()
+
+    def _load_rows(self) -> List[int]:
+        """Posição de cada linha em chunks.jsonl e o mapa hash -> id"""
+        if self._offsets is None:
+            offsets = []
+            hashes = {}
+            try:
+                with open(self._file("chunks.jsonl"), "rb") as file:
+                    position = 0
+                    for line in file:
+                        if len(offsets) == self.count:
+                            break
+                        row = json.loads(line)
+                        hashes.setdefault(row.get("hash") or chunk_hash(row["text"]), row["id"])
+                        offsets.append(position)
+                        position += len(line)
+            except FileNotFoundError:
+                pass
+            self._offsets = offsets
+            self._hashes = hashes
+        return self._offsets
+
+    def _load_ivf(self):
+        if self._ivf_loaded:
+            return
+        self._ivf_loaded = True
+        try:
+            centroids = np.load(self._file("ivf_centroids.npy"))
+            assignments = np.fromfile(self._file("ivf_assign.i32"), dtype=np.int32)
+        except FileNotFoundError:
+            return
+        if len(assignments) == self.count:
+            self._ivf = IVFIndex(centroids, assignments)
+        elif self.count >= self.ivf_min_chunks:
+            # Arquivos fora de sincronia (queda no meio de um acréscimo): retreina
+            self._train_ivf()
+
+    def _load_lexical(self) -> LexicalIndex:
+        if self._lexical is None:
+            lexical = LexicalIndex(self.path)
+            if lexical.count != self.count:
+                # Índice criado antes da busca lexical (ou gravação interrompida): reconstrói dos trechos
+                lexical.reset()
+                if self.count:
+                    lexical.add([row["text"] for row in self.chunks(range(self.count), locked=True)])
+                    lexical.save()
+            self._lexical = lexical
+        return self._lexical
+
+    def _train_ivf(self):
+        self._ivf = IVFIndex.train(self._map())
+        np.save(self._file("ivf_centroids.npy"), self._ivf.centroids)
+        self._ivf.assignments.astype(np.int32).tofile(self._file("ivf_assign.i32"))
+
+    def _map(self) -> np.ndarray:
+        if self._matrix is None or len(self._matrix) != self.count:
+            if self.count == 0:
+                self._matrix = np.zeros((0, self.dim), dtype=self.dtype)
+            else:
+                self._matrix = np.memmap(self._file(self.vectors_file), dtype=self.dtype, mode="r", shape=(self.count, self.dim))
+        return self._matrix
+
+    def _active_mask(self) -> np.ndarray:
+        if self._active is None:
+            active = np.zeros(self.count, dtype=bool)
+            owners = {}
+            for filename, document in self.documents.items():
+                ids = np.asarray(document["chunk_ids"], dtype=np.int64)
+                active[ids[ids < self.count]] = True
+                owners.update(dict.fromkeys(document["chunk_ids"], filename))
+            self._active, self._owners = active, owners
+        return self._active
+
+    def search(self, query: np.ndarray, k: int) -> List[Tuple[int, float]]:
+        """Os k trechos ativos com maior produto interno com a consulta: [(id, score)]"""
+        with self._lock:
+            self._load_ivf()
+            matrix, active, ivf = self._map(), self._active_mask(), self._ivf
+        if not len(matrix) or k <= 0:
+            return []
+        query = np.asarray(query, dtype=np.float32)
+        if ivf is not None:
+            ids = ivf.candidates(query, self.nprobe)
+            ids = ids[active[ids]]
+            scores = np.asarray(matrix[ids], dtype=np.float32) @ query
+        else:
+            ids = np.flatnonzero(active)
+            scores = np.empty(len(matrix), dtype=np.float32)
+            for start in range(0, len(matrix), BLOCK_ROWS):
+                block = np.asarray(matrix[start:start + BLOCK_ROWS], dtype=np.float32)
+                scores[start:start + len(block)] = block @ query
+            scores = scores[ids]
+        if not len(ids):
+            return []
+        k = min(k, len(ids))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(int(ids[i]), float(scores[i])) for i in top]
+
+    def search_lexical(self, query: str, k: int) -> List[Tuple[int, float]]:
+        """Os k trechos ativos com maior BM25 para a consulta: [(id, score)]"""
+        with self._lock:
+            lexical, active = self._load_lexical(), self._active_mask()
+        return lexical.search(query, k, active)
+
+    def chunks(self, ids: Iterable[int], locked: bool = False) -> List[Dict[str, Any]]:
+        """Lê os trechos pelo id (acesso direto pela posição em chunks.jsonl), com o nome do arquivo"""
+        if locked:
+            self._active_mask()
+            offsets, owners = self._load_rows(), self._owners
+        else:
+            with self._lock:
+                self._active_mask()
+                offsets, owners = self._load_rows(), self._owners
+        rows = []
+        with open(self._file("chunks.jsonl"), "rb") as file:
+            for chunk_id in ids:
+                file.seek(offsets[chunk_id])
+                row = json.loads(file.readline())
+                row["filename"] = owners.get(row["id"], "")
+                rows.append(row)
+        return rows
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "documents": len(self.documents),
+            "chunks": self.count,
+            "active_chunks": self.active_count,
+            "stale_chunks": self.count - self.active_count,
+            "dim": self.dim,
+            "dtype": self.dtype.name,
+            "search": "ivf" if self._ivf is not None else "exact",
+            "ivf_lists": self._ivf.nlist if self._ivf is not None else 0,
+            "lexical": self._lexical.stats() if self._lexical is not None else None
+        }
+
+# Índice compartilhado pela ingestão (/base) e pela busca do agente
+knowledge_index = KnowledgeIndex(
+    settings.KB_INDEX_PATH,
+    settings.KB_EMBEDDING_DIM,
+    settings.KB_VECTOR_DTYPE,
+    settings.KB_IVF_MIN_CHUNKS,
+    settings.KB_IVF_NPROBE,
+    settings.KB_COMPACT_RATIO
+)
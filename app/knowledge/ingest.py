@@ -0,0 +1,212 @@
+from typing import Dict, Any, List, Optional
+from dataclasses import dataclass, field, asdict
+from collections import deque
+from contextlib import contextmanager
+from fastapi import UploadFile
+import asyncio
+import hashlib
+import os
+import tempfile
+import time
+import aiofiles
+from ..settings import get_settings
+from ..logging_config import get_logger
+from ..metrics import KB_INGEST_FILES, KB_INGEST_BYTES, KB_INGEST_CHUNKS, KB_INGEST_STAGE, KB_INGEST_REUSED, KB_EMBED_CACHE
+from .extract import SUPPORTED_EXTENSIONS, UnsupportedDocument, extension, extract_text, normalize_whitespace
+from .chunking import chunk_text
+from .embeddings import Embedder
+from .cache import EmbeddingCache
+from .index import KnowledgeIndex, knowledge_index
+from .text import chunk_hash
+
+logger = get_logger(__name__)
+
+settings = get_settings()
+
+class FileTooLarge(ValueError):
+    pass
+
+@dataclass
+class IngestProgress:
+    """Andamento da ingestão de um arquivo (status: queued, reading, extracting, embedding, indexing, done, unchanged, error)"""
+    filename: str
+    status: str = "queued"
+    bytes_read: int = 0
+    chunks: int = 0
+    # Trechos já no índice, vetores vindos do cache, vetores calculados agora e
+    # trechos da versão anterior do arquivo que saíram do índice
+    reused: int = 0
+    cache_hits: int = 0
+    embedded: int = 0
+    removed: int = 0
+    error: Optional[str] = None
+    started_at: float = field(default_factory=time.time)
+    finished_at: Optional[float] = None
+    stages_ms: Dict[str, float] = field(default_factory=dict)
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = asdict(self)
+        elapsed = (self.finished_at or time.time()) - self.started_at
+        data["elapsed_s"] = round(elapsed, 3)
+        data["mb_per_s"] = round(self.bytes_read / 1e6 / elapsed, 3) if elapsed > 0 else 0.0
+        data["chunks_per_s"] = round(self.embedded / elapsed, 1) if elapsed > 0 else 0.0
+        return data
+
+class KnowledgeIngestor:
+    """
+    Pipeline do /base: lê o upload em blocos para um arquivo temporário
+    (calculando o sha256 no caminho), extrai o texto fora do event loop,
+    divide em trechos, calcula os embeddings em lotes no pool de processos e
+    grava tudo no índice em disco. Trechos já indexados (pelo hash do texto)
+    são reaproveitados e os demais passam antes pelo cache de embeddings, de
+    modo que reenviar um manual com uma seção alterada só calcula os vetores
+    dessa seção. O andamento de cada arquivo fica em `progress` até sair das
+    últimas KB_PROGRESS_HISTORY ingestões.
+    """
+
+    def __init__(self, index: KnowledgeIndex, embedder: Embedder, cache: Optional[EmbeddingCache] = None):
+        self.index = index
+        self.embedder = embedder
+        self.cache = cache
+        self.read_chunk_size = settings.KB_READ_CHUNK_SIZE
+        self.max_file_bytes = settings.KB_MAX_FILE_MB * 1024 * 1024
+        self.chunk_size = settings.KB_CHUNK_SIZE
+        self.chunk_overlap = settings.KB_CHUNK_OVERLAP
+        self.progress: deque = deque(maxlen=settings.KB_PROGRESS_HISTORY)
+
+    async def ingest_files(self, files: List[UploadFile]) -> List[IngestProgress]:
+        """Ingere os arquivos em ordem; a falha de um arquivo não interrompe os demais"""
+        jobs = [IngestProgress(filename=file.filename or "sem_nome") for file in files]
+        self.progress.extend(jobs)
+        for file, job in zip(files, jobs):
+            await self.ingest(file, job)
+        return jobs
+
+    async def ingest(self, upload: UploadFile, job: Optional[IngestProgress] = None) -> IngestProgress:
+        job = job or IngestProgress(filename=upload.filename or "sem_nome")
+        ext = extension(job.filename)
+        path = None
+        try:
+            if ext not in SUPPORTED_EXTENSIONS:
+                raise UnsupportedDocument(f"Formato não suportado: {job.filename} (aceitos: {', '.join(SUPPORTED_EXTENSIONS)})")
+
+            job.status = "reading"
+            with self._stage(job, "read"):
+                path, sha256 = await self._spool(upload, job, ext)
+            current = self.index.find(job.filename)
+            if current and current["sha256"] == sha256:
+                job.status = "unchanged"
+                job.chunks = job.reused = current["chunks"]
+                return job
+
+            job.status = "extracting"
+            with self._stage(job, "extract"):
+                text = normalize_whitespace(await asyncio.to_thread(extract_text, path, job.filename))
+                chunks = chunk_text(text, self.chunk_size, self.chunk_overlap)
+            if not chunks:
+                raise UnsupportedDocument(f"Nenhum texto encontrado em {job.filename}")
+            job.chunks = len(chunks)
+            hashes = [chunk_hash(chunk) for chunk in chunks]
+
+            job.status = "embedding"
+            with self._stage(job, "embed"):
+                vectors = await self._vectors(job, chunks, hashes)
+
+            job.status = "indexing"
+            with self._stage(job, "index"):
+                result = await asyncio.to_thread(self.index.add_document, job.filename, sha256, chunks, hashes, vectors)
+            job.removed = result["removed"]
+            job.status = "done"
+        except Exception as e:
+            job.status = "error"
+            job.error = str(e)
+            if not isinstance(e, (UnsupportedDocument, FileTooLarge)):
+                logger.error(f"Erro ao ingerir {job.filename}: {str(e)}")
+        finally:
+            job.finished_at = time.time()
+            if path:
+                os.unlink(path)
+            KB_INGEST_FILES.inc(status=job.status)
+            KB_INGEST_BYTES.inc(job.bytes_read)
+            if job.status == "done":
+                KB_INGEST_CHUNKS.inc(job.chunks)
+                KB_INGEST_REUSED.inc(job.reused)
+            logger.info("kb_ingest", extra={"kb_file": job.filename, **{k: v for k, v in job.to_dict().items() if k != "filename"}})
+        return job
+
+    async def _vectors(self, job: IngestProgress, chunks: List[str], hashes: List[str]) -> Dict[str, Any]:
+        """
+        Vetores (por hash) dos trechos que o índice ainda não tem: primeiro do
+        cache, e só os que faltam passam pelo embedder (e entram no cache)
+        """
+        known = await asyncio.to_thread(self.index.lookup, hashes)
+        job.reused = sum(1 for chunk_hash in hashes if chunk_hash in known)
+        pending = {chunk_hash: chunk for chunk_hash, chunk in zip(hashes, chunks) if chunk_hash not in known}
+        vectors = await asyncio.to_thread(self.cache.get_many, pending) if self.cache and pending else {}
+        job.cache_hits = len(vectors)
+        misses = [chunk_hash for chunk_hash in pending if chunk_hash not in vectors]
+        if self.cache and pending:
+            KB_EMBED_CACHE.inc(len(vectors), result="hit")
+            KB_EMBED_CACHE.inc(len(misses), result="miss")
+        if misses:
+            computed = await self.embedder.embed(
+                [pending[chunk_hash] for chunk_hash in misses],
+                on_batch=lambda size: setattr(job, "embedded", job.embedded + size)
+            )
+            computed = dict(zip(misses, computed))
+            if self.cache:
+                await asyncio.to_thread(self.cache.put_many, computed)
+            vectors.update(computed)
+        return vectors
+
+    async def _spool(self, upload: UploadFile, job: IngestProgress, ext: str):
+        """Copia o upload em blocos de read_chunk_size para um temporário; retorna (caminho, sha256)"""
+        digest = hashlib.sha256()
+        fd, path = tempfile.mkstemp(suffix=ext, prefix="kb_")
+        os.close(fd)
+        try:
+            async with aiofiles.open(path, "wb") as out:
+                while True:
+                    block = await upload.read(self.read_chunk_size)
+                    if not block:
+                        break
+                    job.bytes_read += len(block)
+                    if job.bytes_read > self.max_file_bytes:
+                        raise FileTooLarge(f"{job.filename} passa do limite de {settings.KB_MAX_FILE_MB} MB")
+                    digest.update(block)
+                    await out.write(block)
+        except BaseException:
+            os.unlink(path)
+            raise
+        return path, digest.hexdigest()
+
+    @contextmanager
+    def _stage(self, job: IngestProgress, stage: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            job.stages_ms[stage] = round(elapsed * 1000, 2)
+            KB_INGEST_STAGE.observe(elapsed, stage=stage)
+
+    def snapshot(self) -> Dict[str, Any]:
+        index = self.index.stats()
+        if self.cache:
+            index["embedding_cache"] = self.cache.count()
+        return {"index": index, "files": [job.to_dict() for job in self.progress]}
+
+    def close(self):
+        self.embedder.close()
+        if self.cache:
+            self.cache.close()
+
+# Instância global; o pool de processos só sobe na primeira ingestão
+_embedder = Embedder(settings.KB_EMBEDDING_DIM, settings.KB_EMBED_BATCH, settings.KB_EMBED_WORKERS)
+knowledge_ingestor = KnowledgeIngestor(
+    knowledge_index,
+    _embedder,
+    EmbeddingCache(
+        os.path.join(settings.KB_INDEX_PATH, "embeddings.sqlite"), _embedder.signature, settings.KB_EMBEDDING_DIM
+    ) if settings.KB_EMBED_CACHE else None
+)
@@ -0,0 +1,74 @@
+from typing import Optional
+import numpy as np
+
+# Linhas por bloco nas multiplicações sobre a matriz mapeada (limita a memória temporária)
+BLOCK_ROWS = 32768
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.maximum(norms, 1e-12)
+
+class IVFIndex:
+    """
+    Índice aproximado por listas invertidas (IVF): k-means esférico divide os
+    vetores em nlist grupos; a busca compara a consulta com os centróides e
+    calcula o produto exato só nos vetores dos nprobe grupos mais próximos.
+    Vetores novos entram no grupo do centróide mais próximo, sem retreinar.
+    """
+
+    def __init__(self, centroids: np.ndarray, assignments: np.ndarray):
+        self.centroids = np.ascontiguousarray(centroids, dtype=np.float32)
+        self.assignments = np.asarray(assignments, dtype=np.int32)
+        self._build_lists()
+
+    @classmethod
+    def train(cls, vectors: np.ndarray, nlist: Optional[int] = None, iterations: int = 10,
+              sample: int = 50000, seed: int = 0) -> "IVFIndex":
+        """Treina os centróides numa amostra e atribui todos os vetores (vectors pode ser um memmap)"""
+        count = len(vectors)
+        nlist = max(1, min(nlist or int(np.sqrt(count)), count))
+        rng = np.random.default_rng(seed)
+        rows = np.sort(rng.choice(count, size=min(sample, count), replace=False))
+        data = np.asarray(vectors[rows], dtype=np.float32)
+        centroids = data[rng.choice(len(data), size=nlist, replace=False)].copy()
+        for _ in range(iterations):
+            labels = np.argmax(data @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, labels, data)
+            counts = np.bincount(labels, minlength=nlist)
+            # Grupo vazio mantém o centróide anterior
+            filled = counts > 0
+            centroids[filled] = sums[filled]
+            centroids = _normalize(centroids)
+        index = cls(centroids, np.zeros(0, dtype=np.int32))
+        index.add(index.assign(vectors))
+        return index
+
+    def assign(self, vectors: np.ndarray) -> np.ndarray:
+        """Grupo mais próximo de cada vetor"""
+        labels = np.empty(len(vectors), dtype=np.int32)
+        for start in range(0, len(vectors), BLOCK_ROWS):
+            block = np.asarray(vectors[start:start + BLOCK_ROWS], dtype=np.float32)
+            labels[start:start + len(block)] = np.argmax(block @ self.centroids.T, axis=1)
+        return labels
+
+    def add(self, assignments: np.ndarray):
+        """Acrescenta os grupos dos próximos vetores (ids seguem a ordem de inserção)"""
+        self.assignments = np.concatenate([self.assignments, np.asarray(assignments, dtype=np.int32)])
+        self._build_lists()
+
+    def _build_lists(self):
+        # Ids ordenados por grupo; bounds[g]:bounds[g + 1] são os ids do grupo g
+        self._ids = np.argsort(self.assignments, kind="stable").astype(np.int64)
+        self._bounds = np.searchsorted(self.assignments[self._ids], np.arange(len(self.centroids) + 1))
+
+    @property
+    def nlist(self) -> int:
+        return len(self.centroids)
+
+    def candidates(self, query: np.ndarray, nprobe: int) -> np.ndarray:
+        """Ids dos vetores nos nprobe grupos mais próximos da consulta"""
+        nprobe = min(nprobe, self.nlist)
+        scores = self.centroids @ query
+        probes = np.argpartition(-scores, nprobe - 1)[:nprobe] if nprobe < self.nlist else np.arange(self.nlist)
+        return np.sort(np.concatenate([self._ids[self._bounds[g]:self._bounds[g + 1]] for g in probes]))
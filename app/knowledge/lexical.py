@@ -0,0 +1,142 @@
+from typing import Dict, List, Optional, Tuple
+from collections import Counter
+import json
+import math
+import os
+import numpy as np
+from .text import terms
+
+class LexicalIndex:
+    """
+    Índice invertido com pontuação BM25 para códigos, SKUs e nomes próprios,
+    que os embeddings tratam mal. As listas de postings ficam compactas em
+    arrays contíguos ordenados por termo: doc_ids (int32) e tfs (uint16), com
+    starts[t]:starts[t + 1] delimitando as do termo t. Um acréscimo
+    reordena os postings por termo em numpy (sem laço por posting) e troca os
+    arrays de uma vez, então buscas concorrentes veem o estado antigo ou o
+    novo, nunca um meio-termo. Os ids são os mesmos dos trechos no KnowledgeIndex.
+    """
+
+    def __init__(self, path: Optional[str] = None, k1: float = 1.2, b: float = 0.75):
+        self.path = path
+        self.k1 = k1
+        self.b = b
+        self.reset()
+        if path:
+            self._load()
+
+    def reset(self):
+        self.vocabulary: Dict[str, int] = {}
+        self._set(np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.uint16), np.zeros(1, dtype=np.int64), np.zeros(0, dtype=np.uint16))
+
+    def _set(self, doc_ids: np.ndarray, tfs: np.ndarray, starts: np.ndarray, doc_len: np.ndarray):
+        # O denominador do BM25 por trecho só muda com um acréscimo: fica pré-calculado
+        average = float(doc_len.mean()) if len(doc_len) else 1.0
+        norm = self.k1 * (1 - self.b + self.b * doc_len.astype(np.float32) / (average or 1.0))
+        self._state = (doc_ids, tfs, starts, doc_len, norm)
+
+    @property
+    def doc_ids(self) -> np.ndarray:
+        return self._state[0]
+
+    @property
+    def tfs(self) -> np.ndarray:
+        return self._state[1]
+
+    @property
+    def starts(self) -> np.ndarray:
+        return self._state[2]
+
+    @property
+    def doc_len(self) -> np.ndarray:
+        return self._state[3]
+
+    @property
+    def count(self) -> int:
+        return len(self.doc_len)
+
+    def add(self, texts: List[str], first_id: Optional[int] = None):
+        """Indexa trechos com ids first_id, first_id + 1, ... (por padrão, logo após os existentes)"""
+        first_id = self.count if first_id is None else first_id
+        if first_id < self.count:
+            raise ValueError(f"Ids do índice lexical já usados: {first_id} < {self.count}")
+        new_terms, new_docs, new_tfs = [], [], []
+        lengths = np.zeros(first_id + len(texts) - self.count, dtype=np.uint16)
+        for offset, text in enumerate(texts):
+            counts = Counter(terms(text))
+            lengths[first_id - self.count + offset] = min(sum(counts.values()), 65535)
+            for term, tf in counts.items():
+                term_id = self.vocabulary.setdefault(term, len(self.vocabulary))
+                new_terms.append(term_id)
+                new_docs.append(first_id + offset)
+                new_tfs.append(min(tf, 65535))
+        doc_ids, tfs, starts, doc_len, _ = self._state
+        new_terms = np.array(new_terms, dtype=np.int64)
+        old_terms = np.repeat(np.arange(len(starts) - 1), np.diff(starts))
+        all_terms = np.concatenate([old_terms, new_terms])
+        # Estável: dentro de um termo, os postings antigos (ids menores) vêm antes
+        order = np.argsort(all_terms, kind="stable")
+        self._set(
+            np.concatenate([doc_ids, np.array(new_docs, dtype=np.int32)])[order],
+            np.concatenate([tfs, np.array(new_tfs, dtype=np.uint16)])[order],
+            np.concatenate([[0], np.cumsum(np.bincount(all_terms, minlength=len(self.vocabulary)))]).astype(np.int64),
+            np.concatenate([doc_len, lengths])
+        )
+
+    def search(self, query: str, k: int, active: Optional[np.ndarray] = None) -> List[Tuple[int, float]]:
+        """Os k trechos com maior BM25 para a consulta: [(id, score)]; active filtra trechos removidos"""
+        doc_ids, tfs_all, starts, doc_len, norm = self._state
+        total = len(doc_len)
+        # Termos criados por um acréscimo em andamento ainda não têm postings neste estado
+        query_terms = [term_id for term_id in (self.vocabulary.get(term) for term in dict.fromkeys(terms(query)))
+                       if term_id is not None and term_id < len(starts) - 1]
+        if not query_terms or not total or k <= 0:
+            return []
+        scores = np.zeros(total, dtype=np.float32)
+        for term_id in query_terms:
+            start, end = starts[term_id], starts[term_id + 1]
+            ids = doc_ids[start:end]
+            tfs = tfs_all[start:end].astype(np.float32)
+            df = end - start
+            idf = math.log(1 + (total - df + 0.5) / (df + 0.5))
+            scores[ids] += idf * tfs * (self.k1 + 1) / (tfs + norm[ids])
+        if active is not None:
+            scores[~active[:total]] = 0.0
+        matched = np.flatnonzero(scores)
+        if not len(matched):
+            return []
+        k = min(k, len(matched))
+        top = matched[np.argpartition(-scores[matched], k - 1)[:k]]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [(int(i), float(scores[i])) for i in top]
+
+    def _file(self, name: str) -> str:
+        return os.path.join(self.path, name)
+
+    def save(self):
+        """Grava os arrays e o vocabulário ao lado e troca os arquivos"""
+        os.makedirs(self.path, exist_ok=True)
+        with open(self._file("lexical.npz.tmp"), "wb") as file:
+            doc_ids, tfs, starts, doc_len, _ = self._state
+            np.savez(file, doc_ids=doc_ids, tfs=tfs, starts=starts, doc_len=doc_len)
+        with open(self._file("lexical_terms.json.tmp"), "w", encoding="utf-8") as file:
+            json.dump(sorted(self.vocabulary, key=self.vocabulary.get), file, ensure_ascii=False)
+        os.replace(self._file("lexical.npz.tmp"), self._file("lexical.npz"))
+        os.replace(self._file("lexical_terms.json.tmp"), self._file("lexical_terms.json"))
+
+    def _load(self):
+        try:
+            with np.load(self._file("lexical.npz")) as data:
+                doc_ids, tfs, starts, doc_len = data["doc_ids"], data["tfs"], data["starts"], data["doc_len"]
+            with open(self._file("lexical_terms.json"), encoding="utf-8") as file:
+                vocabulary = json.load(file)
+        except FileNotFoundError:
+            return
+        if len(vocabulary) != len(starts) - 1:
+            # Troca interrompida entre os dois arquivos: o índice é reconstruído pelo chamador
+            return
+        self.vocabulary = {term: term_id for term_id, term in enumerate(vocabulary)}
+        self._set(doc_ids, tfs, starts, doc_len)
+
+    def stats(self) -> Dict[str, int]:
+        return {"terms": len(self.vocabulary), "postings": len(self.doc_ids), "bytes": self.doc_ids.nbytes + self.tfs.nbytes}
@@ -0,0 +1,123 @@
+from typing import Dict, Any, List, Optional, Tuple
+from dataclasses import dataclass
+import asyncio
+import time
+from ..settings import get_settings
+from ..logging_config import get_logger
+from ..metrics import KB_RETRIEVAL_LATENCY
+from .embeddings import embed_batch
+from .index import KnowledgeIndex, knowledge_index
+
+logger = get_logger(__name__)
+
+settings = get_settings()
+
+@dataclass
+class Passage:
+    """Trecho da base de conhecimento recuperado para uma pergunta"""
+    id: int
+    score: float
+    text: str
+    filename: str
+    position: int
+    vector_score: float = 0.0
+    lexical_score: float = 0.0
+
+def reciprocal_rank_fusion(rankings: List[List[int]], k: int = 60) -> List[Tuple[int, float]]:
+    """
+    Funde rankings pela posição, não pelo score (BM25 e cosseno não são
+    comparáveis): cada lista soma 1 / (k + posição) ao trecho.
+    """
+    fused: Dict[int, float] = {}
+    for ranking in rankings:
+        for rank, chunk_id in enumerate(ranking, 1):
+            fused[chunk_id] = fused.get(chunk_id, 0.0) + 1.0 / (k + rank)
+    return sorted(fused.items(), key=lambda item: item[1], reverse=True)
+
+def estimate_tokens(text: str) -> int:
+    """Mesma estimativa local dos adaptadores (~4 caracteres por token)"""
+    return len(text) // 4
+
+class KnowledgeRetriever:
+    """
+    Busca os trechos mais próximos da pergunta e os formata para o prompt. Na
+    busca híbrida, os candidatos do índice vetorial (score >= min_score) e do
+    BM25 são fundidos por reciprocal rank fusion.
+    """
+
+    def __init__(self, index: KnowledgeIndex, top_k: int = 4, min_score: float = 0.2, token_budget: int = 1200,
+                 hybrid: bool = True, candidates: int = 20, rrf_k: int = 60):
+        self.index = index
+        self.top_k = top_k
+        self.min_score = min_score
+        self.token_budget = token_budget
+        self.hybrid = hybrid
+        self.candidates = candidates
+        self.rrf_k = rrf_k
+
+    def search(self, query: str, k: Optional[int] = None) -> List[Passage]:
+        """Busca síncrona (CPU): embedding da consulta, buscas vetorial e lexical, fusão e leitura dos trechos"""
+        k = k or self.top_k
+        depth = max(k, self.candidates) if self.hybrid else k
+        vector = embed_batch([query], self.index.dim)[0]
+        dense = {chunk_id: score for chunk_id, score in self.index.search(vector, depth) if score >= self.min_score}
+        lexical = dict(self.index.search_lexical(query, depth)) if self.hybrid else {}
+        hits = reciprocal_rank_fusion([list(dense), list(lexical)], self.rrf_k)[:k]
+        if not hits:
+            return []
+        rows = self.index.chunks([chunk_id for chunk_id, _ in hits])
+        return [
+            Passage(
+                id=chunk_id,
+                score=round(score, 6),
+                text=row["text"],
+                filename=row["filename"],
+                position=row["position"],
+                vector_score=round(dense.get(chunk_id, 0.0), 4),
+                lexical_score=round(lexical.get(chunk_id, 0.0), 4)
+            )
+            for (chunk_id, score), row in zip(hits, rows)
+        ]
+
+    async def retrieve(self, query: str, k: Optional[int] = None) -> List[Passage]:
+        """Busca fora do event loop; base vazia não custa nada"""
+        if not self.index.active_count or not query.strip():
+            return []
+        start = time.perf_counter()
+        try:
+            passages = await asyncio.to_thread(self.search, query, k)
+        except Exception as e:
+            # Sem a base, o turno segue com o contexto da conversa
+            logger.error(f"Erro na busca da base de conhecimento: {str(e)}")
+            return []
+        KB_RETRIEVAL_LATENCY.observe(time.perf_counter() - start)
+        return passages
+
+    def format_context(self, passages: List[Passage], token_budget: Optional[int] = None) -> str:
+        """Monta o bloco de trechos para o prompt, do mais ao menos relevante, dentro do orçamento de tokens"""
+        budget = self.token_budget if token_budget is None else token_budget
+        blocks = []
+        used = 0
+        for number, passage in enumerate(passages, 1):
+            block = f"[{number}] ({passage.filename}) {passage.text}"
+            tokens = estimate_tokens(block)
+            if used + tokens > budget:
+                remaining = (budget - used) * 4
+                # O primeiro trecho é cortado para caber; os seguintes ficam de fora
+                if not blocks and remaining > 0:
+                    blocks.append(block[:remaining])
+                break
+            blocks.append(block)
+            used += tokens
+        return "\n\n".join(blocks)
+
+# Instância global, sobre o mesmo índice em que o /base grava
+knowledge_retriever = KnowledgeRetriever(
+    knowledge_index,
+    settings.KB_TOP_K,
+    settings.KB_MIN_SCORE,
+    settings.KB_CONTEXT_TOKENS,
+    settings.KB_HYBRID_SEARCH,
+    settings.KB_CANDIDATES,
+    settings.KB_RRF_K
+)
@@ -0,0 +1,63 @@
+from typing import List
+import hashlib
+import re
+import unicodedata
+
+_WORD = re.compile(r"\w+")
+
+# Termo da busca lexical: palavras e códigos com separadores internos (SKU-1007, 12.345/0001)
+_TERM = re.compile(r"[a-z0-9]+(?:[-_./][a-z0-9]+)*")
+
+# Palavras funcionais do português (já sem acento), fora do índice lexical
+STOPWORDS = frozenset("""
+a o as os um uma uns umas de do da dos das no na nos nas em por pelo pela pelos pelas para pra
+com sem sob sobre ao aos e ou mas que se nao sim ja ha foi ser era esta estao eu tu ele ela
+nos vos eles elas me te lhe lhes seu sua seus suas meu minha meus minhas isso isto esse essa este
+aquele aquela qual quais quando onde como porque mais menos muito muita muitos muitas tambem ate
+""".split())
+
+def fold(text: str) -> str:
+    """Minúsculas e sem acentos: "Ação" e "acao" viram o mesmo termo"""
+    decomposed = unicodedata.normalize("NFKD", text.lower())
+    return "".join(char for char in decomposed if not unicodedata.combining(char))
+
+def chunk_hash(text: str) -> str:
+    """
+    Chave do trecho no índice e no cache de embeddings: sha256 do texto em
+    NFC com os espaços colapsados, para que o mesmo parágrafo extraído de um
+    PDF e de um .docx (ou de duas versões do mesmo manual) caia na mesma chave
+    """
+    normalized = " ".join(unicodedata.normalize("NFC", text).split())
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+def tokens(text: str) -> List[str]:
+    return _WORD.findall(fold(text))
+
+def stem(word: str) -> str:
+    """Reduz o plural (e só ele) de palavras em português: garantias -> garantia, acoes -> acao"""
+    if len(word) <= 3 or not word.isalpha() or not word.endswith("s"):
+        return word
+    for suffix, replacement in (("oes", "ao"), ("aes", "ao"), ("ais", "al"), ("eis", "el"), ("ois", "ol"), ("ns", "m")):
+        if word.endswith(suffix):
+            return word[:-len(suffix)] + replacement
+    if word.endswith(("res", "zes")) and len(word) > 4:
+        return word[:-2]
+    if word.endswith(("is", "us", "ss")):
+        return word
+    return word[:-1]
+
+def terms(text: str) -> List[str]:
+    """
+    Termos do índice lexical: sem acento, sem palavras funcionais e sem
+    plural. Um código como "SKU-1007" entra inteiro e também pelas partes,
+    para casar tanto "sku-1007" quanto "1007".
+    """
+    result = []
+    for term in _TERM.findall(fold(text)):
+        parts = re.split(r"[-_./]", term)
+        if len(parts) > 1:
+            result.append(term)
+            result.extend(part for part in parts if part not in STOPWORDS)
+        elif term not in STOPWORDS:
+            result.append(stem(term))
+    return result
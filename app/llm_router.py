@@ -1,230 +1,164 @@
-from typing import Optional, Dict, Any, List, Tuple
+from typing import Optional, Dict, Any, List, Tuple, Callable, Awaitable
 import os
 from dotenv import load_dotenv
-import anthropic
 import requests
-import google.generativeai as genai
 from .settings import get_settings
-from openai import AsyncOpenAI
-import logging
-from rich.console import Console
-from rich.logging import RichHandler
-from rich.panel import Panel
-from rich.table import Table
 import json
+import logging
 import asyncio
-import aiohttp
 from datetime import datetime
-from anthropic import AsyncAnthropic
+import time
+from .generation_profiles import generation_profiles, GenerationProfile
+from .logging_config import get_logger
+from .tracing import tracer
+from .metrics import PROVIDER_CALLS, PROVIDER_LATENCY, PROVIDER_SPILLOVER, record_llm_usage
+from .shared_state import shared_state, WORKER_ID
+from .providers import provider_clients, provider_registry, ProviderAdapter, ToolRequest, make_usage
+from .rate_limit import RateLimitTimeout, is_rate_limit_error, retry_after_seconds
 
-# Configurar rich console e logging
-console = Console()
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(message)s",
-    handlers=[RichHandler(console=console, rich_tracebacks=True)]
-)
-logger = logging.getLogger(__name__)
+logger = get_logger(__name__)
 
 load_dotenv()
 settings = get_settings()
 
+# Intenções que pedem ferramenta: palavras-chave na mensagem e termos que identificam,
+# pelo nome ou pela descrição, a ferramenta do catálogo MCP que a atende
+TOOL_INTENTS = [
+    {
+        "keywords": [
+            "pesquise", "procure", "busque", "encontre informações sobre",
+            "notícias sobre", "dados atuais", "informações recentes",
+            "últimas notícias", "dados estatísticos", "pesquisa sobre"
+        ],
+        "tool_terms": ("search", "busca", "pesquisa", "web"),
+        "reason": "Solicitação explícita de pesquisa ou busca de informações"
+    },
+    {
+        "keywords": [
+            "execute", "rode", "compile", "debug", "teste este código",
+            "execute este programa", "rode este script"
+        ],
+        "tool_terms": ("python", "code", "código", "exec", "run"),
+        "reason": "Solicitação explícita de execução de código"
+    },
+]
+
 class LLMRouter:
     """Router para selecionar o melhor LLM para cada tipo de pergunta"""
     
     def __init__(self):
-        # Inicializa clientes dos LLMs
-        self.anthropic = AsyncAnthropic(api_key=settings.ANTHROPIC_API_KEY)
-        self.openai = AsyncOpenAI(api_key=settings.OPENAI_API_KEY)
-        genai.configure(api_key=settings.GEMINI_API_KEY)
-        self.gemini = genai.GenerativeModel('gemini-1.5-pro')
-        
-        # Status dos modelos
-        self.models_status: Dict[str, bool] = {
-            "openai": True,
-            "anthropic": True,
-            "gemini": True,
-            "deepseek": True
-        }
+        # Status dos modelos (um por provedor configurado)
+        self.models_status: Dict[str, bool] = {name: True for name in provider_registry.names()}
         
         # Timestamp da última verificação
         self.last_check: Dict[str, datetime] = {}
+        
+        # Mudanças de status são publicadas para os outros workers
+        self._status_tasks = set()
+        shared_state.subscribe("provider_health", self._on_remote_status)
+
+    # Clientes construídos sob demanda pelo registro de provedores
+    
+    @property
+    def anthropic(self):
+        return provider_clients.get("anthropic")
+    
+    @property
+    def openai(self):
+        return provider_clients.get("openai")
+    
+    @property
+    def gemini(self):
+        return provider_clients.get("gemini")
 
     def log_api_call(self, model: str, prompt_preview: str):
-        """Log estilizado de chamada de API"""
-        table = Table(show_header=True, header_style="bold magenta")
-        table.add_column("Model")
-        table.add_column("Prompt Preview")
-        table.add_column("Timestamp")
-        table.add_row(
-            f"[cyan]{model}[/cyan]",
-            f"[yellow]{prompt_preview[:50]}...[/yellow]",
-            f"[green]{datetime.now().strftime('%H:%M:%S')}[/green]"
-        )
-        console.print(table)
+        """Log estruturado de chamada de API"""
+        logger.debug("llm_api_call", extra={"model": model, "prompt_chars": len(prompt_preview)})
 
     def log_model_status(self, model_name: str, status: bool, extra_info: str = ""):
-        """Log estilizado do status do modelo"""
-        status_emoji = "✅" if status else "❌"
-        status_color = "green" if status else "red"
-        console.print(Panel(
-            f"[{status_color}]{status_emoji} {model_name.upper()}[/{status_color}]: {extra_info}",
-            border_style=status_color
-        ))
+        """Log estruturado do status do modelo (mudanças de status viram aviso)"""
+        changed = self.models_status.get(model_name) != status
+        level = logging.WARNING if changed and not status else logging.DEBUG
+        logger.log(level, "model_status", extra={"model": model_name, "available": status, "info": extra_info})
 
     def _update_model_status(self, model_name: str, status: bool):
         """Atualiza o status de um modelo"""
+        self.log_model_status(model_name, status)
+        changed = self.models_status.get(model_name) != status
         self.models_status[model_name] = status
         self.last_check[model_name] = datetime.utcnow()
-        self.log_model_status(model_name, status)
-        
-    async def _call_anthropic(self, prompt: str, system_prompt: Optional[str] = None) -> str:
-        """Chama a API Anthropic com o prompt fornecido"""
+        if changed:
+            self._share_model_status(model_name, status)
+    
+    def _share_model_status(self, model_name: str, status: bool):
+        """Grava o status no estado compartilhado e avisa os outros workers, sem bloquear a chamada"""
         try:
-            if not self.anthropic:
-                raise Exception("Cliente Anthropic não inicializado")
-            
-            self.log_api_call("Anthropic", prompt)
-            
-            # Constrói a mensagem com system prompt
-            messages = []
-            
-            # Chama a API Anthropic
-            response = await self.anthropic.messages.create(
-                model="claude-3-opus",
-                max_tokens=4096,
-                messages=[{"role": "user", "content": prompt}],
-                system=system_prompt,  # Passa o system prompt diretamente
-                temperature=0.7
-            )
-            
-            self._update_model_status("anthropic", True)
-            console.print("[bold green]✓[/bold green] Anthropic response received")
-            return response.content[0].text
-            
-        except Exception as e:
-            logger.error(f"Erro ao chamar Anthropic: {str(e)}")
-            self._update_model_status("anthropic", False)
-            
-            # Se falhar, tenta usar OpenAI como fallback
-            try:
-                console.print("[yellow]! Usando OpenAI como fallback para Anthropic[/yellow]")
-                return await self._call_openai(prompt, system_prompt)
-            except:
-                raise Exception(f"Falha ao chamar Anthropic e OpenAI: {str(e)}")
-        
-    async def _call_gemini(self, prompt: str, system_prompt: Optional[str] = None) -> str:
-        """Chama o Gemini da Google"""
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        task = loop.create_task(self._publish_model_status(model_name, status))
+        self._status_tasks.add(task)
+        task.add_done_callback(self._status_tasks.discard)
+    
+    async def _publish_model_status(self, model_name: str, status: bool):
         try:
-            self.log_api_call("Gemini", prompt)
-            
-            # Combina system prompt com o prompt do usuário
-            full_prompt = f"{system_prompt}\n\nUser: {prompt}" if system_prompt else prompt
-            
-            response = await asyncio.to_thread(
-                self.gemini.generate_content,
-                full_prompt
-            )
-            self._update_model_status("gemini", True)
-            console.print("[bold green]✓[/bold green] Gemini response received")
-            return response.text
+            await shared_state.set(f"provider_health:{model_name}", status, ttl=settings.PROVIDER_HEALTH_TTL)
+            await shared_state.publish("provider_health", {"model": model_name, "available": status, "origin": WORKER_ID})
         except Exception as e:
-            logger.error(f"[bold red]✗[/bold red] Erro no Gemini: {str(e)}")
-            self._update_model_status("gemini", False)
-            raise
-        
-    async def _call_deepseek(self, prompt: str, system_prompt: Optional[str] = None) -> str:
-        """Chama o DeepSeek"""
+            logger.error(f"Erro ao compartilhar status do {model_name}: {str(e)}")
+    
+    async def _on_remote_status(self, message: Dict[str, Any]):
+        """Aplica mudanças de status publicadas por outros workers"""
+        model_name = message.get("model")
+        if message.get("origin") == WORKER_ID or model_name not in self.models_status:
+            return
+        self.log_model_status(model_name, message["available"], "remoto")
+        self.models_status[model_name] = message["available"]
+        self.last_check[model_name] = datetime.utcnow()
+    
+    async def load_shared_status(self):
+        """Carrega o status dos provedores gravado por outros workers (usado no startup)"""
         try:
-            self.log_api_call("DeepSeek", prompt)
-            headers = {
-                "Authorization": f"Bearer {settings.DEEPSEEK_API_KEY}",
-                "Content-Type": "application/json"
-            }
-            
-            # Prepara as mensagens com system prompt
-            messages = []
-            if system_prompt:
-                messages.append({"role": "system", "content": system_prompt})
-            messages.append({"role": "user", "content": prompt})
-            
-            data = {
-                "model": "deepseek-chat",
-                "messages": messages,
-                "temperature": 0.7,
-                "max_tokens": 1000
-            }
-            
-            async with aiohttp.ClientSession() as session:
-                async with session.post(
-                    "https://api.deepseek.com/v1/chat/completions",
-                    headers=headers,
-                    json=data
-                ) as response:
-                    response_json = await response.json()
-                    if response.status != 200:
-                        raise Exception(f"DeepSeek API error: {response_json}")
-                    self._update_model_status("deepseek", True)
-                    console.print("[bold green]✓[/bold green] DeepSeek response received")
-                    return response_json["choices"][0]["message"]["content"]
+            shared = await shared_state.get_many([f"provider_health:{model}" for model in self.models_status])
         except Exception as e:
-            logger.error(f"Erro no DeepSeek: {str(e)}")
-            self._update_model_status("deepseek", False)
-            raise
+            logger.error(f"Erro ao carregar status compartilhado: {str(e)}")
+            return
+        for key, status in shared.items():
+            self.models_status[key.split(":", 1)[1]] = status
+        
+    def _default_profile(self) -> GenerationProfile:
+        """Perfil usado quando a chamada não informa canal/classe"""
+        return generation_profiles.resolve("web", None)
 
-    async def _call_openai(self, prompt: str, system_prompt: Optional[str] = None) -> str:
-        """Chama a API OpenAI com o prompt fornecido"""
-        try:
-            if not self.openai:
-                return "Cliente OpenAI não inicializado"
-            
-            self.log_api_call("OpenAI", prompt)
-            
-            # Constrói os parâmetros de requisição
-            messages = []
-            
-            # Sempre adiciona o system prompt se fornecido
-            if system_prompt:
-                messages.append({
-                    "role": "system",
-                    "content": system_prompt
-                })
-            
-            # Adiciona o prompt do usuário
-            messages.append({
-                "role": "user",
-                "content": prompt
-            })
-            
-            # Chama a API OpenAI
-            response = await self.openai.chat.completions.create(
-                model="gpt-4",
-                messages=messages,
-                max_tokens=4096,
-                temperature=0.7
-            )
-            
-            self._update_model_status("openai", True)
-            console.print("[bold green]✓[/bold green] OpenAI response received")
-            return response.choices[0].message.content
-            
-        except Exception as e:
-            logger.error(f"Erro ao chamar OpenAI: {str(e)}")
-            self._update_model_status("openai", False)
-            raise
+    def _build_user_prompt(self, prompt: str, context: Optional[str] = None, knowledge: Optional[str] = None, tool_results: Optional[str] = None) -> str:
+        """Monta a mensagem do usuário com o contexto dinâmico (sempre após o system prompt estático)"""
+        sections = []
+        if tool_results:
+            sections.append(f"Resultados das ferramentas (use-os na resposta):\n{tool_results}")
+        if knowledge:
+            sections.append(f"Trechos da base de conhecimento (use-os se forem relevantes):\n{knowledge}")
+        if context:
+            sections.append(f"Contexto anterior:\n{context}")
+        if not sections:
+            return prompt
+        return "\n\n".join(sections + [f"Mensagem atual:\n{prompt}"])
 
     def get_available_models(self) -> List[str]:
         """Retorna a lista de modelos disponíveis"""
         return [model for model, status in self.models_status.items() if status]
 
-    def _estimate_tokens(self, text: str) -> int:
-        """
-        Estima o número de tokens em um texto.
-        Usa uma aproximação simples: ~4 caracteres por token
-        """
-        return len(text) // 4
-
-    async def generate_response(self, prompt: str, context: Optional[str] = None, system_prompt: Optional[str] = None) -> Dict[str, Any]:
+    async def generate_response(
+        self,
+        prompt: str,
+        context: Optional[str] = None,
+        system_prompt: Optional[str] = None,
+        channel: str = "web",
+        query_class: Optional[str] = None,
+        knowledge: Optional[str] = None,
+        tools: Optional[List[Dict[str, Any]]] = None,
+        run_tools: Optional[Callable[[List[ToolRequest]], Awaitable[List[str]]]] = None,
+        tool_results: Optional[str] = None
+    ) -> Dict[str, Any]:
         """
         Gera uma resposta usando o melhor modelo disponível
         
@@ -232,6 +166,12 @@ class LLMRouter:
             prompt: Prompt do usuário
             context: Contexto opcional da conversa
             system_prompt: System prompt do agente
+            channel: Canal de origem ('web' ou 'whatsapp')
+            query_class: Classe da pergunta (calculada a partir do prompt se omitida)
+            knowledge: Trechos da base de conhecimento já formatados
+            tools: Ferramentas oferecidas ao modelo (function calling nativo), com run_tools
+            run_tools: Executa as chamadas pedidas pelo modelo e retorna as saídas, na mesma ordem
+            tool_results: Saídas de ferramentas já executadas, incluídas na mensagem do usuário
             
         Returns:
             Dict com a resposta e metadados
@@ -240,14 +180,23 @@ class LLMRouter:
             # Seleciona o melhor modelo
             selected_model = await self._select_best_model(prompt)
             
-            # Combina o contexto com o prompt se fornecido
-            full_prompt = f"Contexto: {context}\n\nPergunta: {prompt}" if context else prompt
+            # Resolve o perfil de geração do canal/classe
+            query_class = query_class or self._classify_query_complexity(prompt)
+            profile = generation_profiles.resolve(channel, query_class)
+            
+            # Contexto dinâmico vai depois do system prompt estático (cacheável)
+            full_prompt = self._build_user_prompt(prompt, context, knowledge, tool_results)
+            
+            # O próprio modelo decide se usa as ferramentas, na mesma conversa da resposta
+            if tools and run_tools and self.supports_tools(selected_model):
+                return await self._call_llm_with_tools(selected_model, full_prompt, system_prompt, profile, tools, run_tools)
             
             # Chama o modelo selecionado com o system prompt do agente
             response = await self._call_llm(
                 model_name=selected_model,
                 prompt=full_prompt,
-                system_prompt=system_prompt
+                system_prompt=system_prompt,
+                profile=profile
             )
             
             return response
@@ -258,35 +207,26 @@ class LLMRouter:
 
     def _get_model_name(self, llm: str) -> str:
         """Retorna o nome específico do modelo para cada LLM"""
-        model_names = {
-            "anthropic": "claude-3-opus",
-            "openai": "gpt-4",
-            "gemini": "gemini-1.5-pro",
-            "deepseek": "deepseek-chat",
-            "system": "system"
-        }
-        return model_names.get(llm, "default")
+        if llm == "system":
+            return "system"
+        return provider_registry.model_name(llm) or "default"
 
-    async def detect_tool_need(self, message: str) -> Tuple[bool, Dict[str, Any]]:
+    async def detect_tool_need(self, message: str, tools: Optional[List[Any]] = None) -> Tuple[bool, Dict[str, Any]]:
         """
-        Detecta se o usuário precisa de uma ferramenta específica e qual ferramenta usar
+        Detecta se o usuário precisa de ferramentas e quais, entre as do catálogo
+        
+        Args:
+            message: Mensagem do usuário
+            tools: Ferramentas descobertas nos servidores MCP (ToolSpec: server, name,
+                description, arguments()); sem catálogo, nenhuma ferramenta é usada
         
         Returns:
-            Tuple[bool, Dict]: (precisa_ferramenta, {tool_name, tool_input, server_name})
+            Tuple[bool, Dict]: (precisa_ferramenta, {tool_name, tool_input, server_name, calls}),
+            com a primeira ferramenta no topo e todas as detectadas em calls
         """
         try:
-            # Palavras-chave que indicam necessidade de pesquisa web
-            web_search_keywords = [
-                "pesquise", "procure", "busque", "encontre informações sobre",
-                "notícias sobre", "dados atuais", "informações recentes",
-                "últimas notícias", "dados estatísticos", "pesquisa sobre"
-            ]
-            
-            # Palavras-chave que indicam execução de código
-            code_keywords = [
-                "execute", "rode", "compile", "debug", "teste este código",
-                "execute este programa", "rode este script"
-            ]
+            if not tools:
+                return False, {}
             
             # Palavras-chave que indicam que NÃO é necessário usar ferramentas
             no_tool_keywords = [
@@ -296,26 +236,30 @@ class LLMRouter:
             ]
             
             # Se contém palavras-chave que indicam que não precisa de ferramenta, retorna False
-            if any(keyword in message.lower() for keyword in no_tool_keywords):
+            message_lower = message.lower()
+            if any(keyword in message_lower for keyword in no_tool_keywords):
                 return False, {}
             
-            # Verifica necessidade de pesquisa web
-            if any(keyword in message.lower() for keyword in web_search_keywords):
-                return True, {
-                    "tool_name": "search_web",
-                    "tool_input": message,
-                    "server_name": "web_search",
-                    "reason": "Solicitação explícita de pesquisa ou busca de informações"
-                }
-            
-            # Verifica necessidade de execução de código
-            if any(keyword in message.lower() for keyword in code_keywords):
-                return True, {
-                    "tool_name": "execute_code",
-                    "tool_input": message,
-                    "server_name": "run_python",
-                    "reason": "Solicitação explícita de execução de código"
-                }
+            # Uma mensagem pode pedir mais de uma ferramenta (pesquisa e execução de código);
+            # cada intenção usa a primeira ferramenta do catálogo cujo nome ou descrição a cobre
+            calls = []
+            for intent in TOOL_INTENTS:
+                if not any(keyword in message_lower for keyword in intent["keywords"]):
+                    continue
+                tool = next(
+                    (tool for tool in tools if any(term in f"{tool.name} {tool.description}".lower() for term in intent["tool_terms"])),
+                    None
+                )
+                if tool is not None:
+                    calls.append({
+                        "tool_name": tool.name,
+                        "tool_input": tool.arguments(message),
+                        "server_name": tool.server,
+                        "reason": intent["reason"]
+                    })
+            
+            if calls:
+                return True, {**calls[0], "calls": calls}
             
             return False, {}
                 
@@ -323,111 +267,103 @@ class LLMRouter:
             logger.error(f"Erro ao detectar necessidade de ferramenta: {str(e)}")
             return False, {}
             
-    async def _call_anthropic_with_json(self, system_prompt: str, user_prompt: str) -> Dict[str, Any]:
-        """Chama a API Anthropic com response_format=json"""
-        try:
-            if not self.anthropic:
-                return {}
-            
-            self.log_api_call("Anthropic JSON", user_prompt)
-            
-            # Chama a API Anthropic
-            response = await self.anthropic.messages.create(
-                model="claude-3-opus",
-                system=system_prompt,
-                max_tokens=1024,
-                messages=[{"role": "user", "content": user_prompt}],
-                response_format={"type": "json"}
-            )
-            
-            self._update_model_status("anthropic", True)
-            console.print("[bold green]✓[/bold green] Anthropic JSON response received")
-            
-            # Extrai o conteúdo JSON
-            import json
-            return json.loads(response.content[0].text)
-            
-        except Exception as e:
-            logger.error(f"Erro ao chamar Anthropic com JSON: {str(e)}")
-            self._update_model_status("anthropic", False)
-            return {}
-
-    async def _call_openai_with_json(self, system_prompt: str, user_prompt: str) -> Dict[str, Any]:
-        """Chama a API OpenAI com response_format=json_object"""
-        try:
-            if not self.openai:
-                return {}
-            
-            self.log_api_call("OpenAI JSON", user_prompt)
-            
-            response = await self.openai.chat.completions.create(
-                model="gpt-4o-2024-05-13",
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_prompt}
-                ],
-                response_format={"type": "json_object"},
-                max_tokens=1024
-            )
-            
-            self._update_model_status("openai", True)
-            console.print("[bold green]✓[/bold green] OpenAI JSON response received")
-            
-            # Extrai o conteúdo JSON
-            import json
-            return json.loads(response.choices[0].message.content)
-            
-        except Exception as e:
-            logger.error(f"Erro ao chamar OpenAI com JSON: {str(e)}")
-            self._update_model_status("openai", False)
-            return {}
-            
-    async def combine_tool_result(self, original_message: str, tool_name: str, tool_result: str) -> str:
+    def supports_tools(self, model_name: str) -> bool:
+        """O provedor aceita function calling nativo (capacidade "tools") e está habilitado para isso"""
+        adapter = provider_registry.get(model_name)
+        return bool(settings.MCP_NATIVE_TOOLS and adapter and "tools" in adapter.capabilities)
+    
+    async def _call_provider(
+        self,
+        model_name: str,
+        prompt: str,
+        system_prompt: Optional[str],
+        profile: GenerationProfile,
+        tried: Tuple[str, ...] = ()
+    ) -> Tuple[str, Dict[str, int], Dict[str, str]]:
         """
-        Combina o resultado de uma ferramenta com uma resposta gerada pelo LLM
-        
-        Args:
-            original_message: Mensagem original do usuário
-            tool_name: Nome da ferramenta utilizada
-            tool_result: Resultado da execução da ferramenta
-            
-        Returns:
-            Resposta combinada
+        Chama o adaptador do provedor e retorna (texto, uso de tokens, informações do modelo).
+        Se o provedor falhar e tiver fallback configurado, tenta o fallback. Se estiver
+        no limite de taxa (fila ou 429), desvia para outro provedor livre quando houver.
         """
+        adapter = provider_registry.get(model_name)
+        if not adapter:
+            raise ValueError(f"Modelo desconhecido: {model_name}")
+        tried = tried + (model_name,)
+        
+        # Com um provedor livre para desviar, espera pouco na fila; sem ele, espera até o prazo
+        spill_to = self._spillover_candidate(adapter, tried)
+        timeout = settings.RATE_LIMIT_SPILLOVER_WAIT if spill_to else settings.RATE_LIMIT_QUEUE_TIMEOUT
+        
         try:
-            # Usa o modelo Anthropic (ou fallback para OpenAI) para combinar resultados
-            model = "anthropic" if self.models_status["anthropic"] else "openai"
-            
-            system_prompt = """
-            Você é um assistente que utiliza resultados de ferramentas para elaborar respostas completas e informativas.
-            Com base na mensagem original do usuário e no resultado da ferramenta, forneça uma resposta clara 
-            que integre as informações obtidas da ferramenta de maneira natural e útil.
-            """
-            
-            prompt = f"""
-            Mensagem original do usuário: {original_message}
-            
-            Ferramenta utilizada: {tool_name}
-            
-            Resultado da ferramenta:
-            {tool_result}
-            
-            Por favor, elabore uma resposta completa que incorpore o resultado da ferramenta
-            de maneira natural e útil para o usuário.
-            """
-            
-            if model == "anthropic":
-                response = await self._call_llm("anthropic", prompt, system_prompt)
-            else:
-                response = await self._call_llm("openai", prompt, system_prompt)
-                
-            return response
-            
+            response_text, usage = await self._call_adapter(adapter, prompt, system_prompt, profile, timeout)
+            logger.debug("llm_response_received", extra={"model": model_name})
+            return response_text, usage, self._model_info(adapter)
         except Exception as e:
-            print(f"Erro ao combinar resultado da ferramenta: {str(e)}")
-            return f"Resultado da ferramenta: {tool_result}\n\nDesculpe, não foi possível elaborar uma resposta completa."
+            rate_limited = isinstance(e, RateLimitTimeout) or is_rate_limit_error(e)
+            fallback = self._spillover_candidate(adapter, tried) if rate_limited else adapter.config.fallback
+            if not fallback or fallback in tried or not provider_registry.get(fallback):
+                raise
+            if rate_limited:
+                # Limite de taxa não torna o modelo indisponível
+                PROVIDER_SPILLOVER.inc(provider=model_name, target=fallback)
+                logger.warning("llm_spillover", extra={"model": model_name, "fallback": fallback, "reason": str(e)})
+            else:
+                logger.error(f"Erro ao chamar {model_name}: {str(e)}")
+                self._update_model_status(model_name, False)
+                PROVIDER_CALLS.inc(provider=model_name, status="error")
+                logger.warning("llm_fallback", extra={"model": model_name, "fallback": fallback})
+            return await self._call_provider(fallback, prompt, system_prompt, profile, tried)
+    
+    async def _call_adapter(
+        self,
+        adapter: ProviderAdapter,
+        prompt: str,
+        system_prompt: Optional[str],
+        profile: GenerationProfile,
+        timeout: float
+    ) -> Tuple[str, Dict[str, int]]:
+        """Chama o adaptador dentro do limitador do provedor (vaga + cota de tokens)"""
+        tokens = adapter.count_tokens(prompt) + profile.max_tokens
+        if system_prompt:
+            tokens += adapter.count_tokens(system_prompt)
+        return await self._limited(adapter, tokens, timeout, lambda: adapter.call(prompt, system_prompt, profile))
+    
+    async def _limited(self, adapter: ProviderAdapter, tokens: int, timeout: float, request: Callable[[], Awaitable[Any]]) -> Any:
+        """Executa a chamada ao provedor dentro do limitador (vaga + cota de tokens)"""
+        async with adapter.limiter.slot(tokens, timeout):
+            try:
+                result = await request()
+            except Exception as e:
+                if is_rate_limit_error(e):
+                    adapter.limiter.on_rate_limited(retry_after_seconds(e))
+                raise
+            adapter.limiter.on_success()
+            return result
     
-    async def _call_llm(self, model_name: str, prompt: str, system_prompt: Optional[str] = None) -> Dict[str, Any]:
+    def _spillover_candidate(self, adapter: ProviderAdapter, tried: Tuple[str, ...]) -> Optional[str]:
+        """Fallback configurado ou primeiro provedor disponível que não está no limite"""
+        if not settings.RATE_LIMIT_SPILLOVER:
+            return None
+        for name in [adapter.config.fallback, *self.get_available_models()]:
+            candidate = provider_registry.get(name) if name else None
+            if candidate and name not in tried and not candidate.limiter.saturated:
+                return name
+        return None
+    
+    def _model_info(self, adapter: ProviderAdapter) -> Dict[str, str]:
+        return {
+            "llm": adapter.name,
+            "model": adapter.config.model,
+            "classification": adapter.config.classification
+        }
+
+    async def _call_llm(
+        self,
+        model_name: str,
+        prompt: str,
+        system_prompt: Optional[str] = None,
+        profile: Optional[GenerationProfile] = None
+    ) -> Dict[str, Any]:
         """
         Chama um LLM específico com um prompt opcional de sistema
         
@@ -435,79 +371,38 @@ class LLMRouter:
             model_name: Nome do modelo a ser chamado (anthropic, openai, etc)
             prompt: Prompt do usuário
             system_prompt: Prompt de sistema opcional
+            profile: Perfil de geração (limites de tokens, temperatura e stop sequences)
             
         Returns:
             Dict com a resposta e metadados do modelo
         """
+        profile = profile or self._default_profile()
+        start_time = time.perf_counter()
         try:
             # Log da chamada
             self.log_api_call(model_name, prompt)
             
-            # Estima tokens do prompt e system prompt
-            prompt_tokens = self._estimate_tokens(prompt)
-            system_tokens = self._estimate_tokens(system_prompt) if system_prompt else 0
-            total_input_tokens = prompt_tokens + system_tokens
-            
-            # Chama o modelo específico
-            if model_name == "anthropic":
-                response_text = await self._call_anthropic(prompt, system_prompt)
-                model_info = {
-                    "llm": "anthropic",
-                    "model": "claude-3-opus",
-                    "classification": "analytical"
-                }
-            elif model_name == "openai":
-                response_text = await self._call_openai(prompt, system_prompt)
-                model_info = {
-                    "llm": "openai",
-                    "model": "gpt-4",
-                    "classification": "general"
-                }
-            elif model_name == "gemini":
-                response_text = await self._call_gemini(prompt, system_prompt)
-                model_info = {
-                    "llm": "gemini",
-                    "model": "gemini-1.5-pro",
-                    "classification": "creative"
-                }
-            elif model_name == "deepseek":
-                response_text = await self._call_deepseek(prompt, system_prompt)
-                model_info = {
-                    "llm": "deepseek",
-                    "model": "deepseek-chat",
-                    "classification": "technical"
-                }
-            else:
+            adapter = provider_registry.get(model_name)
+            if not adapter:
                 raise ValueError(f"Modelo desconhecido: {model_name}")
             
-            # Estima tokens da resposta
-            response_tokens = self._estimate_tokens(response_text)
-            
-            # Atualiza o status do modelo
-            self._update_model_status(model_name, True)
+            # Chama o modelo específico
+            with tracer.span("llm_call", provider=model_name, profile=profile.name) as span:
+                response_text, usage, model_info = await self._call_provider(model_name, prompt, system_prompt, profile)
+                span.set_attribute("input_tokens", usage["input_tokens"])
+                span.set_attribute("output_tokens", usage["output_tokens"])
+                span.set_attribute("cache_read_tokens", usage["cache_read_tokens"])
             
-            # Retorna resposta com metadados
-            return {
-                "response": response_text,
-                "llm": model_info["llm"],
-                "model": model_info["model"],
-                "classification": model_info["classification"],
-                "timestamp": datetime.utcnow().isoformat(),
-                "metadata": {
-                    "model_name": model_name,
-                    "system_prompt_used": bool(system_prompt),
-                    "prompt_length": len(prompt),
-                    "response_length": len(response_text),
-                    "input_tokens": total_input_tokens,
-                    "response_tokens": response_tokens,
-                    "total_tokens": total_input_tokens + response_tokens,
-                    "source": "llm_router"
-                }
-            }
+            return self._llm_response(adapter, model_name, model_info, prompt, system_prompt, response_text, usage, profile, start_time)
             
         except Exception as e:
-            print(f"Erro ao chamar LLM {model_name}: {str(e)}")
-            self._update_model_status(model_name, False)
+            logger.error(f"Erro ao chamar LLM {model_name}: {str(e)}")
+            rate_limited = isinstance(e, RateLimitTimeout) or is_rate_limit_error(e)
+            # 429 e fila expirada são sobrecarga, não indisponibilidade do modelo
+            if not rate_limited:
+                self._update_model_status(model_name, False)
+            generation_profiles.record(profile, time.perf_counter() - start_time, success=False)
+            PROVIDER_CALLS.inc(provider=model_name, status="rate_limited" if rate_limited else "error")
             return {
                 "response": f"Erro ao gerar resposta com {model_name}: {str(e)}",
                 "llm": "system",
@@ -515,31 +410,176 @@ class LLMRouter:
                 "classification": "error",
                 "metadata": {
                     "error": str(e),
+                    "generation_profile": profile.name,
                     "source": "llm_router"
                 }
             }
     
-    async def _update_models_status(self):
-        """Atualiza o status de todos os modelos"""
-        # Verifica se é hora de atualizar o status (1 minuto desde a última verificação)
-        now = datetime.utcnow()
+    def _llm_response(
+        self,
+        adapter: ProviderAdapter,
+        model_name: str,
+        model_info: Dict[str, str],
+        prompt: str,
+        system_prompt: Optional[str],
+        response_text: str,
+        usage: Dict[str, int],
+        profile: GenerationProfile,
+        start_time: float
+    ) -> Dict[str, Any]:
+        """Registra uma chamada bem-sucedida (status, perfil, métricas e custo) e monta a resposta com metadados"""
+        # Usa a contagem reportada pelo provedor quando disponível
+        total_input_tokens = usage["input_tokens"] or adapter.count_tokens(prompt) + (adapter.count_tokens(system_prompt) if system_prompt else 0)
+        response_tokens = usage["output_tokens"] or adapter.count_tokens(response_text)
+        
+        # Atualiza o status do provedor que respondeu (pode ser o fallback)
+        self._update_model_status(model_info["llm"], True)
         
-        for model, last_check in self.last_check.items():
-            # Se último check foi há mais de 1 minuto, atualiza
-            if (now - last_check).total_seconds() > 60:
-                try:
-                    if model == "openai":
-                        await self._check_openai()
-                    elif model == "anthropic":
-                        await self._check_anthropic()
-                    elif model == "gemini":
-                        await self._check_gemini()
-                    elif model == "deepseek":
-                        await self._check_deepseek()
-                except Exception as e:
-                    logger.error(f"Erro ao verificar status do {model}: {str(e)}")
-                    # Marca como indisponível em caso de erro
-                    self._update_model_status(model, False)
+        # Registra a latência no perfil de geração e nas métricas
+        latency = time.perf_counter() - start_time
+        generation_profiles.record(profile, latency)
+        PROVIDER_CALLS.inc(provider=model_info["llm"], status="ok")
+        PROVIDER_LATENCY.observe(latency, provider=model_info["llm"])
+        record_llm_usage(model_info["model"], total_input_tokens, response_tokens, usage["cache_read_tokens"])
+        
+        # Retorna resposta com metadados
+        return {
+            "response": response_text,
+            "llm": model_info["llm"],
+            "model": model_info["model"],
+            "classification": model_info["classification"],
+            "timestamp": datetime.utcnow().isoformat(),
+            "metadata": {
+                "model_name": model_name,
+                "system_prompt_used": bool(system_prompt),
+                "prompt_length": len(prompt),
+                "response_length": len(response_text),
+                "input_tokens": total_input_tokens,
+                "response_tokens": response_tokens,
+                "total_tokens": total_input_tokens + response_tokens,
+                "cache_read_tokens": usage["cache_read_tokens"],
+                "cache_write_tokens": usage["cache_write_tokens"],
+                "generation_profile": profile.name,
+                "max_tokens": profile.max_tokens,
+                "latency_ms": round(latency * 1000, 2),
+                "source": "llm_router"
+            }
+        }
+    
+    async def _call_llm_with_tools(
+        self,
+        model_name: str,
+        prompt: str,
+        system_prompt: Optional[str],
+        profile: GenerationProfile,
+        tools: List[Dict[str, Any]],
+        run_tools: Callable[[List[ToolRequest]], Awaitable[List[str]]]
+    ) -> Dict[str, Any]:
+        """
+        Function calling nativo: o modelo selecionado recebe os schemas das
+        ferramentas e, na mesma conversa, pede as chamadas (executadas por
+        run_tools, em paralelo) e escreve a resposta final com as saídas, sem
+        uma segunda chamada só para combinar o resultado. Se o provedor falhar
+        ou as rodadas acabarem (MCP_TOOL_MAX_ROUNDS), a resposta sai de uma
+        chamada comum, com fallback, e as saídas já obtidas no prompt.
+        """
+        adapter = provider_registry.get(model_name)
+        messages: List[Dict[str, Any]] = [{"role": "user", "content": prompt}]
+        outputs: List[Tuple[ToolRequest, str]] = []
+        usage = make_usage(0, 0)
+        start_time = time.perf_counter()
+        self.log_api_call(model_name, prompt)
+        try:
+            with tracer.span("llm_call", provider=model_name, profile=profile.name, tools=len(tools)) as span:
+                for rounds in range(settings.MCP_TOOL_MAX_ROUNDS + 1):
+                    tokens = profile.max_tokens + adapter.count_tokens(json.dumps(messages, ensure_ascii=False, default=str))
+                    if system_prompt:
+                        tokens += adapter.count_tokens(system_prompt)
+                    turn = await self._limited(
+                        adapter, tokens, settings.RATE_LIMIT_QUEUE_TIMEOUT,
+                        lambda: adapter.call_with_tools(messages, system_prompt, tools, profile)
+                    )
+                    for key in usage:
+                        usage[key] += turn.usage[key]
+                    if not turn.requests or rounds == settings.MCP_TOOL_MAX_ROUNDS:
+                        break
+                    results = await run_tools(turn.requests)
+                    messages.append({"role": "assistant", "content": turn.text, "tool_requests": turn.requests})
+                    messages.append({"role": "tool", "results": list(zip(turn.requests, results))})
+                    outputs.extend(zip(turn.requests, results))
+                span.set_attribute("tool_rounds", rounds)
+                span.set_attribute("input_tokens", usage["input_tokens"])
+                span.set_attribute("output_tokens", usage["output_tokens"])
+        except Exception as e:
+            logger.warning("llm_tool_call_failed", extra={"model": model_name, "error": str(e), "tool_calls": len(outputs)})
+            return await self._answer_with_tool_outputs(model_name, prompt, system_prompt, profile, outputs)
+        
+        if turn.requests:
+            logger.warning("llm_tool_rounds_exhausted", extra={"model": model_name, "rounds": rounds})
+            record_llm_usage(adapter.config.model, usage["input_tokens"], usage["output_tokens"], usage["cache_read_tokens"])
+            return await self._answer_with_tool_outputs(model_name, prompt, system_prompt, profile, outputs)
+        
+        response = self._llm_response(adapter, model_name, self._model_info(adapter), prompt, system_prompt, turn.text, usage, profile, start_time)
+        response["metadata"].update({
+            "tool_mode": "native",
+            "tool_rounds": rounds,
+            "tools_used": [request.name for request, _ in outputs]
+        })
+        return response
+    
+    async def _answer_with_tool_outputs(
+        self,
+        model_name: str,
+        prompt: str,
+        system_prompt: Optional[str],
+        profile: GenerationProfile,
+        outputs: List[Tuple[ToolRequest, str]]
+    ) -> Dict[str, Any]:
+        """Resposta por uma chamada comum, com as saídas de ferramentas já obtidas no fim do prompt"""
+        if outputs:
+            tool_results = self.format_tool_results([(request.name, output) for request, output in outputs])
+            prompt = f"{prompt}\n\nResultados das ferramentas (use-os na resposta):\n{tool_results}"
+        response = await self._call_llm(model_name, prompt, system_prompt, profile)
+        response.setdefault("metadata", {})["tools_used"] = [request.name for request, _ in outputs]
+        return response
+    
+    @staticmethod
+    def format_tool_results(results: List[Tuple[str, str]]) -> str:
+        """Saídas de ferramentas como blocos "[ferramenta]\nsaída" """
+        return "\n\n".join(f"[{name}]\n{output}" for name, output in results)
+    
+    async def _update_models_status(self, min_age: float = 60):
+        """
+        Re-testa os provedores indisponíveis (por falha local ou status de outro
+        worker) cuja última verificação tem mais de min_age segundos. Um provedor
+        que volta a responder é liberado aqui e nos outros workers.
+        """
+        now = datetime.utcnow()
+        for model, available in list(self.models_status.items()):
+            if available:
+                continue
+            last_check = self.last_check.get(model)
+            if last_check and (now - last_check).total_seconds() < min_age:
+                continue
+            adapter = provider_registry.get(model)
+            if not adapter:
+                continue
+            try:
+                healthy = await adapter.health_probe()
+            except Exception as e:
+                logger.debug(f"Provedor {model} ainda indisponível: {str(e)}")
+                healthy = False
+            self._update_model_status(model, healthy)
+    
+    async def monitor_health(self, interval: Optional[float] = None):
+        """Loop de fundo: a cada intervalo re-testa os provedores indisponíveis"""
+        interval = interval or settings.PROVIDER_HEALTH_INTERVAL
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self._update_models_status(min_age=interval)
+            except Exception as e:
+                logger.error(f"Erro ao verificar a saúde dos provedores: {str(e)}")
     
     def _classify_query_complexity(self, query: str) -> str:
         """
@@ -579,18 +619,13 @@ class LLMRouter:
             return "simples"
 
     def log_model_selection(self, query: str, complexity: str, selected_model: str, available_models: List[str]):
-        """Log detalhado do processo de seleção do modelo"""
-        table = Table(title="[bold magenta]Model Selection Process[/bold magenta]", show_header=True)
-        table.add_column("Aspect", style="cyan")
-        table.add_column("Value", style="green")
-        
-        table.add_row("Query", f"[yellow]{query[:50]}...[/yellow]")
-        table.add_row("Complexity", complexity)
-        table.add_row("Available Models", ", ".join(available_models))
-        table.add_row("Selected Model", f"[bold]{selected_model}[/bold]")
-        
-        console.print(table)
-        console.print("\n")
+        """Log estruturado do processo de seleção do modelo"""
+        logger.debug("model_selection", extra={
+            "query_chars": len(query),
+            "complexity": complexity,
+            "available_models": available_models,
+            "selected_model": selected_model
+        })
 
     async def _select_best_model(self, query: str) -> str:
         """
@@ -603,53 +638,27 @@ class LLMRouter:
             raise ValueError("Nenhum modelo disponível")
             
         # Classifica o tipo da pergunta
-        query_type = self._classify_query_complexity(query)
+        with tracer.span("classification") as span:
+            query_type = self._classify_query_complexity(query)
+            span.set_attribute("query_class", query_type)
         
-        console.print(Panel(f"[bold blue]Analisando pergunta:[/bold blue] {query[:100]}...", title="Análise da Query"))
-        console.print(f"[bold cyan]Tipo da pergunta:[/bold cyan] {query_type}")
+        # Preferências por tipo de pergunta, seguidas do fallback geral
+        preferences = {
+            "analitica": ["anthropic", "openai"],
+            "complexa": ["deepseek", "anthropic"],
+            "criativa": ["gemini", "openai"]
+        }
+        fallback = provider_registry.names()
         
-        # Seleciona o modelo baseado no tipo da pergunta e disponibilidade
-        if query_type == "analitica":
-            if "anthropic" in available_models:
-                console.print("[bold green]Selecionado Anthropic para pergunta analítica[/bold green]")
-                return "anthropic"
-            elif "openai" in available_models:
-                console.print("[bold yellow]Usando OpenAI como alternativa para pergunta analítica[/bold yellow]")
-                return "openai"
-                
-        elif query_type == "complexa":
-            if "deepseek" in available_models:
-                console.print("[bold green]Selecionado DeepSeek para pergunta complexa[/bold green]")
-                return "deepseek"
-            elif "anthropic" in available_models:
-                console.print("[bold yellow]Usando Anthropic como alternativa para pergunta complexa[/bold yellow]")
-                return "anthropic"
-                
-        elif query_type == "criativa":
-            if "gemini" in available_models:
-                console.print("[bold green]Selecionado Gemini para pergunta criativa[/bold green]")
-                return "gemini"
-            elif "openai" in available_models:
-                console.print("[bold yellow]Usando OpenAI como alternativa para pergunta criativa[/bold yellow]")
-                return "openai"
-                
-        # Para perguntas simples ou fallback geral
-        if "openai" in available_models:
-            console.print("[bold green]Selecionado OpenAI[/bold green]")
-            return "openai"
-        elif "anthropic" in available_models:
-            console.print("[bold yellow]Usando Anthropic como alternativa[/bold yellow]")
-            return "anthropic"
-        elif "gemini" in available_models:
-            console.print("[bold yellow]Usando Gemini como alternativa[/bold yellow]")
-            return "gemini"
-        elif "deepseek" in available_models:
-            console.print("[bold yellow]Usando DeepSeek como alternativa[/bold yellow]")
-            return "deepseek"
-            
         # Se nenhum modelo preferido estiver disponível, usa o primeiro disponível
-        console.print(f"[bold red]Nenhum modelo preferido disponível. Usando {available_models[0]}[/bold red]")
-        return available_models[0]
+        selected_model = available_models[0]
+        for model in preferences.get(query_type, []) + fallback:
+            if model in available_models:
+                selected_model = model
+                break
+        
+        self.log_model_selection(query, query_type, selected_model, available_models)
+        return selected_model
 
 # Instância global do router
 llm_router = LLMRouter() 
\ No newline at end of file
@@ -0,0 +1,133 @@
+from typing import Dict, Any, Optional
+from datetime import datetime, timezone
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import sys
+import threading
+from .settings import get_settings
+
+# Atributos padrão de um LogRecord; todo o resto é tratado como campo estruturado
+_RESERVED_ATTRS = frozenset(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+_setup_lock = threading.Lock()
+_configured = False
+_listener: Optional[logging.handlers.QueueListener] = None
+_queue_handler: Optional["NonBlockingQueueHandler"] = None
+
+class JSONFormatter(logging.Formatter):
+    """Formata registros como uma linha JSON com os campos extras no topo"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        payload: Dict[str, Any] = {
+            "ts": datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage()
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RESERVED_ATTRS and not key.startswith("_"):
+                payload[key] = value
+        if record.exc_info:
+            payload["exc"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            payload["exc"] = record.exc_text
+        return json.dumps(payload, ensure_ascii=False, default=str)
+
+class SamplingFilter(logging.Filter):
+    """Amostra registros abaixo de WARNING; avisos e erros sempre passam"""
+
+    def __init__(self, rate: float):
+        super().__init__()
+        self.rate = max(0.0, min(1.0, rate))
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING or self.rate >= 1.0:
+            return True
+        return random.random() < self.rate
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler que nunca bloqueia quem faz o log: com a fila cheia o registro
+    é descartado e contabilizado em `dropped`.
+    """
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Resolve apenas a mensagem; a serialização JSON acontece na thread do listener
+        record = logging.makeLogRecord(record.__dict__)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+def _use_rich() -> bool:
+    """Saída rich só é permitida em desenvolvimento"""
+    settings = get_settings()
+    return settings.LOG_FORMAT == "rich" and settings.ENVIRONMENT == "development"
+
+def setup_logging():
+    """Configura o logging da aplicação (idempotente)"""
+    global _configured, _listener, _queue_handler
+    with _setup_lock:
+        if _configured:
+            return
+        _configured = True
+
+        settings = get_settings()
+        root = logging.getLogger()
+        root.setLevel(settings.LOG_LEVEL.upper())
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+
+        if _use_rich():
+            # Modo de desenvolvimento: renderização rich síncrona
+            from rich.logging import RichHandler
+            handler = RichHandler(rich_tracebacks=True)
+            handler.addFilter(SamplingFilter(settings.LOG_SAMPLE_RATE))
+            root.addHandler(handler)
+            return
+
+        # Produção: JSON lines escritas por uma thread dedicada
+        log_queue: queue.Queue = queue.Queue(maxsize=settings.LOG_QUEUE_SIZE)
+        _queue_handler = NonBlockingQueueHandler(log_queue)
+        _queue_handler.addFilter(SamplingFilter(settings.LOG_SAMPLE_RATE))
+        root.addHandler(_queue_handler)
+
+        stream_handler = logging.StreamHandler(sys.stdout)
+        stream_handler.setFormatter(JSONFormatter())
+        _listener = logging.handlers.QueueListener(log_queue, stream_handler, respect_handler_level=True)
+        _listener.start()
+        atexit.register(shutdown_logging)
+
+def shutdown_logging():
+    """Esvazia a fila de logs e para o listener"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+def get_log_stats() -> Dict[str, int]:
+    """Profundidade da fila de logs e registros descartados"""
+    if _queue_handler is not None:
+        return {"queue_depth": _queue_handler.queue.qsize(), "dropped": _queue_handler.dropped}
+    return {"queue_depth": 0, "dropped": 0}
+
+def get_logger(name: str) -> logging.Logger:
+    """Retorna um logger com o logging da aplicação configurado"""
+    setup_logging()
+    return logging.getLogger(name)
@@ -1,21 +1,40 @@
-from fastapi import FastAPI, HTTPException, Request, Form, WebSocket, WebSocketDisconnect, Depends, Response
+from fastapi import FastAPI, HTTPException, Request, Form, WebSocket, Depends, Response
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.templating import Jinja2Templates
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import HTMLResponse, JSONResponse
+from fastapi.responses import HTMLResponse, JSONResponse, PlainTextResponse
 from dotenv import load_dotenv
 import os
 import json
 from app.whatsapp import whatsapp_client
 from app.database import DatabaseClient
 from app.agent import ineuro_agent
+from app.mcp_catalog import mcp_catalog
+from app.mcp_engine import mcp_engine
 from app.command_handler import command_handler
+from app.knowledge import knowledge_ingestor
 from app.memory_agent import MemoryAgent
-from typing import List, Dict
+from app.generation_profiles import generation_profiles
+from app.connection_manager import manager
+from app.ws_session import WebSocketSession
+from app.shared_state import shared_state
+from app.settings import get_settings
+from app.llm_router import llm_router
+from app.providers import provider_clients
+from app.http_pool import http_pool
+from typing import List, Dict, Any
 from datetime import datetime
+from app.logging_config import get_logger
+from app.tracing import tracer
+from app.turn_graph import TurnGraph
+from app.metrics import registry, track_request, measure_overhead, monitor_event_loop, QUEUE_DEPTH
+import asyncio
+
+logger = get_logger(__name__)
 
 # Carregar variáveis de ambiente
 load_dotenv()
+settings = get_settings()
 
 app = FastAPI(
     title="I-Neuro",
@@ -36,125 +55,169 @@ app.add_middleware(
 )
 
 app.mount("/static", StaticFiles(directory="app/static"), name="static")
-app.mount("/templates/components", StaticFiles(directory="app/templates/components"), name="components")
+app.mount("/templates/components", StaticFiles(directory="app/templates/components", check_dir=False), name="components")
 
 # Inicializar clientes
 db_client = DatabaseClient()
 memory_agent = MemoryAgent(db_client)
 
-# Gerenciador de conexões WebSocket
-class ConnectionManager:
-    def __init__(self):
-        self.active_connections: List[WebSocket] = []
+def _collect_connections():
+    QUEUE_DEPTH.set(sum(session.inbound.qsize() for session in manager.sessions.values()), queue="ws_inbound")
+    QUEUE_DEPTH.set(sum(session.outbound.qsize() for session in manager.sessions.values()), queue="ws_outbound")
+
+registry.add_collector(_collect_connections)
+
+# Tarefas de fundo iniciadas no startup
+background_tasks = set()
 
-    async def connect(self, websocket: WebSocket):
-        await websocket.accept()
-        self.active_connections.append(websocket)
+def _llm_info(llm_response: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "llm": llm_response.get("llm", ""),
+        "model": llm_response.get("model", ""),
+        "classification": llm_response.get("classification", ""),
+        "metadata": llm_response.get("metadata", {})
+    }
 
-    def disconnect(self, websocket: WebSocket):
-        self.active_connections.remove(websocket)
+def _ws_turn_graph(session: WebSocketSession, sender_id: str, message: str, is_command: bool) -> TurnGraph:
+    """
+    Turno do WebSocket como grafo:
 
-    async def broadcast(self, message: Dict):
-        for connection in self.active_connections:
-            await connection.send_json(message)
+        memory_write_user ──────────────────────┐
+        context ─────┬─> agent ─> ws_send ──────┴─ (resposta enviada)
+        tool_detect ─┘                └─> memory_write ─> memory_update  (segundo plano)
+    """
+    graph = TurnGraph("ws")
+
+    async def run_command(results: Dict[str, Any]) -> Dict[str, Any]:
+        response_data = await command_handler.handle_command(message)
+        return {
+            "response": response_data.get("response", ""),
+            "llm_info": {
+                "llm": "system",
+                "model": "command",
+                "classification": "command",
+                "metadata": {"command": True}
+            }
+        }
 
-manager = ConnectionManager()
+    async def run_agent(results: Dict[str, Any]) -> Dict[str, Any]:
+        llm_response = await ineuro_agent.process_message(
+            message,
+            context=results["context"],
+            channel="web",
+            tool_need=results["tool_detect"]
+        )
+        return {"response": llm_response.get("response", ""), "llm_info": _llm_info(llm_response)}
+
+    async def send(results: Dict[str, Any]):
+        llm_info = results["agent"]["llm_info"]
+        logger.debug("ws_response_sent", extra={"llm": llm_info["llm"], "model": llm_info["model"]})
+        await session.send_json({
+            "response": results["agent"]["response"],
+            "llm_info": {
+                "name": llm_info["llm"],
+                "model": llm_info["model"],
+                "model_name": llm_info["model"],
+                "total_tokens": llm_info["metadata"].get("total_tokens", 0),
+                "input_tokens": llm_info["metadata"].get("input_tokens", 0),
+                "response_tokens": llm_info["metadata"].get("response_tokens", 0),
+                "classification": llm_info["classification"],
+                "source": llm_info["metadata"].get("source", "llm_router")
+            }
+        })
+
+    # shield: a mensagem do usuário é gravada mesmo se o turno for cancelado (stop, desconexão)
+    graph.step("memory_write_user", lambda results: asyncio.shield(memory_agent.save_message(sender_id, message, is_user=True)))
+    if is_command:
+        graph.step("agent", run_command)
+    else:
+        graph.step("context", lambda results: memory_agent.get_relevant_context(sender_id, message))
+        graph.step("tool_detect", lambda results: ineuro_agent.detect_tool_need(message))
+        graph.step("agent", run_agent, deps=("context", "tool_detect"))
+    graph.step("ws_send", send, deps=("agent",))
+    graph.step(
+        "memory_write",
+        lambda results: memory_agent.save_message(
+            sender_id, results["agent"]["response"], is_user=False, llm_response=results["agent"]["llm_info"]
+        ),
+        deps=("ws_send",),
+        critical=False
+    )
+    # Análise (Mistral) da conversa com as duas mensagens do turno já gravadas
+    graph.step("memory_update", lambda results: memory_agent.update_context(sender_id), deps=("memory_write",), critical=False)
+    return graph
+
+async def _handle_ws_message(session: WebSocketSession, data: Dict[str, Any]):
+    """Um turno do WebSocket; roda como task da sessão e é cancelado por stop ou desconexão"""
+    message = data.get("message")
+    is_command = data.get("is_command", False)
+    sender_id = data.get("sender_id", "web_user")
+    
+    if not message:
+        return
+    
+    # Cada mensagem é um turno com seu próprio trace
+    with tracer.start_trace("turn", channel="web", transport="ws"), track_request("ws"):
+        try:
+            graph = _ws_turn_graph(session, sender_id, message, is_command or command_handler.is_command(message))
+            await graph.run()
+            # Persistir a resposta e analisar a memória não atrasam o envio
+            graph.run_background(background_tasks)
+        
+        except Exception as e:
+            error_message = f"Erro ao processar mensagem: {str(e)}"
+            logger.error(f"Error in message processing: {error_message}")
+            await session.send_json({"error": error_message})
 
 @app.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
-    await manager.connect(websocket)
+    session = await manager.connect(websocket)
     try:
-        while True:
-            data = await websocket.receive_json()
-            message = data.get("message")
-            is_command = data.get("is_command", False)
-            sender_id = data.get("sender_id", "web_user")
-            
-            if not message:
-                continue
-            
-            try:
-                # Processa a mensagem do usuário com o MemoryAgent
-                await memory_agent.process_message(
-                    sender_id=sender_id,
-                    message=message,
-                    is_user=True
-                )
-                
-                # Processa a mensagem
-                if is_command or command_handler.is_command(message):
-                    response_data = await command_handler.handle_command(message)
-                    response_text = response_data.get("response", "")
-                    llm_info = {
-                        "llm": "system",
-                        "model": "command",
-                        "classification": "command",
-                        "metadata": {"command": True}
-                    }
-                else:
-                    # Obtém contexto relevante do MemoryAgent
-                    context = await memory_agent.get_relevant_context(sender_id, message)
-                    
-                    # Processa com o agente
-                    llm_response = await ineuro_agent.process_message(
-                        message,
-                        context=context
-                    )
-                    
-                    # Extrai informações da resposta
-                    response_text = llm_response.get("response", "")
-                    llm_info = {
-                        "llm": llm_response.get("llm", ""),
-                        "model": llm_response.get("model", ""),
-                        "classification": llm_response.get("classification", ""),
-                        "metadata": llm_response.get("metadata", {})
-                    }
-                
-                # Processa a resposta com o MemoryAgent
-                await memory_agent.process_message(
-                    sender_id=sender_id,
-                    message=response_text,
-                    is_user=False,
-                    llm_response=llm_info
-                )
-                
-                # Envia resposta ao cliente
-                print("Sending response with LLM info:", llm_info)  # Debug log
-                await websocket.send_json({
-                    "response": response_text,
-                    "llm_info": {
-                        "name": llm_info["llm"],
-                        "model": llm_info["model"],
-                        "model_name": llm_info["model"],
-                        "total_tokens": llm_info["metadata"].get("total_tokens", 0),
-                        "input_tokens": llm_info["metadata"].get("input_tokens", 0),
-                        "response_tokens": llm_info["metadata"].get("response_tokens", 0),
-                        "classification": llm_info["classification"],
-                        "source": llm_info["metadata"].get("source", "llm_router")
-                    }
-                })
-                
-            except Exception as e:
-                error_message = f"Erro ao processar mensagem: {str(e)}"
-                print(f"Error in message processing: {error_message}")
-                await websocket.send_json({"error": error_message})
-            
-    except WebSocketDisconnect:
-        manager.disconnect(websocket)
-    except Exception as e:
-        error_message = str(e)
-        await websocket.send_json({"error": f"Erro ao processar mensagem: {error_message}"})
-        manager.disconnect(websocket)
+        await session.run(_handle_ws_message)
+    finally:
+        manager.disconnect(session)
 
 @app.on_event("startup")
 async def startup_event():
     """Conecta a todos os servidores MCP configurados"""
-    await ineuro_agent.connect_servers()
+    # Estado compartilhado entre workers (saúde dos provedores, broadcast)
+    await shared_state.start()
+    await llm_router.load_shared_status()
+    
+    await ineuro_agent.connect_servers(db_client)
+    
+    # Descoberta das ferramentas MCP (list_tools) e renovação do catálogo antes do TTL
+    task = asyncio.create_task(mcp_catalog.monitor())
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+    
+    # Pre-warm opcional dos clientes dos provedores, em segundo plano para não atrasar o startup
+    prewarm = settings.get_prewarm_providers()
+    if prewarm != []:
+        task = asyncio.create_task(provider_clients.prewarm(prewarm, settings.PREWARM_CONNECTIONS))
+        background_tasks.add(task)
+        task.add_done_callback(background_tasks.discard)
+    
+    # Mede o custo da instrumentação e monitora o atraso do event loop
+    measure_overhead()
+    task = asyncio.create_task(monitor_event_loop())
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+    
+    # Provedores marcados como indisponíveis (aqui ou em outro worker) voltam quando respondem
+    task = asyncio.create_task(llm_router.monitor_health())
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
 
 @app.on_event("shutdown")
 async def shutdown_event():
     """Desconecta de todos os servidores MCP"""
     await ineuro_agent.disconnect_servers()
+    knowledge_ingestor.close()
+    for task in list(background_tasks):
+        task.cancel()
+    await http_pool.close()
+    await shared_state.close()
 
 @app.get("/", response_class=HTMLResponse)
 async def home(request: Request):
@@ -164,136 +227,170 @@ async def home(request: Request):
 async def design_system(request: Request):
     return templates.TemplateResponse("design_system.html", {"request": request})
 
+async def _chat_reply(message: str) -> Dict[str, Any]:
+    """Resposta do /api/chat (comando ou agente) no formato gravado na mensagem"""
+    if command_handler.is_command(message):
+        response_data = await command_handler.handle_command(message)
+        response_text = response_data.get("response", "")
+    else:
+        # Processar com o agente e garantir que temos a resposta
+        response = await ineuro_agent.process_message(message, channel="web")
+        if isinstance(response, dict):
+            response_text = response.get("response", "")
+            response_data = response
+        else:
+            response_text = response
+            response_data = {"response": response_text}
+
+    return {
+        "llm": response_data.get("llm", "ineuro"),
+        "model": response_data.get("model", "default"),
+        "response": response_text,
+        "timestamp": datetime.utcnow().isoformat(),
+        "metadata": {
+            "classification": response_data.get("classification", ""),
+            "tokens_used": response_data.get("tokens_used", 0),
+            "source": "web"
+        }
+    }
+
+async def _save_chat_reply(results: Dict[str, Any]):
+    """Salvar resposta do agente com informações do LLM"""
+    await db_client.update_message_with_llm_response(
+        message_id=results["save_user_message"]["id"],
+        llm_response=results["agent"]
+    )
+
 @app.post("/api/chat")
 async def chat(request: Request):
-    try:
-        data = await request.json()
-        message = data.get("message")
-        sender_id = data.get("sender_id", "web_user")
-        conversation_id = data.get("conversation_id")
-        
-        if not message:
-            raise HTTPException(status_code=400, detail="Message is required")
-        
-        # Salvar mensagem do usuário
-        user_message = await db_client.save_message(
-            source="web",
-            sender_id=sender_id,
-            original_message=message,
-            is_user=True,
-            conversation_id=conversation_id
-        )
-        
-        # Processar a mensagem
-        if command_handler.is_command(message):
-            response_data = await command_handler.handle_command(message)
-            response_text = response_data.get("response", "")
-        else:
-            # Processar com o agente e garantir que temos a resposta
-            response = await ineuro_agent.process_message(message)
-            if isinstance(response, dict):
-                response_text = response.get("response", "")
-                response_data = response
-            else:
-                response_text = response
-                response_data = {"response": response_text}
+    with tracer.start_trace("turn", channel="web", transport="http"), track_request("api_chat"):
+        try:
+            data = await request.json()
+            message = data.get("message")
+            sender_id = data.get("sender_id", "web_user")
+            conversation_id = data.get("conversation_id")
         
-        # Salvar resposta do agente com informações do LLM
-        llm_response = {
-            "llm": response_data.get("llm", "ineuro"),
-            "model": response_data.get("model", "default"),
-            "response": response_text,
-            "timestamp": datetime.utcnow().isoformat(),
-            "metadata": {
-                "classification": response_data.get("classification", ""),
-                "tokens_used": response_data.get("tokens_used", 0),
-                "source": "web"
-            }
-        }
+            if not message:
+                raise HTTPException(status_code=400, detail="Message is required")
         
-        await db_client.update_message_with_llm_response(
-            message_id=user_message["id"],
-            llm_response=llm_response
-        )
+            # Salvar a mensagem do usuário e gerar a resposta em paralelo;
+            # a resposta é gravada na mensagem depois de retornar ao cliente
+            graph = TurnGraph("api_chat")
+            graph.step("save_user_message", lambda results: db_client.save_message(
+                source="web",
+                sender_id=sender_id,
+                original_message=message,
+                is_user=True,
+                conversation_id=conversation_id
+            ))
+            graph.step("agent", lambda results: _chat_reply(message))
+            graph.step("save_reply", _save_chat_reply, deps=("save_user_message", "agent"), critical=False)
+            results = await graph.run()
+            graph.run_background(background_tasks)
+            llm_response = results["agent"]
         
-        # Retornar resposta com informações do LLM
-        return {
-            "response": response_text,
-            "llm_info": {
-                "name": llm_response["llm"],
-                "model": llm_response["model"]
+            # Retornar resposta com informações do LLM
+            return {
+                "response": llm_response["response"],
+                "llm_info": {
+                    "name": llm_response["llm"],
+                    "model": llm_response["model"]
+                }
             }
-        }
         
-    except Exception as e:
-        error_message = str(e)
-        print(f"Erro no processamento do chat: {error_message}")
-        return {"error": f"Erro ao processar mensagem: {error_message}"}
+        except Exception as e:
+            error_message = str(e)
+            logger.error(f"Erro no processamento do chat: {error_message}")
+            return {"error": f"Erro ao processar mensagem: {error_message}"}
 
 @app.post("/webhook")
 async def webhook(request: Request):
-    try:
-        data = await request.json()
-        processed_data = whatsapp_client.process_webhook(data)
-        
-        if not processed_data:
-            return {"status": "ignored", "message": "Tipo de mensagem não suportado"}
+    with tracer.start_trace("turn", channel="whatsapp", transport="webhook"), track_request("webhook"):
+        dedup_key = None
+        try:
+            data = await request.json()
+            processed_data = whatsapp_client.process_webhook(data)
         
-        phone = processed_data["phone"]
-        message = processed_data["message"]
+            if not processed_data:
+                return {"status": "ignored", "message": "Tipo de mensagem não suportado"}
         
-        # Adiciona mensagem do usuário à conversa
-        await db_client.add_message_to_conversation(
-            sender_id=phone,
-            message=message,
-            is_user=True
-        )
-        
-        # Obtém histórico para contexto
-        history = await db_client.get_conversation_history(phone, limit=5)
-        context = "\n".join([
-            f"{'User' if msg['is_user'] else 'Assistant'}: {msg['message']}"
-            for msg in history
-        ])
+            phone = processed_data["phone"]
+            message = processed_data["message"]
         
-        # Processa mensagem usando o agente
-        llm_response = await ineuro_agent.process_message(message, context)
+            # A MegaAPI pode reenviar o mesmo evento; descarta duplicatas em todos os workers.
+            # A chave é o id da mensagem (ou o timestamp, se o evento não tiver id)
+            dedup_id = processed_data.get("message_id") or processed_data.get("timestamp")
+            if dedup_id:
+                dedup_key = f"webhook:{phone}:{dedup_id}"
+                if not await shared_state.set_if_absent(dedup_key, True, ttl=settings.WEBHOOK_DEDUP_TTL):
+                    return {"status": "ignored", "message": "Mensagem duplicada"}
         
-        response_text = llm_response.get("response", "")
-        llm_info = {
-            "llm": llm_response.get("llm", ""),
-            "model": llm_response.get("model", ""),
-            "classification": llm_response.get("classification", ""),
-            "metadata": llm_response.get("metadata", {})
-        }
-        
-        # Adiciona resposta à conversa
-        await db_client.add_message_to_conversation(
-            sender_id=phone,
-            message=response_text,
-            is_user=False,
-            llm_response=llm_info
-        )
-        
-        # Envia resposta via WhatsApp
-        await whatsapp_client.send_message(
-            phone=phone,
-            message=response_text
-        )
+            async def history(results: Dict[str, Any]) -> List[Dict[str, Any]]:
+                # O histórico vem da conversa devolvida pela gravação: são as mensagens
+                # anteriores a esta, que vai separada no prompt (sem outro round-trip)
+                saved = results["save_user_message"]
+                messages = saved.get("content", {}).get("messages") if saved else None
+                if messages is None:
+                    # A gravação falhou: o histórico do banco ainda não tem esta mensagem
+                    return await db_client.get_conversation_history(phone, limit=5)
+                return messages[:-1][-5:]
+            
+            graph = TurnGraph("webhook")
+            graph.step("save_user_message", lambda results: db_client.add_message_to_conversation(
+                sender_id=phone,
+                message=message,
+                is_user=True
+            ))
+            graph.step("context", history, deps=("save_user_message",))
+            graph.step("agent", lambda results: ineuro_agent.process_message(
+                message,
+                "\n".join(
+                    f"{'User' if msg['is_user'] else 'Assistant'}: {msg['message']}"
+                    for msg in results["context"]
+                ),
+                channel="whatsapp"
+            ), deps=("context",))
+            # Envia resposta via WhatsApp
+            graph.step("send", lambda results: whatsapp_client.send_message(
+                phone=phone,
+                message=results["agent"].get("response", "")
+            ), deps=("agent",))
+            # Adiciona resposta à conversa depois do envio
+            graph.step("save_reply", lambda results: db_client.add_message_to_conversation(
+                sender_id=phone,
+                message=results["agent"].get("response", ""),
+                is_user=False,
+                llm_response=_llm_info(results["agent"])
+            ), deps=("send",), critical=False)
+            await graph.run()
+            graph.run_background(background_tasks)
         
-        return {"status": "success", "message": "Mensagem processada com sucesso"}
-    except Exception as e:
-        raise HTTPException(status_code=400, detail=str(e))
+            return {"status": "success", "message": "Mensagem processada com sucesso"}
+        except Exception as e:
+            # O turno falhou: libera a chave para que a reentrega do evento seja processada
+            if dedup_key:
+                await shared_state.delete(dedup_key)
+            raise HTTPException(status_code=400, detail=str(e))
 
 @app.get("/api/mcp/status")
 async def get_mcp_status():
     """Retorna o status de todos os servidores MCP configurados"""
     try:
         status = await ineuro_agent.get_mcp_status()
-        return {"status": "success", "servers": status}
+        return {"status": "success", "servers": status, "tool_cache": mcp_engine.cache.stats()}
     except Exception as e:
         return {"status": "error", "message": str(e)}
 
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Métricas no formato de exposição do Prometheus"""
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/api/generation/profiles")
+async def get_generation_profiles():
+    """Retorna os perfis de geração configurados e suas métricas de latência"""
+    return {"status": "success", "profiles": generation_profiles.snapshot()}
+
 @app.post("/api/save-card")
 async def save_card(request: Request):
     try:
@@ -304,26 +401,26 @@ async def save_card(request: Request):
         if card_type == "base":
             # Save base card data
             # TODO: Implement saving to database
-            print(f"Saving base card data: {card_data}")
+            logger.info("Saving card data", extra={"card_type": card_type})
             return JSONResponse(content={"success": True, "message": "Base information saved successfully"})
         
         elif card_type == "persona":
             # Save persona card data
             # TODO: Implement saving to database
-            print(f"Saving persona card data: {card_data}")
+            logger.info("Saving card data", extra={"card_type": card_type})
             return JSONResponse(content={"success": True, "message": "Persona information saved successfully"})
         
         elif card_type == "prompt":
             # Save prompt card data
             # TODO: Implement saving to database
-            print(f"Saving prompt card data: {card_data}")
+            logger.info("Saving card data", extra={"card_type": card_type})
             return JSONResponse(content={"success": True, "message": "Prompt information saved successfully"})
         
         else:
             return JSONResponse(content={"success": False, "message": "Invalid card type"}, status_code=400)
     
     except Exception as e:
-        print(f"Error saving card data: {str(e)}")
+        logger.error(f"Error saving card data: {str(e)}")
         return JSONResponse(content={"success": False, "message": f"Error: {str(e)}"}, status_code=500)
 
 @app.post("/api/command/base")
@@ -331,7 +428,7 @@ async def handle_base_command(request: Request):
     """Endpoint para processar o comando de base de conhecimento"""
     try:
         form_data = await request.form()
-        files = form_data.getlist("files")
+        files = [file for file in form_data.getlist("files") if hasattr(file, "read")]
         
         if not files:
             return JSONResponse(
@@ -339,23 +436,30 @@ async def handle_base_command(request: Request):
                 content={"status": "error", "message": "Nenhum arquivo enviado"}
             )
             
-        # Aqui processaria os arquivos recebidos
-        # Por enquanto apenas simulamos o sucesso
+        # O Starlette já guardou os uploads em arquivos temporários; a ingestão os lê em blocos
+        result = await command_handler._handle_base_command({"files": files})
         
-        result = await command_handler._handle_base_command({
-            "files": [file.filename for file in files]
-        })
-        
-        return JSONResponse(
-            status_code=200,
-            content={"status": "success", "message": "Base de conhecimento atualizada com sucesso"}
-        )
+        content = {
+            "status": "error" if result.get("error") else "success",
+            "message": result["response"],
+            "response": result["response"],
+            "files": result.get("files", [])
+        }
+        if result.get("error"):
+            # O front mostra o campo error quando nenhum arquivo foi indexado
+            content["error"] = result["response"]
+        return JSONResponse(status_code=200, content=content)
     except Exception as e:
         return JSONResponse(
             status_code=500, 
             content={"status": "error", "message": str(e)}
         )
 
+@app.get("/api/knowledge/status")
+async def get_knowledge_status():
+    """Retorna o tamanho do índice e o andamento das últimas ingestões do /base"""
+    return {"status": "success", **knowledge_ingestor.snapshot()}
+
 @app.post("/api/command/persona")
 async def handle_persona_command(request: Request):
     """Endpoint para processar o comando de persona"""
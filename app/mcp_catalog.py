@@ -0,0 +1,159 @@
+from typing import Dict, Any, List, Optional
+from dataclasses import dataclass, field, asdict
+import asyncio
+import time
+from .settings import get_settings
+from .logging_config import get_logger
+from .metrics import MCP_CATALOG_REFRESH
+from .mcp_engine import MCPExecutionEngine, mcp_engine
+
+logger = get_logger(__name__)
+
+settings = get_settings()
+
+@dataclass
+class ToolSpec:
+    """Ferramenta descoberta num servidor MCP, com o JSON schema dos argumentos"""
+    server: str
+    name: str
+    description: str = ""
+    parameters: Dict[str, Any] = field(default_factory=dict)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+    def input_argument(self) -> str:
+        """Argumento que recebe o texto da mensagem: o primeiro string obrigatório (ou o primeiro string)"""
+        properties = self.parameters.get("properties") or {}
+        strings = [name for name, schema in properties.items() if isinstance(schema, dict) and schema.get("type") == "string"]
+        required = [name for name in self.parameters.get("required") or [] if name in strings]
+        return (required or strings or ["input"])[0]
+
+    def arguments(self, text: str) -> Dict[str, Any]:
+        return {self.input_argument(): text}
+
+@dataclass
+class ServerTools:
+    """Catálogo de um servidor: ferramentas, quando foram lidas (monotonic) e o último erro"""
+    tools: List[ToolSpec]
+    fetched_at: float = 0.0
+    error: Optional[str] = None
+    source: str = "server"
+
+class MCPToolCatalog:
+    """
+    Catálogo em memória das ferramentas de cada servidor MCP conectado,
+    lido com list_tools e válido por `ttl` segundos. O roteamento e o
+    endpoint de status leem só daqui; a atualização roda em segundo plano
+    (monitor) e nunca no caminho de uma mensagem. Cada leitura é gravada no
+    Supabase (save_server_status), de onde o catálogo é recarregado no
+    startup antes da primeira descoberta terminar. Uma falha de list_tools
+    mantém as ferramentas conhecidas e só registra o erro.
+    """
+
+    def __init__(self, engine: MCPExecutionEngine, ttl: float = 300.0, timeout: float = 10.0):
+        self.engine = engine
+        self.ttl = ttl
+        self.timeout = timeout
+        self.database = None  # DatabaseClient, definido em INeuroAgent.connect_servers
+        self._servers: Dict[str, ServerTools] = {}
+        self._refreshing: Dict[str, asyncio.Task] = {}
+
+    def stale(self, server: str) -> bool:
+        entry = self._servers.get(server)
+        if entry is None or entry.source != "server" or entry.error:
+            return True
+        return time.monotonic() - entry.fetched_at >= self.ttl
+
+    def tools(self) -> List[ToolSpec]:
+        """Ferramentas dos servidores conectados, na ordem da configuração"""
+        return [tool for server in self.engine.clients for tool in self.server_tools(server)]
+
+    def server_tools(self, server: str) -> List[ToolSpec]:
+        entry = self._servers.get(server)
+        return entry.tools if entry else []
+
+    def find(self, name: str, server: Optional[str] = None) -> Optional[ToolSpec]:
+        for tool in self.tools():
+            if tool.name == name and (server is None or tool.server == server):
+                return tool
+        return None
+
+    async def load_persisted(self):
+        """Recarrega o último catálogo gravado de cada servidor (válido até a primeira descoberta)"""
+        if self.database is None:
+            return
+        for row in await self.database.get_server_statuses():
+            name = row.get("server_name")
+            tools = [
+                ToolSpec(server=name, **{key: tool[key] for key in ("name", "description", "parameters") if key in tool})
+                for tool in row.get("tools") or [] if isinstance(tool, dict) and tool.get("name")
+            ]
+            if name and name not in self._servers:
+                self._servers[name] = ServerTools(tools, source="database")
+
+    async def refresh(self, force: bool = False):
+        """Relê (em paralelo) os servidores conectados com catálogo vencido, ou todos com force"""
+        tasks = []
+        for server, client in list(self.engine.clients.items()):
+            if not force and not self.stale(server):
+                continue
+            # Uma leitura por servidor por vez: quem chega durante ela espera a mesma
+            task = self._refreshing.get(server)
+            if task is None:
+                task = self._refreshing[server] = asyncio.create_task(self._fetch(server, client))
+                task.add_done_callback(lambda _, server=server: self._refreshing.pop(server, None))
+            tasks.append(task)
+        if tasks:
+            await asyncio.gather(*tasks)
+
+    async def _fetch(self, server: str, client: Any):
+        previous = self._servers.get(server)
+        try:
+            definitions = await asyncio.wait_for(client.list_tools(), self.timeout)
+            tools = [
+                ToolSpec(server, tool.name, tool.description or "", tool.parameters_json_schema or {})
+                for tool in definitions
+            ]
+            self._servers[server] = ServerTools(tools, time.monotonic())
+            MCP_CATALOG_REFRESH.inc(status="ok")
+            logger.info("mcp_tools_discovered", extra={"server": server, "tools": [tool.name for tool in tools]})
+            connected = True
+        except Exception as e:
+            error = "timeout" if isinstance(e, asyncio.TimeoutError) else str(e)
+            tools = previous.tools if previous else []
+            # Mantém as ferramentas conhecidas; a próxima tentativa é no próximo ciclo
+            self._servers[server] = ServerTools(tools, time.monotonic(), error=error, source=previous.source if previous else "server")
+            MCP_CATALOG_REFRESH.inc(status="error")
+            logger.warning("mcp_tools_discovery_failed", extra={"server": server, "error": error})
+            connected = False
+        if self.database is not None:
+            await self.database.save_server_status(server, connected, [tool.to_dict() for tool in tools])
+
+    async def monitor(self, interval: Optional[float] = None):
+        """Descobre as ferramentas já no startup e renova os catálogos antes de vencerem"""
+        interval = interval or max(1.0, self.ttl / 2)
+        while True:
+            try:
+                await self.refresh()
+            except Exception as e:
+                logger.error(f"Erro ao atualizar o catálogo de ferramentas MCP: {str(e)}")
+            await asyncio.sleep(interval)
+
+    def snapshot(self, server: str) -> Dict[str, Any]:
+        """Status de um servidor para o endpoint, só com o que está em memória"""
+        entry = self._servers.get(server)
+        if entry is None:
+            return {"available_tools": [], "tools": [], "catalog_age_s": None}
+        info = {
+            "available_tools": [tool.name for tool in entry.tools],
+            "tools": [tool.to_dict() for tool in entry.tools],
+            "catalog_source": entry.source,
+            "catalog_age_s": round(time.monotonic() - entry.fetched_at, 1) if entry.fetched_at else None
+        }
+        if entry.error:
+            info["error"] = entry.error
+        return info
+
+# Instância global, sobre os clientes do motor de execução
+mcp_catalog = MCPToolCatalog(mcp_engine, settings.MCP_CATALOG_TTL, settings.MCP_DISCOVERY_TIMEOUT)
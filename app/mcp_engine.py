@@ -0,0 +1,274 @@
+from typing import Dict, Any, List, Optional
+from dataclasses import dataclass, field, replace
+from collections import OrderedDict
+import asyncio
+import fnmatch
+import hashlib
+import json
+import time
+import unicodedata
+from .settings import get_settings
+from .logging_config import get_logger
+from .metrics import MCP_TOOL_CALLS, MCP_TOOL_LATENCY, MCP_TOOLS_IN_FLIGHT, MCP_TOOL_CACHE, MCP_TIME_SAVED, MCP_TOOL_OUTPUT_TRUNCATED
+
+logger = get_logger(__name__)
+
+settings = get_settings()
+
+@dataclass
+class ToolCall:
+    """Uma chamada de ferramenta: servidor MCP (pelo nome configurado), ferramenta e argumentos"""
+    server: str
+    tool: str
+    arguments: Dict[str, Any] = field(default_factory=dict)
+
+@dataclass
+class ToolResult:
+    """Resultado de uma chamada (status: ok, error, timeout, not_connected); cached quando veio do cache"""
+    call: ToolCall
+    status: str
+    output: Optional[str] = None
+    error: Optional[str] = None
+    latency: float = 0.0
+    cached: bool = False
+
+    @property
+    def ok(self) -> bool:
+        return self.status == "ok"
+
+def tool_output_text(result: Any) -> str:
+    """Texto do retorno de call_tool (str, lista de partes ou objeto JSON)"""
+    if isinstance(result, str):
+        return result
+    if isinstance(result, list):
+        return "\n".join(tool_output_text(part) for part in result)
+    try:
+        return json.dumps(result, ensure_ascii=False)
+    except (TypeError, ValueError):
+        return str(result)
+
+def truncate_tool_output(tool: str, text: str, max_tokens: int) -> str:
+    """
+    Limita a saída a ~max_tokens (4 caracteres por token, a estimativa dos
+    adaptadores) antes de ela voltar ao modelo. Mantém o começo e o fim, onde
+    costumam estar o resumo e o resultado, cortando em quebras de linha
+    próximas, e marca quanto foi omitido.
+    """
+    limit = max_tokens * 4
+    if max_tokens <= 0 or len(text) <= limit:
+        return text
+    head = text[:limit * 3 // 4]
+    tail = text[len(text) - limit // 4:]
+    if head.rfind("\n") > len(head) // 2:
+        head = head[:head.rfind("\n")]
+    if 0 <= tail.find("\n") < len(tail) // 2:
+        tail = tail[tail.find("\n") + 1:]
+    MCP_TOOL_OUTPUT_TRUNCATED.inc(tool=tool)
+    return f"{head}\n[... {len(text) - len(head) - len(tail)} caracteres omitidos ...]\n{tail}"
+
+# Ferramentas com efeito colateral: nunca cacheadas, qualquer que seja a configuração
+NEVER_CACHE = frozenset({"execute_code", "run_python_code"})
+
+def _normalize(value: Any) -> Any:
+    """Entrada normalizada para a chave do cache: NFC, minúsculas e espaços colapsados nos textos"""
+    if isinstance(value, str):
+        return " ".join(unicodedata.normalize("NFC", value).casefold().split())
+    if isinstance(value, dict):
+        return {key: _normalize(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_normalize(item) for item in value]
+    return value
+
+@dataclass
+class CacheEntry:
+    value: Any
+    expires: float
+    # Quanto custou produzir o valor: o tempo poupado a cada acerto
+    cost: float = 0.0
+
+class ToolResultCache:
+    """
+    LRU limitado a max_entries com TTL por ferramenta. O TTL vem do
+    primeiro padrão (fnmatch) de `ttls` que casa com o nome da ferramenta;
+    sem padrão, ou com TTL 0, a ferramenta não é cacheada.
+    """
+
+    def __init__(self, ttls: Optional[Dict[str, float]] = None, max_entries: int = 512):
+        self.ttls = ttls or {}
+        self.max_entries = max(1, max_entries)
+        self._entries: "OrderedDict[str, CacheEntry]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.shared = 0
+        self.saved = 0.0
+
+    def ttl(self, tool: str) -> float:
+        if tool in NEVER_CACHE:
+            return 0.0
+        for pattern, ttl in self.ttls.items():
+            if fnmatch.fnmatchcase(tool, pattern):
+                return ttl
+        return 0.0
+
+    @staticmethod
+    def key(call: ToolCall) -> str:
+        arguments = json.dumps(_normalize(call.arguments), ensure_ascii=False, sort_keys=True, default=str)
+        return f"{call.server}:{call.tool}:{hashlib.sha256(arguments.encode('utf-8')).hexdigest()}"
+
+    def get(self, key: str) -> Optional[CacheEntry]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry.expires <= time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def put(self, key: str, value: Any, ttl: float, cost: float = 0.0):
+        if ttl <= 0:
+            return
+        self._entries[key] = CacheEntry(value, time.monotonic() + ttl, cost)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def record(self, tool: str, result: str, saved: float = 0.0):
+        """Conta um hit, miss ou shared (chamada igual já em andamento) e o tempo poupado"""
+        if result == "hit":
+            self.hits += 1
+        elif result == "miss":
+            self.misses += 1
+        else:
+            self.shared += 1
+        if saved:
+            self.saved += saved
+            MCP_TIME_SAVED.inc(saved, kind="mcp")
+        MCP_TOOL_CACHE.inc(tool=tool, result=result)
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses + self.shared
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "shared": self.shared,
+            "hit_rate": round((self.hits + self.shared) / lookups, 3) if lookups else 0.0,
+            "mcp_seconds_saved": round(self.saved, 3)
+        }
+
+class MCPExecutionEngine:
+    """
+    Executa chamadas de ferramentas nos servidores MCP. Os clientes ficam num
+    dict pelo nome do servidor; as chamadas de um turno rodam em paralelo
+    (limitadas a max_per_server simultâneas por servidor), cada uma com seu
+    prazo: ao estourar, a chamada é cancelada e volta como "timeout" sem
+    derrubar as demais. Latência e resultado de cada ferramenta vão para as
+    métricas. Ferramentas com TTL no cache respondem do cache enquanto o
+    resultado vale, e chamadas iguais simultâneas esperam a mesma execução.
+    """
+
+    def __init__(self, timeout: float = 15.0, max_per_server: int = 4, cache: Optional[ToolResultCache] = None):
+        self.timeout = timeout
+        self.max_per_server = max(1, max_per_server)
+        self.cache = cache or ToolResultCache()
+        self.clients: Dict[str, Any] = {}  # pydantic_ai.mcp.MCPServerHTTP por nome
+        self._slots: Dict[str, asyncio.Semaphore] = {}
+        self._in_flight: Dict[str, asyncio.Task] = {}
+
+    def register(self, name: str, client: Any):
+        self.clients[name] = client
+        self._slots[name] = asyncio.Semaphore(self.max_per_server)
+
+    def unregister(self, name: str):
+        self.clients.pop(name, None)
+        self._slots.pop(name, None)
+
+    def clear(self):
+        self.clients.clear()
+        self._slots.clear()
+
+    async def call(self, call: ToolCall, timeout: Optional[float] = None) -> ToolResult:
+        """Executa uma chamada (ou a responde do cache); erros e estouro de prazo voltam no ToolResult"""
+        timeout = self.timeout if timeout is None else timeout
+        ttl = self.cache.ttl(call.tool)
+        if ttl <= 0 or call.server not in self.clients:
+            return await self._execute(call, timeout)
+
+        key = self.cache.key(call)
+        entry = self.cache.get(key)
+        if entry is not None:
+            self.cache.record(call.tool, "hit", saved=entry.cost)
+            return replace(entry.value, call=call, latency=0.0, cached=True)
+
+        task = self._in_flight.get(key)
+        if task is None:
+            self.cache.record(call.tool, "miss")
+            # A execução não pertence a quem chegou primeiro: um cancelamento dele não a interrompe
+            task = self._in_flight[key] = asyncio.create_task(self._execute(call, timeout))
+            task.add_done_callback(lambda done: self._store(key, ttl, done))
+        else:
+            self.cache.record(call.tool, "shared")
+        start = time.perf_counter()
+        try:
+            result = await asyncio.wait_for(asyncio.shield(task), timeout)
+        except asyncio.TimeoutError:
+            return ToolResult(call, "timeout", error=f"Ferramenta {call.tool} não respondeu em {timeout:.1f}s", latency=time.perf_counter() - start)
+        return replace(result, call=call)
+
+    def _store(self, key: str, ttl: float, task: asyncio.Task):
+        self._in_flight.pop(key, None)
+        if task.cancelled() or task.exception() is not None:
+            return
+        result = task.result()
+        if result.ok:
+            self.cache.put(key, result, ttl, cost=result.latency)
+
+    async def _execute(self, call: ToolCall, timeout: float) -> ToolResult:
+        client = self.clients.get(call.server)
+        if client is None:
+            MCP_TOOL_CALLS.inc(tool=call.tool, status="not_connected")
+            return ToolResult(call, "not_connected", error=f"Servidor MCP '{call.server}' não encontrado ou não está conectado.")
+
+        start = time.perf_counter()
+        MCP_TOOLS_IN_FLIGHT.inc(server=call.server)
+        try:
+            # O prazo inclui a espera pela vaga no servidor
+            output = await asyncio.wait_for(self._invoke(client, call), timeout)
+            result = ToolResult(call, "ok", output=tool_output_text(output))
+        except asyncio.TimeoutError:
+            result = ToolResult(call, "timeout", error=f"Ferramenta {call.tool} não respondeu em {timeout:.1f}s")
+        except Exception as e:
+            result = ToolResult(call, "error", error=f"Erro ao executar ferramenta {call.tool}: {str(e)}")
+        finally:
+            MCP_TOOLS_IN_FLIGHT.dec(server=call.server)
+        result.latency = time.perf_counter() - start
+        MCP_TOOL_CALLS.inc(tool=call.tool, status=result.status)
+        MCP_TOOL_LATENCY.observe(result.latency, tool=call.tool)
+        if not result.ok:
+            logger.warning("mcp_tool_failed", extra={"tool": call.tool, "server": call.server, "status": result.status, "error": result.error})
+        return result
+
+    async def _invoke(self, client: Any, call: ToolCall) -> Any:
+        async with self._slots[call.server]:
+            return await client.call_tool(call.tool, call.arguments)
+
+    async def run(self, calls: List[ToolCall], deadline: Optional[float] = None) -> List[ToolResult]:
+        """
+        Executa as chamadas em paralelo e retorna os resultados na mesma ordem.
+        deadline (segundos) limita o conjunto: nenhuma chamada passa dele,
+        mesmo que o prazo por chamada seja maior.
+        """
+        timeout = self.timeout if deadline is None else min(self.timeout, deadline)
+        return list(await asyncio.gather(*(self.call(call, timeout) for call in calls)))
+
+# Instância global; os clientes são registrados pelas sessões (mcp_sessions) ao conectar
+mcp_engine = MCPExecutionEngine(
+    settings.MCP_TOOL_TIMEOUT,
+    settings.MCP_MAX_CALLS_PER_SERVER,
+    ToolResultCache(settings.get_mcp_tool_cache_ttls(), settings.MCP_TOOL_CACHE_SIZE)
+)
@@ -0,0 +1,202 @@
+from typing import Dict, Any, Optional, Callable, Awaitable
+from dataclasses import dataclass, field
+import asyncio
+import random
+import time
+from .settings import get_settings
+from .logging_config import get_logger
+from .metrics import MCP_SESSION_CONNECTED, MCP_RECONNECTS, MCP_PING_LATENCY
+from .mcp_engine import MCPExecutionEngine, mcp_engine
+
+logger = get_logger(__name__)
+
+settings = get_settings()
+
+def build_http_client(url: str, api_key: str, timeout: float) -> Any:
+    """Cliente SSE do pydantic_ai (só importado quando há servidores configurados)"""
+    from pydantic_ai.mcp import MCPServerHTTP
+    return MCPServerHTTP(url=f"{url}/sse", headers={"Authorization": f"Bearer {api_key}"}, timeout=timeout)
+
+async def ping(client: Any):
+    """
+    Ping do protocolo MCP na sessão aberta. O MCPServerHTTP não expõe o ping:
+    ele é enviado pela ClientSession que o cliente mantém enquanto está aberto.
+    """
+    await getattr(client, "_client", client).send_ping()
+
+def error_text(error: BaseException) -> str:
+    """Mensagem do erro de origem (o cliente SSE embrulha as falhas em grupos do anyio)"""
+    while getattr(error, "exceptions", None):
+        error = error.exceptions[0]
+    return str(error) or type(error).__name__
+
+@dataclass
+class MCPSession:
+    """
+    Estado da conexão com um servidor (state: connecting, connected,
+    reconnecting, closed). `attempts` conta as falhas seguidas, que definem
+    o backoff da próxima tentativa.
+    """
+    name: str
+    client_factory: Callable[[], Any]
+    state: str = "connecting"
+    client: Any = None
+    connected_at: Optional[float] = None
+    last_ping_ms: Optional[float] = None
+    last_error: Optional[str] = None
+    attempts: int = 0
+    reconnects: int = 0
+    ready: asyncio.Event = field(default_factory=asyncio.Event)
+    task: Optional[asyncio.Task] = None
+
+    @property
+    def connected(self) -> bool:
+        return self.state == "connected"
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "connected_since_s": round(time.time() - self.connected_at, 1) if self.connected and self.connected_at else None,
+            "last_ping_ms": self.last_ping_ms,
+            "last_error": self.last_error,
+            "reconnects": self.reconnects
+        }
+
+class MCPSessionManager:
+    """
+    Mantém uma sessão SSE persistente por servidor MCP. Cada sessão roda numa
+    task própria (o contexto do cliente precisa abrir e fechar na mesma
+    task): abre a conexão e faz o handshake (initialize, com o prazo do
+    próprio cliente), registra o cliente no motor de execução e envia um
+    ping a cada `ping_interval` segundos. Um ping sem resposta ou a queda da conexão tiram o servidor do
+    motor na hora, de modo que nenhuma chamada vai para um servidor morto, e
+    a reconexão segue com backoff exponencial (com jitter) até `backoff_max`.
+    """
+
+    def __init__(
+        self,
+        engine: MCPExecutionEngine,
+        ping_interval: float = 30.0,
+        ping_timeout: float = 5.0,
+        backoff_base: float = 1.0,
+        backoff_max: float = 60.0
+    ):
+        self.engine = engine
+        self.ping_interval = ping_interval
+        self.ping_timeout = ping_timeout
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.sessions: Dict[str, MCPSession] = {}
+        # Chamado a cada (re)conexão, ex.: para ler o catálogo de ferramentas do servidor
+        self.on_connect: Optional[Callable[[str], Awaitable[None]]] = None
+
+    async def start(self, factories: Dict[str, Callable[[], Any]], warmup_timeout: float = 5.0):
+        """
+        Abre as sessões em paralelo e espera até warmup_timeout segundos que
+        todas conectem, para que as primeiras mensagens já encontrem as
+        conexões prontas. Servidores que não conectam no prazo seguem
+        tentando em segundo plano.
+        """
+        for name, factory in factories.items():
+            if name in self.sessions:
+                continue
+            session = self.sessions[name] = MCPSession(name, factory)
+            session.task = asyncio.create_task(self._run(session))
+        if self.sessions and warmup_timeout > 0:
+            await asyncio.wait([asyncio.create_task(session.ready.wait()) for session in self.sessions.values()], timeout=warmup_timeout)
+        for session in self.sessions.values():
+            if not session.connected:
+                logger.warning("mcp_session_not_ready", extra={"server": session.name, "error": session.last_error})
+
+    async def stop(self):
+        """Fecha todas as sessões (o contexto de cada cliente é fechado pela própria task)"""
+        tasks = [session.task for session in self.sessions.values() if session.task]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        for session in self.sessions.values():
+            session.state = "closed"
+            MCP_SESSION_CONNECTED.set(0, server=session.name)
+        self.sessions.clear()
+        self.engine.clear()
+
+    def backoff(self, attempts: int) -> float:
+        delay = min(self.backoff_max, self.backoff_base * 2 ** max(0, attempts - 1))
+        return delay * random.uniform(0.8, 1.2)
+
+    async def _run(self, session: MCPSession):
+        while True:
+            try:
+                client = session.client_factory()
+                async with client:
+                    await self._connected(session, client)
+                    await self._keepalive(session, client)
+            except asyncio.CancelledError:
+                self._disconnected(session, "closed")
+                raise
+            except Exception as e:
+                session.last_error = error_text(e)
+            self._disconnected(session, "reconnecting")
+            session.attempts += 1
+            delay = self.backoff(session.attempts)
+            logger.warning("mcp_session_lost", extra={"server": session.name, "error": session.last_error, "retry_in_s": round(delay, 2)})
+            await asyncio.sleep(delay)
+
+    async def _connected(self, session: MCPSession, client: Any):
+        # O handshake (initialize) já foi feito ao entrar no contexto; o ping confirma a sessão
+        await self._ping(session, client)
+        if session.connected_at is not None:
+            session.reconnects += 1
+            MCP_RECONNECTS.inc(server=session.name)
+        session.client = client
+        session.state = "connected"
+        session.connected_at = time.time()
+        session.attempts = 0
+        session.last_error = None
+        self.engine.register(session.name, client)
+        MCP_SESSION_CONNECTED.set(1, server=session.name)
+        session.ready.set()
+        logger.info("mcp_session_connected", extra={"server": session.name, "ping_ms": session.last_ping_ms})
+        if self.on_connect:
+            task = asyncio.create_task(self.on_connect(session.name))
+            task.add_done_callback(lambda done: done.cancelled() or done.exception())
+
+    async def _keepalive(self, session: MCPSession, client: Any):
+        while True:
+            await asyncio.sleep(self.ping_interval)
+            await self._ping(session, client)
+
+    async def _ping(self, session: MCPSession, client: Any):
+        start = time.perf_counter()
+        try:
+            await asyncio.wait_for(ping(client), self.ping_timeout)
+        except asyncio.TimeoutError:
+            raise ConnectionError(f"ping sem resposta em {self.ping_timeout:.1f}s")
+        elapsed = time.perf_counter() - start
+        session.last_ping_ms = round(elapsed * 1000, 2)
+        MCP_PING_LATENCY.observe(elapsed, server=session.name)
+
+    def _disconnected(self, session: MCPSession, state: str):
+        # Sai do motor antes de qualquer espera: chamadas novas falham na hora em vez de irem ao servidor morto
+        if self.engine.clients.get(session.name) is session.client:
+            self.engine.unregister(session.name)
+        session.client = None
+        session.state = state
+        MCP_SESSION_CONNECTED.set(0, server=session.name)
+
+    def status(self, name: str) -> Dict[str, Any]:
+        session = self.sessions.get(name)
+        return session.to_dict() if session else {"state": "closed"}
+
+    def connected(self, name: str) -> bool:
+        session = self.sessions.get(name)
+        return bool(session and session.connected)
+
+# Instância global sobre o motor de execução; as sessões são abertas em INeuroAgent.connect_servers
+mcp_sessions = MCPSessionManager(
+    mcp_engine,
+    settings.MCP_PING_INTERVAL,
+    settings.MCP_PING_TIMEOUT,
+    settings.MCP_RECONNECT_BACKOFF,
+    settings.MCP_RECONNECT_BACKOFF_MAX
+)
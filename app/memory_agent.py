@@ -1,13 +1,25 @@
 from typing import Dict, List, Optional, Any
 from datetime import datetime, timedelta
+import asyncio
 import json
 from dataclasses import dataclass
 from enum import Enum
-import mistralai
-from mistralai.client import MistralClient
-from mistralai.models.chat_completion import ChatMessage
 import uuid
 from .settings import get_settings
+from .logging_config import get_logger
+from .tracing import tracer
+from .metrics import MEMORY_ANALYSIS
+from .providers import provider_clients
+
+logger = get_logger(__name__)
+
+def _create_mistral():
+    # Cliente assíncrono: a chamada de análise não bloqueia o event loop
+    from mistralai.async_client import MistralAsyncClient
+    settings = get_settings()
+    return MistralAsyncClient(api_key=settings.MISTRAL_API_KEY, endpoint=settings.MISTRAL_BASE_URL)
+
+provider_clients.register("mistral", _create_mistral)
 
 class TopicType(Enum):
     GENERAL = "general"
@@ -40,10 +52,11 @@ class MemoryAgent:
         # Tamanhos máximos (em caracteres)
         self.max_message_size = 4000  # ~4KB por mensagem
         self.max_metadata_size = 1000  # ~1KB para metadados
-        
-        # Inicializa cliente Mistral
-        settings = get_settings()
-        self.mistral = MistralClient(api_key=settings.MISTRAL_API_KEY)
+    
+    @property
+    def mistral(self):
+        """Cliente Mistral, construído no primeiro uso"""
+        return provider_clients.get("mistral")
         
     def _truncate_message(self, message: str) -> str:
         """Trunca mensagem para o tamanho máximo permitido"""
@@ -88,31 +101,37 @@ class MemoryAgent:
                 """
             
             try:
+                from mistralai.models.chat_completion import ChatMessage
+                
                 # Chama a API do Mistral
                 chat_messages = [
                     ChatMessage(role="system", content="Você é um analisador de contexto especializado em extrair informações relevantes de conversas."),
                     ChatMessage(role="user", content=prompt)
                 ]
                 
-                response = await self.mistral.chat(
-                    model="mistral-large-latest",
-                    messages=chat_messages
-                )
+                with tracer.span("memory_analysis", task=task, messages=len(messages)):
+                    response = await self.mistral.chat(
+                        model="mistral-large-latest",
+                        messages=chat_messages
+                    )
                 
                 # Processa a resposta
                 try:
                     result = json.loads(response.choices[0].message.content)
+                    MEMORY_ANALYSIS.inc(task=task, status="ok")
                     return result
                 except json.JSONDecodeError:
-                    print("Failed to parse Mistral response, using fallback")
+                    logger.warning("Failed to parse Mistral response, using fallback")
+                    MEMORY_ANALYSIS.inc(task=task, status="parse_error")
                     return self._get_fallback_analysis(task)
                     
             except Exception as e:
-                print(f"Mistral API error: {e}, using fallback")
+                logger.warning(f"Mistral API error: {e}, using fallback")
+                MEMORY_ANALYSIS.inc(task=task, status="error")
                 return self._get_fallback_analysis(task)
                 
         except Exception as e:
-            print(f"Error in Mistral analysis: {e}")
+            logger.error(f"Error in Mistral analysis: {e}")
             return self._get_fallback_analysis(task)
             
     def _get_fallback_analysis(self, task: str) -> Dict[str, Any]:
@@ -305,12 +324,7 @@ class MemoryAgent:
             metadata["total_cleaned"] = metadata.get("total_cleaned", 0) + 1
             
         # Salva a mensagem no banco de dados
-        await self.db.add_message_to_conversation(
-            sender_id=sender_id,
-            message=message,
-            is_user=is_user,
-            llm_response=llm_response
-        )
+        await self.save_message(sender_id, message, is_user, llm_response)
         
         # Retorna a conversa atualizada
         return {
@@ -320,6 +334,50 @@ class MemoryAgent:
             "llm_history": llm_history
         }
     
+    async def save_message(
+        self,
+        sender_id: str,
+        message: str,
+        is_user: bool,
+        llm_response: Optional[Dict] = None
+    ) -> Dict[str, Any]:
+        """Salva a mensagem na conversa, sem análise"""
+        return await self.db.add_message_to_conversation(
+            sender_id=sender_id,
+            message=self._truncate_message(message),
+            is_user=is_user,
+            llm_response=llm_response
+        )
+    
+    async def update_context(self, sender_id: str) -> Dict[str, Any]:
+        """
+        Analisa as mensagens já salvas da conversa (uma análise de tópico e uma de
+        resumo por turno) e grava o contexto que get_relevant_context lê
+        """
+        conversation = await self.db.get_or_create_conversation(sender_id)
+        content = conversation.get("content", {}) if conversation else {}
+        messages = content.get("messages", []) if isinstance(content, dict) else []
+        active_messages = messages[-self.max_active_messages:]
+        
+        active_topic, topic_analysis = await asyncio.gather(
+            self._extract_topic(active_messages),
+            self._extract_topics_summary(active_messages)
+        )
+        llm_history = [
+            {"llm": msg.get("llm"), "model": msg.get("model"), "classification": msg.get("classification")}
+            for msg in messages
+            if not msg.get("is_user") and msg.get("llm")
+        ]
+        context = {
+            "active_topic": active_topic,
+            "last_accessed": datetime.utcnow().isoformat(),
+            "topic_analysis": topic_analysis,
+            "active_messages": active_messages,
+            "llm_preferences": self._get_llm_preferences({"llm_history": llm_history})
+        }
+        await self.db.update_conversation_context(sender_id, context)
+        return context
+    
     async def get_relevant_context(
         self,
         sender_id: str,
@@ -329,7 +387,8 @@ class MemoryAgent:
         Recupera contexto relevante para a mensagem atual
         """
         try:
-            conversation = await self.db.get_or_create_conversation(sender_id)
+            with tracer.span("context_fetch", sender_id=sender_id):
+                conversation = await self.db.get_or_create_conversation(sender_id)
             if not conversation:
                 return {}
                 
@@ -345,5 +404,5 @@ class MemoryAgent:
             }
             
         except Exception as e:
-            print(f"Error getting relevant context: {e}")
+            logger.error(f"Error getting relevant context: {e}")
             return {} 
\ No newline at end of file
@@ -0,0 +1,321 @@
+from typing import Dict, Any, Optional, List, Tuple, Callable, Iterable
+from contextlib import contextmanager
+from bisect import bisect_left
+import asyncio
+import threading
+import time
+from .logging_config import get_logger, get_log_stats
+from .tracing import tracer
+
+logger = get_logger(__name__)
+
+# Buckets padrão de latência (segundos)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Preço estimado em USD por 1M de tokens: (entrada, saída, entrada em cache)
+MODEL_PRICES: Dict[str, Tuple[float, float, float]] = {
+    "claude-3-opus": (15.0, 75.0, 1.5),
+    "gpt-4": (30.0, 60.0, 15.0),
+    "gemini-1.5-pro": (1.25, 5.0, 0.3125),
+    "deepseek-chat": (0.27, 1.10, 0.07),
+}
+
+def _format_labels(labelnames: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+class _Metric:
+    """Base das métricas: valores por combinação de labels"""
+    type_name = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values: Dict[Tuple[str, ...], Any] = {}
+
+    def _key(self, labels: Dict[str, Any]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"]
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in items:
+            lines.extend(self._render_value(key, value))
+        return lines
+
+    def _render_value(self, key: Tuple[str, ...], value: Any) -> List[str]:
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"]
+
+class Counter(_Metric):
+    type_name = "counter"
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+class Gauge(_Metric):
+    type_name = "gauge"
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels):
+        self.inc(-amount, **labels)
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+class Histogram(_Metric):
+    type_name = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (), buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # [contagens por bucket (+Inf no fim), soma, total]
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def _render_value(self, key: Tuple[str, ...], value: Any) -> List[str]:
+        counts, total, count = value
+        lines = []
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+            cumulative += bucket_count
+            labels = _format_labels(self.labelnames, key, f'le="{_format_value(bound)}"')
+            lines.append(f"{self.name}_bucket{labels} {cumulative}")
+        labels = _format_labels(self.labelnames, key)
+        lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+        lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+class MetricsRegistry:
+    """Registro em processo, renderizado no formato de exposição do Prometheus"""
+
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+        self._collectors: List[Callable[[], None]] = []
+
+    def counter(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> Gauge:
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Iterable[str] = (), buckets: Tuple[float, ...] = LATENCY_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def _register(self, metric: _Metric) -> Any:
+        self._metrics.append(metric)
+        return metric
+
+    def add_collector(self, collector: Callable[[], None]):
+        """Função chamada a cada coleta para atualizar gauges calculados (filas, conexões)"""
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        for collector in self._collectors:
+            try:
+                collector()
+            except Exception as e:
+                logger.error(f"Erro ao coletar métricas: {str(e)}")
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+registry = MetricsRegistry()
+
+# Tráfego e latência ponta a ponta
+REQUESTS = registry.counter("ineuro_requests_total", "Requisições recebidas por canal", ["channel", "status"])
+REQUEST_LATENCY = registry.histogram("ineuro_request_duration_seconds", "Latência ponta a ponta por canal", ["channel"])
+STAGE_LATENCY = registry.histogram("ineuro_stage_duration_seconds", "Latência por estágio do turno", ["stage"])
+TURN_CRITICAL_PATH = registry.histogram("ineuro_turn_critical_path_seconds", "Tempo dos passos críticos do turno (até a resposta)", ["channel"])
+TURN_SERIAL_TIME = registry.histogram("ineuro_turn_serial_seconds", "Soma das durações dos passos críticos (o turno se fosse sequencial)", ["channel"])
+TURN_BACKGROUND = registry.histogram("ineuro_turn_background_seconds", "Passos não críticos executados após a resposta", ["channel"])
+
+# Provedores de LLM
+PROVIDER_CALLS = registry.counter("ineuro_provider_calls_total", "Chamadas aos provedores de LLM", ["provider", "status"])
+PROVIDER_LATENCY = registry.histogram("ineuro_provider_duration_seconds", "Latência das chamadas aos provedores", ["provider"])
+TOKENS = registry.counter("ineuro_tokens_total", "Tokens por modelo e tipo", ["model", "kind"])
+COST = registry.counter("ineuro_cost_usd_total", "Custo estimado em USD por modelo", ["model"])
+PROVIDER_QUEUE_WAIT = registry.histogram("ineuro_provider_queue_wait_seconds", "Espera no limitador antes da chamada ao provedor", ["provider"])
+PROVIDER_IN_FLIGHT = registry.gauge("ineuro_provider_in_flight", "Chamadas em andamento por provedor", ["provider"])
+PROVIDER_CONCURRENCY_LIMIT = registry.gauge("ineuro_provider_concurrency_limit", "Limite adaptativo de chamadas simultâneas", ["provider"])
+PROVIDER_RATE_LIMITED = registry.counter("ineuro_provider_rate_limited_total", "Respostas 429, esperas por RPM/TPM e filas expiradas", ["provider", "reason"])
+PROVIDER_SPILLOVER = registry.counter("ineuro_provider_spillover_total", "Chamadas desviadas para outro provedor por limite de taxa", ["provider", "target"])
+
+# Banco de dados e memória
+DB_REQUESTS = registry.counter("ineuro_db_requests_total", "Round-trips ao Supabase", ["method", "table", "status"])
+MEMORY_ANALYSIS = registry.counter("ineuro_memory_analysis_total", "Chamadas de análise de memória (Mistral)", ["task", "status"])
+
+# Sessões WebSocket
+WS_SESSIONS = registry.gauge("ineuro_ws_sessions", "Sessões WebSocket ativas neste worker")
+WS_TURNS_CANCELLED = registry.counter("ineuro_ws_turns_cancelled_total", "Turnos cancelados antes do fim", ["reason"])
+WS_MESSAGES_REJECTED = registry.counter("ineuro_ws_messages_rejected_total", "Mensagens recusadas com a fila da sessão cheia")
+WS_SESSIONS_CLOSED = registry.counter("ineuro_ws_sessions_closed_total", "Sessões encerradas por motivo", ["reason"])
+WS_FANOUT_LATENCY = registry.histogram("ineuro_ws_fanout_seconds", "Tempo de um broadcast até a entrega (ou falha) em todos os clientes do worker")
+WS_BROADCAST_DROPPED = registry.counter("ineuro_ws_broadcast_dropped_total", "Broadcasts não enfileirados para um cliente", ["reason"])
+WS_SEND_FAILURES = registry.counter("ineuro_ws_send_failures_total", "Clientes desconectados por envio lento ou com erro", ["reason"])
+
+# Base de conhecimento
+KB_INGEST_FILES = registry.counter("ineuro_kb_ingest_files_total", "Arquivos enviados ao /base por resultado", ["status"])
+KB_INGEST_BYTES = registry.counter("ineuro_kb_ingest_bytes_total", "Bytes lidos dos uploads do /base")
+KB_INGEST_CHUNKS = registry.counter("ineuro_kb_ingest_chunks_total", "Trechos indexados na base de conhecimento")
+KB_INGEST_STAGE = registry.histogram("ineuro_kb_ingest_stage_seconds", "Duração de cada etapa da ingestão de um arquivo", ["stage"])
+KB_INGEST_REUSED = registry.counter("ineuro_kb_ingest_reused_chunks_total", "Trechos de uploads que já estavam no índice e não foram recalculados")
+KB_EMBED_CACHE = registry.counter("ineuro_kb_embedding_cache_total", "Consultas ao cache de embeddings por resultado", ["result"])
+KB_RETRIEVAL_LATENCY = registry.histogram(
+    "ineuro_kb_retrieval_seconds",
+    "Busca de trechos da base de conhecimento por mensagem",
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+)
+
+# Ferramentas MCP
+MCP_TOOL_CALLS = registry.counter("ineuro_mcp_tool_calls_total", "Chamadas de ferramentas MCP por resultado", ["tool", "status"])
+MCP_TOOL_LATENCY = registry.histogram("ineuro_mcp_tool_duration_seconds", "Latência das chamadas de ferramentas MCP", ["tool"])
+MCP_TOOL_CACHE = registry.counter("ineuro_mcp_tool_cache_total", "Consultas ao cache de resultados de ferramentas (hit, miss, shared)", ["tool", "result"])
+MCP_TIME_SAVED = registry.counter("ineuro_mcp_time_saved_seconds_total", "Tempo de MCP poupado pelo cache de resultados", ["kind"])
+MCP_TOOL_OUTPUT_TRUNCATED = registry.counter("ineuro_mcp_tool_output_truncated_total", "Saídas de ferramentas cortadas no limite de tokens antes de voltar ao modelo", ["tool"])
+MCP_SESSION_CONNECTED = registry.gauge("ineuro_mcp_session_connected", "Sessão SSE aberta e respondendo ao ping (1) por servidor MCP", ["server"])
+MCP_RECONNECTS = registry.counter("ineuro_mcp_reconnects_total", "Reconexões de sessões MCP após queda", ["server"])
+MCP_PING_LATENCY = registry.histogram("ineuro_mcp_ping_seconds", "Latência do ping nas sessões MCP", ["server"])
+MCP_CATALOG_REFRESH = registry.counter("ineuro_mcp_catalog_refresh_total", "Leituras do catálogo de ferramentas (list_tools) por resultado", ["status"])
+MCP_TOOLS_IN_FLIGHT = registry.gauge("ineuro_mcp_tools_in_flight", "Chamadas de ferramentas em andamento por servidor MCP", ["server"])
+
+# Filas e processo
+QUEUE_DEPTH = registry.gauge("ineuro_queue_depth", "Profundidade das filas internas", ["queue"])
+DROPPED = registry.gauge("ineuro_dropped_records", "Registros descartados por filas cheias", ["queue"])
+EVENT_LOOP_LAG = registry.histogram(
+    "ineuro_event_loop_lag_seconds",
+    "Atraso do event loop (chamadas bloqueantes aparecem aqui)",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0)
+)
+PROCESS_CPU = registry.gauge("ineuro_process_cpu_seconds", "Tempo de CPU consumido pelo processo")
+INSTRUMENTATION_OVERHEAD = registry.gauge(
+    "ineuro_instrumentation_overhead_seconds",
+    "Custo medido por operação de instrumentação",
+    ["operation"]
+)
+
+def record_llm_usage(model: str, input_tokens: int, output_tokens: int, cache_read_tokens: int = 0):
+    """Contabiliza tokens e custo estimado de uma chamada"""
+    TOKENS.inc(input_tokens, model=model, kind="input")
+    TOKENS.inc(output_tokens, model=model, kind="output")
+    if cache_read_tokens:
+        TOKENS.inc(cache_read_tokens, model=model, kind="cache_read")
+    prices = MODEL_PRICES.get(model)
+    if prices:
+        input_price, output_price, cached_price = prices
+        cost = (
+            (input_tokens - cache_read_tokens) * input_price
+            + cache_read_tokens * cached_price
+            + output_tokens * output_price
+        ) / 1_000_000
+        COST.inc(cost, model=model)
+
+@contextmanager
+def track_request(channel: str):
+    """Conta a requisição e mede sua latência ponta a ponta"""
+    start = time.perf_counter()
+    status = "ok"
+    try:
+        yield
+    except asyncio.CancelledError:
+        status = "cancelled"
+        raise
+    except BaseException:
+        status = "error"
+        raise
+    finally:
+        REQUESTS.inc(channel=channel, status=status)
+        REQUEST_LATENCY.observe(time.perf_counter() - start, channel=channel)
+
+def _observe_stage(name: str, seconds: float):
+    STAGE_LATENCY.observe(seconds, stage=name)
+
+# Todo span do tracer (amostrado ou não) alimenta o histograma de estágios
+tracer.stage_observer = _observe_stage
+
+def _collect_queues():
+    log_stats = get_log_stats()
+    QUEUE_DEPTH.set(log_stats["queue_depth"], queue="logging")
+    DROPPED.set(log_stats["dropped"], queue="logging")
+    QUEUE_DEPTH.set(tracer.queue_depth(), queue="tracing")
+    DROPPED.set(tracer.dropped, queue="tracing")
+    PROCESS_CPU.set(time.process_time())
+
+registry.add_collector(_collect_queues)
+
+def measure_overhead(iterations: int = 10000) -> Dict[str, float]:
+    """
+    Mede o custo por operação da instrumentação (em métricas descartáveis)
+    e publica o resultado em ineuro_instrumentation_overhead_seconds.
+    """
+    scratch = MetricsRegistry()
+    counter = scratch.counter("scratch_total", "", ["label"])
+    histogram = scratch.histogram("scratch_seconds", "", ["label"])
+    operations = {
+        "counter_inc": lambda: counter.inc(label="x"),
+        "histogram_observe": lambda: histogram.observe(0.01, label="x"),
+        "span_unsampled": lambda: tracer.span("scratch").__enter__().__exit__(None, None, None),
+    }
+    observer, tracer.stage_observer = tracer.stage_observer, lambda name, seconds: histogram.observe(seconds, label=name)
+    try:
+        results = {}
+        for operation, func in operations.items():
+            start = time.perf_counter()
+            for _ in range(iterations):
+                func()
+            results[operation] = (time.perf_counter() - start) / iterations
+            INSTRUMENTATION_OVERHEAD.set(results[operation], operation=operation)
+        return results
+    finally:
+        tracer.stage_observer = observer
+
+async def monitor_event_loop(interval: float = 0.5):
+    """Mede continuamente o atraso do event loop"""
+    while True:
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        EVENT_LOOP_LAG.observe(max(0.0, time.perf_counter() - start - interval))
@@ -0,0 +1,768 @@
+from typing import Dict, Any, Optional, List, Callable, Awaitable, Tuple, AsyncIterator, FrozenSet
+from dataclasses import dataclass, field, asdict
+from abc import ABC, abstractmethod
+import asyncio
+import json
+import os
+import threading
+import time
+import aiohttp
+from .settings import get_settings
+from .logging_config import get_logger
+from .generation_profiles import GenerationProfile
+from .metrics import MODEL_PRICES
+from .http_pool import http_pool
+from .rate_limit import ProviderLimiter
+
+logger = get_logger(__name__)
+
+settings = get_settings()
+
+class ProviderClientRegistry:
+    """
+    Clientes dos provedores (SDKs de LLM, Mistral) construídos no primeiro uso.
+    As fábricas importam o SDK sob demanda, então importar o app não paga o
+    custo de anthropic/openai/mistralai.
+    """
+
+    def __init__(self):
+        self._factories: Dict[str, Callable[[], Any]] = {}
+        self._warmups: Dict[str, Callable[[Any], Awaitable[Any]]] = {}
+        self._clients: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+        self.load_times: Dict[str, float] = {}
+
+    def register(self, name: str, factory: Callable[[], Any], warmup: Optional[Callable[[Any], Awaitable[Any]]] = None):
+        """Registra a fábrica do cliente e, opcionalmente, uma chamada barata para aquecer a conexão"""
+        self._factories[name] = factory
+        # Reconfigurar um provedor descarta o cliente antigo
+        self._clients.pop(name, None)
+        if warmup:
+            self._warmups[name] = warmup
+
+    def get(self, name: str) -> Any:
+        """Retorna o cliente, construindo-o na primeira chamada"""
+        client = self._clients.get(name)
+        if client is not None:
+            return client
+        with self._lock:
+            client = self._clients.get(name)
+            if client is None:
+                start = time.perf_counter()
+                client = self._factories[name]()
+                self.load_times[name] = time.perf_counter() - start
+                self._clients[name] = client
+                logger.info("provider_client_loaded", extra={"provider": name, "load_ms": round(self.load_times[name] * 1000, 1)})
+        return client
+
+    def is_loaded(self, name: str) -> bool:
+        return name in self._clients
+
+    def names(self) -> List[str]:
+        return list(self._factories)
+
+    async def prewarm(self, names: Optional[List[str]] = None, connections: bool = False):
+        """
+        Constrói os clientes fora do event loop (o import dos SDKs é bloqueante)
+        e, com connections=True, faz a chamada de aquecimento de cada provedor.
+        """
+        for name in names or self.names():
+            if name not in self._factories:
+                logger.warning(f"Provedor desconhecido no pre-warm: {name}")
+                continue
+            try:
+                client = await asyncio.to_thread(self.get, name)
+                if connections and name in self._warmups:
+                    await self._warmups[name](client)
+            except Exception as e:
+                logger.warning(f"Falha no pre-warm de {name}: {str(e)}")
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            name: {
+                "loaded": self.is_loaded(name),
+                "load_ms": round(self.load_times[name] * 1000, 1) if name in self.load_times else None
+            }
+            for name in self._factories
+        }
+
+# Instância global do registro de clientes
+provider_clients = ProviderClientRegistry()
+
+# Status HTTP em que vale repetir a chamada (falhas transitórias). O 429 fica de fora:
+# sobe na hora para o limitador, que aplica o retry-after, o AIMD e o desvio
+RETRYABLE_STATUS = frozenset({500, 502, 503, 504})
+
+class ProviderHTTPError(Exception):
+    """Erro HTTP de um provedor chamado via REST (mesmo atributo status_code dos SDKs)"""
+
+    def __init__(self, provider: str, status_code: int, detail: str = "", retry_after: Optional[str] = None):
+        super().__init__(f"{provider} API error {status_code}: {detail[:200]}")
+        self.provider = provider
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+def is_transient_error(error: Exception) -> bool:
+    """5xx, falha de conexão ou timeout (dos SDKs ou do aiohttp); nunca o 429"""
+    status_code = getattr(error, "status_code", None)
+    if status_code is not None:
+        return status_code in RETRYABLE_STATUS
+    return isinstance(error, (asyncio.TimeoutError, aiohttp.ClientError)) or type(error).__name__ in ("APIConnectionError", "APITimeoutError")
+
+def make_usage(input_tokens: Optional[int], output_tokens: Optional[int], cache_read_tokens: Optional[int] = 0, cache_write_tokens: Optional[int] = 0) -> Dict[str, int]:
+    """Normaliza o uso de tokens reportado pelos provedores"""
+    return {
+        "input_tokens": input_tokens or 0,
+        "output_tokens": output_tokens or 0,
+        "cache_read_tokens": cache_read_tokens or 0,
+        "cache_write_tokens": cache_write_tokens or 0
+    }
+
+@dataclass(frozen=True)
+class ProviderConfig:
+    """Configuração de um provedor de LLM (um modelo servido por um adaptador)"""
+    name: str
+    adapter: str
+    model: str
+    classification: str = "general"
+    api_key: str = ""
+    base_url: str = ""
+    timeout: float = 60.0
+    max_retries: int = 2
+    prompt_format: str = "system_message"
+    prompt_prefix: str = ""
+    fallback: Optional[str] = None
+    capabilities: Tuple[str, ...] = ()
+    prices: Optional[Tuple[float, float, float]] = None
+    # Limites por provedor (0 = sem cota por minuto)
+    max_in_flight: int = 16
+    rpm: int = 0
+    tpm: int = 0
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = asdict(self)
+        data.pop("api_key")
+        return data
+
+@dataclass
+class ToolRequest:
+    """Chamada de ferramenta pedida pelo modelo: id dado pelo provedor, nome e argumentos"""
+    id: str
+    name: str
+    arguments: Dict[str, Any] = field(default_factory=dict)
+
+@dataclass
+class ToolTurn:
+    """Uma rodada da conversa com ferramentas: texto do modelo e as chamadas pedidas (nenhuma = resposta final)"""
+    text: str
+    requests: List[ToolRequest]
+    usage: Dict[str, int]
+
+def parse_tool_arguments(raw: Any) -> Dict[str, Any]:
+    """Argumentos de uma chamada de ferramenta (a OpenAI os envia como JSON em texto)"""
+    if isinstance(raw, dict):
+        return raw
+    try:
+        arguments = json.loads(raw or "{}")
+    except (TypeError, ValueError):
+        return {}
+    return arguments if isinstance(arguments, dict) else {}
+
+class ProviderAdapter(ABC):
+    """
+    Interface comum dos provedores: call, stream, count_tokens, health_probe e
+    capabilities. O cliente do SDK é criado no primeiro uso pelo registro de
+    clientes, com timeout e retries da configuração, e reaproveita o pool de
+    conexões HTTP entre chamadas.
+    """
+
+    default_capabilities: FrozenSet[str] = frozenset()
+
+    def __init__(self, config: ProviderConfig):
+        self.config = config
+        self.name = config.name
+        self.limiter = ProviderLimiter(config.name, config.max_in_flight, config.rpm, config.tpm)
+        provider_clients.register(config.name, self.create_client, warmup=self._warmup)
+
+    @property
+    def capabilities(self) -> FrozenSet[str]:
+        return frozenset(self.config.capabilities) if self.config.capabilities else self.default_capabilities
+
+    @property
+    def client(self) -> Any:
+        return provider_clients.get(self.name)
+
+    @abstractmethod
+    def create_client(self) -> Any:
+        """Cria o cliente do SDK (ou o que o adaptador usa para chamar o provedor)"""
+        ...
+
+    async def _warmup(self, client: Any):
+        await self.health_probe()
+
+    async def _retry(self, request: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Repete falhas transitórias até max_retries vezes com backoff. Os SDKs são
+        criados com max_retries=0 para que o 429 não seja repetido por dentro,
+        segurando a vaga do limitador.
+        """
+        for attempt in range(self.config.max_retries + 1):
+            try:
+                return await request()
+            except Exception as e:
+                if attempt == self.config.max_retries or not is_transient_error(e):
+                    raise
+            await asyncio.sleep(min(0.5 * 2 ** attempt, 8.0))
+
+    @abstractmethod
+    async def call(self, prompt: str, system_prompt: Optional[str], profile: GenerationProfile) -> Tuple[str, Dict[str, int]]:
+        """Gera a resposta completa; retorna (texto, uso de tokens)"""
+        ...
+
+    async def stream(self, prompt: str, system_prompt: Optional[str], profile: GenerationProfile) -> AsyncIterator[Tuple[str, Optional[Dict[str, int]]]]:
+        """
+        Gera a resposta em partes: produz (texto, None) para cada trecho e, no
+        fim, ("", uso de tokens). Provedores sem streaming entregam tudo de uma vez.
+        """
+        text, usage = await self.call(prompt, system_prompt, profile)
+        yield text, None
+        yield "", usage
+
+    async def call_with_tools(
+        self,
+        messages: List[Dict[str, Any]],
+        system_prompt: Optional[str],
+        tools: List[Dict[str, Any]],
+        profile: GenerationProfile
+    ) -> ToolTurn:
+        """
+        Uma rodada de function calling nativo. `messages` é a conversa em formato
+        neutro, traduzida por cada adaptador: {"role": "user", "content"},
+        {"role": "assistant", "content", "tool_requests"} e {"role": "tool",
+        "results": [(ToolRequest, saída)]}. `tools` traz name, description e
+        parameters (JSON schema) de cada ferramenta.
+        """
+        raise NotImplementedError(f"Provedor {self.name} não suporta chamadas de ferramentas")
+
+    def count_tokens(self, text: str) -> int:
+        """Estimativa local (~4 caracteres por token), sem chamada de rede"""
+        return len(text) // 4
+
+    async def health_probe(self) -> bool:
+        """Chamada barata para verificar se o provedor responde"""
+        return True
+
+class AnthropicAdapter(ProviderAdapter):
+    default_capabilities = frozenset({"stream", "prompt_cache", "tools"})
+
+    def create_client(self) -> Any:
+        from anthropic import AsyncAnthropic
+        return AsyncAnthropic(
+            api_key=self.config.api_key,
+            base_url=self.config.base_url or None,
+            timeout=self.config.timeout,
+            # Retries transitórios ficam em _retry; o SDK repetiria também o 429
+            max_retries=0
+        )
+
+    def _system(self, system_prompt: str) -> Any:
+        """
+        Estrutura o system prompt para o cache de prefixo da Anthropic.
+        O system prompt é estático por (modelo, tipo de tarefa), então é marcado
+        como bloco cacheável; o contexto dinâmico vai na mensagem do usuário.
+        """
+        if not settings.PROMPT_CACHE_ENABLED or "prompt_cache" not in self.capabilities:
+            return system_prompt
+        return [{
+            "type": "text",
+            "text": system_prompt,
+            "cache_control": {"type": "ephemeral"}
+        }]
+
+    def _params(self, prompt: str, system_prompt: Optional[str], profile: GenerationProfile) -> Dict[str, Any]:
+        return self._conversation_params([{"role": "user", "content": prompt}], system_prompt, profile)
+
+    def _conversation_params(self, messages: List[Dict[str, Any]], system_prompt: Optional[str], profile: GenerationProfile) -> Dict[str, Any]:
+        params = {
+            "model": self.config.model,
+            "messages": messages,
+            "max_tokens": profile.max_tokens,
+            "temperature": profile.temperature
+        }
+        if profile.stop_sequences:
+            params["stop_sequences"] = list(profile.stop_sequences)
+        # System prompt estático vem primeiro para aproveitar o cache de prefixo
+        if system_prompt:
+            params["system"] = self._system(system_prompt)
+        return params
+
+    def _usage(self, usage: Any) -> Dict[str, int]:
+        # Anthropic reporta os tokens de cache separados dos tokens de entrada
+        cache_read = getattr(usage, "cache_read_input_tokens", 0) or 0
+        cache_write = getattr(usage, "cache_creation_input_tokens", 0) or 0
+        return make_usage(
+            (getattr(usage, "input_tokens", 0) or 0) + cache_read + cache_write,
+            getattr(usage, "output_tokens", 0),
+            cache_read,
+            cache_write
+        )
+
+    async def call(self, prompt: str, system_prompt: Optional[str], profile: GenerationProfile) -> Tuple[str, Dict[str, int]]:
+        params = self._params(prompt, system_prompt, profile)
+        response = await self._retry(lambda: self.client.messages.create(**params))
+        return response.content[0].text, self._usage(response.usage)
+
+    def _tool_messages(self, messages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        converted = []
+        for message in messages:
+            if message["role"] == "user":
+                converted.append({"role": "user", "content": message["content"]})
+            elif message["role"] == "assistant":
+                blocks = [{"type": "text", "text": message["content"]}] if message["content"] else []
+                blocks += [
+                    {"type": "tool_use", "id": request.id, "name": request.name, "input": request.arguments}
+                    for request in message["tool_requests"]
+                ]
+                converted.append({"role": "assistant", "content": blocks})
+            else:
+                converted.append({"role": "user", "content": [
+                    {"type": "tool_result", "tool_use_id": request.id, "content": output}
+                    for request, output in message["results"]
+                ]})
+        return converted
+
+    def _tools(self, tools: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        definitions = [
+            {
+                "name": tool["name"],
+                "description": tool.get("description") or "",
+                "input_schema": tool.get("parameters") or {"type": "object", "properties": {}}
+            }
+            for tool in tools
+        ]
+        # As definições vêm antes do system prompt no prefixo: o cache cobre as duas
+        if definitions and settings.PROMPT_CACHE_ENABLED and "prompt_cache" in self.capabilities:
+            definitions[-1]["cache_control"] = {"type": "ephemeral"}
+        return definitions
+
+    async def call_with_tools(
+        self,
+        messages: List[Dict[str, Any]],
+        system_prompt: Optional[str],
+        tools: List[Dict[str, Any]],
+        profile: GenerationProfile
+    ) -> ToolTurn:
+        params = self._conversation_params(self._tool_messages(messages), system_prompt, profile)
+        params["tools"] = self._tools(tools)
+        response = await self._retry(lambda: self.client.messages.create(**params))
+        text = "".join(block.text for block in response.content if block.type == "text")
+        requests = [
+            ToolRequest(block.id, block.name, parse_tool_arguments(block.input))
+            for block in response.content if block.type == "tool_use"
+        ]
+        return ToolTurn(text, requests, self._usage(response.usage))
+
+    async def stream(self, prompt: str, system_prompt: Optional[str], profile: GenerationProfile) -> AsyncIterator[Tuple[str, Optional[Dict[str, int]]]]:
+        async with self.client.messages.stream(**self._params(prompt, system_prompt, profile)) as stream:
+            async for text in stream.text_stream:
+                yield text, None
+            message = await stream.get_final_message()
+        yield "", self._usage(message.usage)
+
+    async def health_probe(self) -> bool:
+        await self.client.models.list(limit=1)
+        return True
+
+class OpenAICompatibleAdapter(ProviderAdapter):
+    """OpenAI e APIs compatíveis (DeepSeek etc.) via AsyncOpenAI com base_url"""
+
+    default_capabilities = frozenset({"stream", "json", "tools"})
+
+    def create_client(self) -> Any:
+        from openai import AsyncOpenAI
+        return AsyncOpenAI(
+            api_key=self.config.api_key,
+            base_url=self.config.base_url or None,
+            timeout=self.config.timeout,
+            # Retries transitórios ficam em _retry; o SDK repetiria também o 429
+            max_retries=0
+        )
+
+    def _params(self, prompt: str, system_prompt: Optional[str], profile: GenerationProfile) -> Dict[str, Any]:
+        return self._conversation_params([{"role": "user", "content": prompt}], system_prompt, profile)
+
+    def _conversation_params(self, messages: List[Dict[str, Any]], system_prompt: Optional[str], profile: GenerationProfile) -> Dict[str, Any]:
+        if system_prompt:
+            messages = [{"role": "system", "content": system_prompt}] + messages
+        params = {
+            "model": self.config.model,
+            "messages": messages,
+            "max_tokens": profile.max_tokens,
+            "temperature": profile.temperature
+        }
+        if profile.stop_sequences:
+            params["stop"] = list(profile.stop_sequences)
+        return params
+
+    def _usage(self, usage: Any) -> Dict[str, int]:
+        # OpenAI reporta o cache em prompt_tokens_details; DeepSeek em prompt_cache_hit_tokens
+        details = getattr(usage, "prompt_tokens_details", None)
+        cached = getattr(details, "cached_tokens", 0) or getattr(usage, "prompt_cache_hit_tokens", 0)
+        return make_usage(getattr(usage, "prompt_tokens", 0), getattr(usage, "completion_tokens", 0), cached)
+
+    async def call(self, prompt: str, system_prompt: Optional[str], profile: GenerationProfile) -> Tuple[str, Dict[str, int]]:
+        params = self._params(prompt, system_prompt, profile)
+        response = await self._retry(lambda: self.client.chat.completions.create(**params))
+        return response.choices[0].message.content, self._usage(response.usage)
+
+    def _tool_messages(self, messages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        converted = []
+        for message in messages:
+            if message["role"] == "user":
+                converted.append({"role": "user", "content": message["content"]})
+            elif message["role"] == "assistant":
+                converted.append({
+                    "role": "assistant",
+                    "content": message["content"] or None,
+                    "tool_calls": [
+                        {
+                            "id": request.id,
+                            "type": "function",
+                            "function": {"name": request.name, "arguments": json.dumps(request.arguments, ensure_ascii=False)}
+                        }
+                        for request in message["tool_requests"]
+                    ]
+                })
+            else:
+                converted.extend(
+                    {"role": "tool", "tool_call_id": request.id, "content": output}
+                    for request, output in message["results"]
+                )
+        return converted
+
+    async def call_with_tools(
+        self,
+        messages: List[Dict[str, Any]],
+        system_prompt: Optional[str],
+        tools: List[Dict[str, Any]],
+        profile: GenerationProfile
+    ) -> ToolTurn:
+        params = self._conversation_params(self._tool_messages(messages), system_prompt, profile)
+        params["tools"] = [
+            {
+                "type": "function",
+                "function": {
+                    "name": tool["name"],
+                    "description": tool.get("description") or "",
+                    "parameters": tool.get("parameters") or {"type": "object", "properties": {}}
+                }
+            }
+            for tool in tools
+        ]
+        response = await self._retry(lambda: self.client.chat.completions.create(**params))
+        message = response.choices[0].message
+        requests = [
+            ToolRequest(call.id, call.function.name, parse_tool_arguments(call.function.arguments))
+            for call in message.tool_calls or []
+        ]
+        return ToolTurn(message.content or "", requests, self._usage(response.usage))
+
+    async def stream(self, prompt: str, system_prompt: Optional[str], profile: GenerationProfile) -> AsyncIterator[Tuple[str, Optional[Dict[str, int]]]]:
+        params = self._params(prompt, system_prompt, profile)
+        response = await self._retry(lambda: self.client.chat.completions.create(
+            **params,
+            stream=True,
+            stream_options={"include_usage": True}
+        ))
+        usage = make_usage(0, 0)
+        async for chunk in response:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content, None
+            if getattr(chunk, "usage", None):
+                usage = self._usage(chunk.usage)
+        yield "", usage
+
+    async def health_probe(self) -> bool:
+        await self.client.models.list()
+        return True
+
+class GeminiAdapter(ProviderAdapter):
+    """
+    Gemini via API REST (v1beta) pelo pool HTTP compartilhado. As chamadas são
+    nativamente assíncronas: a concorrência não fica limitada às threads do executor.
+    """
+
+    default_capabilities = frozenset({"stream", "prompt_cache", "tools"})
+    default_base_url = "https://generativelanguage.googleapis.com"
+
+    def create_client(self) -> Any:
+        # Sem SDK: o "cliente" é só o endpoint do modelo e os headers de autenticação
+        base_url = (self.config.base_url or self.default_base_url).rstrip("/")
+        if "://" not in base_url:
+            base_url = f"https://{base_url}"
+        return {
+            "url": f"{base_url}/v1beta/models/{self.config.model}",
+            "headers": {"x-goog-api-key": self.config.api_key}
+        }
+
+    # Subconjunto do JSON schema (OpenAPI) aceito nas declarações de função
+    schema_keys = frozenset({"type", "format", "description", "nullable", "enum", "properties", "required", "items"})
+
+    def _body(self, prompt: str, system_prompt: Optional[str], profile: GenerationProfile) -> Dict[str, Any]:
+        return self._conversation_body([{"role": "user", "parts": [{"text": prompt}]}], system_prompt, profile)
+
+    def _conversation_body(self, contents: List[Dict[str, Any]], system_prompt: Optional[str], profile: GenerationProfile) -> Dict[str, Any]:
+        generation_config = {
+            "maxOutputTokens": profile.max_tokens,
+            "temperature": profile.temperature
+        }
+        if profile.stop_sequences:
+            generation_config["stopSequences"] = list(profile.stop_sequences)
+        body = {"generationConfig": generation_config}
+        if system_prompt and self.config.prompt_format == "inline":
+            # Instruções inline, antes da (primeira) mensagem do usuário
+            first = contents[0]["parts"][0]
+            contents = [{**contents[0], "parts": [{"text": f"{system_prompt}\n\nUser: {first['text']}"}, *contents[0]["parts"][1:]]}, *contents[1:]]
+        elif system_prompt:
+            body["systemInstruction"] = {"parts": [{"text": system_prompt}]}
+        body["contents"] = contents
+        return body
+
+    def _tool_contents(self, messages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        contents = []
+        for message in messages:
+            if message["role"] == "user":
+                contents.append({"role": "user", "parts": [{"text": message["content"]}]})
+            elif message["role"] == "assistant":
+                parts = [{"text": message["content"]}] if message["content"] else []
+                parts += [{"functionCall": {"name": request.name, "args": request.arguments}} for request in message["tool_requests"]]
+                contents.append({"role": "model", "parts": parts})
+            else:
+                contents.append({"role": "user", "parts": [
+                    {"functionResponse": {"name": request.name, "response": {"content": output}}}
+                    for request, output in message["results"]
+                ]})
+        return contents
+
+    def _schema(self, schema: Dict[str, Any]) -> Dict[str, Any]:
+        cleaned = {key: value for key, value in schema.items() if key in self.schema_keys}
+        if isinstance(cleaned.get("properties"), dict):
+            cleaned["properties"] = {name: self._schema(value) for name, value in cleaned["properties"].items() if isinstance(value, dict)}
+        if isinstance(cleaned.get("items"), dict):
+            cleaned["items"] = self._schema(cleaned["items"])
+        return cleaned
+
+    async def call_with_tools(
+        self,
+        messages: List[Dict[str, Any]],
+        system_prompt: Optional[str],
+        tools: List[Dict[str, Any]],
+        profile: GenerationProfile
+    ) -> ToolTurn:
+        body = self._conversation_body(self._tool_contents(messages), system_prompt, profile)
+        declarations = []
+        for tool in tools:
+            declaration = {"name": tool["name"], "description": tool.get("description") or ""}
+            if (tool.get("parameters") or {}).get("properties"):
+                declaration["parameters"] = self._schema(tool["parameters"])
+            declarations.append(declaration)
+        body["tools"] = [{"functionDeclarations": declarations}]
+        response = await self._request("POST", f"{self.client['url']}:generateContent", json=body)
+        try:
+            data = await response.json()
+        finally:
+            response.release()
+        parts = (data.get("candidates") or [{}])[0].get("content", {}).get("parts", [])
+        # O Gemini não dá id às chamadas: a posição na rodada serve de id
+        requests = [
+            ToolRequest(str(position), part["functionCall"]["name"], parse_tool_arguments(part["functionCall"].get("args")))
+            for position, part in enumerate(part for part in parts if "functionCall" in part)
+        ]
+        return ToolTurn(self._text(data), requests, self._usage(data.get("usageMetadata")))
+
+    def _usage(self, usage: Optional[Dict[str, Any]]) -> Dict[str, int]:
+        usage = usage or {}
+        return make_usage(
+            usage.get("promptTokenCount"),
+            usage.get("candidatesTokenCount"),
+            usage.get("cachedContentTokenCount")
+        )
+
+    def _text(self, chunk: Dict[str, Any]) -> str:
+        candidates = chunk.get("candidates") or [{}]
+        parts = candidates[0].get("content", {}).get("parts", [])
+        return "".join(part.get("text", "") for part in parts)
+
+    async def _request(self, method: str, url: str, **kwargs: Any) -> aiohttp.ClientResponse:
+        """Faz a requisição pelo pool, repetindo falhas transitórias; o chamador libera a resposta"""
+        client = self.client
+        timeout = aiohttp.ClientTimeout(total=self.config.timeout)
+
+        async def send() -> aiohttp.ClientResponse:
+            response = await http_pool.session().request(method, url, headers=client["headers"], timeout=timeout, **kwargs)
+            if response.status == 200:
+                return response
+            detail = await response.text()
+            response.release()
+            raise ProviderHTTPError(self.name, response.status, detail, response.headers.get("Retry-After"))
+
+        return await self._retry(send)
+
+    async def call(self, prompt: str, system_prompt: Optional[str], profile: GenerationProfile) -> Tuple[str, Dict[str, int]]:
+        response = await self._request("POST", f"{self.client['url']}:generateContent", json=self._body(prompt, system_prompt, profile))
+        try:
+            data = await response.json()
+        finally:
+            response.release()
+        return self._text(data), self._usage(data.get("usageMetadata"))
+
+    async def stream(self, prompt: str, system_prompt: Optional[str], profile: GenerationProfile) -> AsyncIterator[Tuple[str, Optional[Dict[str, int]]]]:
+        response = await self._request(
+            "POST",
+            f"{self.client['url']}:streamGenerateContent",
+            params={"alt": "sse"},
+            json=self._body(prompt, system_prompt, profile)
+        )
+        usage = None
+        try:
+            async for line in response.content:
+                line = line.strip()
+                if not line.startswith(b"data:"):
+                    continue
+                chunk = json.loads(line[5:])
+                # Cada evento traz o uso acumulado; vale o último
+                usage = chunk.get("usageMetadata", usage)
+                text = self._text(chunk)
+                if text:
+                    yield text, None
+        finally:
+            response.release()
+        yield "", self._usage(usage)
+
+    async def health_probe(self) -> bool:
+        response = await self._request("GET", self.client["url"])
+        response.release()
+        return True
+
+ADAPTER_TYPES: Dict[str, type] = {
+    "anthropic": AnthropicAdapter,
+    "openai": OpenAICompatibleAdapter,
+    "gemini": GeminiAdapter,
+}
+
+# Provedores padrão. api_key_setting/base_url_setting apontam para campos das settings;
+# LLM_PROVIDERS (JSON) pode sobrescrever campos, adicionar provedores ou desativá-los.
+DEFAULT_PROVIDERS: List[Dict[str, Any]] = [
+    {
+        "name": "openai",
+        "adapter": "openai",
+        "model": "gpt-4",
+        "classification": "general",
+        "api_key_setting": "OPENAI_API_KEY",
+        "base_url_setting": "OPENAI_BASE_URL",
+        "prompt_format": "system_message",
+        "prompt_prefix": "You are I-Neuro. Be super creative and follow these guidelines in all responses:\n\n"
+    },
+    {
+        "name": "anthropic",
+        "adapter": "anthropic",
+        "model": "claude-3-opus",
+        "classification": "analytical",
+        "api_key_setting": "ANTHROPIC_API_KEY",
+        "base_url_setting": "ANTHROPIC_BASE_URL",
+        "prompt_format": "system",
+        "prompt_prefix": "You are I-Neuro, a super creative virtual assistant! 🎨 Follow these guidelines strictly:\n\n",
+        "fallback": "openai"
+    },
+    {
+        "name": "gemini",
+        "adapter": "gemini",
+        "model": "gemini-1.5-pro",
+        "classification": "creative",
+        "api_key_setting": "GEMINI_API_KEY",
+        "base_url_setting": "GEMINI_BASE_URL",
+        "prompt_format": "inline",
+        "prompt_prefix": "Act as I-Neuro, being super creative and following these guidelines carefully:\n\n"
+    },
+    {
+        "name": "deepseek",
+        "adapter": "openai",
+        "model": "deepseek-chat",
+        "classification": "technical",
+        "api_key_setting": "DEEPSEEK_API_KEY",
+        "base_url_setting": "DEEPSEEK_BASE_URL",
+        "prompt_format": "system_message",
+        "prompt_prefix": "Embody I-Neuro and be super creative while following these guidelines:\n\n"
+    },
+]
+
+def _merge_configs(defaults: List[Dict[str, Any]], overrides: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Sobrescreve por nome, mantendo a ordem (que é a ordem de fallback)"""
+    merged = {config["name"]: dict(config) for config in defaults}
+    for override in overrides:
+        merged.setdefault(override["name"], {}).update(override)
+    return [config for config in merged.values() if config.get("enabled", True)]
+
+def _build_config(raw: Dict[str, Any]) -> ProviderConfig:
+    raw = dict(raw)
+    api_key_setting = raw.pop("api_key_setting", None)
+    base_url_setting = raw.pop("base_url_setting", None)
+    raw.pop("enabled", None)
+    if not raw.get("api_key") and api_key_setting:
+        raw["api_key"] = getattr(settings, api_key_setting, None) or os.getenv(api_key_setting, "")
+    if not raw.get("base_url") and base_url_setting:
+        raw["base_url"] = getattr(settings, base_url_setting, None) or os.getenv(base_url_setting, "")
+    if "capabilities" in raw:
+        raw["capabilities"] = tuple(raw["capabilities"])
+    if raw.get("prices"):
+        raw["prices"] = tuple(raw["prices"])
+    return ProviderConfig(**raw)
+
+class ProviderRegistry:
+    """Adaptadores de LLM carregados da configuração, na ordem de fallback"""
+
+    def __init__(self, configs: List[Dict[str, Any]]):
+        self.adapters: Dict[str, ProviderAdapter] = {}
+        for raw in configs:
+            try:
+                config = _build_config(raw)
+                adapter_type = ADAPTER_TYPES[config.adapter]
+            except (KeyError, TypeError) as e:
+                logger.error(f"Configuração de provedor inválida {raw.get('name')}: {str(e)}")
+                continue
+            self.adapters[config.name] = adapter_type(config)
+            if config.prices:
+                MODEL_PRICES[config.model] = config.prices
+
+    def get(self, name: str) -> Optional[ProviderAdapter]:
+        return self.adapters.get(name)
+
+    def names(self) -> List[str]:
+        return list(self.adapters)
+
+    def model_name(self, name: str) -> Optional[str]:
+        adapter = self.adapters.get(name)
+        return adapter.config.model if adapter else None
+
+    def prompt_instructions(self) -> Dict[str, Dict[str, str]]:
+        """Instruções de prompt por nome de modelo (usadas na tabela de system prompts do agente)"""
+        return {
+            adapter.config.model: {"format": adapter.config.prompt_format, "prefix": adapter.config.prompt_prefix}
+            for adapter in self.adapters.values()
+        }
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            name: {**adapter.config.to_dict(), "capabilities": sorted(adapter.capabilities), "limiter": adapter.limiter.snapshot()}
+            for name, adapter in self.adapters.items()
+        }
+
+def _load_configs() -> List[Dict[str, Any]]:
+    try:
+        return _merge_configs(DEFAULT_PROVIDERS, settings.get_llm_providers())
+    except (KeyError, TypeError, AttributeError) as e:
+        logger.error(f"Erro ao carregar LLM_PROVIDERS, usando provedores padrão: {str(e)}")
+        return _merge_configs(DEFAULT_PROVIDERS, [])
+
+# Instância global do registro de provedores de LLM
+provider_registry = ProviderRegistry(_load_configs())
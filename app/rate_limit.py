@@ -0,0 +1,210 @@
+from typing import Dict, Any, Optional, Deque
+from collections import deque
+from contextlib import asynccontextmanager
+import asyncio
+import time
+from .settings import get_settings
+from .logging_config import get_logger
+from .shared_state import shared_state
+from .metrics import PROVIDER_QUEUE_WAIT, PROVIDER_IN_FLIGHT, PROVIDER_CONCURRENCY_LIMIT, PROVIDER_RATE_LIMITED
+
+logger = get_logger(__name__)
+
+settings = get_settings()
+
+# Espera máxima honrada de um retry-after (segundos)
+MAX_RETRY_AFTER = 60.0
+
+class RateLimitTimeout(Exception):
+    """O limitador não liberou a chamada antes do prazo da fila"""
+
+    def __init__(self, provider: str, reason: str, waited: float):
+        super().__init__(f"Limite de taxa do {provider} ({reason}): {waited:.2f}s na fila")
+        self.provider = provider
+        self.reason = reason
+        self.waited = waited
+
+def is_rate_limit_error(error: Exception) -> bool:
+    """429 do provedor (SDKs e ProviderHTTPError expõem status_code)"""
+    return getattr(error, "status_code", None) == 429
+
+def retry_after_seconds(error: Exception) -> Optional[float]:
+    """Lê o retry-after do erro (atributo próprio ou header da resposta do SDK)"""
+    value = getattr(error, "retry_after", None)
+    if value is None:
+        headers = getattr(getattr(error, "response", None), "headers", None)
+        value = headers.get("retry-after") if headers is not None else None
+    try:
+        return min(float(value), MAX_RETRY_AFTER) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+class ProviderLimiter:
+    """
+    Limitador de um provedor: chamadas simultâneas com limite adaptativo (AIMD:
+    metade a cada 429, +1 a cada `limit` sucessos), pausa pelo retry-after e
+    cotas de requisições/tokens por minuto. As cotas usam contadores do estado
+    compartilhado, então valem para todos os workers.
+    """
+
+    def __init__(self, provider: str, max_in_flight: int = 16, rpm: int = 0, tpm: int = 0):
+        self.provider = provider
+        self.max_in_flight = max(1, max_in_flight)
+        self.limit = float(self.max_in_flight)
+        self.rpm = rpm
+        self.tpm = tpm
+        self.in_flight = 0
+        self.blocked_until = 0.0
+        self._last_decrease = 0.0
+        self._waiters: Deque[asyncio.Future] = deque()
+        PROVIDER_CONCURRENCY_LIMIT.set(self.limit, provider=provider)
+
+    @property
+    def saturated(self) -> bool:
+        """True se uma nova chamada teria que esperar"""
+        return self.in_flight >= int(self.limit) or time.monotonic() < self.blocked_until
+
+    @asynccontextmanager
+    async def slot(self, tokens: int = 0, timeout: Optional[float] = None):
+        await self.acquire(tokens, timeout)
+        try:
+            yield
+        finally:
+            self.release()
+
+    async def acquire(self, tokens: int = 0, timeout: Optional[float] = None):
+        """
+        Espera uma vaga e a cota do minuto. Levanta RateLimitTimeout se não
+        conseguir dentro de timeout segundos.
+        """
+        start = time.monotonic()
+        deadline = start + timeout if timeout is not None else None
+        try:
+            await self._wait_blocked(deadline, start)
+            await self._acquire_slot(deadline, start)
+            try:
+                await self._reserve_quota(tokens, deadline, start)
+            except BaseException:
+                self.release()
+                raise
+        except RateLimitTimeout as e:
+            PROVIDER_RATE_LIMITED.inc(provider=self.provider, reason=f"{e.reason}_timeout")
+            raise
+        finally:
+            PROVIDER_QUEUE_WAIT.observe(time.monotonic() - start, provider=self.provider)
+
+    def release(self):
+        self.in_flight -= 1
+        PROVIDER_IN_FLIGHT.set(self.in_flight, provider=self.provider)
+        self._wake_available()
+
+    def on_success(self):
+        """Aumento aditivo: +1 no limite a cada `limit` chamadas bem-sucedidas"""
+        if self.limit < self.max_in_flight:
+            self.limit = min(float(self.max_in_flight), self.limit + 1 / self.limit)
+            PROVIDER_CONCURRENCY_LIMIT.set(self.limit, provider=self.provider)
+            self._wake_available()
+
+    def on_rate_limited(self, retry_after: Optional[float] = None):
+        """Redução multiplicativa no 429 (uma vez por segundo) e pausa pelo retry-after"""
+        now = time.monotonic()
+        PROVIDER_RATE_LIMITED.inc(provider=self.provider, reason="429")
+        if now - self._last_decrease >= 1.0:
+            self.limit = max(1.0, self.limit / 2)
+            self._last_decrease = now
+            PROVIDER_CONCURRENCY_LIMIT.set(self.limit, provider=self.provider)
+        if retry_after:
+            self.blocked_until = max(self.blocked_until, now + retry_after)
+        logger.warning("provider_rate_limited", extra={
+            "provider": self.provider,
+            "limit": round(self.limit, 2),
+            "retry_after": retry_after
+        })
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "in_flight": self.in_flight,
+            "queued": len(self._waiters),
+            "limit": round(self.limit, 2),
+            "max_in_flight": self.max_in_flight,
+            "rpm": self.rpm,
+            "tpm": self.tpm,
+            "blocked_for_s": round(max(0.0, self.blocked_until - time.monotonic()), 2)
+        }
+
+    def _remaining(self, deadline: Optional[float]) -> Optional[float]:
+        return None if deadline is None else deadline - time.monotonic()
+
+    async def _wait_blocked(self, deadline: Optional[float], start: float):
+        delay = self.blocked_until - time.monotonic()
+        if delay <= 0:
+            return
+        remaining = self._remaining(deadline)
+        if remaining is not None and delay > remaining:
+            raise RateLimitTimeout(self.provider, "retry_after", time.monotonic() - start)
+        await asyncio.sleep(delay)
+
+    async def _acquire_slot(self, deadline: Optional[float], start: float):
+        while self.in_flight >= int(self.limit):
+            future = asyncio.get_running_loop().create_future()
+            self._waiters.append(future)
+            try:
+                remaining = self._remaining(deadline)
+                if remaining is not None and remaining <= 0:
+                    raise asyncio.TimeoutError
+                await asyncio.wait_for(future, remaining)
+            except BaseException as e:
+                if future.done() and not future.cancelled():
+                    # Acordado junto com o timeout/cancelamento: passa a vaga adiante
+                    self._wake_available()
+                if isinstance(e, asyncio.TimeoutError):
+                    raise RateLimitTimeout(self.provider, "concurrency", time.monotonic() - start) from None
+                raise
+            finally:
+                if future in self._waiters:
+                    self._waiters.remove(future)
+        self.in_flight += 1
+        PROVIDER_IN_FLIGHT.set(self.in_flight, provider=self.provider)
+
+    def _wake_available(self):
+        free = int(self.limit) - self.in_flight
+        for future in list(self._waiters):
+            if free <= 0:
+                break
+            if not future.done():
+                future.set_result(None)
+                free -= 1
+
+    async def _reserve_quota(self, tokens: int, deadline: Optional[float], start: float):
+        if not self.rpm and not self.tpm:
+            return
+        while True:
+            now = time.time()
+            reason = await self._try_reserve(int(now // 60), tokens)
+            if reason is None:
+                return
+            # Janela de um minuto cheia: espera a próxima
+            wait = 60 - now % 60
+            remaining = self._remaining(deadline)
+            if remaining is not None and wait > remaining:
+                raise RateLimitTimeout(self.provider, reason, time.monotonic() - start)
+            PROVIDER_RATE_LIMITED.inc(provider=self.provider, reason=reason)
+            await asyncio.sleep(wait)
+
+    async def _try_reserve(self, window: int, tokens: int) -> Optional[str]:
+        """Reserva 1 requisição e os tokens na janela; desfaz e retorna o motivo se estourar"""
+        rpm_key = f"ratelimit:{self.provider}:rpm:{window}"
+        tpm_key = f"ratelimit:{self.provider}:tpm:{window}"
+        if self.rpm:
+            if await shared_state.incr(rpm_key, 1, ttl=120) > self.rpm:
+                await shared_state.incr(rpm_key, -1)
+                return "rpm"
+        if self.tpm and tokens:
+            used = await shared_state.incr(tpm_key, tokens, ttl=120)
+            # Uma chamada maior que a cota inteira passa sozinha na janela
+            if used > self.tpm and used > tokens:
+                await shared_state.incr(tpm_key, -tokens)
+                if self.rpm:
+                    await shared_state.incr(rpm_key, -1)
+                return "tpm"
+        return None
@@ -4,24 +4,141 @@ import json
 from typing import Optional
 
 class Settings(BaseSettings):
+    # As credenciais têm default vazio para que os módulos possam ser importados
+    # (testes, benchmarks) sem ambiente configurado; a falta só aparece no uso.
+    
     # MegaAPI
-    MEGAAPI_TOKEN: str
-    MEGAAPI_INSTANCE_ID: str
-    MEGAAPI_HOST: str
+    MEGAAPI_TOKEN: str = ""
+    MEGAAPI_INSTANCE_ID: str = ""
+    MEGAAPI_HOST: str = ""
     
     # Supabase
-    SUPABASE_URL: str
-    SUPABASE_KEY: str
+    SUPABASE_URL: str = ""
+    SUPABASE_KEY: str = ""
     
     # LLM APIs
-    MISTRAL_API_KEY: str
-    OPENAI_API_KEY: str
-    GEMINI_API_KEY: str
-    DEEPSEEK_API_KEY: str
-    ANTHROPIC_API_KEY: str
+    MISTRAL_API_KEY: str = ""
+    OPENAI_API_KEY: str = ""
+    GEMINI_API_KEY: str = ""
+    DEEPSEEK_API_KEY: str = ""
+    ANTHROPIC_API_KEY: str = ""
+    
+    # Endpoints dos provedores (vazio = endpoint oficial; os benchmarks apontam para servidores falsos)
+    ANTHROPIC_BASE_URL: str = ""
+    OPENAI_BASE_URL: str = ""
+    DEEPSEEK_BASE_URL: str = "https://api.deepseek.com/v1"
+    GEMINI_BASE_URL: str = ""
+    MISTRAL_BASE_URL: str = "https://api.mistral.ai"
+    
+    # Conexões simultâneas do pool HTTP compartilhado (chamadas REST aos provedores)
+    HTTP_POOL_SIZE: int = 100
+    
+    # Provedores de LLM (JSON: [{"name": ..., "adapter": "anthropic|openai|gemini", "model": ..., ...}])
+    # Sobrescreve os provedores padrão pelo nome; {"name": ..., "enabled": false} remove um provedor
+    LLM_PROVIDERS: str = ""
+    
+    # Limitador por provedor (max_in_flight/rpm/tpm ficam em LLM_PROVIDERS): espera máxima na
+    # fila e, quando há outro provedor livre, espera antes de desviar a chamada para ele
+    RATE_LIMIT_QUEUE_TIMEOUT: float = 30.0
+    RATE_LIMIT_SPILLOVER_WAIT: float = 2.0
+    RATE_LIMIT_SPILLOVER: bool = True
+    
+    # WebSocket: mensagens pendentes por sessão, intervalo do ping da aplicação e tempo
+    # sem nenhuma mensagem do cliente (nem pong) até fechar a sessão
+    WS_MAX_PENDING: int = 8
+    WS_HEARTBEAT_INTERVAL: float = 20.0
+    WS_IDLE_TIMEOUT: float = 120.0
+    # Fila de envio por cliente (broadcasts além dela são descartados para o cliente) e
+    # prazo de um envio; um cliente que não recebe dentro do prazo é desconectado
+    WS_SEND_QUEUE: int = 64
+    WS_SEND_TIMEOUT: float = 5.0
+    
+    # Base de conhecimento (/base): diretório do índice, trechos de até KB_CHUNK_SIZE caracteres
+    # com KB_CHUNK_OVERLAP de sobreposição, leitura do upload em blocos de KB_READ_CHUNK_SIZE
+    # bytes, embeddings em lotes de KB_EMBED_BATCH em KB_EMBED_WORKERS processos (0 = threads)
+    KB_INDEX_PATH: str = "data/knowledge"
+    KB_CHUNK_SIZE: int = 1000
+    KB_CHUNK_OVERLAP: int = 150
+    KB_READ_CHUNK_SIZE: int = 1024 * 1024
+    KB_MAX_FILE_MB: int = 50
+    KB_EMBEDDING_DIM: int = 384
+    KB_EMBED_BATCH: int = 64
+    KB_EMBED_WORKERS: int = 2
+    KB_PROGRESS_HISTORY: int = 100
+    # Busca: matriz de vetores em float32 ou float16 (metade do disco e da memória), busca
+    # exata até KB_IVF_MIN_CHUNKS trechos e aproximada (IVF, KB_IVF_NPROBE grupos) acima disso;
+    # até KB_TOP_K trechos com score >= KB_MIN_SCORE entram no prompt, limitados a KB_CONTEXT_TOKENS
+    KB_VECTOR_DTYPE: str = "float32"
+    KB_IVF_MIN_CHUNKS: int = 20000
+    KB_IVF_NPROBE: int = 8
+    KB_TOP_K: int = 4
+    KB_MIN_SCORE: float = 0.2
+    KB_CONTEXT_TOKENS: int = 1200
+    # Busca híbrida: os KB_CANDIDATES melhores do índice vetorial e do BM25 (códigos, SKUs,
+    # nomes próprios) são fundidos por reciprocal rank fusion com constante KB_RRF_K
+    KB_HYBRID_SEARCH: bool = True
+    KB_CANDIDATES: int = 20
+    KB_RRF_K: int = 60
+    # Reingestão: trechos iguais (mesmo hash) são reaproveitados e os vetores ficam num cache
+    # persistente; o índice é compactado quando os trechos sem documento passam de KB_COMPACT_RATIO
+    KB_EMBED_CACHE: bool = True
+    KB_COMPACT_RATIO: float = 0.5
     
     # MCP
-    MCP_SERVERS: str
+    MCP_SERVERS: str = "[]"
+    # Prazo de cada chamada de ferramenta (segundos) e chamadas simultâneas por servidor
+    MCP_TOOL_TIMEOUT: float = 15.0
+    MCP_MAX_CALLS_PER_SERVER: int = 4
+    # Catálogo de ferramentas (list_tools) válido por MCP_CATALOG_TTL segundos, renovado em segundo plano
+    MCP_CATALOG_TTL: float = 300.0
+    MCP_DISCOVERY_TIMEOUT: float = 10.0
+    # Cache de resultados de ferramentas: TTL (s) por nome de ferramenta (aceita curingas) e
+    # tamanho máximo do LRU; ferramentas sem TTL (ou com 0) não são cacheadas
+    MCP_TOOL_CACHE_TTLS: str = '{"*search*": 120, "*busca*": 120}'
+    MCP_TOOL_CACHE_SIZE: int = 512
+    # Sessões SSE persistentes: ping a cada MCP_PING_INTERVAL s, prazo do handshake/ping,
+    # reconexão com backoff exponencial (MCP_RECONNECT_BACKOFF * 2^n, até o máximo) e espera
+    # de até MCP_WARMUP_TIMEOUT s no startup pelas conexões
+    MCP_PING_INTERVAL: float = 30.0
+    MCP_PING_TIMEOUT: float = 5.0
+    MCP_CONNECT_TIMEOUT: float = 10.0
+    MCP_RECONNECT_BACKOFF: float = 1.0
+    MCP_RECONNECT_BACKOFF_MAX: float = 60.0
+    MCP_WARMUP_TIMEOUT: float = 5.0
+    # Function calling nativo: o provedor escolhido recebe os schemas das ferramentas e decide,
+    # na mesma conversa, quais chamar (até MCP_TOOL_MAX_ROUNDS rodadas) e a resposta final.
+    # Cada saída de ferramenta volta ao modelo cortada em ~MCP_TOOL_OUTPUT_TOKENS tokens
+    MCP_NATIVE_TOOLS: bool = True
+    MCP_TOOL_MAX_ROUNDS: int = 3
+    MCP_TOOL_OUTPUT_TOKENS: int = 1500
+    
+    # Pre-warm no startup ("all" ou lista separada por vírgulas: openai,anthropic,gemini,mistral)
+    PREWARM_PROVIDERS: str = ""
+    PREWARM_CONNECTIONS: bool = False
+    
+    # Geração (JSON: {"canal": {"classe": {"max_tokens": ..., "temperature": ..., "stop_sequences": [...]}}})
+    GENERATION_PROFILES: str = ""
+    PROMPT_CACHE_ENABLED: bool = True
+    
+    # Logging (LOG_FORMAT "rich" só vale em ENVIRONMENT=development)
+    LOG_LEVEL: str = "INFO"
+    LOG_FORMAT: str = "json"
+    LOG_SAMPLE_RATE: float = 1.0
+    LOG_QUEUE_SIZE: int = 10000
+    
+    # Tracing (TRACE_EXPORT_FORMAT: "jsonl" ou "otlp"; 0.0 desliga a amostragem)
+    TRACE_SAMPLE_RATE: float = 0.0
+    TRACE_EXPORT_PATH: str = "traces.jsonl"
+    TRACE_EXPORT_FORMAT: str = "jsonl"
+    
+    # Estado compartilhado entre workers ("" = em memória; "redis://host:6379/0" para vários workers)
+    SHARED_STATE_URL: str = ""
+    WEB_CONCURRENCY: int = 1
+    PORT: int = 8000
+    PROVIDER_HEALTH_TTL: int = 300
+    # Intervalo (s) em que os provedores marcados como indisponíveis são testados de novo
+    PROVIDER_HEALTH_INTERVAL: float = 60.0
+    WEBHOOK_DEDUP_TTL: int = 600
     
     # General
     ENVIRONMENT: str = "development"
@@ -35,6 +152,40 @@ class Settings(BaseSettings):
             return json.loads(self.MCP_SERVERS)
         except json.JSONDecodeError:
             return []
+    
+    def get_mcp_tool_cache_ttls(self):
+        """Parse MCP_TOOL_CACHE_TTLS into {padrão do nome da ferramenta: segundos}"""
+        try:
+            return {str(pattern): float(ttl) for pattern, ttl in json.loads(self.MCP_TOOL_CACHE_TTLS).items()}
+        except (json.JSONDecodeError, AttributeError, TypeError, ValueError):
+            return {}
+    
+    def get_prewarm_providers(self):
+        """Parse PREWARM_PROVIDERS into a list of provider names (None = all)"""
+        value = self.PREWARM_PROVIDERS.strip()
+        if not value:
+            return []
+        if value == "all":
+            return None
+        return [name.strip() for name in value.split(",") if name.strip()]
+    
+    def get_llm_providers(self):
+        """Parse LLM_PROVIDERS string into a list of provider overrides"""
+        if not self.LLM_PROVIDERS:
+            return []
+        try:
+            return json.loads(self.LLM_PROVIDERS)
+        except json.JSONDecodeError:
+            return []
+    
+    def get_generation_profiles(self):
+        """Parse GENERATION_PROFILES string into a dictionary of overrides"""
+        if not self.GENERATION_PROFILES:
+            return {}
+        try:
+            return json.loads(self.GENERATION_PROFILES)
+        except json.JSONDecodeError:
+            return {}
 
 @lru_cache()
 def get_settings():
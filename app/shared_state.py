@@ -0,0 +1,229 @@
+from typing import Dict, Any, Optional, List, Callable, Awaitable
+from abc import ABC, abstractmethod
+from collections import defaultdict
+import asyncio
+import json
+import os
+import socket
+import time
+from .settings import get_settings
+from .logging_config import get_logger
+
+logger = get_logger(__name__)
+
+settings = get_settings()
+
+# Identifica o worker nas mensagens de pub/sub (para ignorar os próprios eventos)
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+Handler = Callable[[Dict[str, Any]], Awaitable[None]]
+
+class SharedState(ABC):
+    """
+    Estado compartilhado entre workers: chaves com TTL (saúde dos provedores,
+    caches, deduplicação), contadores (rate limits) e pub/sub (broadcast de
+    WebSocket). Valores são serializados em JSON.
+    """
+
+    def __init__(self):
+        self.handlers: Dict[str, List[Handler]] = defaultdict(list)
+
+    async def start(self):
+        pass
+
+    async def close(self):
+        pass
+
+    @abstractmethod
+    async def get(self, key: str) -> Optional[Any]:
+        ...
+
+    @abstractmethod
+    async def get_many(self, keys: List[str]) -> Dict[str, Any]:
+        """Retorna apenas as chaves existentes"""
+        ...
+
+    @abstractmethod
+    async def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        ...
+
+    @abstractmethod
+    async def set_if_absent(self, key: str, value: Any, ttl: Optional[float] = None) -> bool:
+        """Grava apenas se a chave não existir; retorna True se gravou"""
+        ...
+
+    @abstractmethod
+    async def delete(self, key: str):
+        ...
+
+    @abstractmethod
+    async def incr(self, key: str, amount: int = 1, ttl: Optional[float] = None) -> int:
+        """Incrementa um contador; o TTL é aplicado quando o contador é criado"""
+        ...
+
+    @abstractmethod
+    async def publish(self, channel: str, message: Dict[str, Any]):
+        ...
+
+    def subscribe(self, channel: str, handler: Handler):
+        """Registra um handler para as mensagens do canal (inclusive as do próprio worker)"""
+        self.handlers[channel].append(handler)
+
+    async def _dispatch(self, channel: str, message: Dict[str, Any]):
+        for handler in list(self.handlers.get(channel, [])):
+            try:
+                await handler(message)
+            except Exception as e:
+                logger.error(f"Erro no handler do canal {channel}: {str(e)}")
+
+class InMemorySharedState(SharedState):
+    """Implementação em processo: correta apenas com um worker"""
+
+    def __init__(self):
+        super().__init__()
+        self._data: Dict[str, Any] = {}
+        self._expires: Dict[str, float] = {}
+
+    def _alive(self, key: str) -> bool:
+        expires = self._expires.get(key)
+        if expires is not None and expires <= time.monotonic():
+            self._data.pop(key, None)
+            self._expires.pop(key, None)
+        return key in self._data
+
+    def _store(self, key: str, value: Any, ttl: Optional[float]):
+        self._data[key] = value
+        if ttl:
+            self._expires[key] = time.monotonic() + ttl
+        else:
+            self._expires.pop(key, None)
+
+    async def get(self, key: str) -> Optional[Any]:
+        return self._data[key] if self._alive(key) else None
+
+    async def get_many(self, keys: List[str]) -> Dict[str, Any]:
+        return {key: self._data[key] for key in keys if self._alive(key)}
+
+    async def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        self._store(key, value, ttl)
+
+    async def set_if_absent(self, key: str, value: Any, ttl: Optional[float] = None) -> bool:
+        if self._alive(key):
+            return False
+        self._store(key, value, ttl)
+        return True
+
+    async def delete(self, key: str):
+        self._data.pop(key, None)
+        self._expires.pop(key, None)
+
+    async def incr(self, key: str, amount: int = 1, ttl: Optional[float] = None) -> int:
+        if not self._alive(key):
+            self._store(key, 0, ttl)
+        self._data[key] += amount
+        return self._data[key]
+
+    async def publish(self, channel: str, message: Dict[str, Any]):
+        await self._dispatch(channel, message)
+
+class RedisSharedState(SharedState):
+    """Implementação sobre Redis (ou compatível), compartilhada entre workers e hosts"""
+
+    def __init__(self, url: str, prefix: str = "ineuro:"):
+        super().__init__()
+        # Importado sob demanda: o redis só é necessário neste backend
+        import redis.asyncio as redis
+
+        self.url = url
+        self.prefix = prefix
+        self.client = redis.from_url(url, decode_responses=True)
+        self._pubsub = None
+        self._listener: Optional[asyncio.Task] = None
+
+    def _key(self, key: str) -> str:
+        return f"{self.prefix}{key}"
+
+    async def start(self):
+        if self._pubsub is not None:
+            return
+        self._pubsub = self.client.pubsub()
+        if self.handlers:
+            await self._pubsub.subscribe(*(self._key(channel) for channel in self.handlers))
+        self._listener = asyncio.create_task(self._listen())
+
+    async def close(self):
+        if self._listener:
+            self._listener.cancel()
+            self._listener = None
+        if self._pubsub is not None:
+            await self._pubsub.aclose()
+            self._pubsub = None
+        await self.client.aclose()
+
+    async def _listen(self):
+        while True:
+            try:
+                if not self._pubsub.subscribed:
+                    # Sem canais inscritos o listen() retornaria na hora
+                    await asyncio.sleep(1)
+                    continue
+                async for message in self._pubsub.listen():
+                    if message.get("type") != "message":
+                        continue
+                    channel = message["channel"][len(self.prefix):]
+                    await self._dispatch(channel, json.loads(message["data"]))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Erro no pub/sub do Redis: {str(e)}")
+                await asyncio.sleep(1)
+
+    def subscribe(self, channel: str, handler: Handler):
+        new_channel = channel not in self.handlers
+        super().subscribe(channel, handler)
+        if new_channel and self._pubsub is not None:
+            asyncio.get_running_loop().create_task(self._pubsub.subscribe(self._key(channel)))
+
+    async def get(self, key: str) -> Optional[Any]:
+        value = await self.client.get(self._key(key))
+        return json.loads(value) if value is not None else None
+
+    async def get_many(self, keys: List[str]) -> Dict[str, Any]:
+        if not keys:
+            return {}
+        values = await self.client.mget([self._key(key) for key in keys])
+        return {key: json.loads(value) for key, value in zip(keys, values) if value is not None}
+
+    async def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        await self.client.set(self._key(key), json.dumps(value), px=int(ttl * 1000) if ttl else None)
+
+    async def set_if_absent(self, key: str, value: Any, ttl: Optional[float] = None) -> bool:
+        return bool(await self.client.set(self._key(key), json.dumps(value), px=int(ttl * 1000) if ttl else None, nx=True))
+
+    async def delete(self, key: str):
+        await self.client.delete(self._key(key))
+
+    async def incr(self, key: str, amount: int = 1, ttl: Optional[float] = None) -> int:
+        pipe = self.client.pipeline()
+        pipe.incrby(self._key(key), amount)
+        if ttl:
+            # NX: o TTL só é definido na criação, como no backend em memória
+            pipe.pexpire(self._key(key), int(ttl * 1000), nx=True)
+        result = await pipe.execute()
+        return int(result[0])
+
+    async def publish(self, channel: str, message: Dict[str, Any]):
+        await self.client.publish(self._key(channel), json.dumps(message, ensure_ascii=False, default=str))
+
+def create_shared_state(url: str) -> SharedState:
+    """Cria o backend a partir de SHARED_STATE_URL ("" ou memory:// = em processo)"""
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisSharedState(url)
+    if url and not url.startswith("memory://"):
+        raise ValueError(f"SHARED_STATE_URL não suportada: {url}")
+    if settings.WEB_CONCURRENCY > 1:
+        logger.warning("Estado em memória com mais de um worker: saúde dos provedores e broadcast não serão compartilhados")
+    return InMemorySharedState()
+
+# Instância global do estado compartilhado
+shared_state = create_shared_state(settings.SHARED_STATE_URL)
@@ -157,6 +157,15 @@ function connectWebSocket() {
     ws.onmessage = (event) => {
         try {
             const data = JSON.parse(event.data);
+            // Heartbeat do servidor: responde e não mostra nada
+            if (data.type === 'ping') {
+                ws.send(JSON.stringify({ type: 'pong' }));
+                return;
+            }
+            if (data.type === 'stopped') {
+                hideThinkingIndicator();
+                return;
+            }
             console.log("Recebido do servidor:", data);
             handleMessage(data);
         } catch (error) {
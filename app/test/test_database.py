@@ -0,0 +1,45 @@
+from app.database import DatabaseClient
+from app.http_pool import http_pool
+from benchmarks.fake_servers import FakeServices, FakeServer
+import asyncio
+import sys
+import os
+import pytest
+
+# Adiciona o diretório raiz ao PYTHONPATH
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+
+def _client(base_url: str) -> DatabaseClient:
+    client = DatabaseClient()
+    client.supabase_url = base_url
+    client.supabase_key = "fake-key"
+    return client
+
+@pytest.mark.asyncio
+async def test_first_turn_steps_create_a_single_conversation():
+    async with FakeServer(FakeServices()) as fake:
+        db = _client(fake.base_url)
+        # Passos paralelos do primeiro turno de um usuário novo
+        saved, _, history = await asyncio.gather(
+            db.add_message_to_conversation(sender_id="5511999990000", message="Olá", is_user=True),
+            db.get_or_create_conversation("5511999990000"),
+            db.get_conversation_history("5511999990000", limit=5)
+        )
+        rows = fake.services.tables["conversations"]
+        assert len(rows) == 1
+        assert [msg["message"] for msg in saved["content"]["messages"]] == ["Olá"]
+        await http_pool.close()
+
+@pytest.mark.asyncio
+async def test_context_update_keeps_concurrent_messages():
+    async with FakeServer(FakeServices()) as fake:
+        db = _client(fake.base_url)
+        await db.add_message_to_conversation(sender_id="web_user", message="primeira", is_user=True)
+        await asyncio.gather(
+            db.update_conversation_context("web_user", {"active_topic": {"summary": "teste"}}),
+            db.add_message_to_conversation(sender_id="web_user", message="segunda", is_user=True)
+        )
+        conversation = await db.get_or_create_conversation("web_user")
+        assert [msg["message"] for msg in conversation["content"]["messages"]] == ["primeira", "segunda"]
+        assert conversation["content"]["context"]["active_topic"] == {"summary": "teste"}
+        await http_pool.close()
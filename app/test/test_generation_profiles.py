@@ -0,0 +1,55 @@
+from app.generation_profiles import GenerationProfileRegistry
+import sys
+import os
+
+# Adiciona o diretório raiz ao PYTHONPATH
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+
+def test_resolve_profiles():
+    registry = GenerationProfileRegistry()
+
+    # WhatsApp usa limites menores que a web para a mesma classe
+    assert registry.resolve("whatsapp", "complexa").max_tokens < registry.resolve("web", "complexa").max_tokens
+
+    # Classe desconhecida cai no default do canal
+    assert registry.resolve("whatsapp", "desconhecida").name == "whatsapp:default"
+
+    # Canal desconhecido cai no default da web
+    assert registry.resolve("telegram", None).name == "web:default"
+
+def test_overrides_and_stats():
+    registry = GenerationProfileRegistry({
+        "whatsapp": {"simples": {"max_tokens": 120, "stop_sequences": ["\n\n\n"]}}
+    })
+
+    profile = registry.resolve("whatsapp", "simples")
+    assert profile.max_tokens == 120
+    assert profile.stop_sequences == ("\n\n\n",)
+
+    registry.record(profile, 0.2)
+    registry.record(profile, 0.4, success=False)
+
+    latency = registry.snapshot()["whatsapp:simples"]["latency"]
+    assert latency["count"] == 2
+    assert latency["errors"] == 1
+    assert latency["max_ms"] == 400.0
+
+def test_override_adding_class_or_channel_inherits_defaults():
+    registry = GenerationProfileRegistry({
+        "whatsapp": {"saudacao": {"temperature": 0.2}},
+        "telegram": {"default": {"stop_sequences": ["FIM"]}},
+        "web": {"quebrado": {"max_tokens": "muitos"}}
+    })
+
+    # Classe nova sem max_tokens herda do default do canal
+    profile = registry.resolve("whatsapp", "saudacao")
+    assert profile.name == "whatsapp:saudacao"
+    assert profile.max_tokens == registry.resolve("whatsapp", None).max_tokens
+    assert profile.temperature == 0.2
+
+    # Canal novo herda do default da web
+    assert registry.resolve("telegram", None).max_tokens == registry.resolve("web", None).max_tokens
+    assert registry.resolve("telegram", None).stop_sequences == ("FIM",)
+
+    # Perfil inválido é ignorado sem derrubar o carregamento
+    assert registry.resolve("web", "quebrado").name == "web:default"
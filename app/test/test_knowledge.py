@@ -0,0 +1,312 @@
+from app.knowledge import chunk_text, chunk_hash, extract_text, embed_batch, Embedder, EmbeddingCache, KnowledgeIndex, KnowledgeIngestor, UnsupportedDocument
+from starlette.datastructures import UploadFile
+import io
+import zipfile
+import sys
+import os
+import numpy as np
+import pytest
+
+# Adiciona o diretório raiz ao PYTHONPATH
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+
+MANUAL = "\n\n".join(
+    f"Seção {i}. O produto SKU-{1000 + i} deve ser limpo com pano úmido. "
+    f"Em caso de defeito, a garantia cobre a troca em até {i + 30} dias úteis."
+    for i in range(40)
+)
+
+FAQ = "\n\n".join([
+    "Entrega: os pedidos são enviados pelos Correios e chegam em até cinco dias úteis nas capitais.",
+    "Pagamento: aceitamos cartão de crédito em até doze vezes, boleto bancário e Pix com desconto.",
+    "Garantia: todos os aparelhos têm garantia de doze meses contra defeitos de fabricação; a troca é feita na assistência técnica autorizada.",
+    "Limpeza: use apenas pano macio levemente umedecido, sem álcool ou produtos abrasivos.",
+    "Cancelamento: o pedido pode ser cancelado sem custo enquanto não for despachado.",
+] * 3)
+
+def _upload(name: str, data: bytes) -> UploadFile:
+    return UploadFile(io.BytesIO(data), filename=name)
+
+def _ingestor(tmp_path, workers: int = 0, dim: int = 64) -> KnowledgeIngestor:
+    ingestor = KnowledgeIngestor(KnowledgeIndex(str(tmp_path / "kb"), dim), Embedder(dim=dim, batch_size=8, workers=workers))
+    ingestor.read_chunk_size = 1024
+    ingestor.chunk_size = 300
+    ingestor.chunk_overlap = 50
+    return ingestor
+
+def test_chunks_respect_size_and_overlap():
+    chunks = chunk_text(MANUAL, chunk_size=300, overlap=50)
+    assert len(chunks) > 5
+    assert all(len(chunk) <= 301 for chunk in chunks)
+    # Todas as seções aparecem em algum trecho, e trechos vizinhos se sobrepõem
+    assert all(any(f"SKU-{1000 + i} " in chunk for chunk in chunks) for i in range(40))
+    assert chunks[1].split()[0] in chunks[0]
+
+    # Um parágrafo sem quebras maior que o trecho é dividido em palavras
+    long_chunks = chunk_text("palavra " * 500, chunk_size=200, overlap=0)
+    assert all(len(chunk) <= 200 for chunk in long_chunks)
+    assert sum(len(chunk.split()) for chunk in long_chunks) == 500
+
+def test_docx_and_plain_extraction(tmp_path):
+    path = tmp_path / "manual.docx"
+    body = "".join(f'<w:p><w:r><w:t>{text}</w:t></w:r></w:p>' for text in ("Título", "Garantia de 90 dias"))
+    with zipfile.ZipFile(path, "w") as archive:
+        archive.writestr("word/document.xml", f'<w:document xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main"><w:body>{body}</w:body></w:document>')
+    assert extract_text(str(path), "manual.docx") == "Título\n\nGarantia de 90 dias"
+
+    latin = tmp_path / "notas.txt"
+    latin.write_bytes("Atenção ao prazo".encode("cp1252"))
+    assert extract_text(str(latin), "notas.txt") == "Atenção ao prazo"
+
+    with pytest.raises(UnsupportedDocument):
+        extract_text(str(latin), "planilha.xlsx")
+
+def test_hashing_embeddings_are_normalised_and_accent_insensitive():
+    vectors = embed_batch(["Garantia e devolução", "garantia e devolucao", "receita de bolo de cenoura"], 128)
+    assert vectors.dtype == np.float32
+    assert np.allclose(np.linalg.norm(vectors, axis=1), 1.0, atol=1e-5)
+    assert vectors[0] @ vectors[1] == pytest.approx(1.0, abs=1e-5)
+    assert vectors[0] @ vectors[2] < 0.5
+
+@pytest.mark.asyncio
+async def test_ingest_streams_file_into_index(tmp_path):
+    ingestor = _ingestor(tmp_path, workers=1)
+    try:
+        jobs = await ingestor.ingest_files([
+            _upload("manual.md", MANUAL.encode("utf-8")),
+            _upload("foto.png", b"\x89PNG"),
+        ])
+    finally:
+        ingestor.embedder.close()
+    manual, image = jobs
+    assert manual.status == "done", manual.error
+    assert manual.bytes_read == len(MANUAL.encode("utf-8"))
+    assert manual.embedded == manual.chunks > 5
+    assert set(manual.stages_ms) == {"read", "extract", "embed", "index"}
+    assert image.status == "error" and "não suportado" in image.error
+
+    # O índice em disco tem um vetor por trecho, e reabre com o mesmo conteúdo
+    reopened = KnowledgeIndex(str(tmp_path / "kb"), 64)
+    assert reopened.stats()["chunks"] == manual.chunks
+    assert reopened.find("manual.md")["chunks"] == manual.chunks
+    assert os.path.getsize(tmp_path / "kb" / "vectors.f32") == manual.chunks * 64 * 4
+    assert ingestor.snapshot()["files"][0]["status"] == "done"
+
+@pytest.mark.asyncio
+async def test_reupload_skips_unchanged_and_rejects_large_files(tmp_path):
+    ingestor = _ingestor(tmp_path)
+    first = await ingestor.ingest(_upload("manual.txt", MANUAL.encode("utf-8")))
+    again = await ingestor.ingest(_upload("manual.txt", MANUAL.encode("utf-8")))
+    assert again.status == "unchanged" and again.chunks == first.chunks
+    assert ingestor.index.stats()["chunks"] == first.chunks
+
+    ingestor.max_file_bytes = 2048
+    large = await ingestor.ingest(_upload("grande.txt", b"a" * 5000))
+    assert large.status == "error" and "limite" in large.error
+    assert large.bytes_read <= 2048 + ingestor.read_chunk_size
+    assert ingestor.index.find("grande.txt") is None
+
+def _random_unit(count: int, dim: int, seed: int = 0) -> np.ndarray:
+    vectors = np.random.default_rng(seed).standard_normal((count, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+def _add(index: KnowledgeIndex, filename: str, vectors: np.ndarray, sha: str = "0" * 64, prefix: str = ""):
+    texts = [f"{prefix}{filename} trecho {i}" for i in range(len(vectors))]
+    hashes = [chunk_hash(text) for text in texts]
+    return index.add_document(filename, sha, texts, hashes, dict(zip(hashes, vectors)))
+
+@pytest.mark.parametrize("dtype", ["float32", "float16"])
+def test_exact_search_over_memory_mapped_matrix(tmp_path, dtype):
+    vectors = _random_unit(500, 32)
+    index = KnowledgeIndex(str(tmp_path), 32, dtype=dtype, compact_ratio=1.0)
+    _add(index, "a.md", vectors[:300])
+    _add(index, "b.md", vectors[300:])
+
+    hits = index.search(vectors[420], 3)
+    assert hits[0][0] == 420 and hits[0][1] == pytest.approx(1.0, abs=1e-2)
+    assert [score for _, score in hits] == sorted((score for _, score in hits), reverse=True)
+    row = index.chunks([420])[0]
+    assert row["filename"] == "b.md" and row["text"] == "b.md trecho 120"
+
+    # Reabre do disco (memmap) e a versão nova de a.md tira a antiga das buscas
+    reopened = KnowledgeIndex(str(tmp_path), 32, dtype=dtype, compact_ratio=1.0)
+    _add(reopened, "a.md", vectors[:10], sha="1" * 64, prefix="v2 ")
+    assert reopened.search(vectors[100], 1)[0][0] != 100
+    assert reopened.search(vectors[5], 1)[0][0] == 500 + 5
+    assert reopened.stats()["active_chunks"] == 210
+    assert os.path.getsize(tmp_path / f"vectors.{dtype[0]}{dtype[-2:]}") == 510 * 32 * np.dtype(dtype).itemsize
+
+def test_ivf_is_built_once_and_extended_on_append(tmp_path):
+    # Vetores agrupados em torno de 20 centros, como trechos de documentos sobre poucos assuntos
+    centers = _random_unit(20, 32, seed=1)
+    rng = np.random.default_rng(2)
+    vectors = centers[rng.integers(0, 20, 3000)] + rng.normal(0, 0.15, (3000, 32)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+
+    index = KnowledgeIndex(str(tmp_path), 32, ivf_min_chunks=2000, nprobe=4)
+    _add(index, "a.md", vectors[:2500])
+    assert index.stats()["search"] == "ivf"
+    centroids = np.load(tmp_path / "ivf_centroids.npy")
+
+    _add(index, "b.md", vectors[2500:])
+    assert np.array_equal(np.load(tmp_path / "ivf_centroids.npy"), centroids)
+    assert len(np.fromfile(tmp_path / "ivf_assign.i32", dtype=np.int32)) == 3000
+
+    # Recall@10 do IVF contra a busca exata, inclusive para os vetores acrescentados
+    queries = vectors[2900:3000]
+    exact = vectors @ queries.T
+    recall = []
+    for q, query in enumerate(queries):
+        truth = set(np.argsort(-exact[:, q])[:10])
+        recall.append(len(truth & {chunk_id for chunk_id, _ in index.search(query, 10)}) / 10)
+    assert np.mean(recall) >= 0.9
+
+    reopened = KnowledgeIndex(str(tmp_path), 32, ivf_min_chunks=2000, nprobe=4)
+    assert reopened.search(vectors[2950], 1)[0][0] == 2950
+    assert reopened.stats()["search"] == "ivf"
+
+@pytest.mark.asyncio
+async def test_retrieved_passages_go_into_the_prompt_within_budget(tmp_path, monkeypatch):
+    import app.agent as agent_module
+    from app.knowledge import KnowledgeRetriever
+    from app.llm_router import llm_router
+
+    ingestor = _ingestor(tmp_path, dim=384)
+    ingestor.chunk_size = 160
+    ingestor.chunk_overlap = 0
+    await ingestor.ingest(_upload("faq.md", FAQ.encode("utf-8")))
+    retriever = KnowledgeRetriever(ingestor.index, top_k=3, min_score=0.1, token_budget=60)
+
+    passages = await retriever.retrieve("Qual é a garantia dos aparelhos?")
+    assert passages and passages[0].text.startswith("Garantia")
+    context = retriever.format_context(passages)
+    assert context.startswith("[1] (faq.md) Garantia")
+    assert len(context) // 4 <= 60
+
+    captured = {}
+
+    async def generate_response(**kwargs):
+        captured.update(kwargs)
+        return {"response": "ok", "llm": "openai", "model": "gpt-4", "metadata": {}}
+
+    monkeypatch.setattr(agent_module, "knowledge_retriever", retriever)
+    monkeypatch.setattr(llm_router, "generate_response", generate_response)
+    response = await agent_module.ineuro_agent.process_message("Qual é a garantia dos aparelhos?")
+    assert "doze meses" in captured["knowledge"]
+    assert response["metadata"]["knowledge_passages"][0]["filename"] == "faq.md"
+    prompt = llm_router._build_user_prompt("pergunta", "histórico", captured["knowledge"])
+    assert prompt.index("base de conhecimento") < prompt.index("Contexto anterior") < prompt.index("Mensagem atual")
+
+    # Base vazia: nenhuma busca
+    empty = KnowledgeRetriever(KnowledgeIndex(str(tmp_path / "vazia"), 64))
+    assert await empty.retrieve("garantia") == []
+
+def test_bm25_matches_codes_and_ignores_accents_and_plurals(tmp_path):
+    from app.knowledge import LexicalIndex
+    texts = [
+        "A válvula SKU-1007 tem garantia de doze meses.",
+        "A válvula SKU-1008 é vendida em Ribeirão Preto.",
+        "Informações sobre garantias e devoluções.",
+        "Receita de pão de queijo mineiro.",
+    ]
+    lexical = LexicalIndex(str(tmp_path))
+    lexical.add(texts[:2])
+    lexical.add(texts[2:])
+
+    assert lexical.search("sku-1007", 3)[0][0] == 0
+    assert lexical.search("1008", 3)[0][0] == 1
+    assert lexical.search("ribeirao preto", 3)[0][0] == 1
+    assert {chunk_id for chunk_id, _ in lexical.search("garantia", 3)} == {0, 2}
+    assert lexical.search("devolucao", 3)[0][0] == 2
+    assert lexical.search("de que", 3) == []
+    # Trechos removidos (máscara do KnowledgeIndex) saem do resultado
+    assert lexical.search("sku-1007", 3, active=np.array([False, True, True, True]))[0][0] != 0
+
+    # Acréscimos sucessivos dão o mesmo índice que um único lote, e o índice salvo reabre igual
+    single = LexicalIndex()
+    single.add(texts)
+    assert np.array_equal(single.doc_ids, lexical.doc_ids) and np.array_equal(single.tfs, lexical.tfs)
+    lexical.save()
+    assert LexicalIndex(str(tmp_path)).search("sku-1007", 1) == lexical.search("sku-1007", 1)
+
+def test_reciprocal_rank_fusion_rewards_agreement():
+    from app.knowledge import reciprocal_rank_fusion
+    fused = reciprocal_rank_fusion([[1, 2, 3], [3, 4]], k=60)
+    assert fused[0][0] == 3
+    assert [chunk_id for chunk_id, _ in fused] == [3, 1, 2, 4]
+
+@pytest.mark.asyncio
+async def test_hybrid_search_ranks_exact_codes_first(tmp_path):
+    from app.knowledge import KnowledgeRetriever
+    ingestor = _ingestor(tmp_path, dim=384)
+    ingestor.chunk_size = 120
+    ingestor.chunk_overlap = 0
+    await ingestor.ingest(_upload("catalogo.md", MANUAL.encode("utf-8")))
+
+    hybrid = KnowledgeRetriever(ingestor.index, top_k=1, min_score=0.0)
+    query = "SKU-1023"
+    assert "SKU-1023" in hybrid.search(query)[0].text
+    assert hybrid.search(query)[0].lexical_score > 0
+
+    # O índice lexical é reconstruído dos trechos se faltar no disco (índices anteriores a ele)
+    for name in ("lexical.npz", "lexical_terms.json"):
+        os.remove(tmp_path / "kb" / name)
+    reopened = KnowledgeRetriever(KnowledgeIndex(str(tmp_path / "kb"), 384), top_k=1, min_score=0.0)
+    assert "SKU-1023" in reopened.search(query)[0].text
+
+def test_knowledge_benchmark_reports_latency():
+    from benchmarks.knowledge import build_parser, run
+    report = run(build_parser().parse_args(["--chunks", "3000", "--queries", "50", "--hybrid", "--dim", "64"]))
+    assert report["bm25_sku_top1"] == 1.0
+    assert report["bm25"]["queries"] == 50
+    assert report["hybrid"]["p95_ms"] < 50
+
+@pytest.mark.asyncio
+async def test_reingest_embeds_only_changed_chunks(tmp_path):
+    ingestor = _ingestor(tmp_path, dim=384)
+    ingestor.cache = EmbeddingCache(str(tmp_path / "kb" / "embeddings.sqlite"), ingestor.embedder.signature, 384)
+    ingestor.chunk_size = 160
+    ingestor.chunk_overlap = 0
+    first = await ingestor.ingest(_upload("faq.md", FAQ.encode("utf-8")))
+    # O FAQ repete cada seção três vezes: só os cinco trechos distintos são calculados
+    assert first.status == "done" and first.embedded == 5 and ingestor.index.count == 5
+
+    edited = FAQ.replace("cinco dias úteis", "dois dias úteis")
+    second = await ingestor.ingest(_upload("faq.md", edited.encode("utf-8")))
+    assert second.status == "done"
+    assert (second.reused, second.embedded, second.removed) == (12, 1, 1)
+    assert ingestor.index.stats()["active_chunks"] == 5
+    passages = ingestor.index.chunks(row_id for row_id, _ in ingestor.index.search_lexical("entrega correios", 5))
+    assert [row["text"] for row in passages if "Entrega" in row["text"]] == [edited.split("\n\n")[0]]
+
+    # Voltar à versão anterior reaproveita o vetor do cache, mesmo num índice novo
+    fresh = _ingestor(tmp_path / "outro", dim=384)
+    fresh.cache = EmbeddingCache(str(tmp_path / "kb" / "embeddings.sqlite"), fresh.embedder.signature, 384)
+    fresh.chunk_size = 160
+    fresh.chunk_overlap = 0
+    restored = await fresh.ingest(_upload("faq.md", FAQ.encode("utf-8")))
+    assert (restored.cache_hits, restored.embedded) == (5, 0)
+    assert np.allclose(fresh.index.search(embed_batch([FAQ.split("\n\n")[0]], 384)[0], 1)[0][1], 1.0, atol=1e-5)
+    ingestor.close()
+    fresh.close()
+
+def test_compaction_drops_stale_chunks_and_keeps_search(tmp_path):
+    vectors = _random_unit(400, 32)
+    index = KnowledgeIndex(str(tmp_path), 32, compact_ratio=0.4)
+    _add(index, "a.md", vectors[:300])
+    _add(index, "b.md", vectors[300:])
+    result = index.add_document(
+        "a.md", "2" * 64, [f"novo {i}" for i in range(250)], [chunk_hash(f"novo {i}") for i in range(250)],
+        {chunk_hash(f"novo {i}"): vector for i, vector in enumerate(_random_unit(250, 32, seed=4))}
+    )
+    assert (result["added"], result["removed"]) == (250, 300)
+    # 300 de 650 trechos sem documento passam de 40%: o índice é regravado só com os ativos
+    assert index.count == 350 and index.stats()["stale_chunks"] == 0
+    assert os.path.getsize(tmp_path / "vectors.f32") == 350 * 32 * 4
+    hit = index.search(vectors[350], 1)[0][0]
+    assert index.chunks([hit])[0]["text"] == "b.md trecho 50"
+    assert index.search_lexical("novo", 1) and index.chunks([index.search_lexical("b.md trecho", 1)[0][0]])[0]["filename"] == "b.md"
+
+    reopened = KnowledgeIndex(str(tmp_path), 32)
+    assert reopened.search(vectors[350], 1)[0][0] == hit
+    assert reopened.lookup([chunk_hash("b.md trecho 50")]) == {chunk_hash("b.md trecho 50"): hit}
@@ -0,0 +1,44 @@
+from benchmarks.fake_servers import LatencyModel
+import json
+import subprocess
+import sys
+import os
+import pytest
+
+# Adiciona o diretório raiz ao PYTHONPATH
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
+sys.path.append(ROOT)
+
+def test_latency_model_specs():
+    assert LatencyModel("0").sample() == 0.0
+    assert LatencyModel("fixed:0.25").sample() == 0.25
+    assert all(0.1 <= LatencyModel("uniform:0.1:0.2", seed=1).sample() <= 0.2 for _ in range(100))
+    assert LatencyModel("lognormal:0.3:0.5", seed=1).sample() > 0
+    with pytest.raises(ValueError):
+        LatencyModel("pareto:1")
+
+def test_offline_load_run(tmp_path):
+    """Roda o harness completo contra os serviços falsos, sem rede"""
+    report_path = tmp_path / "report.json"
+    completed = subprocess.run(
+        [
+            sys.executable, "-m", "benchmarks.load_test",
+            "--requests", "4", "--concurrency", "2", "--warmup", "0",
+            "--llm-latency", "0", "--db-latency", "0", "--mistral-latency", "0", "--whatsapp-latency", "0",
+            "--json", str(report_path)
+        ],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+        timeout=180
+    )
+    assert completed.returncode == 0, completed.stderr[-2000:]
+
+    report = json.loads(report_path.read_text())
+    phases = {phase["endpoint"]: phase for phase in report["phases"]}
+    assert set(phases) == {"ws", "api_chat", "webhook"}
+    for phase in phases.values():
+        assert phase["requests"] == 4
+        assert phase["errors"] == 0
+        assert phase["llm_calls_per_turn"] >= 1
+        assert phase["db_calls_per_turn"] > 0
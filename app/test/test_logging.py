@@ -0,0 +1,35 @@
+from app.logging_config import JSONFormatter, SamplingFilter, NonBlockingQueueHandler
+import json
+import logging
+import queue
+import sys
+import os
+
+# Adiciona o diretório raiz ao PYTHONPATH
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+
+def _record(level: int = logging.INFO, **extra) -> logging.LogRecord:
+    record = logging.LogRecord("app.test", level, __file__, 1, "evento %s", ("ok",), None)
+    record.__dict__.update(extra)
+    return record
+
+def test_json_formatter_includes_extra_fields():
+    line = JSONFormatter().format(_record(model="openai", latency_ms=12.5))
+    payload = json.loads(line)
+    assert payload["msg"] == "evento ok"
+    assert payload["level"] == "INFO"
+    assert payload["model"] == "openai"
+    assert payload["latency_ms"] == 12.5
+
+def test_sampling_keeps_warnings():
+    sampler = SamplingFilter(0.0)
+    assert sampler.filter(_record(logging.INFO)) is False
+    assert sampler.filter(_record(logging.WARNING)) is True
+    assert SamplingFilter(1.0).filter(_record(logging.DEBUG)) is True
+
+def test_queue_handler_never_blocks():
+    handler = NonBlockingQueueHandler(queue.Queue(maxsize=1))
+    handler.handle(_record())
+    handler.handle(_record())
+    assert handler.queue.qsize() == 1
+    assert handler.dropped == 1
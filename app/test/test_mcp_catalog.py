@@ -0,0 +1,139 @@
+from app.mcp_engine import MCPExecutionEngine
+from app.mcp_catalog import MCPToolCatalog, ToolSpec
+from app.database import DatabaseClient
+from app.http_pool import http_pool
+from benchmarks.fake_servers import FakeServices, FakeServer
+from dataclasses import dataclass, field
+import asyncio
+import sys
+import os
+import pytest
+
+# Adiciona o diretório raiz ao PYTHONPATH
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+
+@dataclass
+class Definition:
+    """Mesmos campos do ToolDefinition retornado por MCPServerHTTP.list_tools"""
+    name: str
+    description: str
+    parameters_json_schema: dict = field(default_factory=dict)
+
+class ToolServer:
+    def __init__(self, *definitions, fail: bool = False):
+        self.definitions = list(definitions)
+        self.fail = fail
+        self.list_calls = 0
+
+    async def list_tools(self):
+        self.list_calls += 1
+        await asyncio.sleep(0.01)
+        if self.fail:
+            raise ConnectionError("servidor fora do ar")
+        return self.definitions
+
+SEARCH = Definition("brave_search", "Pesquisa na web", {"type": "object", "properties": {"count": {"type": "integer"}, "query": {"type": "string"}}, "required": ["query"]})
+PYTHON = Definition("run_python_code", "Run Python code in a sandbox", {"type": "object", "properties": {"python_code": {"type": "string"}}})
+
+def _catalog(ttl: float = 300.0, **servers) -> MCPToolCatalog:
+    engine = MCPExecutionEngine()
+    for name, server in servers.items():
+        engine.register(name, server)
+    return MCPToolCatalog(engine, ttl=ttl, timeout=1.0)
+
+@pytest.mark.asyncio
+async def test_discovered_tools_drive_routing_and_arguments():
+    from app.llm_router import llm_router
+    catalog = _catalog(web=ToolServer(SEARCH), sandbox=ToolServer(PYTHON))
+    await catalog.refresh()
+
+    assert [tool.name for tool in catalog.tools()] == ["brave_search", "run_python_code"]
+    needs, info = await llm_router.detect_tool_need("pesquise o preço do café e rode este script", catalog.tools())
+    assert needs
+    assert [(call["server_name"], call["tool_name"]) for call in info["calls"]] == [("web", "brave_search"), ("sandbox", "run_python_code")]
+    assert info["calls"][0]["tool_input"] == {"query": "pesquise o preço do café e rode este script"}
+    assert info["calls"][1]["tool_input"] == {"python_code": "pesquise o preço do café e rode este script"}
+
+    # Sem ferramenta de busca no catálogo, a intenção de pesquisa não vira chamada
+    needs, info = await llm_router.detect_tool_need("pesquise o preço do café", [tool for tool in catalog.tools() if tool.server == "sandbox"])
+    assert not needs
+
+@pytest.mark.asyncio
+async def test_catalog_is_cached_until_ttl_and_refreshed_once_concurrently():
+    server = ToolServer(SEARCH)
+    catalog = _catalog(web=server)
+    await asyncio.gather(catalog.refresh(), catalog.refresh(), catalog.refresh())
+    assert server.list_calls == 1
+    await catalog.refresh()
+    assert server.list_calls == 1
+    assert catalog.snapshot("web")["available_tools"] == ["brave_search"]
+
+    catalog.ttl = 0
+    await catalog.refresh()
+    assert server.list_calls == 2
+
+@pytest.mark.asyncio
+async def test_failed_discovery_keeps_known_tools():
+    server = ToolServer(SEARCH)
+    catalog = _catalog(web=server)
+    await catalog.refresh()
+    server.fail = True
+    await catalog.refresh(force=True)
+    status = catalog.snapshot("web")
+    assert status["available_tools"] == ["brave_search"]
+    assert "fora do ar" in status["error"]
+    assert catalog.stale("web")
+
+@pytest.mark.asyncio
+async def test_catalog_is_persisted_and_reloaded():
+    async with FakeServer(FakeServices()) as fake:
+        db = DatabaseClient()
+        db.supabase_url = fake.base_url
+        db.supabase_key = "fake-key"
+
+        catalog = _catalog(web=ToolServer(SEARCH))
+        catalog.database = db
+        await catalog.refresh()
+        rows = fake.services.tables["server_status"]
+        assert rows[0]["server_name"] == "web" and rows[0]["is_connected"] is True
+        assert rows[0]["tools"][0]["name"] == "brave_search"
+
+        # Outro processo começa com o catálogo gravado, antes de falar com o servidor
+        restarted = _catalog(web=ToolServer(SEARCH, fail=True))
+        restarted.database = db
+        await restarted.load_persisted()
+        assert restarted.find("brave_search").arguments("café") == {"query": "café"}
+        assert restarted.snapshot("web")["catalog_source"] == "database"
+        await http_pool.close()
+
+@pytest.mark.asyncio
+async def test_status_endpoint_reads_the_cache(monkeypatch):
+    from app.agent import ineuro_agent, MCPServer
+    from app.mcp_catalog import mcp_catalog
+    from app.mcp_sessions import mcp_sessions
+
+    class Client(ToolServer):
+        async def __aenter__(self):
+            return self
+
+        async def __aexit__(self, *exc):
+            pass
+
+        async def send_ping(self):
+            pass
+
+    server = Client(PYTHON)
+    monkeypatch.setattr(ineuro_agent, "mcp_servers", [MCPServer(name="sandbox", url="http://sandbox", api_key="x")])
+    await mcp_sessions.start({"sandbox": lambda: server}, warmup_timeout=1.0)
+    try:
+        await mcp_catalog.refresh()
+        calls = server.list_calls
+        status = await ineuro_agent.get_mcp_status()
+        status = await ineuro_agent.get_mcp_status()
+    finally:
+        await mcp_sessions.stop()
+    assert server.list_calls == calls == 1
+    assert status[0]["connected"] and status[0]["session"]["state"] == "connected"
+    assert status[0]["available_tools"] == ["run_python_code"]
+    assert status[0]["tools"][0]["parameters"]["properties"]["python_code"]["type"] == "string"
+    assert not (await ineuro_agent.get_mcp_status())[0]["connected"]
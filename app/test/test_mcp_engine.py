@@ -0,0 +1,203 @@
+from app.mcp_engine import MCPExecutionEngine, ToolCall, ToolResultCache
+from app.metrics import MCP_TOOL_CALLS, MCP_TOOL_LATENCY
+import asyncio
+import time
+import sys
+import os
+import pytest
+
+# Adiciona o diretório raiz ao PYTHONPATH
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+
+class SlowServer:
+    """Servidor MCP de teste: cada ferramenta responde após `delay` segundos"""
+
+    def __init__(self, delay: float = 0.0, fail: bool = False):
+        self.delay = delay
+        self.fail = fail
+        self.calls = []
+        self.cancelled = 0
+
+    async def call_tool(self, tool_name, arguments):
+        self.calls.append((tool_name, arguments))
+        try:
+            await asyncio.sleep(self.delay)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        if self.fail:
+            raise RuntimeError("servidor indisponível")
+        return [f"{tool_name}: {arguments['input']}"]
+
+@pytest.mark.asyncio
+async def test_calls_on_different_servers_run_concurrently():
+    engine = MCPExecutionEngine(timeout=2.0)
+    engine.register("web_search", SlowServer(0.2))
+    engine.register("run_python", SlowServer(0.2))
+
+    start = time.perf_counter()
+    results = await engine.run([
+        ToolCall("web_search", "search_web", {"input": "cotação do dólar"}),
+        ToolCall("run_python", "execute_code", {"input": "print(1)"}),
+    ])
+    assert time.perf_counter() - start < 0.35
+    assert [result.status for result in results] == ["ok", "ok"]
+    assert results[0].output == "search_web: cotação do dólar"
+    assert all(result.latency >= 0.2 for result in results)
+
+@pytest.mark.asyncio
+async def test_hung_tool_is_cancelled_at_deadline_without_blocking_others():
+    engine = MCPExecutionEngine(timeout=5.0)
+    hung = SlowServer(30)
+    engine.register("web_search", hung)
+    engine.register("run_python", SlowServer(0.01))
+    timeouts = MCP_TOOL_CALLS.value(tool="search_web", status="timeout")
+
+    start = time.perf_counter()
+    slow, fast = await engine.run([
+        ToolCall("web_search", "search_web", {"input": "x"}),
+        ToolCall("run_python", "execute_code", {"input": "y"}),
+    ], deadline=0.1)
+    assert time.perf_counter() - start < 1.0
+    assert slow.status == "timeout" and "não respondeu" in slow.error
+    assert hung.cancelled == 1
+    assert fast.ok
+    assert MCP_TOOL_CALLS.value(tool="search_web", status="timeout") == timeouts + 1
+
+@pytest.mark.asyncio
+async def test_errors_and_unknown_servers_come_back_as_results():
+    engine = MCPExecutionEngine(timeout=1.0)
+    engine.register("run_python", SlowServer(fail=True))
+    failed, missing = await engine.run([
+        ToolCall("run_python", "execute_code", {"input": "1/0"}),
+        ToolCall("desconhecido", "search_web", {"input": "x"}),
+    ])
+    assert failed.status == "error" and "servidor indisponível" in failed.error
+    assert missing.status == "not_connected"
+    assert MCP_TOOL_LATENCY._values.get(("execute_code",)) is not None
+
+@pytest.mark.asyncio
+async def test_per_server_limit_queues_extra_calls():
+    engine = MCPExecutionEngine(timeout=2.0, max_per_server=1)
+    server = SlowServer(0.1)
+    engine.register("run_python", server)
+    start = time.perf_counter()
+    results = await engine.run([ToolCall("run_python", "execute_code", {"input": str(i)}) for i in range(3)])
+    assert all(result.ok for result in results)
+    assert time.perf_counter() - start >= 0.3
+
+@pytest.mark.asyncio
+async def test_agent_runs_every_detected_tool():
+    from app.agent import ineuro_agent
+    from app.llm_router import llm_router
+    from app.mcp_engine import mcp_engine
+    from app.mcp_catalog import ToolSpec
+
+    mcp_engine.register("web_search", SlowServer(0.05))
+    mcp_engine.register("run_python", SlowServer(0.05))
+    try:
+        need = await llm_router.detect_tool_need("pesquise a fórmula e rode este script", [
+            ToolSpec("web_search", "search_web", "Busca na web"),
+            ToolSpec("run_python", "execute_code", "Executa código"),
+        ])
+        assert [call["tool_name"] for call in need[1]["calls"]] == ["search_web", "execute_code"]
+        tool_results = await ineuro_agent._use_server_tools("pesquise a fórmula e rode este script", need)
+    finally:
+        mcp_engine.clear()
+    # As saídas vão para o prompt da resposta, sem chamada ao LLM só para combiná-las
+    assert tool_results.startswith("[search_web]\nsearch_web: pesquise")
+    assert "\n\n[execute_code]\nexecute_code: pesquise" in tool_results
+
+def test_large_tool_output_is_cut_to_token_budget():
+    from app.mcp_engine import truncate_tool_output
+    from app.metrics import MCP_TOOL_OUTPUT_TRUNCATED
+
+    lines = [f"linha {i}: " + "x" * 60 for i in range(500)]
+    output = "\n".join(lines)
+    assert truncate_tool_output("search_web", "curto", 100) == "curto"
+    truncated = MCP_TOOL_OUTPUT_TRUNCATED.value(tool="search_web")
+
+    cut = truncate_tool_output("search_web", output, 200)
+    assert len(cut) <= 200 * 4 + 50
+    assert cut.startswith("linha 0:") and cut.endswith(lines[-1])
+    head, marker, tail = cut.split("\n[... ")[0], cut.split("\n[... ")[1].split(" ...]\n")[0], cut.split(" ...]\n")[1]
+    # Corte em quebras de linha, com o total omitido
+    assert head.endswith("x") and tail.startswith("linha ")
+    assert marker == f"{len(output) - len(head) - len(tail)} caracteres omitidos"
+    assert MCP_TOOL_OUTPUT_TRUNCATED.value(tool="search_web") == truncated + 1
+
+@pytest.mark.asyncio
+async def test_model_tool_requests_run_on_catalogued_servers(monkeypatch):
+    from app.agent import ineuro_agent
+    from app.mcp_engine import mcp_engine
+    from app.mcp_catalog import mcp_catalog, ServerTools, ToolSpec
+    from app.providers import ToolRequest
+
+    class VerboseServer(SlowServer):
+        async def call_tool(self, tool_name, arguments):
+            self.calls.append((tool_name, arguments))
+            return "resultado " * 2000
+
+    monkeypatch.setattr(mcp_catalog, "_servers", {"web_search": ServerTools([ToolSpec("web_search", "search_web")], time.monotonic())})
+    monkeypatch.setattr(ineuro_agent, "mcp_clients", mcp_engine.clients)
+    server = VerboseServer()
+    mcp_engine.register("web_search", server)
+    try:
+        assert [tool["name"] for tool in ineuro_agent._offered_tools("openai")] == ["search_web"]
+        outputs = await ineuro_agent._run_tool_requests([
+            ToolRequest("1", "search_web", {"query": "clima"}),
+            ToolRequest("2", "apagar_tudo", {}),
+        ])
+    finally:
+        mcp_engine.clear()
+    assert server.calls == [("search_web", {"query": "clima"})]
+    assert "caracteres omitidos" in outputs[0] and len(outputs[0]) < len("resultado " * 2000)
+    assert outputs[1] == "Ferramenta desconhecida: apagar_tudo"
+
+def _cached_engine(**ttls) -> MCPExecutionEngine:
+    return MCPExecutionEngine(timeout=2.0, cache=ToolResultCache({"*search*": 60, "execute_code": 60, **ttls}, max_entries=2))
+
+@pytest.mark.asyncio
+async def test_search_results_are_cached_by_normalised_input():
+    engine = _cached_engine()
+    server = SlowServer(0.05)
+    engine.register("web_search", server)
+
+    first = await engine.call(ToolCall("web_search", "search_web", {"input": "Copa do Mundo"}))
+    again = await engine.call(ToolCall("web_search", "search_web", {"input": "  copa do   MUNDO "}))
+    assert len(server.calls) == 1
+    assert again.cached and again.output == first.output and again.call.arguments["input"] == "  copa do   MUNDO "
+    stats = engine.cache.stats()
+    assert (stats["hits"], stats["misses"]) == (1, 1)
+    assert stats["mcp_seconds_saved"] >= 0.05
+
+    # Erros não são cacheados
+    engine.register("web_busca", SlowServer(fail=True))
+    await engine.call(ToolCall("web_busca", "search_news", {"input": "x"}))
+    await engine.call(ToolCall("web_busca", "search_news", {"input": "x"}))
+    assert engine.cache.stats()["misses"] == 3
+
+@pytest.mark.asyncio
+async def test_code_execution_is_never_cached_and_lru_is_bounded():
+    engine = _cached_engine()
+    code = SlowServer()
+    engine.register("run_python", code)
+    engine.register("web_search", SlowServer())
+    await engine.call(ToolCall("run_python", "execute_code", {"input": "print(1)"}))
+    await engine.call(ToolCall("run_python", "execute_code", {"input": "print(1)"}))
+    assert len(code.calls) == 2 and engine.cache.ttl("execute_code") == 0
+
+    for topic in ("a", "b", "c"):
+        await engine.call(ToolCall("web_search", "search_web", {"input": topic}))
+    assert engine.cache.stats()["entries"] == 2
+    assert not (await engine.call(ToolCall("web_search", "search_web", {"input": "a"}))).cached
+
+@pytest.mark.asyncio
+async def test_concurrent_identical_calls_share_one_execution():
+    engine = _cached_engine()
+    server = SlowServer(0.1)
+    engine.register("web_search", server)
+    results = await asyncio.gather(*(engine.call(ToolCall("web_search", "search_web", {"input": "eleições"})) for _ in range(5)))
+    assert len(server.calls) == 1
+    assert all(result.ok for result in results)
+    assert engine.cache.stats()["shared"] == 4
@@ -0,0 +1,120 @@
+from app.mcp_engine import MCPExecutionEngine, ToolCall
+from app.mcp_sessions import MCPSessionManager
+import asyncio
+import sys
+import os
+import pytest
+
+# Adiciona o diretório raiz ao PYTHONPATH
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+
+class FakeServer:
+    """Servidor MCP de teste: liga e desliga; cada conexão aberta é um FakeClient"""
+
+    def __init__(self, up: bool = True):
+        self.up = up
+        self.handshakes = 0
+        self.pings = 0
+        self.open_sessions = 0
+
+    def client(self) -> "FakeClient":
+        return FakeClient(self)
+
+class FakeClient:
+    """Mesma interface usada do MCPServerHTTP: contexto assíncrono (handshake), ping e call_tool"""
+
+    def __init__(self, server: FakeServer):
+        self.server = server
+
+    async def __aenter__(self):
+        await asyncio.sleep(0.01)
+        if not self.server.up:
+            raise ConnectionError("conexão recusada")
+        self.server.handshakes += 1
+        self.server.open_sessions += 1
+        return self
+
+    async def __aexit__(self, *exc):
+        self.server.open_sessions -= 1
+
+    async def send_ping(self):
+        if not self.server.up:
+            await asyncio.sleep(3600)
+        self.server.pings += 1
+
+    async def call_tool(self, tool_name, arguments):
+        return f"{tool_name} ok"
+
+def _manager(**options) -> MCPSessionManager:
+    return MCPSessionManager(
+        MCPExecutionEngine(timeout=1.0),
+        ping_interval=options.get("ping_interval", 0.05),
+        ping_timeout=0.05,
+        backoff_base=0.02,
+        backoff_max=0.1
+    )
+
+async def _until(condition, timeout: float = 2.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition():
+        assert asyncio.get_running_loop().time() < deadline, "condição não atingida"
+        await asyncio.sleep(0.01)
+
+@pytest.mark.asyncio
+async def test_warmup_opens_sessions_before_first_call():
+    manager = _manager(ping_interval=10)
+    server = FakeServer()
+    connected = []
+    manager.on_connect = lambda name: asyncio.sleep(0, connected.append(name))
+    await manager.start({"sandbox": server.client}, warmup_timeout=1.0)
+    try:
+        assert manager.connected("sandbox") and manager.status("sandbox")["state"] == "connected"
+        assert server.handshakes == 1 and server.pings == 1
+        # A chamada usa a sessão já aberta: nenhum handshake novo
+        result = await manager.engine.call(ToolCall("sandbox", "run_python_code", {"python_code": "1"}))
+        assert result.ok and server.handshakes == 1
+        await _until(lambda: connected == ["sandbox"])
+    finally:
+        await manager.stop()
+    assert server.open_sessions == 0
+    assert manager.engine.clients == {}
+
+@pytest.mark.asyncio
+async def test_dead_server_is_removed_and_reconnected_with_backoff():
+    manager = _manager()
+    server = FakeServer()
+    await manager.start({"sandbox": server.client}, warmup_timeout=1.0)
+    try:
+        server.up = False
+        # O ping sem resposta tira o servidor do motor: a chamada falha na hora
+        await _until(lambda: not manager.connected("sandbox"))
+        assert "sandbox" not in manager.engine.clients
+        result = await manager.engine.call(ToolCall("sandbox", "run_python_code", {}))
+        assert result.status == "not_connected"
+        await _until(lambda: manager.sessions["sandbox"].attempts >= 2)
+        assert "recusada" in manager.status("sandbox")["last_error"]
+
+        server.up = True
+        await _until(lambda: manager.connected("sandbox"))
+        assert manager.status("sandbox")["reconnects"] == 1
+        assert manager.sessions["sandbox"].attempts == 0
+        assert (await manager.engine.call(ToolCall("sandbox", "run_python_code", {}))).ok
+    finally:
+        await manager.stop()
+
+@pytest.mark.asyncio
+async def test_unreachable_server_does_not_hold_startup_past_warmup():
+    manager = _manager()
+    await manager.start({"down": FakeServer(up=False).client, "up": FakeServer().client}, warmup_timeout=0.2)
+    try:
+        assert manager.connected("up") and not manager.connected("down")
+        assert manager.status("down")["state"] == "reconnecting"
+    finally:
+        await manager.stop()
+    assert manager.status("down") == {"state": "closed"}
+
+def test_backoff_grows_exponentially_up_to_the_cap():
+    manager = MCPSessionManager(MCPExecutionEngine(), backoff_base=1.0, backoff_max=30.0)
+    delays = [manager.backoff(attempt) for attempt in range(1, 8)]
+    assert 0.8 <= delays[0] <= 1.2 and 3.2 <= delays[2] <= 4.8
+    assert max(delays) <= 36.0
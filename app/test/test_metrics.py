@@ -0,0 +1,43 @@
+from app.metrics import MetricsRegistry, record_llm_usage, measure_overhead, COST, TOKENS, registry
+from app.tracing import tracer
+import sys
+import os
+
+# Adiciona o diretório raiz ao PYTHONPATH
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+
+def test_prometheus_rendering():
+    metrics = MetricsRegistry()
+    requests = metrics.counter("test_requests_total", "Requisições", ["channel"])
+    latency = metrics.histogram("test_latency_seconds", "Latência", ["channel"], buckets=(0.1, 1.0))
+
+    requests.inc(channel="ws")
+    requests.inc(channel="ws")
+    latency.observe(0.05, channel="ws")
+    latency.observe(0.5, channel="ws")
+    latency.observe(5.0, channel="ws")
+
+    output = metrics.render()
+    assert '# TYPE test_requests_total counter' in output
+    assert 'test_requests_total{channel="ws"} 2' in output
+    assert 'test_latency_seconds_bucket{channel="ws",le="0.1"} 1' in output
+    assert 'test_latency_seconds_bucket{channel="ws",le="1"} 2' in output
+    assert 'test_latency_seconds_bucket{channel="ws",le="+Inf"} 3' in output
+    assert 'test_latency_seconds_count{channel="ws"} 3' in output
+
+def test_llm_usage_cost():
+    before = COST.value(model="gpt-4")
+    record_llm_usage("gpt-4", input_tokens=1000, output_tokens=1000, cache_read_tokens=1000)
+    assert TOKENS.value(model="gpt-4", kind="cache_read") >= 1000
+    # 1000 tokens em cache a 15/M + 1000 de saída a 60/M
+    assert abs(COST.value(model="gpt-4") - before - 0.075) < 1e-9
+
+def test_stage_spans_feed_histogram():
+    with tracer.span("test_stage"):
+        pass
+    assert 'ineuro_stage_duration_seconds_count{stage="test_stage"} 1' in registry.render()
+
+def test_overhead_measurement():
+    results = measure_overhead(iterations=100)
+    assert set(results) == {"counter_inc", "histogram_observe", "span_unsampled"}
+    assert 'ineuro_instrumentation_overhead_seconds{operation="counter_inc"}' in registry.render()
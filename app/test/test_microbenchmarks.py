@@ -0,0 +1,28 @@
+from benchmarks.micro import build_conversation, compare, measure
+import sys
+import os
+
+# Adiciona o diretório raiz ao PYTHONPATH
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+
+def _result(**benchmarks):
+    return {"benchmarks": {name: {"min_us": us, "median_us": us} for name, us in benchmarks.items()}}
+
+def test_compare_flags_regressions():
+    baseline = _result(classify=10.0, format=20.0, dumps=100.0)
+    current = _result(classify=13.0, format=21.0)
+    status = {row[0]: row[4] for row in compare(baseline, current, threshold=0.25)}
+    assert status == {"classify": "REGRESSION", "format": "ok", "dumps": "missing"}
+    assert compare(baseline, _result(classify=5.0, format=20.0, dumps=100.0))[0][4] == "faster"
+
+def test_conversation_corpus_spans_cutoff():
+    from app.memory_agent import MemoryAgent
+    conversation = build_conversation(1000)
+    assert len(conversation) == 1000
+    kept = MemoryAgent(None)._clean_old_messages(conversation)
+    assert 400 < len(kept) < 600
+
+def test_measure_reports_per_call_stats():
+    stats = measure(lambda: sum(range(100)), repeat=3, min_time=0.001)
+    assert stats["loops"] >= 1
+    assert 0 < stats["min_us"] <= stats["median_us"]
@@ -0,0 +1,35 @@
+from app.agent import INeuroAgent
+import asyncio
+import sys
+import os
+
+# Adiciona o diretório raiz ao PYTHONPATH
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+
+def test_prompt_table_lookup():
+    agent = INeuroAgent()
+
+    # Nome do LLM e nome do modelo resolvem para a mesma entrada
+    prompt, prompt_hash = agent.get_system_prompt("anthropic", "technical")
+    assert (prompt, prompt_hash) == agent.get_system_prompt("claude-3-opus", "technical")
+    assert prompt.startswith(agent.model_instructions["claude-3-opus"]["prefix"])
+    assert agent.task_prompts["technical"] in prompt
+
+    # Modelo desconhecido usa as instruções padrão
+    assert agent.get_system_prompt("desconhecido", None)[0].startswith("Follow these guidelines")
+
+    # Compatibilidade com a API assíncrona existente
+    assert asyncio.run(agent._format_system_prompt("gpt-4", "creative")) == agent.get_system_prompt("openai", "creative")[0]
+
+def test_prompt_table_rebuild():
+    agent = INeuroAgent()
+    _, old_hash = agent.get_system_prompt("openai", None)
+
+    # Mesmas entradas não reconstroem a tabela
+    assert agent.update_prompt_inputs(persona=agent.agent_persona) is False
+
+    # Nova persona reconstrói e muda o hash
+    assert agent.update_prompt_inputs(persona="Assistente formal e objetivo") is True
+    prompt, new_hash = agent.get_system_prompt("openai", None)
+    assert new_hash != old_hash
+    assert "Assistente formal e objetivo" in prompt
@@ -0,0 +1,265 @@
+from app.providers import ProviderClientRegistry, ProviderRegistry, DEFAULT_PROVIDERS, _merge_configs
+from app.generation_profiles import GenerationProfile
+from app.metrics import MODEL_PRICES
+from app.http_pool import http_pool
+from benchmarks.fake_servers import FakeServices, FakeServer
+import asyncio
+import concurrent.futures
+import json
+import subprocess
+import time
+import sys
+import os
+import pytest
+
+# Adiciona o diretório raiz ao PYTHONPATH
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
+sys.path.append(ROOT)
+
+def test_clients_are_built_once_on_first_use():
+    calls = []
+    registry = ProviderClientRegistry()
+    registry.register("openai", lambda: calls.append(1) or object())
+
+    assert not registry.is_loaded("openai")
+    client = registry.get("openai")
+    assert registry.get("openai") is client
+    assert calls == [1]
+    assert registry.snapshot()["openai"]["loaded"] is True
+
+@pytest.mark.asyncio
+async def test_prewarm_builds_clients_and_warms_connections():
+    warmed = []
+
+    async def warmup(client):
+        warmed.append(client)
+
+    registry = ProviderClientRegistry()
+    registry.register("openai", lambda: "cliente-openai", warmup=warmup)
+    registry.register("gemini", lambda: "cliente-gemini")
+
+    await registry.prewarm(["openai", "desconhecido"], connections=True)
+    assert registry.is_loaded("openai")
+    assert not registry.is_loaded("gemini")
+    assert warmed == ["cliente-openai"]
+
+def test_app_import_does_not_load_provider_sdks():
+    """Importar o app sem ambiente configurado não deve carregar os SDKs dos provedores"""
+    code = (
+        "import sys, app.main; "
+        "print(','.join(m for m in ('anthropic', 'openai', 'google.generativeai', 'mistralai', 'pydantic_ai') if m in sys.modules))"
+    )
+    env = {"PATH": os.environ.get("PATH", ""), "LOG_LEVEL": "WARNING"}
+    completed = subprocess.run([sys.executable, "-c", code], cwd=ROOT, env=env, capture_output=True, text=True, timeout=120)
+    assert completed.returncode == 0, completed.stderr[-2000:]
+    assert completed.stdout.strip() == ""
+
+def test_provider_config_overrides_defaults():
+    configs = _merge_configs(DEFAULT_PROVIDERS, [
+        {"name": "openai", "model": "gpt-4o-mini"},
+        {"name": "gemini", "enabled": False},
+        {"name": "groq", "adapter": "openai", "model": "llama-3.1-70b", "base_url": "http://groq.local/v1",
+         "classification": "technical", "prices": [0.59, 0.79, 0.59]},
+    ])
+    registry = ProviderRegistry(configs)
+
+    assert registry.names() == ["openai", "anthropic", "deepseek", "groq"]
+    assert registry.model_name("openai") == "gpt-4o-mini"
+    assert registry.model_name("gemini") is None
+    assert registry.get("anthropic").config.fallback == "openai"
+    assert "stream" in registry.get("groq").capabilities
+    assert MODEL_PRICES["llama-3.1-70b"] == (0.59, 0.79, 0.59)
+    assert registry.prompt_instructions()["gpt-4o-mini"]["prefix"].startswith("You are I-Neuro")
+    assert "api_key" not in registry.snapshot()["groq"]
+
+def test_invalid_provider_config_is_skipped():
+    registry = ProviderRegistry([{"name": "x", "adapter": "desconhecido", "model": "m"}, {"name": "y"}])
+    assert registry.names() == []
+
+def _fake_provider(name: str, base_url: str, **extra):
+    return {"name": name, "adapter": "openai", "model": f"{name}-model", "base_url": base_url,
+            "api_key": "fake-key", "max_retries": 0, "timeout": 5, **extra}
+
+@pytest.mark.asyncio
+async def test_openai_compatible_adapter_call_and_stream():
+    profile = GenerationProfile(name="teste", max_tokens=5, temperature=0.2)
+    async with FakeServer(FakeServices()) as fake:
+        registry = ProviderRegistry([_fake_provider("fake-deepseek", f"{fake.base_url}/deepseek/v1")])
+        adapter = registry.get("fake-deepseek")
+
+        text, usage = await adapter.call("Olá", "Sistema", profile)
+        assert text and usage["output_tokens"] == 5
+
+        chunks = [chunk async for chunk in adapter.stream("Olá", "Sistema", profile)]
+        assert "".join(delta for delta, _ in chunks) == text
+        assert chunks[-1][1]["output_tokens"] == 5
+        assert fake.services.calls["deepseek"] == 2
+
+@pytest.mark.asyncio
+async def test_router_falls_back_to_configured_provider(monkeypatch):
+    import app.llm_router as router_module
+    profile = GenerationProfile(name="teste", max_tokens=5, temperature=0.2)
+    async with FakeServer(FakeServices()) as fake:
+        registry = ProviderRegistry([
+            _fake_provider("fake-primary", "http://127.0.0.1:9/v1", fallback="fake-backup"),
+            _fake_provider("fake-backup", f"{fake.base_url}/openai/v1"),
+        ])
+        monkeypatch.setattr(router_module, "provider_registry", registry)
+        router = router_module.LLMRouter()
+
+        response = await router._call_llm("fake-primary", "Olá", "Sistema", profile)
+        assert response["llm"] == "fake-backup"
+        assert response["model"] == "fake-backup-model"
+        assert router.models_status == {"fake-primary": False, "fake-backup": True}
+
+@pytest.mark.asyncio
+async def test_gemini_adapter_call_and_stream():
+    profile = GenerationProfile(name="teste", max_tokens=4, temperature=0.2)
+    async with FakeServer(FakeServices()) as fake:
+        registry = ProviderRegistry([{"name": "fake-gemini", "adapter": "gemini", "model": "gemini-1.5-pro",
+                                      "base_url": fake.base_url, "api_key": "fake-key"}])
+        adapter = registry.get("fake-gemini")
+
+        text, usage = await adapter.call("Olá", "Sistema", profile)
+        assert text and usage["output_tokens"] == 4 and usage["input_tokens"] > 0
+
+        chunks = [chunk async for chunk in adapter.stream("Olá", "Sistema", profile)]
+        assert len(chunks) == 5
+        assert "".join(delta for delta, _ in chunks) == text
+        assert chunks[-1][1]["output_tokens"] == 4
+        assert await adapter.health_probe() is True
+        await http_pool.close()
+
+@pytest.mark.asyncio
+async def test_gemini_concurrency_is_not_bounded_by_executor():
+    """Com um executor de uma thread, chamadas simultâneas ainda devem se sobrepor"""
+    asyncio.get_running_loop().set_default_executor(concurrent.futures.ThreadPoolExecutor(max_workers=1))
+    profile = GenerationProfile(name="teste", max_tokens=4, temperature=0.2)
+    async with FakeServer(FakeServices(latencies={"gemini": "fixed:0.2"})) as fake:
+        registry = ProviderRegistry([{"name": "fake-gemini-pool", "adapter": "gemini", "model": "gemini-1.5-pro",
+                                      "base_url": fake.base_url, "api_key": "fake-key"}])
+        adapter = registry.get("fake-gemini-pool")
+
+        start = time.perf_counter()
+        await asyncio.gather(*(adapter.call("Olá", None, profile) for _ in range(8)))
+        assert time.perf_counter() - start < 0.2 * 4
+        await http_pool.close()
+
+SEARCH_TOOL = {
+    "server": "web_search",
+    "name": "search_web",
+    "description": "Busca na web",
+    "parameters": {"type": "object", "properties": {"query": {"type": "string", "title": "Query"}}, "required": ["query"], "additionalProperties": False}
+}
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("adapter", ["openai", "gemini"])
+async def test_native_tool_turn_uses_one_conversation(monkeypatch, adapter):
+    import app.llm_router as router_module
+    profile = GenerationProfile(name="teste", max_tokens=20, temperature=0.2)
+    async with FakeServer(FakeServices()) as fake:
+        base_url = {"openai": f"{fake.base_url}/openai/v1", "gemini": fake.base_url}[adapter]
+        registry = ProviderRegistry([{"name": adapter, "adapter": adapter, "model": f"{adapter}-model", "base_url": base_url,
+                                      "api_key": "fake-key", "max_retries": 0, "timeout": 5}])
+        monkeypatch.setattr(router_module, "provider_registry", registry)
+        router = router_module.LLMRouter()
+        executed = []
+
+        async def run_tools(requests):
+            executed.extend(requests)
+            return ["Ensolarado, 25°C"]
+
+        response = await router._call_llm_with_tools(adapter, "Qual o clima em Recife?", "Sistema", profile, [SEARCH_TOOL], run_tools)
+        await http_pool.close()
+
+    assert response["llm"] == adapter and response["classification"] != "error"
+    assert response["metadata"]["tools_used"] == ["search_web"]
+    assert response["metadata"]["tool_rounds"] == 1
+    assert [(request.name, request.arguments) for request in executed] == [("search_web", {"query": "Qual o clima em Recife?"})]
+    # Pedido da ferramenta e resposta final na mesma conversa: duas rodadas, nenhuma chamada extra
+    first, second = fake.services.tool_requests[adapter]
+    assert fake.services.calls[adapter] == 2
+    assert "Ensolarado, 25°C" in json.dumps(second, ensure_ascii=False)
+    assert "Ensolarado" not in json.dumps(first, ensure_ascii=False)
+    if adapter == "gemini":
+        # Só o subconjunto de JSON schema aceito pelo Gemini
+        assert "additionalProperties" not in json.dumps(first["tools"])
+
+def test_anthropic_tool_conversation_blocks():
+    from app.providers import ToolRequest, settings
+    registry = ProviderRegistry([{"name": "fake-anthropic", "adapter": "anthropic", "model": "claude", "api_key": "fake-key"}])
+    adapter = registry.get("fake-anthropic")
+    request = ToolRequest("toolu_1", "search_web", {"query": "clima"})
+    messages = adapter._tool_messages([
+        {"role": "user", "content": "Qual o clima?"},
+        {"role": "assistant", "content": "", "tool_requests": [request]},
+        {"role": "tool", "results": [(request, "Ensolarado")]},
+    ])
+    assert messages[1] == {"role": "assistant", "content": [{"type": "tool_use", "id": "toolu_1", "name": "search_web", "input": {"query": "clima"}}]}
+    assert messages[2] == {"role": "user", "content": [{"type": "tool_result", "tool_use_id": "toolu_1", "content": "Ensolarado"}]}
+    tools = adapter._tools([SEARCH_TOOL])
+    assert tools[0]["input_schema"] == SEARCH_TOOL["parameters"]
+    # Definições estáticas entram no prefixo cacheável
+    assert tools[-1].get("cache_control") == ({"type": "ephemeral"} if settings.PROMPT_CACHE_ENABLED else None)
+
+@pytest.mark.asyncio
+async def test_tool_turn_falls_back_to_plain_call_with_outputs(monkeypatch):
+    import app.llm_router as router_module
+    async with FakeServer(FakeServices()) as fake:
+        registry = ProviderRegistry(_merge_configs(DEFAULT_PROVIDERS, [
+            {"name": "anthropic", "enabled": False},
+            {"name": "gemini", "enabled": False},
+            {"name": "deepseek", "enabled": False},
+            _fake_provider("openai", f"{fake.base_url}/openai/v1"),
+        ]))
+        monkeypatch.setattr(router_module, "provider_registry", registry)
+        monkeypatch.setattr(router_module.settings, "MCP_TOOL_MAX_ROUNDS", 0)
+        router = router_module.LLMRouter()
+
+        async def run_tools(requests):
+            raise AssertionError("sem rodadas de ferramentas")
+
+        response = await router.generate_response("Qual o clima?", tools=[SEARCH_TOOL], run_tools=run_tools)
+        await http_pool.close()
+    # Rodadas esgotadas: a resposta sai de uma chamada comum ao mesmo provedor
+    assert response["llm"] == "openai" and response["classification"] != "error"
+    assert response["metadata"]["tools_used"] == []
+    assert fake.services.calls["openai"] == 2
+
+def test_adapter_must_implement_call_and_client():
+    from app.providers import ProviderAdapter, ProviderConfig
+
+    class Incomplete(ProviderAdapter):
+        async def call(self, prompt, system_prompt, profile):
+            return "", {}
+
+    with pytest.raises(TypeError):
+        Incomplete(ProviderConfig(name="incompleto", adapter="openai", model="x"))
+
+@pytest.mark.asyncio
+async def test_rate_limit_is_not_retried_by_adapters():
+    """429 sobe na primeira resposta (o limitador cuida do retry-after); 5xx é repetido"""
+    from app.providers import ProviderHTTPError
+    profile = GenerationProfile(name="teste", max_tokens=4, temperature=0.2)
+    async with FakeServer(FakeServices()) as fake:
+        registry = ProviderRegistry([
+            _fake_provider("fake-deepseek", f"{fake.base_url}/deepseek/v1", max_retries=2),
+            {"name": "fake-gemini", "adapter": "gemini", "model": "gemini-1.5-pro",
+             "base_url": fake.base_url, "api_key": "fake-key", "max_retries": 2},
+        ])
+        fake.services.failures["deepseek"] = [429]
+        with pytest.raises(Exception) as error:
+            await registry.get("fake-deepseek").call("Olá", "Sistema", profile)
+        assert error.value.status_code == 429
+        assert fake.services.calls["deepseek"] == 1
+
+        fake.services.failures["gemini"] = [429]
+        with pytest.raises(ProviderHTTPError) as error:
+            await registry.get("fake-gemini").call("Olá", "Sistema", profile)
+        assert error.value.status_code == 429 and error.value.retry_after == "1"
+        assert fake.services.calls["gemini"] == 1
+
+        fake.services.failures["deepseek"] = [503]
+        text, _ = await registry.get("fake-deepseek").call("Olá", "Sistema", profile)
+        assert text and fake.services.calls["deepseek"] == 3
+        await http_pool.close()
@@ -0,0 +1,115 @@
+from app.rate_limit import ProviderLimiter, RateLimitTimeout, retry_after_seconds
+from app.providers import ProviderAdapter, ProviderRegistry, ProviderHTTPError, ADAPTER_TYPES, make_usage
+from app.generation_profiles import GenerationProfile
+from app.metrics import PROVIDER_RATE_LIMITED, PROVIDER_SPILLOVER
+import asyncio
+import sys
+import os
+import pytest
+
+# Adiciona o diretório raiz ao PYTHONPATH
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+
+@pytest.mark.asyncio
+async def test_in_flight_limit_queues_extra_calls():
+    limiter = ProviderLimiter("teste-concorrencia", max_in_flight=2)
+    peak = 0
+
+    async def call():
+        nonlocal peak
+        async with limiter.slot():
+            peak = max(peak, limiter.in_flight)
+            await asyncio.sleep(0.02)
+
+    await asyncio.gather(*(call() for _ in range(6)))
+    assert peak == 2
+    assert limiter.in_flight == 0
+
+@pytest.mark.asyncio
+async def test_queue_deadline_raises_timeout():
+    limiter = ProviderLimiter("teste-prazo", max_in_flight=1)
+    await limiter.acquire()
+    with pytest.raises(RateLimitTimeout) as error:
+        await limiter.acquire(timeout=0.05)
+    assert error.value.reason == "concurrency"
+    assert PROVIDER_RATE_LIMITED.value(provider="teste-prazo", reason="concurrency_timeout") == 1
+    limiter.release()
+    await limiter.acquire(timeout=0.05)
+
+@pytest.mark.asyncio
+async def test_429_halves_limit_and_honours_retry_after():
+    limiter = ProviderLimiter("teste-aimd", max_in_flight=8)
+    limiter.on_rate_limited(retry_after=0.1)
+    assert limiter.limit == 4
+    assert limiter.saturated
+    with pytest.raises(RateLimitTimeout):
+        await limiter.acquire(timeout=0.01)
+
+    # Aumento aditivo: cerca de +1 a cada `limit` sucessos
+    for _ in range(5):
+        limiter.on_success()
+    assert int(limiter.limit) == 5
+
+    await asyncio.sleep(0.1)
+    await limiter.acquire(timeout=0.01)
+    limiter.release()
+
+@pytest.mark.asyncio
+async def test_requests_per_minute_quota():
+    limiter = ProviderLimiter("teste-rpm", rpm=2)
+    for _ in range(2):
+        await limiter.acquire(timeout=0.05)
+        limiter.release()
+    with pytest.raises(RateLimitTimeout) as error:
+        await limiter.acquire(timeout=0.05)
+    assert error.value.reason == "rpm"
+
+def test_retry_after_from_sdk_response_headers():
+    class Response:
+        headers = {"retry-after": "3"}
+
+    class SDKError(Exception):
+        status_code = 429
+        response = Response()
+
+    assert retry_after_seconds(SDKError()) == 3.0
+    assert retry_after_seconds(ProviderHTTPError("gemini", 429, retry_after="120")) == 60.0
+
+class RateLimitedAdapter(ProviderAdapter):
+    def create_client(self):
+        return None
+
+    async def call(self, prompt, system_prompt, profile):
+        raise ProviderHTTPError(self.name, 429, "slow down", "1")
+
+class EchoAdapter(ProviderAdapter):
+    def create_client(self):
+        return None
+
+    async def call(self, prompt, system_prompt, profile):
+        return f"eco: {prompt}", make_usage(1, 1)
+
+@pytest.mark.asyncio
+async def test_router_spills_over_on_429_without_marking_unavailable(monkeypatch):
+    import app.llm_router as router_module
+    monkeypatch.setitem(ADAPTER_TYPES, "ratelimited", RateLimitedAdapter)
+    monkeypatch.setitem(ADAPTER_TYPES, "echo", EchoAdapter)
+    registry = ProviderRegistry([
+        {"name": "rl-primary", "adapter": "ratelimited", "model": "primary-model"},
+        {"name": "rl-backup", "adapter": "echo", "model": "backup-model"},
+    ])
+    monkeypatch.setattr(router_module, "provider_registry", registry)
+    router = router_module.LLMRouter()
+    profile = GenerationProfile(name="teste", max_tokens=5)
+
+    response = await router._call_llm("rl-primary", "Olá", None, profile)
+    assert response["llm"] == "rl-backup"
+    assert router.models_status["rl-primary"] is True
+    assert registry.get("rl-primary").limiter.limit == 8
+    assert PROVIDER_SPILLOVER.value(provider="rl-primary", target="rl-backup") == 1
+
+    # Sem outro provedor livre, o 429 vira erro, mas o modelo continua disponível
+    registry.get("rl-backup").limiter.blocked_until = float("inf")
+    response = await router._call_llm("rl-primary", "Olá", None, profile)
+    assert response["classification"] == "error"
+    assert router.models_status["rl-primary"] is True
@@ -0,0 +1,112 @@
+from app.shared_state import InMemorySharedState
+from app.connection_manager import ConnectionManager
+import asyncio
+import json
+import sys
+import os
+import pytest
+
+# Adiciona o diretório raiz ao PYTHONPATH
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+
+class FakeWebSocket:
+    def __init__(self, fail: bool = False):
+        self.sent = []
+        self.fail = fail
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, text):
+        if self.fail:
+            raise RuntimeError("closed")
+        self.sent.append(json.loads(text))
+
+    async def close(self, code: int = 1000):
+        pass
+
+@pytest.mark.asyncio
+async def test_keys_ttl_and_dedup():
+    state = InMemorySharedState()
+    await state.set("provider_health:openai", False, ttl=0.05)
+    assert await state.get_many(["provider_health:openai", "provider_health:gemini"]) == {"provider_health:openai": False}
+    await asyncio.sleep(0.06)
+    assert await state.get("provider_health:openai") is None
+
+    assert await state.set_if_absent("webhook:5511:1", True, ttl=10) is True
+    assert await state.set_if_absent("webhook:5511:1", True, ttl=10) is False
+
+@pytest.mark.asyncio
+async def test_counters_keep_ttl_from_creation():
+    state = InMemorySharedState()
+    assert await state.incr("rpm:openai", ttl=0.05) == 1
+    assert await state.incr("rpm:openai", 4, ttl=10) == 5
+    await asyncio.sleep(0.06)
+    assert await state.incr("rpm:openai") == 1
+
+@pytest.mark.asyncio
+async def test_broadcast_goes_through_pubsub():
+    state = InMemorySharedState()
+    manager = ConnectionManager(state)
+    alive, dead = FakeWebSocket(), FakeWebSocket(fail=True)
+    await manager.connect(alive)
+    await manager.connect(dead)
+
+    await manager.broadcast({"type": "aviso"})
+    await manager.flush()
+    assert alive.sent == [{"type": "aviso"}]
+    assert manager.active_connections == [alive]
+
+    # Mensagem publicada por outro worker no mesmo canal
+    await state.publish(ConnectionManager.CHANNEL, {"type": "remoto"})
+    await manager.flush()
+    assert alive.sent[-1] == {"type": "remoto"}
+
+@pytest.mark.asyncio
+async def test_provider_health_from_other_worker():
+    from app.llm_router import llm_router
+    from app.shared_state import WORKER_ID
+    previous = llm_router.models_status["gemini"]
+    try:
+        await llm_router._on_remote_status({"model": "gemini", "available": False, "origin": "outro:1"})
+        assert llm_router.models_status["gemini"] is False
+        # Eventos do próprio worker são ignorados
+        await llm_router._on_remote_status({"model": "gemini", "available": True, "origin": WORKER_ID})
+        assert llm_router.models_status["gemini"] is False
+    finally:
+        llm_router.models_status["gemini"] = previous
+
+@pytest.mark.asyncio
+async def test_unavailable_provider_is_probed_again(monkeypatch):
+    import app.llm_router as router_module
+    from app.providers import ProviderRegistry, ProviderAdapter, ADAPTER_TYPES
+
+    class HealthyAdapter(ProviderAdapter):
+        def create_client(self):
+            return None
+
+        async def call(self, prompt, system_prompt, profile):
+            return "", {}
+
+    monkeypatch.setitem(ADAPTER_TYPES, "healthy", HealthyAdapter)
+    monkeypatch.setattr(router_module, "provider_registry", ProviderRegistry([
+        {"name": "probe-provider", "adapter": "healthy", "model": "probe-model"}
+    ]))
+    router = router_module.LLMRouter()
+    # Marcado como fora por outro worker: sem nova verificação ficaria fora para sempre
+    await router._on_remote_status({"model": "probe-provider", "available": False, "origin": "outro:1"})
+    await router._update_models_status(min_age=60)
+    assert router.models_status["probe-provider"] is False
+
+    await router._update_models_status(min_age=0)
+    assert router.models_status["probe-provider"] is True
+
+def test_shared_state_backend_must_implement_interface():
+    from app.shared_state import SharedState
+
+    class Incomplete(SharedState):
+        async def get(self, key):
+            return None
+
+    with pytest.raises(TypeError):
+        Incomplete()
@@ -0,0 +1,46 @@
+from app.tracing import Tracer, NOOP_SPAN
+import json
+import sys
+import os
+
+# Adiciona o diretório raiz ao PYTHONPATH
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+
+def test_unsampled_turn_is_noop(tmp_path):
+    tracer = Tracer(sample_rate=0.0, export_path=str(tmp_path / "traces.jsonl"))
+    with tracer.start_trace("turn") as root:
+        assert root is NOOP_SPAN
+        assert tracer.span("llm_call") is NOOP_SPAN
+    assert not (tmp_path / "traces.jsonl").exists()
+
+def test_sampled_turn_exports_spans(tmp_path):
+    path = tmp_path / "traces.jsonl"
+    tracer = Tracer(sample_rate=1.0, export_path=str(path))
+
+    with tracer.start_trace("turn", channel="web") as root:
+        with tracer.span("llm_call", provider="openai") as span:
+            span.set_attribute("ttft_ms", 1.0)
+        try:
+            with tracer.span("db_request"):
+                raise RuntimeError("timeout")
+        except RuntimeError:
+            pass
+    tracer.shutdown()
+
+    spans = {s["name"]: s for s in map(json.loads, path.read_text().splitlines())}
+    assert set(spans) == {"turn", "llm_call", "db_request"}
+    assert spans["llm_call"]["trace_id"] == root.trace_id
+    assert spans["llm_call"]["parent_id"] == root.span_id
+    assert spans["llm_call"]["attributes"] == {"provider": "openai", "ttft_ms": 1.0}
+    assert "RuntimeError" in spans["db_request"]["attributes"]["error"]
+
+def test_otlp_export_format(tmp_path):
+    path = tmp_path / "traces.jsonl"
+    tracer = Tracer(sample_rate=1.0, export_path=str(path), export_format="otlp")
+    with tracer.start_trace("turn", channel="whatsapp"):
+        pass
+    tracer.shutdown()
+
+    span = json.loads(path.read_text())["resourceSpans"][0]["scopeSpans"][0]["spans"][0]
+    assert span["name"] == "turn"
+    assert span["attributes"] == [{"key": "channel", "value": {"stringValue": "whatsapp"}}]
@@ -0,0 +1,83 @@
+from app.turn_graph import TurnGraph
+import asyncio
+import sys
+import os
+import pytest
+
+# Adiciona o diretório raiz ao PYTHONPATH
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+
+def _sleep(seconds: float, value=None, log=None, name=None):
+    async def step(results):
+        await asyncio.sleep(seconds)
+        if log is not None:
+            log.append(name)
+        return value
+    return step
+
+@pytest.mark.asyncio
+async def test_independent_steps_run_concurrently():
+    graph = TurnGraph("teste")
+    graph.step("memory_write_user", _sleep(0.05))
+    graph.step("context", _sleep(0.05, "contexto"))
+    graph.step("tool_detect", _sleep(0.05, (False, {})))
+    graph.step("agent", lambda results: _sleep(0.05, f"resposta com {results['context']}")(results), deps=("context", "tool_detect"))
+
+    results = await graph.run()
+    assert results["agent"] == "resposta com contexto"
+    # Caminho crítico ~ context + agent; sequencial seria a soma dos quatro passos
+    assert graph.critical_path_ms < 150
+    assert graph.serial_ms >= 190
+    assert graph.timings["agent"][0] >= graph.timings["context"][1]
+
+@pytest.mark.asyncio
+async def test_background_steps_run_after_critical_path():
+    log = []
+    tasks = set()
+    graph = TurnGraph("teste")
+    graph.step("agent", _sleep(0.01, "ok", log, "agent"))
+    graph.step("send", _sleep(0, None, log, "send"), deps=("agent",))
+    graph.step("memory_write", _sleep(0.05, None, log, "memory_write"), deps=("send",), critical=False)
+
+    await graph.run()
+    assert log == ["agent", "send"]
+    task = graph.run_background(tasks)
+    assert task in tasks
+    await task
+    assert log == ["agent", "send", "memory_write"]
+    assert not tasks
+
+@pytest.mark.asyncio
+async def test_failure_propagates_without_cancelling_independent_steps():
+    log = []
+
+    async def fail(results):
+        raise RuntimeError("provedor fora")
+
+    graph = TurnGraph("teste")
+    graph.step("memory_write_user", _sleep(0.03, None, log, "memory_write_user"))
+    graph.step("agent", fail)
+    graph.step("send", _sleep(0, None, log, "send"), deps=("agent",))
+
+    with pytest.raises(RuntimeError):
+        await graph.run()
+    assert log == ["memory_write_user"]
+
+@pytest.mark.asyncio
+async def test_background_failures_are_logged_not_raised():
+    async def fail(results):
+        raise RuntimeError("banco fora")
+
+    graph = TurnGraph("teste")
+    graph.step("agent", _sleep(0, "ok"))
+    graph.step("memory_write", fail, deps=("agent",), critical=False)
+    await graph.run()
+    await graph.run_background()
+
+def test_invalid_dependencies_are_rejected():
+    graph = TurnGraph("teste")
+    with pytest.raises(ValueError):
+        graph.step("agent", _sleep(0), deps=("context",))
+    graph.step("memory_write", _sleep(0), critical=False)
+    with pytest.raises(ValueError):
+        graph.step("send", _sleep(0), deps=("memory_write",))
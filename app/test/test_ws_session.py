@@ -0,0 +1,216 @@
+from app.ws_session import WebSocketSession
+from app.connection_manager import ConnectionManager
+from app.shared_state import InMemorySharedState
+from app.metrics import WS_SESSIONS, WS_TURNS_CANCELLED, WS_BROADCAST_DROPPED, WS_SEND_FAILURES
+from fastapi import WebSocketDisconnect
+import asyncio
+import json
+import sys
+import os
+import pytest
+
+# Adiciona o diretório raiz ao PYTHONPATH
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+
+class FakeWebSocket:
+    """Cliente simulado: o teste empurra mensagens em `incoming`; None desconecta"""
+
+    def __init__(self):
+        self.incoming: asyncio.Queue = asyncio.Queue()
+        self.sent = []
+        self.closed_with = None
+
+    async def accept(self):
+        pass
+
+    async def receive_json(self):
+        data = await self.incoming.get()
+        if data is None:
+            raise WebSocketDisconnect(1000)
+        return data
+
+    async def send_text(self, text):
+        self.sent.append(json.loads(text))
+
+    async def close(self, code: int = 1000):
+        self.closed_with = code
+
+class SlowHandler:
+    """Turno que espera `release`; registra o que começou, terminou e foi cancelado"""
+
+    def __init__(self):
+        self.release = asyncio.Event()
+        self.started = []
+        self.finished = []
+        self.cancelled = []
+
+    async def __call__(self, session, data):
+        self.started.append(data["message"])
+        try:
+            await self.release.wait()
+        except asyncio.CancelledError:
+            self.cancelled.append(data["message"])
+            raise
+        self.finished.append(data["message"])
+        await session.send_json({"response": data["message"]})
+
+@pytest.mark.asyncio
+async def test_stop_cancels_in_flight_turn_and_keeps_reading():
+    websocket, handler = FakeWebSocket(), SlowHandler()
+    session = WebSocketSession(websocket, max_pending=4)
+    run = asyncio.create_task(session.run(handler))
+    before = WS_TURNS_CANCELLED.value(reason="stop")
+
+    await websocket.incoming.put({"message": "primeira"})
+    await asyncio.sleep(0.01)
+    await websocket.incoming.put({"type": "stop"})
+    await asyncio.sleep(0.01)
+    assert handler.cancelled == ["primeira"]
+    assert {"type": "stopped", "cancelled": True} in websocket.sent
+    assert WS_TURNS_CANCELLED.value(reason="stop") == before + 1
+
+    # A sessão continua atendendo depois do stop
+    handler.release.set()
+    await websocket.incoming.put({"message": "segunda"})
+    await asyncio.sleep(0.01)
+    assert websocket.sent[-1] == {"response": "segunda"}
+
+    await websocket.incoming.put(None)
+    assert await run == "disconnect"
+
+@pytest.mark.asyncio
+async def test_disconnect_cancels_turn_and_pending_messages():
+    websocket, handler = FakeWebSocket(), SlowHandler()
+    session = WebSocketSession(websocket, max_pending=4)
+    run = asyncio.create_task(session.run(handler))
+
+    await websocket.incoming.put({"message": "longa"})
+    await asyncio.sleep(0.01)
+    await websocket.incoming.put({"message": "na fila"})
+    await websocket.incoming.put(None)
+    assert await run == "disconnect"
+    assert handler.cancelled == ["longa"]
+    assert handler.started == ["longa"]
+    assert websocket.closed_with is None
+
+@pytest.mark.asyncio
+async def test_inbound_queue_is_bounded():
+    websocket, handler = FakeWebSocket(), SlowHandler()
+    session = WebSocketSession(websocket, max_pending=1)
+    run = asyncio.create_task(session.run(handler))
+
+    await websocket.incoming.put({"message": "um"})
+    await asyncio.sleep(0.01)
+    await websocket.incoming.put({"message": "dois"})
+    await websocket.incoming.put({"message": "três"})
+    await asyncio.sleep(0.01)
+    assert any("pendentes" in message.get("error", "") for message in websocket.sent)
+
+    handler.release.set()
+    await asyncio.sleep(0.01)
+    assert handler.finished == ["um", "dois"]
+    await websocket.incoming.put(None)
+    await run
+
+@pytest.mark.asyncio
+async def test_heartbeat_and_idle_timeout():
+    websocket, handler = FakeWebSocket(), SlowHandler()
+    session = WebSocketSession(websocket, heartbeat_interval=0.02, idle_timeout=0.07)
+    run = asyncio.create_task(session.run(handler))
+
+    await asyncio.sleep(0.03)
+    assert {"type": "ping"} in websocket.sent
+    # O pong conta como atividade e adia o fechamento
+    await websocket.incoming.put({"type": "pong"})
+    await asyncio.sleep(0.05)
+    assert not run.done()
+
+    assert await asyncio.wait_for(run, 1) == "idle"
+    assert websocket.closed_with == 1000
+
+@pytest.mark.asyncio
+async def test_manager_tracks_sessions_by_id():
+    manager = ConnectionManager(InMemorySharedState())
+    first = await manager.connect(FakeWebSocket())
+    second = await manager.connect(FakeWebSocket())
+    assert set(manager.sessions) == {first.id, second.id}
+    assert WS_SESSIONS.value() == 2
+
+    manager.disconnect(first)
+    manager.disconnect(first)
+    assert list(manager.sessions) == [second.id]
+    assert WS_SESSIONS.value() == 1
+    manager.disconnect(second)
+
+class SlowWebSocket(FakeWebSocket):
+    """Cliente que só recebe quando `release` é liberado (ou nunca)"""
+
+    def __init__(self):
+        super().__init__()
+        self.release = asyncio.Event()
+        self.texts = []
+
+    async def send_text(self, text):
+        await self.release.wait()
+        self.texts.append(text)
+
+class RecordingWebSocket(FakeWebSocket):
+    def __init__(self):
+        super().__init__()
+        self.texts = []
+
+    async def send_text(self, text):
+        self.texts.append(text)
+
+@pytest.mark.asyncio
+async def test_broadcast_serialises_once_and_drops_slow_consumer():
+    manager = ConnectionManager(InMemorySharedState())
+    fast = [RecordingWebSocket() for _ in range(50)]
+    slow = SlowWebSocket()
+    for websocket in fast + [slow]:
+        await manager.connect(websocket)
+    slow_session = next(session for session in manager.sessions.values() if session.websocket is slow)
+    slow_session.send_timeout = 0.05
+
+    await manager.broadcast({"type": "aviso", "texto": "manutenção às 22h"})
+    await asyncio.sleep(0.01)
+    # Os clientes rápidos recebem sem esperar o lento, todos o mesmo texto serializado
+    assert all(len(websocket.texts) == 1 for websocket in fast)
+    assert len({id(websocket.texts[0]) for websocket in fast}) == 1
+    assert slow_session.id in manager.sessions
+
+    await manager.flush()
+    assert slow_session.id not in manager.sessions
+    assert slow.closed_with == 1008
+    assert len(manager.sessions) == 50
+    assert WS_SEND_FAILURES.value(reason="timeout") >= 1
+
+@pytest.mark.asyncio
+async def test_full_send_queue_drops_broadcasts_for_that_client():
+    manager = ConnectionManager(InMemorySharedState())
+    websocket = SlowWebSocket()
+    await manager.connect(websocket)
+    session = next(iter(manager.sessions.values()))
+    session.outbound = asyncio.Queue(maxsize=2)
+    before = WS_BROADCAST_DROPPED.value(reason="queue_full")
+
+    for number in range(4):
+        await manager.broadcast({"n": number})
+    assert WS_BROADCAST_DROPPED.value(reason="queue_full") == before + 2
+
+    websocket.release.set()
+    await manager.flush()
+    assert [json.loads(text)["n"] for text in websocket.texts] == [0, 1]
+    assert session.id in manager.sessions
+    await session.close()
+
+@pytest.mark.asyncio
+async def test_send_json_waits_for_delivery_and_fails_after_disconnect():
+    websocket = SlowWebSocket()
+    session = WebSocketSession(websocket, send_timeout=0.05)
+    with pytest.raises(ConnectionError):
+        await session.send_json({"response": "olá"})
+    assert session.closed
+    with pytest.raises(ConnectionError):
+        await session.send_json({"response": "de novo"})
+    await session.close()
@@ -0,0 +1,264 @@
+from typing import Dict, Any, Optional, List, Callable
+from contextvars import ContextVar
+import atexit
+import json
+import os
+import queue
+import random
+import threading
+import time
+from .settings import get_settings
+from .logging_config import get_logger
+
+logger = get_logger(__name__)
+
+_current_span: ContextVar[Optional["Span"]] = ContextVar("ineuro_current_span", default=None)
+
+class Span:
+    """Trecho cronometrado de um turno; usado como context manager"""
+
+    __slots__ = ("tracer", "trace_id", "span_id", "parent_id", "name", "attributes",
+                 "start_ns", "end_ns", "_start", "_token")
+
+    def __init__(self, tracer: "Tracer", name: str, trace_id: str, parent_id: Optional[str], attributes: Dict[str, Any]):
+        self.tracer = tracer
+        self.trace_id = trace_id
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.name = name
+        self.attributes = attributes
+        self.start_ns = 0
+        self.end_ns = 0
+        self._start = 0.0
+        self._token = None
+
+    @property
+    def sampled(self) -> bool:
+        return True
+
+    def set_attribute(self, key: str, value: Any):
+        self.attributes[key] = value
+
+    def elapsed_ms(self) -> float:
+        """Tempo desde o início do span (útil para TTFT)"""
+        return (time.perf_counter() - self._start) * 1000
+
+    def __enter__(self) -> "Span":
+        self.start_ns = time.time_ns()
+        self._start = time.perf_counter()
+        self._token = _current_span.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        duration = time.perf_counter() - self._start
+        self.end_ns = self.start_ns + int(duration * 1e9)
+        if exc is not None:
+            self.attributes["error"] = f"{exc_type.__name__}: {exc}"
+        _current_span.reset(self._token)
+        if self.tracer.stage_observer is not None:
+            self.tracer.stage_observer(self.name, duration)
+        self.tracer._export(self)
+        return False
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start_ns": self.start_ns,
+            "duration_ms": round((self.end_ns - self.start_ns) / 1e6, 3),
+            "attributes": self.attributes
+        }
+
+class _NoopSpan:
+    """Span usado quando o turno não foi amostrado: não mede nem exporta nada"""
+
+    __slots__ = ()
+    trace_id = None
+    span_id = None
+
+    @property
+    def sampled(self) -> bool:
+        return False
+
+    def set_attribute(self, key: str, value: Any):
+        pass
+
+    def elapsed_ms(self) -> float:
+        return 0.0
+
+    def __enter__(self) -> "_NoopSpan":
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+NOOP_SPAN = _NoopSpan()
+
+class _StageTimer:
+    """Span não amostrado que só mede a duração para o observador de estágios"""
+
+    __slots__ = ("tracer", "name", "_start")
+    trace_id = None
+    span_id = None
+
+    def __init__(self, tracer: "Tracer", name: str):
+        self.tracer = tracer
+        self.name = name
+        self._start = 0.0
+
+    @property
+    def sampled(self) -> bool:
+        return False
+
+    def set_attribute(self, key: str, value: Any):
+        pass
+
+    def elapsed_ms(self) -> float:
+        return (time.perf_counter() - self._start) * 1000
+
+    def __enter__(self) -> "_StageTimer":
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        observer = self.tracer.stage_observer
+        if observer is not None:
+            observer(self.name, time.perf_counter() - self._start)
+        return False
+
+class Tracer:
+    """
+    Tracing por turno com exportação local. A decisão de amostragem é feita
+    uma vez por turno em start_trace; sem amostragem, span() devolve um span
+    nulo compartilhado e o custo é uma leitura de ContextVar. Se houver um
+    stage_observer (métricas), spans não amostrados apenas medem a duração.
+    """
+
+    def __init__(self, sample_rate: float = 0.0, export_path: str = "traces.jsonl",
+                 export_format: str = "jsonl", service_name: str = "ineuro"):
+        self.sample_rate = max(0.0, min(1.0, sample_rate))
+        self.export_path = export_path
+        self.export_format = export_format
+        self.service_name = service_name
+        self.dropped = 0
+        self._queue: "queue.Queue[Optional[Span]]" = queue.Queue(maxsize=10000)
+        self._writer: Optional[threading.Thread] = None
+        self._writer_lock = threading.Lock()
+        self.stage_observer: Optional[Callable[[str, float], None]] = None
+
+    def start_trace(self, name: str, **attributes) -> Any:
+        """Inicia o span raiz de um turno (amostrado ou nulo)"""
+        if self.sample_rate <= 0.0 or (self.sample_rate < 1.0 and random.random() >= self.sample_rate):
+            return NOOP_SPAN
+        return Span(self, name, os.urandom(16).hex(), None, attributes)
+
+    def span(self, name: str, **attributes) -> Any:
+        """Cria um span filho do span atual; nulo se o turno não foi amostrado"""
+        parent = _current_span.get()
+        if parent is None:
+            return NOOP_SPAN if self.stage_observer is None else _StageTimer(self, name)
+        return Span(self, name, parent.trace_id, parent.span_id, attributes)
+
+    def current_trace_id(self) -> Optional[str]:
+        parent = _current_span.get()
+        return parent.trace_id if parent else None
+
+    def _export(self, span: Span):
+        """Enfileira o span para a thread de escrita sem bloquear o turno"""
+        self._ensure_writer()
+        try:
+            self._queue.put_nowait(span)
+        except queue.Full:
+            self.dropped += 1
+
+    def _ensure_writer(self):
+        if self._writer is not None:
+            return
+        with self._writer_lock:
+            if self._writer is None:
+                self._writer = threading.Thread(target=self._write_loop, name="trace-exporter", daemon=True)
+                self._writer.start()
+                atexit.register(self.shutdown)
+
+    def _format(self, span: Span) -> str:
+        if self.export_format == "otlp":
+            return json.dumps(self._to_otlp(span), ensure_ascii=False, default=str)
+        return json.dumps(span.to_dict(), ensure_ascii=False, default=str)
+
+    def _to_otlp(self, span: Span) -> Dict[str, Any]:
+        """Formato OTLP/JSON (uma linha por span), compatível com o file exporter do OpenTelemetry"""
+        return {
+            "resourceSpans": [{
+                "resource": {"attributes": [_otlp_attr("service.name", self.service_name)]},
+                "scopeSpans": [{
+                    "scope": {"name": "app.tracing"},
+                    "spans": [{
+                        "traceId": span.trace_id,
+                        "spanId": span.span_id,
+                        "parentSpanId": span.parent_id or "",
+                        "name": span.name,
+                        "kind": 1,
+                        "startTimeUnixNano": str(span.start_ns),
+                        "endTimeUnixNano": str(span.end_ns),
+                        "attributes": [_otlp_attr(k, v) for k, v in span.attributes.items()],
+                        "status": {"code": 2 if "error" in span.attributes else 1}
+                    }]
+                }]
+            }]
+        }
+
+    def _write_loop(self):
+        while True:
+            span = self._queue.get()
+            if span is None:
+                return
+            batch: List[Span] = [span]
+            # Escreve em lotes para reduzir syscalls
+            while len(batch) < 256:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    self._write(batch)
+                    return
+                batch.append(item)
+            self._write(batch)
+
+    def _write(self, batch: List[Span]):
+        try:
+            with open(self.export_path, "a", encoding="utf-8") as f:
+                f.write("".join(self._format(span) + "\n" for span in batch))
+        except Exception as e:
+            logger.error(f"Erro ao exportar spans: {str(e)}")
+
+    def queue_depth(self) -> int:
+        return self._queue.qsize()
+
+    def shutdown(self):
+        """Esvazia a fila de spans e encerra a thread de escrita"""
+        if self._writer is not None and self._writer.is_alive():
+            self._queue.put(None)
+            self._writer.join(timeout=5)
+
+def _otlp_attr(key: str, value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"key": key, "value": {"boolValue": value}}
+    if isinstance(value, int):
+        return {"key": key, "value": {"intValue": str(value)}}
+    if isinstance(value, float):
+        return {"key": key, "value": {"doubleValue": value}}
+    return {"key": key, "value": {"stringValue": str(value)}}
+
+def _create_tracer() -> Tracer:
+    settings = get_settings()
+    return Tracer(
+        sample_rate=settings.TRACE_SAMPLE_RATE,
+        export_path=settings.TRACE_EXPORT_PATH,
+        export_format=settings.TRACE_EXPORT_FORMAT
+    )
+
+# Instância global do tracer
+tracer = _create_tracer()
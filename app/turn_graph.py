@@ -0,0 +1,113 @@
+from typing import Dict, Any, Optional, List, Callable, Awaitable, Tuple, Set
+from dataclasses import dataclass
+import asyncio
+import time
+from .logging_config import get_logger
+from .tracing import tracer
+from .metrics import TURN_CRITICAL_PATH, TURN_SERIAL_TIME, TURN_BACKGROUND
+
+logger = get_logger(__name__)
+
+# Cada passo recebe os resultados dos passos já concluídos (por nome)
+StepFunc = Callable[[Dict[str, Any]], Awaitable[Any]]
+
+@dataclass
+class Step:
+    name: str
+    func: StepFunc
+    deps: Tuple[str, ...] = ()
+    critical: bool = True
+
+class TurnGraph:
+    """
+    Um turno como grafo de dependências. run() executa os passos críticos, cada
+    um assim que suas dependências terminam (passos independentes rodam em
+    paralelo). run_background() agenda os passos não críticos (persistir a
+    resposta, análise de memória) para depois que a resposta foi enviada.
+    Mede o caminho crítico e a soma das durações (o custo se fosse sequencial).
+    """
+
+    def __init__(self, channel: str):
+        self.channel = channel
+        self.steps: Dict[str, Step] = {}
+        self.results: Dict[str, Any] = {}
+        self.timings: Dict[str, Tuple[float, float]] = {}
+        self.critical_path_ms = 0.0
+        self.serial_ms = 0.0
+        self._start = 0.0
+
+    def step(self, name: str, func: StepFunc, deps: Tuple[str, ...] = (), critical: bool = True) -> "TurnGraph":
+        """Adiciona um passo; as dependências precisam ter sido adicionadas antes"""
+        for dep in deps:
+            if dep not in self.steps:
+                raise ValueError(f"Dependência desconhecida: {dep}")
+            if critical and not self.steps[dep].critical:
+                raise ValueError(f"Passo crítico {name} não pode depender do passo não crítico {dep}")
+        self.steps[name] = Step(name, func, tuple(deps), critical)
+        return self
+
+    async def run(self) -> Dict[str, Any]:
+        """Executa os passos críticos e retorna os resultados por nome"""
+        self._start = time.perf_counter()
+        critical = [step for step in self.steps.values() if step.critical]
+        await self._execute(critical)
+
+        self.critical_path_ms = (time.perf_counter() - self._start) * 1000
+        self.serial_ms = sum((self.timings[step.name][1] - self.timings[step.name][0]) * 1000 for step in critical)
+        TURN_CRITICAL_PATH.observe(self.critical_path_ms / 1000, channel=self.channel)
+        TURN_SERIAL_TIME.observe(self.serial_ms / 1000, channel=self.channel)
+        logger.debug("turn_critical_path", extra={
+            "channel": self.channel,
+            "critical_path_ms": round(self.critical_path_ms, 2),
+            "serial_ms": round(self.serial_ms, 2),
+            "steps": {name: [round(start * 1000, 2), round(end * 1000, 2)] for name, (start, end) in self.timings.items()}
+        })
+        return self.results
+
+    def run_background(self, tasks: Optional[Set[asyncio.Task]] = None) -> Optional[asyncio.Task]:
+        """
+        Agenda os passos não críticos. Falhas são registradas no log e não afetam
+        o turno; a task fica em `tasks` (se informado) até terminar.
+        """
+        background = [step for step in self.steps.values() if not step.critical]
+        if not background:
+            return None
+        task = asyncio.create_task(self._run_background(background))
+        if tasks is not None:
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        return task
+
+    async def _run_background(self, steps: List[Step]):
+        start = time.perf_counter()
+        try:
+            await self._execute(steps)
+        except Exception as e:
+            logger.error(f"Erro nos passos em segundo plano do turno: {str(e)}")
+        finally:
+            TURN_BACKGROUND.observe(time.perf_counter() - start, channel=self.channel)
+
+    async def _execute(self, steps: List[Step]):
+        tasks: Dict[str, asyncio.Task] = {}
+
+        async def run_step(step: Step) -> Any:
+            pending = [tasks[dep] for dep in step.deps if dep in tasks]
+            if pending:
+                await asyncio.gather(*pending)
+            start = time.perf_counter()
+            try:
+                with tracer.span(step.name):
+                    result = await step.func(self.results)
+            finally:
+                self.timings[step.name] = (start - self._start, time.perf_counter() - self._start)
+            self.results[step.name] = result
+            return result
+
+        for step in steps:
+            tasks[step.name] = asyncio.create_task(run_step(step))
+        # Espera todos os passos (uma falha não cancela passos independentes, como
+        # persistir a mensagem do usuário) e propaga o primeiro erro
+        outcomes = await asyncio.gather(*tasks.values(), return_exceptions=True)
+        for outcome in outcomes:
+            if isinstance(outcome, BaseException):
+                raise outcome
@@ -1,16 +1,23 @@
-import requests
+import aiohttp
 from .settings import get_settings
 import re
+from .logging_config import get_logger
+from .tracing import tracer
+from .http_pool import http_pool
+
+logger = get_logger(__name__)
 
 settings = get_settings()
 
 class WhatsAppClient:
     def __init__(self):
-        self.base_url = f"https://{settings.MEGAAPI_HOST}"
+        host = settings.MEGAAPI_HOST
+        self.base_url = host if host.startswith(("http://", "https://")) else f"https://{host}"
         self.headers = {
             "Authorization": f"Bearer {settings.MEGAAPI_TOKEN}",
             "Content-Type": "application/json"
         }
+        self.timeout = aiohttp.ClientTimeout(total=30)
     
     def format_message_for_whatsapp(self, message: str) -> str:
         """Formata a mensagem para WhatsApp mantendo emojis e formatação básica"""
@@ -38,11 +45,12 @@ class WhatsAppClient:
                 "phone": phone,
                 "message": formatted_message
             }
-            response = requests.post(url, headers=self.headers, json=data)
-            response.raise_for_status()
-            return response.json()
+            with tracer.span("whatsapp_send", chars=len(formatted_message)):
+                async with http_pool.session().post(url, headers=self.headers, json=data, timeout=self.timeout) as response:
+                    response.raise_for_status()
+                    return await response.json(content_type=None)
         except Exception as e:
-            print(f"Erro ao enviar mensagem: {str(e)}")
+            logger.error(f"Erro ao enviar mensagem: {str(e)}")
             raise
     
     def process_webhook(self, data: dict):
@@ -52,11 +60,13 @@ class WhatsAppClient:
                 return {
                     "phone": data.get("from"),
                     "message": data.get("text"),
-                    "timestamp": data.get("timestamp")
+                    "timestamp": data.get("timestamp"),
+                    # Id da mensagem no provedor (único; o timestamp é só por segundo)
+                    "message_id": data.get("id") or (data.get("key") or {}).get("id")
                 }
             return None
         except Exception as e:
-            print(f"Erro ao processar webhook: {str(e)}")
+            logger.error(f"Erro ao processar webhook: {str(e)}")
             raise
 
 whatsapp_client = WhatsAppClient() 
\ No newline at end of file
@@ -0,0 +1,233 @@
+from typing import Dict, Any, Optional, Callable, Awaitable
+import asyncio
+import json
+import os
+import time
+from fastapi import WebSocket, WebSocketDisconnect
+from .settings import get_settings
+from .logging_config import get_logger
+from .metrics import WS_TURNS_CANCELLED, WS_MESSAGES_REJECTED, WS_SESSIONS_CLOSED, WS_SEND_FAILURES
+
+logger = get_logger(__name__)
+
+settings = get_settings()
+
+# Processa uma mensagem do cliente (um turno); roda como task cancelável
+MessageHandler = Callable[["WebSocketSession", Dict[str, Any]], Awaitable[None]]
+
+def dumps(message: Dict[str, Any]) -> str:
+    """Serialização usada em todos os envios (a mesma do send_json do Starlette)"""
+    return json.dumps(message, ensure_ascii=False, separators=(",", ":"), default=str)
+
+def _resolve(done: Optional[asyncio.Future], delivered: bool):
+    if done is not None and not done.done():
+        done.set_result(delivered)
+
+class WebSocketSession:
+    """
+    Uma conexão WebSocket. A leitura roda separada do processamento: as
+    mensagens entram numa fila limitada e são processadas em ordem, uma por
+    vez, enquanto o socket continua sendo lido. Assim um {"type": "stop"} ou a
+    desconexão cancelam o turno em andamento (e a chamada ao LLM) na hora.
+    Sem mensagens do cliente, a sessão envia {"type": "ping"} (o cliente
+    responde {"type": "pong"}) e fecha depois de idle_timeout segundos.
+
+    Os envios passam por uma fila limitada com uma task escritora: respostas
+    esperam a vez, broadcasts são descartados se a fila estiver cheia, e um
+    envio que passa de send_timeout desconecta o cliente lento.
+    """
+
+    def __init__(
+        self,
+        websocket: WebSocket,
+        max_pending: Optional[int] = None,
+        heartbeat_interval: Optional[float] = None,
+        idle_timeout: Optional[float] = None,
+        send_queue: Optional[int] = None,
+        send_timeout: Optional[float] = None
+    ):
+        self.id = os.urandom(8).hex()
+        self.websocket = websocket
+        self.inbound: asyncio.Queue = asyncio.Queue(maxsize=max_pending or settings.WS_MAX_PENDING)
+        self.heartbeat_interval = heartbeat_interval or settings.WS_HEARTBEAT_INTERVAL
+        self.idle_timeout = idle_timeout or settings.WS_IDLE_TIMEOUT
+        self.current: Optional[asyncio.Task] = None
+        self.last_seen = time.monotonic()
+        self.turns = 0
+        self.outbound: asyncio.Queue = asyncio.Queue(maxsize=send_queue or settings.WS_SEND_QUEUE)
+        self.send_timeout = send_timeout or settings.WS_SEND_TIMEOUT
+        self.closed = False
+        self._writer: Optional[asyncio.Task] = None
+
+    async def send_json(self, message: Dict[str, Any]):
+        """
+        Envia uma mensagem da sessão (resposta, erro, ping): espera vaga na fila
+        e a entrega. Levanta ConnectionError se o cliente foi desconectado.
+        """
+        if self.closed:
+            raise ConnectionError("Sessão WebSocket encerrada")
+        done = asyncio.get_running_loop().create_future()
+        self._start_writer()
+        await self.outbound.put((dumps(message), done))
+        if self.closed and self._writer.done():
+            # Entrou na fila depois que a escritora terminou: ninguém mais vai entregar
+            _resolve(done, False)
+        if not await done:
+            raise ConnectionError("Sessão WebSocket encerrada")
+
+    def enqueue(self, text: str, done: Optional[asyncio.Future] = None) -> bool:
+        """
+        Enfileira um texto já serializado (broadcast) sem esperar. Retorna False
+        se a sessão está fechada ou a fila cheia; `done` recebe True/False na entrega.
+        """
+        if self.closed:
+            return False
+        try:
+            self.outbound.put_nowait((text, done))
+        except asyncio.QueueFull:
+            return False
+        self._start_writer()
+        return True
+
+    async def close(self):
+        """Para a task escritora; envios pendentes são dados como não entregues"""
+        self.closed = True
+        if self._writer is not None and not self._writer.done():
+            self._writer.cancel()
+            await asyncio.gather(self._writer, return_exceptions=True)
+        self._drain()
+
+    async def run(self, handler: MessageHandler) -> str:
+        """Atende a sessão até o cliente desconectar ou ficar ocioso; retorna o motivo"""
+        start = time.monotonic()
+        worker = asyncio.create_task(self._worker(handler))
+        reason = "error"
+        try:
+            reason = await self._reader()
+        finally:
+            # Desconexão (ou ociosidade) cancela o turno em andamento e a fila
+            self.cancel(reason)
+            worker.cancel()
+            await asyncio.gather(worker, return_exceptions=True)
+            await self.close()
+            if reason not in ("disconnect", "slow_consumer"):
+                try:
+                    await self.websocket.close(code=1000)
+                except Exception:
+                    pass
+            WS_SESSIONS_CLOSED.inc(reason=reason)
+            logger.debug("ws_session_closed", extra={
+                "session": self.id,
+                "reason": reason,
+                "turns": self.turns,
+                "duration_s": round(time.monotonic() - start, 2)
+            })
+        return reason
+
+    def cancel(self, reason: str) -> bool:
+        """Descarta as mensagens pendentes e cancela o turno em andamento"""
+        while not self.inbound.empty():
+            self.inbound.get_nowait()
+        task = self.current
+        if task is None or task.done():
+            return False
+        task.cancel()
+        WS_TURNS_CANCELLED.inc(reason=reason)
+        return True
+
+    @property
+    def idle(self) -> bool:
+        busy = (self.current is not None and not self.current.done()) or not self.inbound.empty()
+        return not busy and time.monotonic() - self.last_seen >= self.idle_timeout
+
+    async def _reader(self) -> str:
+        wait = min(self.heartbeat_interval, self.idle_timeout)
+        while True:
+            try:
+                data = await asyncio.wait_for(self.websocket.receive_json(), wait)
+            except asyncio.TimeoutError:
+                if self.closed:
+                    return "slow_consumer"
+                if self.idle:
+                    return "idle"
+                try:
+                    await self.send_json({"type": "ping"})
+                except Exception:
+                    return "disconnect"
+                continue
+            except WebSocketDisconnect:
+                return "disconnect"
+            except json.JSONDecodeError:
+                self.last_seen = time.monotonic()
+                await self.send_json({"error": "Mensagem inválida: esperado JSON"})
+                continue
+            except Exception as e:
+                logger.warning(f"Erro ao ler do WebSocket: {str(e)}")
+                return "error"
+
+            self.last_seen = time.monotonic()
+            if not isinstance(data, dict):
+                await self.send_json({"error": "Mensagem inválida: esperado um objeto JSON"})
+                continue
+            kind = data.get("type")
+            if kind == "pong":
+                continue
+            if kind == "stop":
+                cancelled = self.cancel("stop")
+                await self.send_json({"type": "stopped", "cancelled": cancelled})
+                continue
+            try:
+                self.inbound.put_nowait(data)
+            except asyncio.QueueFull:
+                WS_MESSAGES_REJECTED.inc()
+                await self.send_json({"error": "Muitas mensagens pendentes; aguarde as respostas anteriores"})
+
+    async def _worker(self, handler: MessageHandler):
+        while True:
+            data = await self.inbound.get()
+            self.turns += 1
+            self.current = asyncio.create_task(handler(self, data))
+            # wait() não propaga o cancelamento do turno (stop) para o worker
+            await asyncio.wait({self.current})
+            if not self.current.cancelled() and self.current.exception() is not None:
+                logger.error(f"Erro não tratado no turno do WebSocket: {str(self.current.exception())}")
+
+    def _start_writer(self):
+        if self._writer is None:
+            self._writer = asyncio.create_task(self._write_loop())
+
+    async def _write_loop(self):
+        done = None
+        try:
+            # Termina quando a sessão fecha (close() ou cliente lento): nada mais é enviado
+            while not self.closed:
+                text, done = await self.outbound.get()
+                if self.closed:
+                    break
+                try:
+                    await asyncio.wait_for(self.websocket.send_text(text), self.send_timeout)
+                except Exception as e:
+                    _resolve(done, False)
+                    await self._drop_client("timeout" if isinstance(e, asyncio.TimeoutError) else "error")
+                    return
+                _resolve(done, True)
+                done = None
+        finally:
+            _resolve(done, False)
+            self._drain()
+
+    def _drain(self):
+        """Dá como não entregues os envios ainda na fila (e libera quem espera vaga)"""
+        while not self.outbound.empty():
+            _, done = self.outbound.get_nowait()
+            _resolve(done, False)
+
+    async def _drop_client(self, reason: str):
+        """Cliente lento ou com erro: marca a sessão como fechada e fecha o socket"""
+        self.closed = True
+        WS_SEND_FAILURES.inc(reason=reason)
+        logger.warning("ws_slow_consumer", extra={"session": self.id, "reason": reason, "queued": self.outbound.qsize()})
+        try:
+            await asyncio.wait_for(self.websocket.close(code=1008), self.send_timeout)
+        except Exception:
+            pass
@@ -0,0 +1,26 @@
+"""Mensagens em português usadas pelos benchmarks (misturam as classes do LLMRouter)"""
+from typing import List
+import itertools
+
+MESSAGES: List[str] = [
+    "Oi, tudo bem?",
+    "Qual o horário de funcionamento de vocês?",
+    "Pode me explicar a diferença entre juros simples e compostos?",
+    "Preciso de uma análise comparativa entre as vendas deste trimestre e do anterior.",
+    "Escreva uma história curta sobre um robô que aprende a cozinhar.",
+    "Como funciona o processo de onboarding para novos clientes?",
+    "Analise os prós e contras de migrar nosso sistema para microsserviços.",
+    "Me ajude a criar um slogan criativo para uma padaria artesanal.",
+    "Qual é a capital da Austrália?",
+    "Explique detalhadamente como funciona o algoritmo de ordenação quicksort.",
+    "Quais são os principais indicadores financeiros para avaliar uma empresa?",
+    "Crie um poema sobre a chuva em São Paulo.",
+    "Obrigado pela ajuda!",
+    "Calcule a média de 12, 15, 18 e 21.",
+    "Faça um resumo das tendências de inteligência artificial para 2025.",
+    "Compare PostgreSQL e MongoDB para um sistema de pedidos com alto volume.",
+]
+
+def messages(count: int) -> List[str]:
+    """Retorna count mensagens, repetindo o corpus se necessário"""
+    return list(itertools.islice(itertools.cycle(MESSAGES), count))
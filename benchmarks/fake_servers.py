@@ -0,0 +1,480 @@
+"""
+Servidores falsos para benchmarks offline.
+
+Um único app aiohttp imita o REST do Supabase, os quatro provedores de LLM
+(OpenAI, Anthropic, Gemini, DeepSeek), o Mistral e a MegaAPI. Cada serviço
+tem sua própria distribuição de latência e seus contadores de chamadas, e
+os endpoints de LLM suportam streaming (SSE) no formato de cada provedor.
+Quando a requisição oferece ferramentas, o "modelo" pede a primeira delas
+com a última mensagem do usuário e, depois de receber o resultado, responde.
+"""
+from typing import Dict, Any, Optional, List, Tuple
+from collections import defaultdict
+from datetime import datetime
+import asyncio
+import itertools
+import json
+import math
+import random
+import threading
+import time
+from aiohttp import web
+
+# Texto usado para gerar respostas dos LLMs falsos
+_WORDS = (
+    "o agente analisou a pergunta e preparou uma resposta objetiva com base no "
+    "contexto da conversa considerando os pontos principais levantados pelo usuário"
+).split()
+
+class LatencyModel:
+    """
+    Distribuição de latência em segundos, criada a partir de uma especificação:
+    "0" ou "fixed:0.05", "uniform:0.02:0.2", "normal:0.3:0.05" (média, desvio)
+    ou "lognormal:0.3:0.5" (mediana, sigma).
+    """
+
+    def __init__(self, spec: str = "0", seed: Optional[int] = None):
+        self.spec = spec
+        self._random = random.Random(seed)
+        parts = spec.split(":")
+        if len(parts) == 1:
+            self.kind, self.params = "fixed", [float(parts[0])]
+        else:
+            self.kind, self.params = parts[0], [float(p) for p in parts[1:]]
+        if self.kind not in ("fixed", "uniform", "normal", "lognormal"):
+            raise ValueError(f"Distribuição de latência desconhecida: {spec}")
+
+    def sample(self) -> float:
+        if self.kind == "fixed":
+            return self.params[0]
+        if self.kind == "uniform":
+            return self._random.uniform(self.params[0], self.params[1])
+        if self.kind == "normal":
+            return max(0.0, self._random.gauss(self.params[0], self.params[1]))
+        return self._random.lognormvariate(math.log(self.params[0]), self.params[1])
+
+    async def wait(self):
+        delay = self.sample()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+def _count_tokens(payload: Any) -> int:
+    """Estimativa grosseira (4 caracteres por token), suficiente para simular usage"""
+    return max(1, len(json.dumps(payload, ensure_ascii=False)) // 4)
+
+def _text(tokens: int) -> List[str]:
+    return [word + " " for word in itertools.islice(itertools.cycle(_WORDS), tokens)]
+
+def _tool_arguments(schema: Optional[Dict[str, Any]], text: str) -> Dict[str, Any]:
+    """Argumentos do pedido de ferramenta: o texto no primeiro parâmetro obrigatório (ou no primeiro)"""
+    schema = schema or {}
+    names = list(schema.get("required") or []) + list(schema.get("properties") or {})
+    return {(names or ["input"])[0]: text}
+
+def _sse(data: Any, event: Optional[str] = None) -> bytes:
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data, ensure_ascii=False)}\n\n".encode()
+
+class FakeServices:
+    """Estado e rotas dos serviços falsos"""
+
+    SERVICES = ("supabase", "openai", "anthropic", "gemini", "deepseek", "mistral", "megaapi")
+
+    def __init__(self, latencies: Optional[Dict[str, str]] = None, response_tokens: int = 60,
+                 token_interval: float = 0.0, seed: Optional[int] = None):
+        latencies = latencies or {}
+        self.latency = {name: LatencyModel(latencies.get(name, "0"), seed) for name in self.SERVICES}
+        self.response_tokens = response_tokens
+        self.token_interval = token_interval
+        self.calls: Dict[str, int] = defaultdict(int)
+        self.tables: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+        # Status de erro a devolver nas próximas chamadas de cada serviço (ex.: [429, 503])
+        self.failures: Dict[str, List[int]] = defaultdict(list)
+        # Corpo das requisições que ofereceram ferramentas, por serviço
+        self.tool_requests: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+        self._ids = itertools.count(1)
+
+    def reset_counters(self):
+        self.calls.clear()
+
+    def snapshot(self) -> Dict[str, int]:
+        return dict(self.calls)
+
+    def _failure(self, service: str) -> Optional[web.Response]:
+        if not self.failures[service]:
+            return None
+        status = self.failures[service].pop(0)
+        headers = {"Retry-After": "1"} if status == 429 else None
+        return web.json_response({"error": {"message": f"fake {status}", "code": status}}, status=status, headers=headers)
+
+    def build_app(self) -> web.Application:
+        app = web.Application(client_max_size=32 * 1024 * 1024)
+        app.router.add_route("*", "/rest/v1/{table}", self.supabase)
+        app.router.add_post("/openai/v1/chat/completions", self.openai)
+        app.router.add_post("/deepseek/v1/chat/completions", self.deepseek)
+        app.router.add_post("/mistral/v1/chat/completions", self.mistral)
+        app.router.add_post("/anthropic/v1/messages", self.anthropic)
+        app.router.add_post("/v1beta/models/{model}:generateContent", self.gemini)
+        app.router.add_post("/v1beta/models/{model}:streamGenerateContent", self.gemini_stream)
+        app.router.add_get("/v1beta/models/{model}", self.gemini_model)
+        app.router.add_post("/megaapi/message/sendText/{instance}", self.megaapi)
+        return app
+
+    # Supabase (PostgREST)
+
+    def _filters(self, request: web.Request) -> List[Tuple[str, str]]:
+        """Extrai filtros eq. da query string, inclusive o formato col=eq.x.and.col2=eq.y"""
+        filters = []
+        for key, value in request.query.items():
+            if key in ("order", "limit", "select", "on_conflict", "offset"):
+                continue
+            for clause in f"{key}={value}".split(".and."):
+                column, _, condition = clause.partition("=")
+                if condition.startswith("eq."):
+                    filters.append((column, condition[3:]))
+        return filters
+
+    def _match(self, row: Dict[str, Any], filters: List[Tuple[str, str]]) -> bool:
+        return all(str(row.get(column)).lower() == value.lower() for column, value in filters)
+
+    async def supabase(self, request: web.Request) -> web.Response:
+        table = request.match_info["table"]
+        self.calls["supabase"] += 1
+        self.calls[f"supabase:{request.method}:{table}"] += 1
+        await self.latency["supabase"].wait()
+
+        rows = self.tables[table]
+        filters = self._filters(request)
+        if request.method == "GET":
+            result = [row for row in rows if self._match(row, filters)]
+            limit = request.query.get("limit")
+            return web.json_response(result[:int(limit)] if limit else result)
+
+        body = await request.json()
+        if request.method == "POST":
+            conflict = request.query.get("on_conflict")
+            if conflict:
+                for row in rows:
+                    if row.get(conflict) == body.get(conflict):
+                        row.update(body)
+                        return web.json_response([row], status=201)
+            row = {"id": next(self._ids), "created_at": datetime.utcnow().isoformat(), **body}
+            rows.append(row)
+            return web.json_response([row], status=201)
+
+        if request.method in ("PUT", "PATCH"):
+            updated = []
+            for row in rows:
+                if self._match(row, filters):
+                    row.update(body)
+                    updated.append(row)
+            return web.json_response(updated)
+
+        return web.json_response({"message": "method not allowed"}, status=405)
+
+    # Provedores compatíveis com OpenAI (OpenAI, DeepSeek, Mistral)
+
+    async def _chat_completions(self, request: web.Request, service: str, content: Optional[str] = None) -> web.StreamResponse:
+        self.calls[service] += 1
+        failure = self._failure(service)
+        if failure is not None:
+            return failure
+        body = await request.json()
+        model = body.get("model", service)
+        prompt_tokens = _count_tokens(body.get("messages", []))
+        pieces = [content] if content is not None else _text(min(self.response_tokens, body.get("max_tokens") or self.response_tokens))
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": len(pieces),
+            "total_tokens": prompt_tokens + len(pieces)
+        }
+        await self.latency[service].wait()
+
+        completion_id = f"chatcmpl-{next(self._ids)}"
+        created = int(time.time())
+        messages = body.get("messages", [])
+        if body.get("tools"):
+            self.tool_requests[service].append(body)
+        if body.get("tools") and not any(message.get("role") == "tool" for message in messages):
+            function = body["tools"][0]["function"]
+            question = next(message["content"] for message in reversed(messages) if message.get("role") == "user")
+            return web.json_response({
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": created,
+                "model": model,
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": None, "tool_calls": [{
+                        "id": f"call_{next(self._ids)}",
+                        "type": "function",
+                        "function": {"name": function["name"], "arguments": json.dumps(_tool_arguments(function.get("parameters"), question))}
+                    }]},
+                    "finish_reason": "tool_calls"
+                }],
+                "usage": {**usage, "completion_tokens": 1, "total_tokens": prompt_tokens + 1}
+            })
+        if body.get("stream"):
+            response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+            await response.prepare(request)
+            for piece in pieces:
+                await response.write(_sse({
+                    "id": completion_id, "object": "chat.completion.chunk", "created": created, "model": model,
+                    "choices": [{"index": 0, "delta": {"content": piece}, "finish_reason": None}]
+                }))
+                if self.token_interval:
+                    await asyncio.sleep(self.token_interval)
+            await response.write(_sse({
+                "id": completion_id, "object": "chat.completion.chunk", "created": created, "model": model,
+                "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}], "usage": usage
+            }))
+            await response.write(b"data: [DONE]\n\n")
+            await response.write_eof()
+            return response
+
+        return web.json_response({
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": created,
+            "model": model,
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": "".join(pieces)},
+                "finish_reason": "stop"
+            }],
+            "usage": usage
+        })
+
+    async def openai(self, request: web.Request) -> web.StreamResponse:
+        return await self._chat_completions(request, "openai")
+
+    async def deepseek(self, request: web.Request) -> web.StreamResponse:
+        return await self._chat_completions(request, "deepseek")
+
+    async def mistral(self, request: web.Request) -> web.StreamResponse:
+        # O MemoryAgent espera JSON com tópico ou resumo
+        analysis = {
+            "topic": "Benchmark",
+            "type": "general",
+            "subtopics": [],
+            "summary": "Conversa de benchmark",
+            "key_points": [],
+            "sentiment": "neutral"
+        }
+        return await self._chat_completions(request, "mistral", json.dumps(analysis))
+
+    # Anthropic
+
+    async def anthropic(self, request: web.Request) -> web.StreamResponse:
+        self.calls["anthropic"] += 1
+        body = await request.json()
+        model = body.get("model", "claude")
+        input_tokens = _count_tokens(body.get("messages", [])) + _count_tokens(body.get("system", ""))
+        pieces = _text(min(self.response_tokens, body.get("max_tokens") or self.response_tokens))
+        await self.latency["anthropic"].wait()
+
+        message_id = f"msg_{next(self._ids)}"
+        usage = {"input_tokens": input_tokens, "output_tokens": len(pieces),
+                 "cache_read_input_tokens": 0, "cache_creation_input_tokens": 0}
+        messages = body.get("messages", [])
+        if body.get("tools"):
+            self.tool_requests["anthropic"].append(body)
+        answered = any(
+            isinstance(message.get("content"), list) and any(block.get("type") == "tool_result" for block in message["content"])
+            for message in messages
+        )
+        if body.get("tools") and not answered:
+            tool = body["tools"][0]
+            question = next(message["content"] for message in reversed(messages) if isinstance(message.get("content"), str))
+            return web.json_response({
+                "id": message_id,
+                "type": "message",
+                "role": "assistant",
+                "model": model,
+                "content": [{"type": "tool_use", "id": f"toolu_{next(self._ids)}", "name": tool["name"],
+                             "input": _tool_arguments(tool.get("input_schema"), question)}],
+                "stop_reason": "tool_use",
+                "stop_sequence": None,
+                "usage": {**usage, "output_tokens": 1}
+            })
+        if body.get("stream"):
+            response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+            await response.prepare(request)
+            await response.write(_sse({"type": "message_start", "message": {
+                "id": message_id, "type": "message", "role": "assistant", "model": model, "content": [],
+                "stop_reason": None, "stop_sequence": None, "usage": {**usage, "output_tokens": 0}
+            }}, "message_start"))
+            await response.write(_sse({"type": "content_block_start", "index": 0,
+                                       "content_block": {"type": "text", "text": ""}}, "content_block_start"))
+            for piece in pieces:
+                await response.write(_sse({"type": "content_block_delta", "index": 0,
+                                           "delta": {"type": "text_delta", "text": piece}}, "content_block_delta"))
+                if self.token_interval:
+                    await asyncio.sleep(self.token_interval)
+            await response.write(_sse({"type": "content_block_stop", "index": 0}, "content_block_stop"))
+            await response.write(_sse({"type": "message_delta", "delta": {"stop_reason": "end_turn", "stop_sequence": None},
+                                       "usage": {"output_tokens": len(pieces)}}, "message_delta"))
+            await response.write(_sse({"type": "message_stop"}, "message_stop"))
+            await response.write_eof()
+            return response
+
+        return web.json_response({
+            "id": message_id,
+            "type": "message",
+            "role": "assistant",
+            "model": model,
+            "content": [{"type": "text", "text": "".join(pieces)}],
+            "stop_reason": "end_turn",
+            "stop_sequence": None,
+            "usage": usage
+        })
+
+    # Gemini (API REST v1beta)
+
+    def _gemini_chunk(self, text: str, prompt_tokens: int, output_tokens: int, finish: bool) -> Dict[str, Any]:
+        candidate = {"content": {"parts": [{"text": text}], "role": "model"}, "index": 0}
+        if finish:
+            candidate["finishReason"] = "STOP"
+        return {
+            "candidates": [candidate],
+            "usageMetadata": {
+                "promptTokenCount": prompt_tokens,
+                "candidatesTokenCount": output_tokens,
+                "totalTokenCount": prompt_tokens + output_tokens
+            }
+        }
+
+    async def _gemini_request(self, request: web.Request) -> Tuple[int, List[str]]:
+        self.calls["gemini"] += 1
+        body = await request.json()
+        max_tokens = body.get("generationConfig", {}).get("maxOutputTokens") or self.response_tokens
+        pieces = _text(min(self.response_tokens, max_tokens))
+        await self.latency["gemini"].wait()
+        return _count_tokens(body.get("contents", [])), pieces
+
+    async def gemini(self, request: web.Request) -> web.Response:
+        failure = self._failure("gemini")
+        if failure is not None:
+            self.calls["gemini"] += 1
+            return failure
+        body = await request.json()
+        prompt_tokens, pieces = await self._gemini_request(request)
+        if body.get("tools"):
+            self.tool_requests["gemini"].append(body)
+        contents = body.get("contents", [])
+        answered = any("functionResponse" in part for content in contents for part in content.get("parts", []))
+        if body.get("tools") and not answered:
+            declaration = body["tools"][0]["functionDeclarations"][0]
+            question = next(part["text"] for content in reversed(contents) for part in content.get("parts", []) if "text" in part)
+            chunk = self._gemini_chunk("", prompt_tokens, 1, True)
+            chunk["candidates"][0]["content"]["parts"] = [{"functionCall": {
+                "name": declaration["name"], "args": _tool_arguments(declaration.get("parameters"), question)
+            }}]
+            return web.json_response(chunk)
+        return web.json_response(self._gemini_chunk("".join(pieces), prompt_tokens, len(pieces), True))
+
+    async def gemini_model(self, request: web.Request) -> web.Response:
+        return web.json_response({"name": f"models/{request.match_info['model']}", "inputTokenLimit": 1048576})
+
+    async def gemini_stream(self, request: web.Request) -> web.StreamResponse:
+        prompt_tokens, pieces = await self._gemini_request(request)
+        if request.query.get("alt") != "sse":
+            chunks = [self._gemini_chunk(piece, prompt_tokens, i + 1, i == len(pieces) - 1) for i, piece in enumerate(pieces)]
+            return web.json_response(chunks)
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await response.prepare(request)
+        for i, piece in enumerate(pieces):
+            await response.write(_sse(self._gemini_chunk(piece, prompt_tokens, i + 1, i == len(pieces) - 1)))
+            if self.token_interval:
+                await asyncio.sleep(self.token_interval)
+        await response.write_eof()
+        return response
+
+    # MegaAPI (WhatsApp)
+
+    async def megaapi(self, request: web.Request) -> web.Response:
+        self.calls["megaapi"] += 1
+        await request.read()
+        await self.latency["megaapi"].wait()
+        return web.json_response({"error": False, "message": "sent", "key": {"id": f"wamid.{next(self._ids)}"}})
+
+class FakeServer:
+    """
+    Sobe os serviços falsos em uma porta local. No teste de carga o servidor
+    roda fora do event loop do app (start_thread()/stop_thread()), para que a
+    latência simulada não dispute o loop medido; nos testes, use async with.
+    """
+
+    def __init__(self, services: FakeServices, host: str = "127.0.0.1", port: int = 0):
+        self.services = services
+        self.host = host
+        self.port = port
+        self._runner: Optional[web.AppRunner] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    def environment(self) -> Dict[str, str]:
+        """Variáveis de ambiente que apontam o app para os serviços falsos"""
+        return {
+            "SUPABASE_URL": self.base_url,
+            "SUPABASE_KEY": "fake-key",
+            "OPENAI_BASE_URL": f"{self.base_url}/openai/v1",
+            "DEEPSEEK_BASE_URL": f"{self.base_url}/deepseek/v1",
+            "ANTHROPIC_BASE_URL": f"{self.base_url}/anthropic",
+            "GEMINI_BASE_URL": self.base_url,
+            "MISTRAL_BASE_URL": f"{self.base_url}/mistral",
+            "MEGAAPI_HOST": f"{self.base_url}/megaapi",
+            "MEGAAPI_TOKEN": "fake-token",
+            "MEGAAPI_INSTANCE_ID": "fake-instance",
+            "OPENAI_API_KEY": "fake-key",
+            "ANTHROPIC_API_KEY": "fake-key",
+            "GEMINI_API_KEY": "fake-key",
+            "DEEPSEEK_API_KEY": "fake-key",
+            "MISTRAL_API_KEY": "fake-key",
+            "MCP_SERVERS": "[]",
+        }
+
+    async def start(self):
+        self._runner = web.AppRunner(self.services.build_app(), access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        if self._runner:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def __aenter__(self) -> "FakeServer":
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.stop()
+
+    def start_thread(self) -> "FakeServer":
+        """Roda o servidor em uma thread com event loop próprio"""
+        ready = threading.Event()
+
+        def run():
+            self._loop = asyncio.new_event_loop()
+            self._loop.run_until_complete(self.start())
+            ready.set()
+            self._loop.run_forever()
+            self._loop.run_until_complete(self.stop())
+            self._loop.close()
+
+        self._thread = threading.Thread(target=run, name="fake-servers", daemon=True)
+        self._thread.start()
+        ready.wait()
+        return self
+
+    def stop_thread(self):
+        if self._loop and self._thread:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join(timeout=5)
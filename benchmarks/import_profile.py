@@ -0,0 +1,86 @@
+"""
+Perfil do tempo de importação (cold start de um worker).
+
+Roda `python -X importtime -c "import app.main"` em processos novos e
+agrega o tempo próprio dos módulos por pacote de topo. Também lista os SDKs pesados
+que foram carregados (deveriam ser importados só no primeiro uso).
+
+    python -m benchmarks.import_profile --runs 3 --top 15
+"""
+from typing import Dict, Any, List, Optional
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+# SDKs que não deveriam ser importados junto com o app
+HEAVY_MODULES = ("anthropic", "openai", "google.generativeai", "mistralai", "pydantic_ai", "rich")
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def profile_once(module: str = "app.main") -> Dict[str, Any]:
+    """Importa o módulo em um processo novo e retorna tempos (ms) por pacote de topo"""
+    code = (
+        "import sys, json, time; start = time.perf_counter(); "
+        f"import {module}; elapsed = time.perf_counter() - start; "
+        f"heavy = [m for m in {HEAVY_MODULES!r} if m in sys.modules]; "
+        "print(json.dumps({'elapsed': elapsed, 'heavy': heavy}))"
+    )
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+        check=True
+    )
+    packages: Dict[str, float] = {}
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        try:
+            own, _, name = line[len("import time:"):].split("|")
+            own_us = int(own)
+        except ValueError:
+            continue
+        # Soma o tempo próprio de cada módulo no pacote de topo (sem contar filhos duas vezes)
+        top = name.strip().split(".")[0]
+        packages[top] = packages.get(top, 0.0) + own_us / 1000
+    result = json.loads(completed.stdout.strip().splitlines()[-1])
+    return {"total_ms": result["elapsed"] * 1000, "heavy_modules": result["heavy"], "packages": packages}
+
+def profile(module: str = "app.main", runs: int = 3) -> Dict[str, Any]:
+    samples = [profile_once(module) for _ in range(runs)]
+    packages = {}
+    for name in samples[0]["packages"]:
+        packages[name] = round(statistics.median(s["packages"].get(name, 0.0) for s in samples), 1)
+    return {
+        "module": module,
+        "runs": runs,
+        "total_ms": round(statistics.median(s["total_ms"] for s in samples), 1),
+        "heavy_modules": samples[-1]["heavy_modules"],
+        "packages": dict(sorted(packages.items(), key=lambda item: item[1], reverse=True)),
+    }
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Perfil do tempo de importação do app")
+    parser.add_argument("--module", default="app.main")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--json", dest="json_path", help="Salva o relatório em JSON")
+    args = parser.parse_args(argv)
+
+    report = profile(args.module, args.runs)
+    print(f"import {report['module']}: {report['total_ms']} ms (mediana de {report['runs']} processos)")
+    print(f"SDKs pesados carregados: {', '.join(report['heavy_modules']) or 'nenhum'}")
+    print(f"{'pacote':<30} {'ms':>10}")
+    for name, ms in list(report["packages"].items())[:args.top]:
+        print(f"{name:<30} {ms:>10}")
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
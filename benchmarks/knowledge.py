@@ -0,0 +1,159 @@
+"""
+Benchmark da busca na base de conhecimento.
+
+Gera um corpus sintético de trechos em português (descrições de produtos
+com SKUs, cidades e nomes de fornecedores), monta o índice lexical (BM25)
+e, com --hybrid, também o índice vetorial em disco, e mede a latência de
+consultas com códigos, nomes próprios e perguntas em linguagem natural.
+
+    python -m benchmarks.knowledge --chunks 100000 --queries 500
+    python -m benchmarks.knowledge --chunks 100000 --hybrid --dim 384
+
+Com --max-p95-ms o processo sai com código 1 quando o p95 de alguma busca
+passa do limite (uso em CI).
+"""
+from typing import Dict, Any, List, Optional, Callable
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+from .corpus import MESSAGES
+
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+CITIES = ["São Paulo", "Belo Horizonte", "Florianópolis", "Ribeirão Preto", "Maceió", "Curitiba", "Porto Alegre", "Goiânia"]
+SUPPLIERS = ["Tecelagem Guaraciaba", "Metalúrgica Itaúna", "Laticínios Serra Azul", "Cerâmica Conceição", "Vinícola Aurora"]
+PRODUCTS = ["bomba d'água", "válvula de pressão", "sensor de umidade", "motor elétrico", "painel solar", "filtro de ar", "caixa de câmbio"]
+ACTIONS = [
+    "A garantia cobre defeitos de fabricação por {n} meses.",
+    "A instalação deve ser feita por técnico credenciado em {city}.",
+    "O prazo de entrega para {city} é de {n} dias úteis.",
+    "Em caso de vazamento, desligue o equipamento e acione o suporte.",
+    "A manutenção preventiva é recomendada a cada {n} mil horas de uso.",
+]
+
+def build_corpus(count: int, seed: int = 0) -> List[str]:
+    """count trechos de ~60 palavras; cada um cita um SKU único"""
+    rng = random.Random(seed)
+    chunks = []
+    for i in range(count):
+        city = rng.choice(CITIES)
+        sentences = [
+            f"O {rng.choice(PRODUCTS)} SKU-{i:06d} é fornecido pela {rng.choice(SUPPLIERS)}.",
+            *(rng.choice(ACTIONS).format(n=rng.randint(2, 36), city=city) for _ in range(3)),
+            rng.choice(MESSAGES),
+        ]
+        chunks.append(" ".join(sentences))
+    return chunks
+
+def build_queries(count: int, corpus_size: int, seed: int = 1) -> List[str]:
+    rng = random.Random(seed)
+    kinds = [
+        lambda: f"SKU-{rng.randrange(corpus_size):06d}",
+        lambda: f"qual a garantia do sku-{rng.randrange(corpus_size):06d}?",
+        lambda: f"fornecedor {rng.choice(SUPPLIERS)} em {rng.choice(CITIES)}",
+        lambda: f"prazo de entrega para {rng.choice(CITIES).lower()}",
+        lambda: f"como fazer a manutenção do {rng.choice(PRODUCTS)}",
+    ]
+    return [rng.choice(kinds)() for _ in range(count)]
+
+def _percentile(ordered: List[float], pct: float) -> float:
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+def measure(search: Callable[[str], Any], queries: List[str], warmup: int = 20) -> Dict[str, float]:
+    for query in queries[:warmup]:
+        search(query)
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        search(query)
+        latencies.append((time.perf_counter() - start) * 1000)
+    ordered = sorted(latencies)
+    return {
+        "queries": len(latencies),
+        "p50_ms": round(_percentile(ordered, 50), 3),
+        "p95_ms": round(_percentile(ordered, 95), 3),
+        "p99_ms": round(_percentile(ordered, 99), 3),
+        "max_ms": round(ordered[-1], 3),
+    }
+
+def run(args: argparse.Namespace) -> Dict[str, Any]:
+    from app.knowledge import LexicalIndex, KnowledgeIndex, KnowledgeRetriever, embed_batch, chunk_hash
+
+    corpus = build_corpus(args.chunks, args.seed)
+    queries = build_queries(args.queries, args.chunks, args.seed + 1)
+    report: Dict[str, Any] = {"config": {"chunks": args.chunks, "queries": args.queries, "hybrid": args.hybrid, "dim": args.dim}}
+
+    start = time.perf_counter()
+    lexical = LexicalIndex()
+    lexical.add(corpus)
+    report["lexical_build_s"] = round(time.perf_counter() - start, 2)
+    report["lexical_index"] = lexical.stats()
+    report["bm25"] = measure(lambda query: lexical.search(query, args.candidates), queries)
+
+    # O SKU consultado deve vir em primeiro lugar
+    sku_queries = [query for query in queries if query.startswith("SKU-")][:100]
+    hits = sum(1 for query in sku_queries if lexical.search(query, 1)[0][0] == int(query[4:]))
+    report["bm25_sku_top1"] = round(hits / len(sku_queries), 3) if sku_queries else None
+
+    if args.hybrid:
+        with tempfile.TemporaryDirectory(prefix="kb_bench_") as path:
+            start = time.perf_counter()
+            index = KnowledgeIndex(path, args.dim, ivf_min_chunks=args.ivf_min_chunks)
+            batch = 10000
+            for first in range(0, len(corpus), batch):
+                texts = corpus[first:first + batch]
+                hashes = [chunk_hash(text) for text in texts]
+                index.add_document(f"lote_{first // batch}.md", f"{first:064d}", texts, hashes, dict(zip(hashes, embed_batch(texts, args.dim))))
+            report["hybrid_build_s"] = round(time.perf_counter() - start, 2)
+            report["vector_index"] = {key: value for key, value in index.stats().items() if key != "lexical"}
+            retriever = KnowledgeRetriever(index, top_k=4, min_score=0.0, candidates=args.candidates)
+            report["vector"] = measure(lambda query: index.search(embed_batch([query], args.dim)[0], args.candidates), queries)
+            report["hybrid"] = measure(retriever.search, queries)
+    return report
+
+def _print_report(report: Dict[str, Any]):
+    print(f"Corpus: {report['config']['chunks']} trechos, {report['config']['queries']} consultas")
+    print(f"Índice lexical: {report['lexical_index']} em {report['lexical_build_s']}s; SKU no topo: {report['bm25_sku_top1']}")
+    for name in ("bm25", "vector", "hybrid"):
+        if name in report:
+            stats = report[name]
+            print(f"{name:>8}: p50 {stats['p50_ms']:.3f} ms  p95 {stats['p95_ms']:.3f} ms  p99 {stats['p99_ms']:.3f} ms  max {stats['max_ms']:.3f} ms")
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Latência da busca lexical e híbrida da base de conhecimento")
+    parser.add_argument("--chunks", type=int, default=100000)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--candidates", type=int, default=20, help="Profundidade de cada busca antes da fusão")
+    parser.add_argument("--hybrid", action="store_true", help="Mede também o índice vetorial e a fusão (RRF)")
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--ivf-min-chunks", type=int, default=20000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", dest="json_path", help="Salva o relatório em JSON")
+    parser.add_argument("--max-p95-ms", type=float, default=None)
+    return parser
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    report = run(args)
+    _print_report(report)
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+    failures = [
+        f"{name} p95 {report[name]['p95_ms']} ms > {args.max_p95_ms} ms"
+        for name in ("bm25", "vector", "hybrid")
+        if args.max_p95_ms is not None and name in report and report[name]["p95_ms"] > args.max_p95_ms
+    ]
+    for failure in failures:
+        print(f"LIMITE EXCEDIDO: {failure}", file=sys.stderr)
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
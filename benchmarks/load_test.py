@@ -0,0 +1,268 @@
+"""
+Teste de carga offline do iNeuro.
+
+Sobe os serviços falsos (benchmarks/fake_servers.py) e o app em threads
+separadas e dispara turnos em /ws, /api/chat e /webhook com concorrência
+configurável. Reporta throughput, latência p50/p95/p99 e chamadas ao banco
+e aos LLMs por turno. Não precisa de rede.
+
+    python -m benchmarks.load_test --requests 200 --concurrency 20 \\
+        --llm-latency lognormal:0.4:0.5 --db-latency uniform:0.01:0.04
+
+Com --max-p95-ms / --max-db-calls-per-turn o processo sai com código 1
+quando um limite é ultrapassado (uso em CI).
+"""
+from typing import Dict, Any, List, Optional
+from dataclasses import dataclass, field, asdict
+import argparse
+import asyncio
+import json
+import os
+import socket
+import sys
+import threading
+import time
+import aiohttp
+
+from .corpus import messages
+from .fake_servers import FakeServices, FakeServer
+
+ENDPOINTS = ("ws", "api_chat", "webhook")
+LLM_SERVICES = ("openai", "anthropic", "gemini", "deepseek")
+
+@dataclass
+class PhaseResult:
+    """Resultado de um endpoint"""
+    endpoint: str
+    requests: int = 0
+    errors: int = 0
+    duration_s: float = 0.0
+    latencies_ms: List[float] = field(default_factory=list)
+    calls: Dict[str, int] = field(default_factory=dict)
+
+    def _percentile(self, ordered: List[float], pct: float) -> float:
+        if not ordered:
+            return 0.0
+        index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+        return ordered[index]
+
+    def summary(self) -> Dict[str, Any]:
+        ordered = sorted(self.latencies_ms)
+        turns = max(1, self.requests)
+        return {
+            "endpoint": self.endpoint,
+            "requests": self.requests,
+            "errors": self.errors,
+            "throughput_rps": round(self.requests / self.duration_s, 2) if self.duration_s else 0.0,
+            "p50_ms": round(self._percentile(ordered, 50), 2),
+            "p95_ms": round(self._percentile(ordered, 95), 2),
+            "p99_ms": round(self._percentile(ordered, 99), 2),
+            "max_ms": round(ordered[-1], 2) if ordered else 0.0,
+            "db_calls_per_turn": round(self.calls.get("supabase", 0) / turns, 2),
+            "llm_calls_per_turn": round(sum(self.calls.get(s, 0) for s in LLM_SERVICES) / turns, 2),
+            "mistral_calls_per_turn": round(self.calls.get("mistral", 0) / turns, 2),
+            "calls": self.calls,
+        }
+
+class AppServer:
+    """Roda o app FastAPI com uvicorn em uma thread própria"""
+
+    def __init__(self, port: int):
+        self.port = port
+        self._server = None
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        import uvicorn
+        # Importado só agora: as settings são lidas do ambiente na importação
+        from app.main import app
+
+        config = uvicorn.Config(app, host="127.0.0.1", port=self.port, log_level="warning", lifespan="on")
+        self._server = uvicorn.Server(config)
+        self._thread = threading.Thread(target=self._server.run, name="app-server", daemon=True)
+        self._thread.start()
+        deadline = time.monotonic() + 30
+        while not self._server.started:
+            if time.monotonic() > deadline or not self._thread.is_alive():
+                raise RuntimeError("App não iniciou")
+            time.sleep(0.05)
+
+    def stop(self):
+        if self._server:
+            self._server.should_exit = True
+            self._thread.join(timeout=10)
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+async def _ws_worker(session: aiohttp.ClientSession, base_url: str, worker: int, jobs: asyncio.Queue, result: PhaseResult):
+    async with session.ws_connect(f"{base_url}/ws") as ws:
+        while True:
+            try:
+                message = jobs.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            start = time.perf_counter()
+            await ws.send_json({"message": message, "sender_id": f"bench-ws-{worker}"})
+            reply = await ws.receive_json()
+            while reply.get("type") == "ping":
+                await ws.send_json({"type": "pong"})
+                reply = await ws.receive_json()
+            result.latencies_ms.append((time.perf_counter() - start) * 1000)
+            result.requests += 1
+            if "error" in reply:
+                result.errors += 1
+
+async def _http_worker(session: aiohttp.ClientSession, base_url: str, endpoint: str, worker: int, jobs: asyncio.Queue, result: PhaseResult):
+    while True:
+        try:
+            message = jobs.get_nowait()
+        except asyncio.QueueEmpty:
+            return
+        if endpoint == "api_chat":
+            url, payload = f"{base_url}/api/chat", {"message": message, "sender_id": f"bench-api-{worker}"}
+        else:
+            url, payload = f"{base_url}/webhook", {"type": "message", "from": f"5511{worker:09d}", "text": message}
+        start = time.perf_counter()
+        async with session.post(url, json=payload) as response:
+            body = await response.json(content_type=None)
+        result.latencies_ms.append((time.perf_counter() - start) * 1000)
+        result.requests += 1
+        if response.status != 200 or (isinstance(body, dict) and "error" in body):
+            result.errors += 1
+
+async def run_phase(base_url: str, endpoint: str, total: int, concurrency: int, services: Optional[FakeServices] = None) -> PhaseResult:
+    """Dispara total turnos em um endpoint com concurrency clientes simultâneos"""
+    result = PhaseResult(endpoint)
+    jobs: asyncio.Queue = asyncio.Queue()
+    for message in messages(total):
+        jobs.put_nowait(message)
+
+    before = services.snapshot() if services else {}
+    timeout = aiohttp.ClientTimeout(total=300)
+    async with aiohttp.ClientSession(timeout=timeout) as session:
+        start = time.perf_counter()
+        if endpoint == "ws":
+            workers = [_ws_worker(session, base_url, i, jobs, result) for i in range(concurrency)]
+        else:
+            workers = [_http_worker(session, base_url, endpoint, i, jobs, result) for i in range(concurrency)]
+        outcomes = await asyncio.gather(*workers, return_exceptions=True)
+        result.duration_s = time.perf_counter() - start
+    result.errors += sum(1 for outcome in outcomes if isinstance(outcome, Exception))
+
+    if services:
+        after = services.snapshot()
+        result.calls = {key: after[key] - before.get(key, 0) for key in after if after[key] - before.get(key, 0)}
+    return result
+
+def _print_report(report: Dict[str, Any]):
+    header = f"{'endpoint':<10} {'reqs':>6} {'errs':>5} {'rps':>8} {'p50':>9} {'p95':>9} {'p99':>9} {'db/turn':>8} {'llm/turn':>9}"
+    print(header)
+    print("-" * len(header))
+    for phase in report["phases"]:
+        print(
+            f"{phase['endpoint']:<10} {phase['requests']:>6} {phase['errors']:>5} {phase['throughput_rps']:>8} "
+            f"{phase['p50_ms']:>9} {phase['p95_ms']:>9} {phase['p99_ms']:>9} "
+            f"{phase['db_calls_per_turn']:>8} {phase['llm_calls_per_turn']:>9}"
+        )
+
+def _check_limits(report: Dict[str, Any], args: argparse.Namespace) -> List[str]:
+    failures = []
+    for phase in report["phases"]:
+        if phase["errors"] > args.max_errors:
+            failures.append(f"{phase['endpoint']}: {phase['errors']} erros")
+        if args.max_p95_ms is not None and phase["p95_ms"] > args.max_p95_ms:
+            failures.append(f"{phase['endpoint']}: p95 {phase['p95_ms']}ms > {args.max_p95_ms}ms")
+        if args.max_db_calls_per_turn is not None and phase["db_calls_per_turn"] > args.max_db_calls_per_turn:
+            failures.append(f"{phase['endpoint']}: {phase['db_calls_per_turn']} chamadas ao banco por turno")
+    return failures
+
+async def _drive(base_url: str, args: argparse.Namespace, services: FakeServices) -> List[PhaseResult]:
+    results = []
+    for endpoint in args.endpoints:
+        if args.warmup:
+            await run_phase(base_url, endpoint, args.warmup, min(args.warmup, args.concurrency))
+        results.append(await run_phase(base_url, endpoint, args.requests, args.concurrency, services))
+    return results
+
+def run(args: argparse.Namespace) -> Dict[str, Any]:
+    """Executa o teste de carga completo e retorna o relatório"""
+    services = FakeServices(
+        latencies={
+            "supabase": args.db_latency,
+            "openai": args.llm_latency,
+            "anthropic": args.llm_latency,
+            "gemini": args.llm_latency,
+            "deepseek": args.llm_latency,
+            "mistral": args.mistral_latency,
+            "megaapi": args.whatsapp_latency,
+        },
+        response_tokens=args.response_tokens,
+        token_interval=args.token_interval,
+        seed=args.seed
+    )
+    fake = FakeServer(services).start_thread()
+    os.environ.update(fake.environment())
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    os.environ.setdefault("ENVIRONMENT", "benchmark")
+    # Mede regime permanente: os SDKs são carregados no startup, não no primeiro turno
+    os.environ.setdefault("PREWARM_PROVIDERS", "all")
+
+    server = AppServer(args.port or _free_port())
+    try:
+        server.start()
+        results = asyncio.run(_drive(f"http://127.0.0.1:{server.port}", args, services))
+    finally:
+        server.stop()
+        fake.stop_thread()
+
+    return {
+        "config": {
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "llm_latency": args.llm_latency,
+            "db_latency": args.db_latency,
+            "mistral_latency": args.mistral_latency,
+            "whatsapp_latency": args.whatsapp_latency,
+            "response_tokens": args.response_tokens,
+        },
+        "phases": [result.summary() for result in results],
+    }
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Teste de carga offline com serviços falsos")
+    parser.add_argument("--endpoints", nargs="+", choices=ENDPOINTS, default=list(ENDPOINTS))
+    parser.add_argument("--requests", type=int, default=100, help="Turnos por endpoint")
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--warmup", type=int, default=2, help="Turnos descartados antes de medir")
+    parser.add_argument("--llm-latency", default="lognormal:0.3:0.4", help="Latência dos LLMs (ex.: fixed:0.2)")
+    parser.add_argument("--db-latency", default="uniform:0.005:0.02", help="Latência do Supabase")
+    parser.add_argument("--mistral-latency", default="lognormal:0.2:0.3", help="Latência do Mistral")
+    parser.add_argument("--whatsapp-latency", default="fixed:0.05", help="Latência da MegaAPI")
+    parser.add_argument("--response-tokens", type=int, default=60)
+    parser.add_argument("--token-interval", type=float, default=0.0, help="Intervalo entre tokens no streaming")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--port", type=int, default=0)
+    parser.add_argument("--json", dest="json_path", help="Salva o relatório em JSON")
+    parser.add_argument("--max-errors", type=int, default=0)
+    parser.add_argument("--max-p95-ms", type=float, default=None)
+    parser.add_argument("--max-db-calls-per-turn", type=float, default=None)
+    return parser
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    report = run(args)
+    _print_report(report)
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+    failures = _check_limits(report, args)
+    for failure in failures:
+        print(f"LIMITE EXCEDIDO: {failure}", file=sys.stderr)
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,235 @@
+"""
+Microbenchmarks dos caminhos quentes em Python puro.
+
+Mede as funções que rodam a cada mensagem (classificação, detecção de
+ferramentas, formatação para WhatsApp, limpeza de memória, serialização do
+contexto) com um corpus em português e conversas de 1000 mensagens.
+
+    python -m benchmarks.micro run --output benchmarks/micro_baseline.json
+    python -m benchmarks.micro compare benchmarks/micro_baseline.json
+
+O compare roda os benchmarks (ou lê --current) e sai com código 1 quando
+algum benchmark piora mais que --threshold em relação ao baseline. Por
+padrão compara o mínimo das rodadas, que é bem menos sensível a ruído da
+máquina que a mediana.
+"""
+from typing import Dict, Any, List, Callable, Optional, Tuple
+from datetime import datetime, timedelta
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+
+from .corpus import MESSAGES
+
+# O app lê as settings do ambiente na importação; nenhum benchmark faz I/O
+for _key in ("MEGAAPI_TOKEN", "MEGAAPI_INSTANCE_ID", "MEGAAPI_HOST", "SUPABASE_URL", "SUPABASE_KEY",
+             "MISTRAL_API_KEY", "OPENAI_API_KEY", "GEMINI_API_KEY", "DEEPSEEK_API_KEY", "ANTHROPIC_API_KEY"):
+    os.environ.setdefault(_key, "benchmark")
+os.environ.setdefault("MCP_SERVERS", "[]")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+CONVERSATION_SIZE = 1000
+
+# Resposta típica de LLM com markdown (negrito e listas) para a formatação do WhatsApp
+MARKDOWN_RESPONSE = "\n".join(
+    ["**Resumo da análise**", ""]
+    + [f"- **Ponto {i}**: {MESSAGES[i % len(MESSAGES)]}" for i in range(12)]
+    + ["", "Se quiser, posso **detalhar** qualquer um dos itens acima."]
+)
+
+def build_conversation(size: int = CONVERSATION_SIZE) -> List[Dict[str, Any]]:
+    """Conversa com size mensagens espalhadas nas últimas 48h (metade expira no corte de 24h)"""
+    now = datetime.utcnow()
+    llms = ("openai", "anthropic", "gemini", "deepseek")
+    conversation = []
+    for i in range(size):
+        is_user = i % 2 == 0
+        message = {
+            "id": f"msg-{i}",
+            "is_user": is_user,
+            "message": MESSAGES[i % len(MESSAGES)],
+            "timestamp": (now - timedelta(hours=48) + timedelta(seconds=i * 48 * 3600 / size)).isoformat()
+        }
+        if not is_user:
+            message.update({
+                "llm": llms[(i // 6) % len(llms)],
+                "model": "benchmark",
+                "metadata": {"classification": "simples", "total_tokens": 120},
+                "classification": "simples"
+            })
+        conversation.append(message)
+    return conversation
+
+def _run_coroutine(coro):
+    """Executa uma corrotina que não aguarda nada, sem custo de event loop"""
+    try:
+        coro.send(None)
+    except StopIteration as stop:
+        return stop.value
+    raise RuntimeError("A corrotina aguardou I/O; não é um caminho puramente de CPU")
+
+def build_benchmarks() -> Dict[str, Callable[[], Any]]:
+    """Cada benchmark processa o corpus inteiro (ou uma conversa) por chamada"""
+    from app.llm_router import llm_router
+    from app.agent import ineuro_agent
+    from app.whatsapp import whatsapp_client
+    from app.memory_agent import MemoryAgent
+    from app.mcp_catalog import ToolSpec
+
+    memory = MemoryAgent(None)
+    # Catálogo típico: uma ferramenta de busca e uma de execução de código
+    catalog = [
+        ToolSpec("web_search", "search_web", "Busca na web", {"type": "object", "properties": {"query": {"type": "string"}}, "required": ["query"]}),
+        ToolSpec("run_python", "run_python_code", "Executa código Python", {"type": "object", "properties": {"python_code": {"type": "string"}}}),
+    ]
+    conversation = build_conversation()
+    llm_history = [msg for msg in conversation if not msg["is_user"]]
+
+    def classify():
+        for message in MESSAGES:
+            llm_router._classify_query_complexity(message)
+
+    def task_type():
+        for message in MESSAGES:
+            _run_coroutine(ineuro_agent._get_task_type(message))
+
+    def tool_need():
+        for message in MESSAGES:
+            _run_coroutine(llm_router.detect_tool_need(message, catalog))
+
+    def whatsapp_format():
+        whatsapp_client.format_message_for_whatsapp(MARKDOWN_RESPONSE)
+
+    def clean_old_messages():
+        memory._clean_old_messages(conversation)
+
+    def context_switches():
+        memory._count_context_switches(llm_history)
+
+    def context_json():
+        json.dumps(conversation, ensure_ascii=False)
+
+    return {
+        "classify_query_complexity": classify,
+        "get_task_type": task_type,
+        "detect_tool_need": tool_need,
+        "format_message_for_whatsapp": whatsapp_format,
+        "clean_old_messages_1000": clean_old_messages,
+        "count_context_switches_1000": context_switches,
+        "context_json_dumps_1000": context_json,
+    }
+
+def measure(func: Callable[[], Any], repeat: int = 7, min_time: float = 0.05) -> Dict[str, Any]:
+    """
+    Calibra o número de iterações para cada rodada durar ao menos min_time e
+    retorna estatísticas por chamada (em microssegundos) das rodadas.
+    """
+    func()  # aquecimento
+    loops = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(loops):
+            func()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            break
+        loops *= 2 if elapsed == 0 else max(2, int(min_time / elapsed) + 1)
+
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(loops):
+            func()
+        samples.append((time.perf_counter() - start) / loops * 1e6)
+    return {
+        "loops": loops,
+        "median_us": round(statistics.median(samples), 3),
+        "min_us": round(min(samples), 3),
+        "stdev_us": round(statistics.stdev(samples), 3) if len(samples) > 1 else 0.0,
+    }
+
+def run(names: Optional[List[str]] = None, repeat: int = 7, min_time: float = 0.05) -> Dict[str, Any]:
+    benchmarks = build_benchmarks()
+    selected = names or list(benchmarks)
+    return {
+        "meta": {
+            "python": platform.python_version(),
+            "implementation": platform.python_implementation(),
+            "machine": platform.machine(),
+            "timestamp": datetime.utcnow().isoformat(),
+        },
+        "benchmarks": {name: measure(benchmarks[name], repeat, min_time) for name in selected},
+    }
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any], threshold: float = 0.25,
+            metric: str = "min_us") -> List[Tuple[str, float, float, float, str]]:
+    """Compara a métrica escolhida; retorna (nome, baseline_us, atual_us, variação, status) por benchmark"""
+    rows = []
+    for name, base in baseline["benchmarks"].items():
+        result = current["benchmarks"].get(name)
+        if result is None:
+            rows.append((name, base[metric], 0.0, 0.0, "missing"))
+            continue
+        change = result[metric] / base[metric] - 1 if base[metric] else 0.0
+        if change > threshold:
+            status = "REGRESSION"
+        elif change < -threshold:
+            status = "faster"
+        else:
+            status = "ok"
+        rows.append((name, base[metric], result[metric], change, status))
+    return rows
+
+def _print_results(results: Dict[str, Any]):
+    print(f"{'benchmark':<30} {'median_us':>12} {'min_us':>12} {'stdev_us':>10} {'loops':>8}")
+    for name, stats in results["benchmarks"].items():
+        print(f"{name:<30} {stats['median_us']:>12} {stats['min_us']:>12} {stats['stdev_us']:>10} {stats['loops']:>8}")
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Microbenchmarks dos caminhos quentes")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = sub.add_parser("run", help="Executa os benchmarks")
+    run_parser.add_argument("--output", help="Salva o resultado em JSON (ex.: baseline)")
+
+    compare_parser = sub.add_parser("compare", help="Compara com um baseline")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("--current", help="Resultado já salvo; se omitido, roda os benchmarks")
+    compare_parser.add_argument("--threshold", type=float, default=0.25, help="Piora relativa tolerada")
+    compare_parser.add_argument("--metric", choices=("min_us", "median_us"), default="min_us")
+
+    for sub_parser in (run_parser, compare_parser):
+        sub_parser.add_argument("--bench", nargs="+", help="Roda apenas os benchmarks indicados")
+        sub_parser.add_argument("--repeat", type=int, default=7)
+        sub_parser.add_argument("--min-time", type=float, default=0.05)
+
+    args = parser.parse_args(argv)
+
+    if args.command == "run":
+        results = run(args.bench, args.repeat, args.min_time)
+        _print_results(results)
+        if args.output:
+            with open(args.output, "w", encoding="utf-8") as f:
+                json.dump(results, f, indent=2)
+        return 0
+
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline = json.load(f)
+    if args.current:
+        with open(args.current, encoding="utf-8") as f:
+            current = json.load(f)
+    else:
+        current = run(args.bench or list(baseline["benchmarks"]), args.repeat, args.min_time)
+
+    rows = compare(baseline, current, args.threshold, args.metric)
+    print(f"{'benchmark':<30} {'baseline_us':>12} {'current_us':>12} {'change':>8}  status")
+    for name, base_us, current_us, change, status in rows:
+        print(f"{name:<30} {base_us:>12} {current_us:>12} {change:>+8.1%}  {status}")
+    return 1 if any(row[4] in ("REGRESSION", "missing") for row in rows) else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
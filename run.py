@@ -1,11 +1,25 @@
 import uvicorn
-from app.main import app
+from app.settings import get_settings
 
 if __name__ == "__main__":
-    uvicorn.run(
-        "app.main:app",
-        host="0.0.0.0",
-        port=8000,
-        reload=True,
-        workers=1
-    )
\ No newline at end of file
+    settings = get_settings()
+
+    if settings.ENVIRONMENT == "production":
+        # Vários workers, sem reload; o estado compartilhado deve usar Redis (SHARED_STATE_URL)
+        uvicorn.run(
+            "app.main:app",
+            host="0.0.0.0",
+            port=settings.PORT,
+            workers=settings.WEB_CONCURRENCY,
+            reload=False,
+            proxy_headers=True,
+            log_level=settings.LOG_LEVEL.lower()
+        )
+    else:
+        uvicorn.run(
+            "app.main:app",
+            host="0.0.0.0",
+            port=settings.PORT,
+            reload=True,
+            workers=1
+        )